@@ -0,0 +1,68 @@
+import loopy as lp
+import numpy as np
+from time import time
+
+from loopy.target.c import ExecutableCTarget
+from loopy.version import LOOPY_USE_LANGUAGE_VERSION_2018_2  # noqa
+
+
+NRUNS = 3
+
+# L1 and L2 capacities of the machine, in bytes
+CACHE_SIZES = (32*1024, 256*1024)
+
+
+def make_kernels(n):
+    # the kernels of test_plain_matrix_mul and test_transpose in
+    # test/test_linalg.py, on the C target
+    matmul = lp.make_kernel(
+            "{[i,j,k]: 0<=i,j,k<n}",
+            "c[i, j] = sum(k, a[i, k]*b[k, j])",
+            [lp.GlobalArg("a,b,c", np.float64, shape=("n", "n")), "..."],
+            name="matmul", target=ExecutableCTarget())
+
+    transpose = lp.make_kernel(
+            "{[i,j]: 0<=i,j<n}",
+            "b[i, j] = a[j, i]",
+            [lp.GlobalArg("a,b", np.float64, shape=("n", "n")), "..."],
+            name="transpose", target=ExecutableCTarget())
+
+    a = np.random.rand(n, n)
+    b = np.random.rand(n, n)
+
+    return [
+            (matmul, 2*n**3, dict(a=a, b=b, c=np.empty((n, n)))),
+            (transpose, n**2, dict(a=a, b=np.empty((n, n)))),
+            ]
+
+
+def time_per_run(knl, args):
+    # compile
+    knl(**args)
+
+    start_time = time()
+    for irun in range(NRUNS):
+        knl(**args)
+    return (time() - start_time)/NRUNS
+
+
+def main():
+    n = 1024
+
+    for knl, nops, args in make_kernels(n):
+        variants = [
+                ("untiled", knl),
+                ("auto_tile", lp.auto_tile(
+                    knl, CACHE_SIZES, parameters={"n": n})),
+                ("auto_tile, prefetch", lp.auto_tile(
+                    knl, CACHE_SIZES, parameters={"n": n}, prefetch=True)),
+                ]
+
+        for variant_name, variant in variants:
+            elapsed = time_per_run(variant, args)
+            print("%-12s %-22s %8.4f s %10.3f Gop/s"
+                    % (knl.name, variant_name, elapsed, nops/elapsed/1e9))
+
+
+if __name__ == "__main__":
+    main()
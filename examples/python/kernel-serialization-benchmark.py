@@ -0,0 +1,92 @@
+import loopy as lp
+import numpy as np
+import pickle
+from time import time
+
+from loopy.kernel.serialization import (dump_kernel, load_kernel,
+        load_kernel_fields, _isl_object_cache)
+
+
+NRUNS = 20
+
+
+def make_kernel(n=8):
+    knl = lp.make_kernel(
+            "{[i,j,e,m,o,o2]: 0<=i,j,m,o,o2<n and 0<=e<K}",
+            [
+                "ur(a,b) := simul_reduce(sum, o, D[a,o]*u[e,o,b])",
+                "us(a,b) := simul_reduce(sum, o2, D[b,o2]*u[e,a,o2])",
+                "Gux(a,b) := G$x[0,e,a,b]*ur(a,b)+G$x[1,e,a,b]*us(a,b)",
+                "Guy(a,b) := G$y[1,e,a,b]*ur(a,b)+G$y[2,e,a,b]*us(a,b)",
+                "lap[e,i,j]  = "
+                "  simul_reduce(sum, m, D[m,i]*Gux(m,j))"
+                "+ simul_reduce(sum, m, D[m,j]*Guy(i,m))"
+            ],
+            [
+                lp.GlobalArg("u,lap", np.float32, shape=("K", n, n)),
+                lp.GlobalArg("G", np.float32, shape=(3, "K", n, n)),
+                lp.GlobalArg("D", np.float32, shape=(n, n)),
+                lp.ValueArg("K", np.int32),
+                ],
+            name="semlap2D", assumptions="K>=1")
+
+    knl = lp.fix_parameters(knl, n=n)
+    knl = lp.duplicate_inames(knl, "o", within="id:ur")
+    knl = lp.duplicate_inames(knl, "o", within="id:us")
+    knl = lp.tag_inames(knl, dict(i="l.0", j="l.1", e="g.0"))
+
+    knl = lp.add_prefetch(knl, "D[:,:]", default_tag="l.auto")
+    knl = lp.add_prefetch(knl, "u[e, :, :]", default_tag="l.auto")
+    knl = lp.precompute(knl, "ur(m,j)", ["m", "j"], default_tag="l.auto")
+    knl = lp.precompute(knl, "us(i,m)", ["i", "m"], default_tag="l.auto")
+
+    knl = lp.preprocess_kernel(knl)
+    return lp.get_one_scheduled_kernel(knl)
+
+
+def time_per_run(f):
+    start_time = time()
+    for irun in range(NRUNS):
+        f()
+    return (time() - start_time)/NRUNS
+
+
+def main():
+    knl = make_kernel()
+
+    pickled = pickle.dumps(knl, pickle.HIGHEST_PROTOCOL)
+    serialized = dump_kernel(knl)
+
+    assert load_kernel(serialized) == knl
+
+    print("size [bytes]: pickle %d, dump_kernel %d"
+            % (len(pickled), len(serialized)))
+
+    def touch_all(k):
+        # pickle already loads instructions lazily
+        list(k.instructions)
+
+    def load_cold():
+        # as in a fresh process
+        _isl_object_cache.clear()
+        touch_all(load_kernel(serialized, lazy=False))
+
+    results = [
+            ("pickle, full", lambda: touch_all(pickle.loads(pickled))),
+            ("load_kernel, full, cold", load_cold),
+            ("load_kernel, full",
+                lambda: touch_all(load_kernel(serialized, lazy=False))),
+            ("pickle, args only", lambda: pickle.loads(pickled).args),
+            ("load_kernel, args only", lambda: load_kernel(serialized).args),
+            ("load_kernel_fields, args only",
+                lambda: load_kernel_fields(serialized, ["args"])),
+            ]
+
+    for name, f in results:
+        print("load time [ms]: %-30s %.3f" % (name, 1e3*time_per_run(f)))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=marker
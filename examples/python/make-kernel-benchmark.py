@@ -0,0 +1,48 @@
+import loopy as lp
+import numpy as np
+from time import time
+
+from loopy.version import LOOPY_USE_LANGUAGE_VERSION_2018_2  # noqa
+
+
+INSTRUCTION_COUNTS = [10**2, 10**3, 3*10**3, 10**4]
+
+
+def make_instructions(ninsns):
+    # mimics generated code: repeated expressions, glob dependencies and
+    # 'for' blocks
+    insns = []
+    for k in range(ninsns // 3):
+        insns.extend([
+            "<> t%d = a[i]*%d + sin(b[i])  {id=t%d}" % (k, k % 7, k),
+            "out[i] = out[i] + t%d  {id=acc%d%s}" % (
+                k, k, ",dep=acc%d*" % (k-1) if k else ""),
+            "for j",
+            "    c[i, j] = c[i, j] + t%d*b[j]  {id=c%d,dep=acc%d}" % (k, k, k),
+            "end",
+            ])
+
+    return insns
+
+
+def main():
+    for ninsns in INSTRUCTION_COUNTS:
+        insns = make_instructions(ninsns)
+
+        start_time = time()
+        knl = lp.make_kernel(
+                "{[i,j]: 0<=i,j<n}",
+                insns,
+                [
+                    lp.GlobalArg("a,b,out", np.float64, shape="n"),
+                    lp.GlobalArg("c", np.float64, shape="n, n"),
+                    "..."])
+        elapsed = time() - start_time
+
+        print("%6d instructions %8.3f s %8.1f us/instruction" % (
+            len(knl.instructions), elapsed,
+            elapsed/len(knl.instructions)*1e6))
+
+
+if __name__ == "__main__":
+    main()
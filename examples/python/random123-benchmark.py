@@ -0,0 +1,76 @@
+import loopy as lp
+import numpy as np
+from time import time
+
+from loopy.target.c.c_execution import CCompiler
+
+
+NRUNS = 5
+
+N = 2**24
+
+# include directories containing Random123/philox.h and Random123/threefry.h,
+# if they are not on the default include path
+RANDOM123_INCLUDE_DIRS = []
+
+VARIANTS = [
+        ("philox4x32", np.uint32),
+        ("philox4x32", np.float32),
+        ("philox4x32", np.float64),
+        ("threefry4x64", np.uint64),
+        ("threefry4x64", np.float32),
+        ("threefry4x64", np.float64),
+        ]
+
+
+def time_per_run(fill, ary):
+    # compile
+    fill(ary)
+
+    start_time = time()
+    for irun in range(NRUNS):
+        fill(ary)
+    return (time() - start_time)/NRUNS
+
+
+def get_queue():
+    try:
+        import pyopencl as cl
+        ctx = cl.create_some_context(interactive=False)
+    except Exception:
+        return None
+
+    return cl.CommandQueue(ctx)
+
+
+def main():
+    compiler = CCompiler(include_dirs=RANDOM123_INCLUDE_DIRS)
+    queue = get_queue()
+
+    for rng, dtype in VARIANTS:
+        key = (1234,) + (0,)*(3 if rng == "threefry4x64" else 1)
+
+        def fill_c(ary):
+            lp.fill_random123(ary, key, rng=rng, compiler=compiler)
+
+        executors = [("C", fill_c, np.empty(N, dtype))]
+
+        if queue is not None:
+            import pyopencl.array as cl_array
+
+            def fill_cl(ary):
+                lp.fill_random123(ary, key, rng=rng)
+                queue.finish()
+
+            executors.append(
+                    ("PyOpenCL", fill_cl, cl_array.empty(queue, N, dtype)))
+
+        for executor_name, fill, ary in executors:
+            elapsed = time_per_run(fill, ary)
+            print("%-12s %-8s %-8s %8.4f s %8.3f GB/s" % (
+                rng, np.dtype(dtype).name, executor_name, elapsed,
+                ary.nbytes/elapsed/1e9))
+
+
+if __name__ == "__main__":
+    main()
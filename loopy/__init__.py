@@ -78,7 +78,7 @@ from loopy.transform.iname import (
         add_inames_to_insn)
 
 from loopy.transform.instruction import (
-        find_instructions, map_instructions,
+        find_instructions, map_instructions, intern_expressions,
         set_instruction_priority, add_dependency,
         remove_instructions,
         replace_instruction_ids,
@@ -113,12 +113,20 @@ from loopy.transform.padding import (
 
 from loopy.transform.privatize import privatize_temporaries_with_inames
 from loopy.transform.batch import to_batched
-from loopy.transform.parameter import assume, fix_parameters
+from loopy.transform.parameter import (assume, fix_parameters,
+        make_multiversioned_kernel, MultiVersionedKernel)
 from loopy.transform.save import save_and_reload_temporaries
+from loopy.transform.storage_reuse import (
+        reuse_temporary_storage, get_temporary_storage_footprint)
 from loopy.transform.add_barrier import add_barrier
+from loopy.transform.tiling import auto_tile
+from loopy.transform.parallelize import (
+        iname_dependence_kind, get_iname_dependence_kinds, auto_parallelize,
+        parallelize_reduction)
 # }}}
 
-from loopy.type_inference import infer_unknown_types
+from loopy.type_inference import (infer_unknown_types,
+        infer_arg_independent_types, infer_types_for_arg_dtypes)
 from loopy.preprocess import preprocess_kernel, realize_reduction
 from loopy.schedule import generate_loop_schedules, get_one_scheduled_kernel
 from loopy.statistics import (ToCountMap, CountGranularity, stringify_stats_mapping,
@@ -126,6 +134,10 @@ from loopy.statistics import (ToCountMap, CountGranularity, stringify_stats_mapp
         get_DRAM_access_poly, get_gmem_access_poly, get_mem_access_map,
         get_synchronization_poly, get_synchronization_map,
         gather_access_footprints, gather_access_footprint_bytes)
+from loopy.performance_model import (MachineDescription, get_performance_model,
+        rank_kernel_variants, calibrate_machine_description)
+from loopy.cache_simulation import (get_memory_access_trace, CacheLevel,
+        simulate_cache)
 from loopy.codegen import (
         PreambleInfo,
         generate_code, generate_code_v2, generate_body)
@@ -133,6 +145,9 @@ from loopy.codegen.result import (
         GeneratedProgram,
         CodeGenerationResult)
 from loopy.compiled import CompiledKernel
+from loopy.lazy import LazyKernelGraph, LazyArray
+from loopy.library.random123 import (
+        make_random123_fill_kernel, fill_random123, get_random123_block_size)
 from loopy.options import Options
 from loopy.auto_test import auto_test_vs_ref
 from loopy.frontend.fortran import (c_preprocess, parse_transformed_fortran,
@@ -194,7 +209,7 @@ __all__ = [
         "alias_temporaries", "set_argument_order",
         "rename_argument", "set_temporary_scope",
 
-        "find_instructions", "map_instructions",
+        "find_instructions", "map_instructions", "intern_expressions",
         "set_instruction_priority", "add_dependency",
         "remove_instructions",
         "replace_instruction_ids",
@@ -217,11 +232,17 @@ __all__ = [
         "to_batched",
 
         "assume", "fix_parameters",
+        "make_multiversioned_kernel", "MultiVersionedKernel",
 
         "save_and_reload_temporaries",
+        "reuse_temporary_storage", "get_temporary_storage_footprint",
 
         "add_barrier",
 
+        "auto_tile",
+        "iname_dependence_kind", "get_iname_dependence_kinds",
+        "auto_parallelize", "parallelize_reduction",
+
         # }}}
 
         "get_dot_dependency_graph",
@@ -236,6 +257,7 @@ __all__ = [
         "to_loopy_type",
 
         "infer_unknown_types",
+        "infer_arg_independent_types", "infer_types_for_arg_dtypes",
 
         "preprocess_kernel", "realize_reduction",
         "generate_loop_schedules", "get_one_scheduled_kernel",
@@ -249,8 +271,17 @@ __all__ = [
         "get_synchronization_poly", "get_synchronization_map",
         "gather_access_footprints", "gather_access_footprint_bytes",
 
+        "MachineDescription", "get_performance_model", "rank_kernel_variants",
+        "calibrate_machine_description",
+        "get_memory_access_trace", "CacheLevel", "simulate_cache",
+
         "CompiledKernel",
 
+        "LazyKernelGraph", "LazyArray",
+
+        "make_random123_fill_kernel", "fill_random123",
+        "get_random123_block_size",
+
         "auto_test_vs_ref",
 
         "Options",
@@ -275,6 +306,9 @@ __all__ = [
 
         "set_caching_enabled",
         "CacheMode",
+        "set_transform_caching_enabled",
+        "set_bounds_caching_enabled",
+        "set_executor_cache_limits",
         "make_copy_kernel",
 
         # }}}
@@ -405,6 +439,77 @@ def set_caching_enabled(flag):
     CACHING_ENABLED = flag
 
 
+TRANSFORM_CACHING_ENABLED = "LOOPY_TRANSFORM_CACHE" in os.environ
+
+
+def set_transform_caching_enabled(flag):
+    """Set whether transformations decorated with
+    :func:`loopy.transform.cache.memoize_transform` may look up and store their
+    results in a disk cache. This is off by default, unless the
+    ``LOOPY_TRANSFORM_CACHE`` environment variable is set, and has no effect
+    if caching is disabled by :func:`set_caching_enabled`.
+
+    .. versionadded:: 2018.2
+    """
+    global TRANSFORM_CACHING_ENABLED
+    TRANSFORM_CACHING_ENABLED = flag
+
+
+BOUNDS_CACHING_ENABLED = "LOOPY_BOUNDS_CACHE" in os.environ
+
+
+def set_bounds_caching_enabled(flag):
+    """Set whether the base indices and lengths of loops and array axes found
+    by :class:`loopy.kernel.tools.SetOperationCacheManager` may be looked up
+    and stored in a disk cache, in addition to the in-memory one. This is
+    off by default, unless the ``LOOPY_BOUNDS_CACHE`` environment variable
+    is set, and has no effect if caching is disabled by
+    :func:`set_caching_enabled`.
+
+    .. versionadded:: 2018.2
+    """
+    global BOUNDS_CACHING_ENABLED
+    BOUNDS_CACHING_ENABLED = flag
+
+
+def _get_int_from_environ(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    elif value.lower() == "none":
+        return None
+    else:
+        return int(value)
+
+
+EXECUTOR_CACHE_MAX_ENTRIES = _get_int_from_environ(
+        "LOOPY_EXECUTOR_CACHE_MAX_ENTRIES", 128)
+EXECUTOR_CACHE_MAX_BYTES = _get_int_from_environ(
+        "LOOPY_EXECUTOR_CACHE_MAX_BYTES", None)
+
+
+def set_executor_cache_limits(max_entries=None, max_bytes=None):
+    """Set the maximum number of kernel executors (which hold compiled code,
+    see :meth:`LoopKernel.__call__`) and their maximum estimated memory usage
+    in bytes, across all kernels. *None* means no limit. Beyond these, the
+    least recently used executors are evicted from
+    :attr:`LoopKernel.executor_cache`.
+
+    The defaults are 128 executors and no limit on memory usage, or the
+    values of the ``LOOPY_EXECUTOR_CACHE_MAX_ENTRIES`` and
+    ``LOOPY_EXECUTOR_CACHE_MAX_BYTES`` environment variables.
+
+    .. versionadded:: 2018.2
+    """
+    global EXECUTOR_CACHE_MAX_ENTRIES
+    global EXECUTOR_CACHE_MAX_BYTES
+    EXECUTOR_CACHE_MAX_ENTRIES = max_entries
+    EXECUTOR_CACHE_MAX_BYTES = max_bytes
+
+    from loopy.target.execution import enforce_executor_cache_limits
+    enforce_executor_cache_limits()
+
+
 class CacheMode(object):
     """A context manager for setting whether :mod:`loopy` is allowed to use
     disk caches.
@@ -0,0 +1,809 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import six
+import numpy as np
+
+from pytools import ImmutableRecord
+from loopy.diagnostic import LoopyError
+from loopy.symbolic import WalkMapper
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+Simulation of the behavior of a (CPU-like) cache hierarchy for the memory
+accesses of a kernel with given parameter values. This allows judging
+transformations such as :func:`split_iname`, :func:`add_prefetch` or
+:func:`buffer_array` on machines without (accessible) hardware performance
+counters.
+
+The trace of accesses is obtained from the schedule of the kernel: loops
+are executed in the order given by the schedule, work groups one after the
+other, and, for each instruction, all work items of a group (and all
+values of other parallel inames) one after the other, with ``l.0`` varying
+fastest. Within an instruction, the array elements read are accessed (in
+the order in which they occur in the expression) before those written.
+Variables without an index (e.g. scalar temporaries) are assumed to be held
+in registers, and instruction predicates are disregarded.
+
+.. currentmodule:: loopy
+
+.. autofunction:: get_memory_access_trace
+
+.. autoclass:: CacheLevel
+
+.. autofunction:: simulate_cache
+
+.. currentmodule:: loopy.cache_simulation
+
+.. autoclass:: MemoryAccessTrace
+
+.. autoclass:: CacheStatistics
+
+.. autoclass:: CacheSimulationResult
+
+.. currentmodule:: loopy
+
+.. versionadded:: 2018.2
+"""
+
+
+# {{{ access trace
+
+class MemoryAccessTrace(object):
+    """A sequence of memory accesses, as obtained by
+    :func:`loopy.get_memory_access_trace`. All attributes other than
+    *array_names* and *insn_ids* are :class:`numpy.ndarray` instances with
+    one entry per access.
+
+    .. attribute:: addresses
+
+        The byte address of the first byte accessed.
+
+    .. attribute:: sizes
+
+        The number of bytes accessed.
+
+    .. attribute:: is_write
+
+    .. attribute:: array_indices
+
+        Indices into *array_names*.
+
+    .. attribute:: insn_indices
+
+        Indices into *insn_ids*.
+
+    .. attribute:: array_names
+
+    .. attribute:: array_base_addresses
+
+        A :class:`dict` mapping array names to the address at which they start.
+
+    .. attribute:: insn_ids
+    """
+
+    def __init__(self, addresses, sizes, is_write, array_indices, insn_indices,
+            array_names, array_base_addresses, insn_ids):
+        self.addresses = addresses
+        self.sizes = sizes
+        self.is_write = is_write
+        self.array_indices = array_indices
+        self.insn_indices = insn_indices
+        self.array_names = array_names
+        self.array_base_addresses = array_base_addresses
+        self.insn_ids = insn_ids
+
+    def __len__(self):
+        return len(self.addresses)
+
+
+class _AccessGatherer(WalkMapper):
+    def __init__(self, array_names):
+        self.array_names = array_names
+        self.accesses = []
+
+    def map_subscript(self, expr):
+        if expr.aggregate.name in self.array_names:
+            self.accesses.append(expr)
+
+        self.rec(expr.index)
+
+
+def _get_domain_points(domain, inames, parameters):
+    """Return a :class:`dict` mapping each of *inames* to a
+    :class:`numpy.ndarray` of its values at the integer points of *domain*.
+    """
+    import islpy as isl
+    dim_type = isl.dim_type
+
+    for i in range(domain.dim(dim_type.param) - 1, -1, -1):
+        name = domain.get_dim_name(dim_type.param, i)
+        if name not in parameters:
+            raise LoopyError("no value given for parameter '%s'" % name)
+        domain = domain.fix_val(dim_type.param, i, parameters[name])
+    domain = domain.project_out(dim_type.param, 0, domain.dim(dim_type.param))
+
+    set_names = [
+            domain.get_dim_name(dim_type.set, i)
+            for i in range(domain.dim(dim_type.set))]
+    assert set(set_names) == set(inames)
+
+    result = dict((iname, []) for iname in inames)
+
+    from loopy.isl_helpers import static_min_of_pw_aff, static_max_of_pw_aff
+
+    for bset in domain.make_disjoint().get_basic_sets():
+        if bset.is_empty():
+            continue
+
+        if bset.dim(dim_type.div):
+            # existentially quantified variables, e.g. from strides: let isl
+            # enumerate the points
+            points = []
+            bset.foreach_point(points.append)
+            for iname in inames:
+                result[iname].append(np.array([
+                    pt.get_coordinate_val(
+                        dim_type.set, set_names.index(iname)).to_python()
+                    for pt in points], dtype=np.int64))
+            continue
+
+        # Enumerate the bounding box, then filter by the constraints.
+        ranges = []
+        for i in range(len(set_names)):
+            lower = static_min_of_pw_aff(
+                    bset.dim_min(i), constants_only=True)
+            upper = static_max_of_pw_aff(
+                    bset.dim_max(i), constants_only=True)
+            ranges.append(np.arange(
+                lower.get_constant_val().to_python(),
+                upper.get_constant_val().to_python() + 1,
+                dtype=np.int64))
+
+        grid = np.meshgrid(*ranges, indexing="ij")
+        values = dict(
+                (name, axis_values.ravel())
+                for name, axis_values in zip(set_names, grid))
+
+        npoints = values[set_names[0]].size if set_names else 1
+        mask = np.ones(npoints, dtype=np.bool_)
+        for constr in bset.get_constraints():
+            lhs = 0
+            for name, coeff in six.iteritems(constr.get_coefficients_by_name()):
+                coeff = coeff.to_python()
+                if name == 1:
+                    lhs = lhs + coeff
+                else:
+                    lhs = lhs + coeff*values[name]
+
+            if constr.is_equality():
+                mask &= (lhs == 0)
+            else:
+                mask &= (lhs >= 0)
+
+        for iname in inames:
+            result[iname].append(values[iname][mask])
+
+    return dict(
+            (iname, np.concatenate(vals) if vals else np.zeros(0, np.int64))
+            for iname, vals in six.iteritems(result))
+
+
+def _get_array_layout(kernel, parameters, alignment):
+    """Return a tuple ``(array_names, base_addresses, strides)``, where
+    *strides* maps array names to tuples of strides in bytes.
+    """
+    from pymbolic import evaluate
+    from loopy.kernel.array import ArrayBase, FixedStrideArrayDimTag
+
+    array_names = []
+    base_addresses = {}
+    strides = {}
+
+    storage_to_address = {}
+    next_address = 0
+
+    arrays = [
+            ary for ary in kernel.args
+            if isinstance(ary, ArrayBase)]
+    arrays.extend(
+            tv for tv in six.itervalues(kernel.temporary_variables)
+            if tv.shape)
+
+    for ary in arrays:
+        if ary.dim_tags is None:
+            raise LoopyError("array '%s' has no layout information"
+                    % ary.name)
+
+        itemsize = ary.dtype.numpy_dtype.itemsize
+        ary_strides = []
+        for dim_tag in ary.dim_tags:
+            if not isinstance(dim_tag, FixedStrideArrayDimTag):
+                raise LoopyError("array '%s': unsupported dimension "
+                        "implementation tag '%s'" % (ary.name, dim_tag))
+            ary_strides.append(itemsize*evaluate(dim_tag.stride, parameters))
+
+        nbytes = itemsize
+        for length, stride in zip(ary.shape, ary_strides):
+            nbytes += (evaluate(length, parameters) - 1)*abs(stride)
+
+        storage = getattr(ary, "base_storage", None) or ary.name
+        if storage not in storage_to_address:
+            storage_to_address[storage] = next_address
+            next_address += (nbytes + alignment - 1) // alignment * alignment
+
+        array_names.append(ary.name)
+        base_addresses[ary.name] = storage_to_address[storage]
+        strides[ary.name] = tuple(ary_strides)
+
+    return array_names, base_addresses, strides
+
+
+def _get_sort_order(keys, ncolumns):
+    """Return the permutation sorting the concatenation of groups of
+    accesses lexicographically by their keys. *keys* is a list of tuples
+    ``(naccesses, columns)``, where each column is either an integer or a
+    :class:`numpy.ndarray` of length *naccesses*.
+    """
+    mins = [None]*ncolumns
+    maxs = [None]*ncolumns
+    for _, columns in keys:
+        assert len(columns) == ncolumns
+        for i, column in enumerate(columns):
+            if isinstance(column, np.ndarray):
+                col_min, col_max = int(column.min()), int(column.max())
+            else:
+                col_min = col_max = column
+
+            mins[i] = col_min if mins[i] is None else min(mins[i], col_min)
+            maxs[i] = col_max if maxs[i] is None else max(maxs[i], col_max)
+
+    # Pack the columns into a single integer if possible, to save memory
+    # and time.
+    weights = [0]*ncolumns
+    weight = 1
+    for i in range(ncolumns - 1, -1, -1):
+        weights[i] = weight
+        weight *= maxs[i] - mins[i] + 1
+
+    if weight < 2**63:
+        packed_keys = []
+        for naccesses, columns in keys:
+            packed = np.zeros(naccesses, dtype=np.int64)
+            for column, col_min, col_weight in zip(columns, mins, weights):
+                packed += (column - col_min) * col_weight
+            packed_keys.append(packed)
+
+        return np.argsort(np.concatenate(packed_keys), kind="mergesort")
+
+    else:
+        stacked_columns = np.concatenate([
+            np.array([
+                np.broadcast_to(column, (naccesses,))
+                for column in columns], dtype=np.int64)
+            for naccesses, columns in keys], axis=1)
+        return np.lexsort(stacked_columns[::-1])
+
+
+def get_memory_access_trace(kernel, parameters, alignment=4096):
+    """Return a :class:`loopy.cache_simulation.MemoryAccessTrace` of the
+    accesses to array elements that *kernel* carries out for the parameter
+    values given by the :class:`dict` *parameters*, in the order described
+    in :mod:`loopy.cache_simulation`.
+
+    :arg alignment: the alignment (in bytes) of the start of each array.
+        Arrays are laid out one after the other, temporaries sharing a
+        :attr:`loopy.TemporaryVariable.base_storage` at the same address.
+
+    The addresses are computed (using :mod:`numpy`) from the strides in the
+    :attr:`loopy.ArrayBase.dim_tags` of the arrays, which must all be
+    :class:`loopy.kernel.array.FixedStrideArrayDimTag` instances.
+    Data-dependent indices are not supported.
+    """
+    import loopy as lp
+    from islpy import dim_type
+    from pymbolic import evaluate
+    from loopy.kernel import kernel_state
+    from loopy.kernel.data import GroupIndexTag, LocalIndexTag
+    from loopy.schedule import (
+            EnterLoop, LeaveLoop, RunInstruction, CallKernel, ReturnFromKernel,
+            Barrier)
+
+    if kernel.state < kernel_state.PREPROCESSED:
+        kernel = lp.preprocess_kernel(kernel)
+    if kernel.schedule is None:
+        kernel = lp.get_one_scheduled_kernel(kernel)
+
+    array_names, base_addresses, strides = _get_array_layout(
+            kernel, parameters, alignment)
+    array_name_to_index = dict(
+            (name, i) for i, name in enumerate(array_names))
+    insn_ids = [insn.id for insn in kernel.instructions]
+    insn_id_to_index = dict((insn_id, i) for i, insn_id in enumerate(insn_ids))
+
+    # {{{ determine the number of key columns
+
+    ngroup_axes = 0
+    nlocal_axes = 0
+    max_nother_parallel = 0
+    max_loop_depth = 0
+
+    loop_inames = []
+    for sched_item in kernel.schedule:
+        if isinstance(sched_item, EnterLoop):
+            loop_inames.append(sched_item.iname)
+            max_loop_depth = max(max_loop_depth, len(loop_inames))
+        elif isinstance(sched_item, LeaveLoop):
+            loop_inames.pop()
+        elif isinstance(sched_item, RunInstruction):
+            nother_parallel = 0
+            for iname in (
+                    kernel.insn_inames(sched_item.insn_id) - set(loop_inames)):
+                tags = kernel.iname_tags_of_type(
+                        iname, (GroupIndexTag, LocalIndexTag))
+                if not tags:
+                    nother_parallel += 1
+                    continue
+                tag, = tags
+                if isinstance(tag, GroupIndexTag):
+                    ngroup_axes = max(ngroup_axes, tag.axis + 1)
+                else:
+                    nlocal_axes = max(nlocal_axes, tag.axis + 1)
+            max_nother_parallel = max(max_nother_parallel, nother_parallel)
+
+    # Each access is identified by a sort key with the following columns:
+    # - index of CallKernel item, group indices (slowest first)
+    # - for each enclosing loop: index of EnterLoop item, value of loop index
+    # - index of RunInstruction item (in place of the next loop, if any)
+    # - local indices (slowest first), other parallel inames (by name)
+    # - position of the access in the instruction
+    nkernel_columns = 1 + ngroup_axes
+    nloop_columns = 2*max_loop_depth + 1
+    ninsn_columns = nlocal_axes + max_nother_parallel + 1
+    ncolumns = nkernel_columns + nloop_columns + ninsn_columns
+
+    # }}}
+
+    keys = []
+    addresses = []
+    sizes = []
+    is_write = []
+    array_indices = []
+    insn_indices = []
+
+    callkernel_idx = 0
+    loop_stack = []
+
+    for sched_idx, sched_item in enumerate(kernel.schedule):
+        if isinstance(sched_item, CallKernel):
+            callkernel_idx = sched_idx
+            continue
+        elif isinstance(sched_item, EnterLoop):
+            loop_stack.append((sched_idx, sched_item.iname))
+            continue
+        elif isinstance(sched_item, LeaveLoop):
+            loop_stack.pop()
+            continue
+        elif isinstance(sched_item, (ReturnFromKernel, Barrier)):
+            continue
+
+        assert isinstance(sched_item, RunInstruction)
+        insn = kernel.id_to_insn[sched_item.insn_id]
+
+        gatherer = _AccessGatherer(array_name_to_index)
+        gatherer(insn.expression)
+        read_accesses = gatherer.accesses
+
+        gatherer = _AccessGatherer(array_name_to_index)
+        for assignee in insn.assignees:
+            gatherer(assignee)
+        write_accesses = gatherer.accesses
+
+        if not (read_accesses or write_accesses):
+            continue
+
+        insn_inames = kernel.insn_inames(insn)
+        domain = (kernel.get_inames_domain(insn_inames)
+                .project_out_except(insn_inames, [dim_type.set]))
+        points = _get_domain_points(domain, insn_inames, parameters)
+
+        npoints = len(points[next(iter(insn_inames))]) if insn_inames else 1
+        if not npoints:
+            continue
+
+        # {{{ build sort key columns for the instances of the instruction
+
+        def const_column(value):
+            return np.full(npoints, value, dtype=np.int64)
+
+        # Constant columns are kept as integers, see _get_sort_order.
+        zero = 0
+
+        group_columns = [zero]*ngroup_axes
+        local_columns = [zero]*nlocal_axes
+        other_parallel_columns = []
+
+        loop_inames = set(iname for _, iname in loop_stack)
+        for iname in sorted(insn_inames - loop_inames):
+            tags = kernel.iname_tags_of_type(
+                    iname, (GroupIndexTag, LocalIndexTag))
+            if tags:
+                tag, = tags
+                if isinstance(tag, GroupIndexTag):
+                    group_columns[ngroup_axes - 1 - tag.axis] = points[iname]
+                else:
+                    local_columns[nlocal_axes - 1 - tag.axis] = points[iname]
+            else:
+                other_parallel_columns.append(points[iname])
+
+        columns = [callkernel_idx] + group_columns
+        for enter_idx, iname in loop_stack:
+            columns.append(enter_idx)
+            columns.append(points[iname])
+        columns.append(sched_idx)
+        columns.extend(
+                [zero]*(nloop_columns - 2*len(loop_stack) - 1))
+        columns.extend(local_columns)
+        columns.extend(other_parallel_columns)
+        columns.extend(
+                [zero]*(max_nother_parallel - len(other_parallel_columns)))
+
+        # }}}
+
+        context = dict(parameters)
+        context.update(points)
+
+        for iaccess, (access, access_is_write) in enumerate(
+                [(access, False) for access in read_accesses]
+                + [(access, True) for access in write_accesses]):
+            name = access.aggregate.name
+            index = access.index_tuple
+
+            if len(index) != len(strides[name]):
+                raise LoopyError("instruction '%s': access to '%s' has "
+                        "%d indices, expected %d" % (
+                            insn.id, name, len(index), len(strides[name])))
+
+            offset = 0
+            for idx_expr, stride in zip(index, strides[name]):
+                try:
+                    idx_value = evaluate(idx_expr, context)
+                except Exception as e:
+                    raise LoopyError("instruction '%s': unable to evaluate "
+                            "index '%s' of '%s' (%s: %s)" % (
+                                insn.id, idx_expr, name, type(e).__name__, e))
+                offset = offset + np.asarray(idx_value, dtype=np.int64)*stride
+
+            keys.append((npoints, columns + [iaccess]))
+            addresses.append(
+                    base_addresses[name]
+                    + np.broadcast_to(offset, (npoints,)).astype(np.int64))
+            sizes.append(const_column(
+                kernel.get_var_descriptor(name).dtype.numpy_dtype.itemsize))
+            is_write.append(np.full(npoints, access_is_write, dtype=np.bool_))
+            array_indices.append(const_column(array_name_to_index[name]))
+            insn_indices.append(const_column(insn_id_to_index[insn.id]))
+
+    if keys:
+        order = _get_sort_order(keys, ncolumns)
+
+        def concat_and_sort(arrays):
+            return np.concatenate(arrays)[order]
+    else:
+        def concat_and_sort(arrays):
+            return np.zeros(0, dtype=np.int64)
+
+    return MemoryAccessTrace(
+            addresses=concat_and_sort(addresses),
+            sizes=concat_and_sort(sizes),
+            is_write=concat_and_sort(is_write).astype(np.bool_),
+            array_indices=concat_and_sort(array_indices),
+            insn_indices=concat_and_sort(insn_indices),
+            array_names=array_names,
+            array_base_addresses=base_addresses,
+            insn_ids=insn_ids)
+
+# }}}
+
+
+# {{{ cache simulation
+
+class CacheLevel(ImmutableRecord):
+    """Describes one level of a hierarchy of set-associative, write-back,
+    write-allocate caches with least-recently-used replacement.
+
+    .. attribute:: name
+    .. attribute:: size
+
+        The capacity in bytes.
+
+    .. attribute:: line_size
+
+        In bytes.
+
+    .. attribute:: associativity
+
+        The number of lines in each set. Must divide the number of lines in
+        the cache.
+    """
+
+    def __init__(self, name, size, line_size=64, associativity=8):
+        nlines = size // line_size
+        if nlines * line_size != size or nlines % associativity:
+            raise LoopyError("cache level '%s': size must be a multiple of "
+                    "line_size*associativity" % name)
+
+        ImmutableRecord.__init__(self, name=name, size=size,
+                line_size=line_size, associativity=associativity)
+
+    @property
+    def nsets(self):
+        return self.size // (self.line_size * self.associativity)
+
+
+class CacheStatistics(ImmutableRecord):
+    """Access statistics for one level of the cache hierarchy.
+
+    .. attribute:: accesses
+
+        The number of accesses reaching this level, including write-backs
+        from the level above.
+
+    .. attribute:: hits
+    .. attribute:: misses
+    .. attribute:: hit_rate
+    .. attribute:: traffic_bytes
+
+        The number of bytes transferred between this level and the next
+        (i.e. lines fetched and lines written back).
+    """
+
+    @property
+    def misses(self):
+        return self.accesses - self.hits
+
+    @property
+    def hit_rate(self):
+        if not self.accesses:
+            return 1.
+        return self.hits / self.accesses
+
+
+class CacheSimulationResult(object):
+    """The result of :func:`loopy.simulate_cache`.
+
+    .. attribute:: levels
+
+        A :class:`list` of :class:`loopy.CacheLevel` instances.
+
+    .. attribute:: total
+
+        A :class:`list` of :class:`CacheStatistics`, one per level.
+
+    .. attribute:: by_array
+
+        A :class:`dict` mapping array names to lists of
+        :class:`CacheStatistics`, one per level.
+
+    .. attribute:: by_instruction
+
+        A :class:`dict` mapping instruction ids to lists of
+        :class:`CacheStatistics`, one per level.
+    """
+
+    def __init__(self, levels, total, by_array, by_instruction):
+        self.levels = levels
+        self.total = total
+        self.by_array = by_array
+        self.by_instruction = by_instruction
+
+    def __str__(self):
+        lines = []
+
+        name_width = max(
+                [20] + [len(name) for name in self.by_array]
+                + [len(name) for name in self.by_instruction])
+
+        def add_rows(title, name_to_stats):
+            lines.append("%-*s %-8s %12s %9s %14s" % (
+                name_width, title,
+                "level", "accesses", "hit rate", "traffic [B]"))
+            for name in sorted(name_to_stats):
+                for level, stats in zip(self.levels, name_to_stats[name]):
+                    lines.append("%-*s %-8s %12d %9.4f %14d" % (
+                        name_width, name,
+                        level.name, stats.accesses, stats.hit_rate,
+                        stats.traffic_bytes))
+
+        add_rows("array", self.by_array)
+        lines.append("")
+        add_rows("instruction", self.by_instruction)
+        lines.append("")
+        add_rows("", {"total": self.total})
+
+        return "\n".join(lines)
+
+
+def _simulate_cache_level(level, addresses, is_write):
+    """Return a tuple ``(hits, next_indices, next_addresses, next_is_write)``.
+    *hits* is a :class:`numpy.ndarray` of :class:`bool`. The accesses that
+    are passed on to the next level are line fetches and write-backs, where
+    *next_indices* gives the index of the access responsible for each
+    (the access that missed, or the last one writing the line written back).
+    """
+    line_size = level.line_size
+    nsets = level.nsets
+    associativity = level.associativity
+
+    lines = addresses // line_size
+    naccesses = len(lines)
+
+    # Accesses to the line accessed just before always hit, so only the
+    # first access of each run of accesses to the same line is simulated.
+    is_run_head = np.ones(naccesses, dtype=np.bool_)
+    is_run_head[1:] = lines[1:] != lines[:-1]
+    head_indices = np.flatnonzero(is_run_head)
+
+    # the last write in each run
+    last_write = np.where(is_write, np.arange(naccesses), -1)
+    last_write = np.maximum.reduceat(last_write, head_indices) \
+            if naccesses else last_write
+
+    hits = np.ones(naccesses, dtype=np.bool_)
+
+    sets = [[] for i in range(nsets)]
+    dirty = {}
+
+    next_indices = []
+    next_addresses = []
+    next_is_write = []
+
+    for head_idx, line, writer in zip(
+            head_indices.tolist(), lines[head_indices].tolist(),
+            last_write.tolist()):
+        ways = sets[line % nsets]
+        if line in ways:
+            if ways[-1] != line:
+                ways.remove(line)
+                ways.append(line)
+        else:
+            hits[head_idx] = False
+
+            next_indices.append(head_idx)
+            next_addresses.append(line*line_size)
+            next_is_write.append(False)
+
+            if len(ways) >= associativity:
+                victim = ways.pop(0)
+                victim_writer = dirty.pop(victim, None)
+                if victim_writer is not None:
+                    next_indices.append(victim_writer)
+                    next_addresses.append(victim*line_size)
+                    next_is_write.append(True)
+
+            ways.append(line)
+
+        if writer >= 0:
+            dirty[line] = writer
+
+    # write back the remaining dirty lines
+    for line, writer in sorted(six.iteritems(dirty)):
+        next_indices.append(writer)
+        next_addresses.append(line*line_size)
+        next_is_write.append(True)
+
+    return (hits,
+            np.array(next_indices, dtype=np.int64),
+            np.array(next_addresses, dtype=np.int64),
+            np.array(next_is_write, dtype=np.bool_))
+
+
+def simulate_cache(kernel, parameters, levels, alignment=4096):
+    """Simulate the behavior of the cache hierarchy described by *levels*
+    (a sequence of :class:`CacheLevel` instances, closest to the processor
+    first) for the accesses of *kernel* with the parameter values given by
+    the :class:`dict` *parameters*. Return a
+    :class:`loopy.cache_simulation.CacheSimulationResult`, reporting hit
+    rates and traffic per array and per instruction.
+
+    *kernel* may also be a :class:`loopy.cache_simulation.MemoryAccessTrace`,
+    as obtained from :func:`get_memory_access_trace` (with *alignment*), in
+    which case *parameters* is ignored.
+
+    Example usage::
+
+        levels = [
+            lp.CacheLevel("L1", 32*1024, associativity=8),
+            lp.CacheLevel("L2", 1024*1024, associativity=16),
+            ]
+        result = lp.simulate_cache(knl, {"n": 512}, levels)
+        print(result)
+        print(result.by_array["a"][0].hit_rate)
+    """
+    if isinstance(kernel, MemoryAccessTrace):
+        trace = kernel
+    else:
+        trace = get_memory_access_trace(kernel, parameters, alignment=alignment)
+
+    narrays = len(trace.array_names)
+    ninsns = len(trace.insn_ids)
+
+    total = []
+    by_array = dict((name, []) for name in trace.array_names)
+    by_insn = dict((insn_id, []) for insn_id in trace.insn_ids)
+
+    # indices into the original trace of the accesses reaching a level
+    trace_indices = np.arange(len(trace))
+    addresses = trace.addresses
+    is_write = trace.is_write
+
+    for level in levels:
+        hits, next_indices, addresses, is_write = _simulate_cache_level(
+                level, addresses, is_write)
+
+        array_indices = trace.array_indices[trace_indices]
+        insn_indices = trace.insn_indices[trace_indices]
+
+        trace_indices = trace_indices[next_indices]
+        next_array_indices = trace.array_indices[trace_indices]
+        next_insn_indices = trace.insn_indices[trace_indices]
+
+        def get_stats(selector_indices, next_selector_indices, nselectors):
+            accesses = np.bincount(selector_indices, minlength=nselectors)
+            level_hits = np.bincount(selector_indices, weights=hits,
+                    minlength=nselectors)
+            traffic = np.bincount(next_selector_indices,
+                    minlength=nselectors) * level.line_size
+
+            return [
+                    CacheStatistics(
+                        accesses=int(accesses[i]),
+                        hits=int(level_hits[i]),
+                        traffic_bytes=int(traffic[i]))
+                    for i in range(nselectors)]
+
+        for name, stats in zip(trace.array_names,
+                get_stats(array_indices, next_array_indices, narrays)):
+            by_array[name].append(stats)
+        for insn_id, stats in zip(trace.insn_ids,
+                get_stats(insn_indices, next_insn_indices, ninsns)):
+            by_insn[insn_id].append(stats)
+
+        total.append(CacheStatistics(
+            accesses=len(hits),
+            hits=int(np.sum(hits)),
+            traffic_bytes=len(next_indices)*level.line_size))
+
+    return CacheSimulationResult(
+            levels=list(levels),
+            total=total,
+            by_array=by_array,
+            by_instruction=by_insn)
+
+# }}}
+
+# vim: foldmethod=marker
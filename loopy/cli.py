@@ -2,6 +2,8 @@ from __future__ import print_function
 
 import sys
 
+import six
+
 import loopy as lp
 import numpy as np
 
@@ -53,82 +55,68 @@ def defines_to_python_code(defines_str):
     return "\n".join(result)
 
 
-def main():
-    from argparse import ArgumentParser
+TARGET_CHOICES = ("opencl", "ispc", "ispc-occa", "c", "c-fortran", "cuda")
 
-    parser = ArgumentParser(description="Stand-alone loopy frontend")
+TARGET_FILE_EXTENSIONS = {
+        "opencl": ".cl",
+        "ispc": ".ispc",
+        "ispc-occa": ".ispc",
+        "c": ".c",
+        "c-fortran": ".c",
+        "cuda": ".cu",
+        }
 
-    parser.add_argument("infile", metavar="INPUT_FILE")
-    parser.add_argument("outfile", default="-", metavar="OUTPUT_FILE",
-            help="Defaults to stdout ('-').", nargs='?')
-    parser.add_argument("--lang", metavar="LANGUAGE", help="loopy|fortran")
-    parser.add_argument("--target", choices=(
-        "opencl", "ispc", "ispc-occa", "c", "c-fortran", "cuda"),
-        default="opencl")
-    parser.add_argument("--name")
-    parser.add_argument("--transform")
-    parser.add_argument("--edit-code", action="store_true")
-    parser.add_argument("--occa-defines")
-    parser.add_argument("--occa-add-dummy-arg", action="store_true")
-    parser.add_argument("--print-ir", action="store_true")
-    args = parser.parse_args()
 
-    if args.target == "opencl":
+def get_target(target_name):
+    if target_name == "opencl":
         from loopy.target.opencl import OpenCLTarget
-        target = OpenCLTarget()
-    elif args.target == "ispc":
+        return OpenCLTarget()
+    elif target_name == "ispc":
         from loopy.target.ispc import ISPCTarget
-        target = ISPCTarget()
-    elif args.target == "ispc-occa":
+        return ISPCTarget()
+    elif target_name == "ispc-occa":
         from loopy.target.ispc import ISPCTarget
-        target = ISPCTarget(occa_mode=True)
-    elif args.target == "c":
+        return ISPCTarget(occa_mode=True)
+    elif target_name == "c":
         from loopy.target.c import CTarget
-        target = CTarget()
-    elif args.target == "c-fortran":
+        return CTarget()
+    elif target_name == "c-fortran":
         from loopy.target.c import CTarget
-        target = CTarget(fortran_abi=True)
-    elif args.target == "cuda":
+        return CTarget(fortran_abi=True)
+    elif target_name == "cuda":
         from loopy.target.cuda import CudaTarget
-        target = CudaTarget()
+        return CudaTarget()
     else:
-        raise ValueError("unknown target: %s" % target)
+        raise ValueError("unknown target: %s" % target_name)
 
-    lp.set_default_target(target)
 
-    lang = None
-    if args.infile == "-":
-        infile_content = sys.stdin.read()
-    else:
-        from os.path import splitext
-        _, ext = splitext(args.infile)
-
-        lang = {
-                ".py": "loopy",
-                ".loopy": "loopy",
-                ".floopy": "fortran",
-                ".f90": "fortran",
-                ".fpp": "fortran",
-                ".f": "fortran",
-                ".f77": "fortran",
-                }.get(ext)
-        with open(args.infile, "r") as infile_fd:
-            infile_content = infile_fd.read()
+def guess_language(filename):
+    from os.path import splitext
+    _, ext = splitext(filename)
 
-    if args.lang is not None:
-        lang = args.lang
+    return {
+            ".py": "loopy",
+            ".loopy": "loopy",
+            ".floopy": "fortran",
+            ".f90": "fortran",
+            ".fpp": "fortran",
+            ".f": "fortran",
+            ".f77": "fortran",
+            }.get(ext)
 
-    if lang is None:
-        raise RuntimeError("unable to deduce input language "
-                "(wrong input file extension? --lang flag?)")
 
+def read_kernels(infile, infile_content, lang, transform=None,
+        occa_defines=None, name=None):
+    """Return the kernels defined by *infile_content*, the contents of the
+    file *infile* in the language *lang*.
+    """
     if lang == "loopy":
         # {{{ path wrangling
 
         from os.path import dirname, abspath
         from os import getcwd
 
-        infile_dirname = dirname(args.infile)
+        infile_dirname = dirname(infile)
         if infile_dirname:
             infile_dirname = abspath(infile_dirname)
         else:
@@ -142,18 +130,17 @@ def main():
         data_dic["lp"] = lp
         data_dic["np"] = np
 
-        if args.occa_defines:
-            with open(args.occa_defines, "r") as defines_fd:
+        if occa_defines:
+            with open(occa_defines, "r") as defines_fd:
                 occa_define_code = defines_to_python_code(defines_fd.read())
-            exec(compile(occa_define_code, args.occa_defines, "exec"), data_dic)
+            exec(compile(occa_define_code, occa_defines, "exec"), data_dic)
 
-        with open(args.infile, "r") as infile_fd:
-            exec(compile(infile_content, args.infile, "exec"), data_dic)
+        exec(compile(infile_content, infile, "exec"), data_dic)
 
-        if args.transform:
-            with open(args.transform, "r") as xform_fd:
+        if transform:
+            with open(transform, "r") as xform_fd:
                 exec(compile(xform_fd.read(),
-                    args.transform, "exec"), data_dic)
+                    transform, "exec"), data_dic)
 
         try:
             kernel = data_dic["lp_knl"]
@@ -161,56 +148,388 @@ def main():
             raise RuntimeError("loopy-lang requires 'lp_knl' "
                     "to be defined on exit")
 
-        if args.name is not None:
-            kernel = kernel.copy(name=args.name)
+        if name is not None:
+            kernel = kernel.copy(name=name)
 
         kernels = [kernel]
 
     elif lang in ["fortran", "floopy", "fpp"]:
         pre_transform_code = None
-        if args.transform:
-            with open(args.transform, "r") as xform_fd:
+        if transform:
+            with open(transform, "r") as xform_fd:
                 pre_transform_code = xform_fd.read()
 
-        if args.occa_defines:
+        if occa_defines:
             if pre_transform_code is None:
                 pre_transform_code = ""
 
-            with open(args.occa_defines, "r") as defines_fd:
+            with open(occa_defines, "r") as defines_fd:
                 pre_transform_code = (
                         defines_to_python_code(defines_fd.read())
                         + pre_transform_code)
 
         kernels = lp.parse_transformed_fortran(
                 infile_content, pre_transform_code=pre_transform_code,
-                filename=args.infile)
+                filename=infile)
 
-        if args.name is not None:
+        if name is not None:
             kernels = [kernel for kernel in kernels
-                    if kernel.name == args.name]
+                    if kernel.name == name]
 
         if not kernels:
             raise RuntimeError("no kernels found (name specified: %s)"
-                    % args.name)
+                    % name)
 
     else:
         raise RuntimeError("unknown language: '%s'"
-                % args.lang)
+                % lang)
+
+    return kernels
+
+
+def add_occa_dummy_arg(kernels):
+    return [
+            kernel.copy(args=[
+                lp.GlobalArg("occa_info", np.int32, shape=None)
+                ] + kernel.args)
+            for kernel in kernels]
+
+
+# {{{ batch mode
+
+def _get_input_hash(infile_content, lang, target_names, transform,
+        occa_defines, occa_add_dummy_arg):
+    import hashlib
+    from loopy.version import DATA_MODEL_VERSION
+
+    def read_if_given(filename):
+        if filename is None:
+            return ""
+
+        with open(filename, "r") as inf:
+            return inf.read()
+
+    key_hash = hashlib.sha256()
+    for item in [
+            DATA_MODEL_VERSION, lang, ",".join(sorted(set(target_names))),
+            read_if_given(transform), read_if_given(occa_defines),
+            repr(occa_add_dummy_arg), infile_content]:
+        item = item.encode("utf-8")
+        key_hash.update(("%d:" % len(item)).encode("ascii") + item)
+
+    return key_hash.hexdigest()
+
+
+def _build_input_file(task):
+    """Generate code for the input file described by *task* (a :class:`dict`)
+    for each of its targets. Runs in a worker process in batch mode.
+    """
+    from time import time
+    import os
+
+    result = {
+            "hash": task["hash"],
+            "outputs": {},
+            "timings": {},
+            }
+
+    start_time = time()
+
+    # Input files create their kernels with the default target. Batch mode
+    # may run in the calling process, whose default must not change.
+    prev_default_target = lp._DEFAULT_TARGET
+
+    try:
+        for target_name, outfile in sorted(six.iteritems(task["outputs"])):
+            timings = dict(
+                    (phase, 0)
+                    for phase in ["translation", "preprocessing", "scheduling",
+                        "codegen"])
+
+            lp.set_default_target(get_target(target_name))
+
+            phase_start_time = time()
+            kernels = read_kernels(
+                    task["infile"], task["infile_content"], task["lang"],
+                    transform=task["transform"],
+                    occa_defines=task["occa_defines"])
+            if task["occa_add_dummy_arg"]:
+                kernels = add_occa_dummy_arg(kernels)
+            timings["translation"] = time() - phase_start_time
+
+            codes = []
+            for kernel in kernels:
+                phase_start_time = time()
+                kernel = lp.preprocess_kernel(kernel)
+                timings["preprocessing"] += time() - phase_start_time
+
+                phase_start_time = time()
+                kernel = lp.get_one_scheduled_kernel(kernel)
+                timings["scheduling"] += time() - phase_start_time
+
+                phase_start_time = time()
+                codes.append(lp.generate_code_v2(kernel).device_code())
+                timings["codegen"] += time() - phase_start_time
+
+            outdir = os.path.dirname(outfile)
+            if outdir and not os.path.isdir(outdir):
+                try:
+                    os.makedirs(outdir)
+                except OSError:
+                    # created concurrently by another worker
+                    if not os.path.isdir(outdir):
+                        raise
+
+            with open(outfile, "w") as outfile_fd:
+                outfile_fd.write("\n\n".join(codes))
+
+            result["outputs"][target_name] = outfile
+            result["timings"][target_name] = timings
+
+    except Exception:
+        from traceback import format_exc
+        result["status"] = "failed"
+        result["error"] = format_exc()
+
+        # do not leave outputs of an earlier build of the input in place
+        for outfile in six.itervalues(task["outputs"]):
+            if os.path.exists(outfile):
+                os.unlink(outfile)
+
+        result["outputs"] = {}
+    else:
+        result["status"] = "built"
+    finally:
+        lp.set_default_target(prev_default_target)
+
+    result["wall_time"] = time() - start_time
+
+    return task["infile"], result
+
+
+def batch_main(argv=None):
+    """Generate code for many input files in a pool of worker processes.
+
+    Inputs whose contents (and options) are unchanged since the build
+    recorded in the manifest are skipped. The manifest only records the
+    inputs given, and outputs of inputs that fail to build are removed. The
+    on-disk caches of preprocessed and scheduled kernels and generated code
+    are shared among the workers. Returns the exit status.
+    """
+    from argparse import ArgumentParser
+    from multiprocessing import cpu_count
+    from time import time
+    import json
+    import os
+
+    from loopy.version import VERSION_TEXT
+
+    parser = ArgumentParser(prog="loopy batch",
+            description="Generate code for many loopy or Fortran input files "
+            "in parallel")
+
+    parser.add_argument("infiles", metavar="INPUT_FILE", nargs="+")
+    parser.add_argument("-o", "--output-dir", required=True,
+            help="Code for target TARGET generated from INPUT_FILE "
+            "is written to OUTPUT_DIR/TARGET/.")
+    parser.add_argument("--target", dest="targets", action="append",
+            choices=TARGET_CHOICES,
+            help="May be given more than once. Defaults to opencl.")
+    parser.add_argument("--lang", metavar="LANGUAGE", help="loopy|fortran")
+    parser.add_argument("--transform")
+    parser.add_argument("--occa-defines")
+    parser.add_argument("--occa-add-dummy-arg", action="store_true")
+    parser.add_argument("-j", "--jobs", type=int, default=cpu_count(),
+            help="Number of worker processes. Defaults to the number of "
+            "processors.")
+    parser.add_argument("--manifest",
+            help="Build manifest to read and update. Defaults to "
+            "OUTPUT_DIR/manifest.json.")
+    parser.add_argument("--force", action="store_true",
+            help="Rebuild all inputs, even if unchanged")
+    args = parser.parse_args(argv)
+
+    target_names = sorted(set(args.targets or ["opencl"]))
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    manifest_filename = args.manifest
+    if manifest_filename is None:
+        manifest_filename = os.path.join(args.output_dir, "manifest.json")
+
+    manifest = {"files": {}}
+    if os.path.exists(manifest_filename):
+        with open(manifest_filename, "r") as manifest_fd:
+            manifest = json.load(manifest_fd)
+
+    # {{{ gather tasks
+
+    tasks = []
+    results = {}
+    output_to_infile = {}
+
+    for infile in args.infiles:
+        infile = os.path.normpath(infile)
+
+        lang = args.lang
+        if lang is None:
+            lang = guess_language(infile)
+        if lang is None:
+            parser.error("unable to deduce input language of '%s' "
+                    "(wrong input file extension? --lang flag?)" % infile)
+
+        outputs = {}
+        for target_name in target_names:
+            outfile = os.path.join(
+                    args.output_dir, target_name,
+                    os.path.splitext(os.path.basename(infile))[0]
+                    + TARGET_FILE_EXTENSIONS[target_name])
+
+            if output_to_infile.setdefault(outfile, infile) != infile:
+                parser.error("inputs '%s' and '%s' would both be written to "
+                        "'%s'" % (output_to_infile[outfile], infile, outfile))
+
+            outputs[target_name] = outfile
+
+        with open(infile, "r") as infile_fd:
+            infile_content = infile_fd.read()
+
+        input_hash = _get_input_hash(infile_content, lang, target_names,
+                args.transform, args.occa_defines, args.occa_add_dummy_arg)
+
+        prev_result = manifest["files"].get(infile)
+        if (not args.force
+                and prev_result is not None
+                and prev_result["status"] in ["built", "unchanged"]
+                and prev_result["hash"] == input_hash
+                and prev_result["outputs"] == outputs
+                and all(os.path.exists(outfile)
+                    for outfile in six.itervalues(outputs))):
+            results[infile] = dict(prev_result, status="unchanged")
+            continue
+
+        tasks.append({
+            "infile": infile,
+            "infile_content": infile_content,
+            "lang": lang,
+            "hash": input_hash,
+            "outputs": outputs,
+            "transform": args.transform,
+            "occa_defines": args.occa_defines,
+            "occa_add_dummy_arg": args.occa_add_dummy_arg,
+            })
+
+    # }}}
+
+    start_time = time()
+
+    def report(infile, result):
+        print("%-9s %s (%.2f s)" % (
+            result["status"], infile, result.get("wall_time", 0)),
+            file=sys.stderr)
+        if result["status"] == "failed":
+            print(result["error"], file=sys.stderr)
+
+    for infile, result in sorted(six.iteritems(results)):
+        report(infile, result)
+
+    if args.jobs == 1 or len(tasks) <= 1:
+        build_results = (_build_input_file(task) for task in tasks)
+        pool = None
+    else:
+        from multiprocessing import Pool
+        pool = Pool(min(args.jobs, len(tasks)))
+        build_results = pool.imap_unordered(_build_input_file, tasks)
+
+    try:
+        for infile, result in build_results:
+            report(infile, result)
+            results[infile] = result
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # {{{ write manifest
+
+    # inputs not given this time are dropped
+    manifest["files"] = results
+    manifest["loopy_version"] = VERSION_TEXT
+    manifest["targets"] = target_names
+    manifest["wall_time"] = time() - start_time
+
+    manifest_dir = os.path.dirname(manifest_filename)
+    if manifest_dir and not os.path.isdir(manifest_dir):
+        os.makedirs(manifest_dir)
+
+    with open(manifest_filename, "w") as manifest_fd:
+        json.dump(manifest, manifest_fd, indent=2, sort_keys=True)
+
+    # }}}
+
+    nfailed = sum(
+            1 for result in six.itervalues(results)
+            if result["status"] == "failed")
+    if nfailed:
+        print("%d of %d inputs failed" % (nfailed, len(results)),
+                file=sys.stderr)
+        return 1
+
+    return 0
+
+# }}}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(batch_main(sys.argv[2:]))
+
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Stand-alone loopy frontend",
+            epilog="Use 'loopy batch' to generate code for many input files "
+            "at once, see 'loopy batch --help'.")
+
+    parser.add_argument("infile", metavar="INPUT_FILE")
+    parser.add_argument("outfile", default="-", metavar="OUTPUT_FILE",
+            help="Defaults to stdout ('-').", nargs='?')
+    parser.add_argument("--lang", metavar="LANGUAGE", help="loopy|fortran")
+    parser.add_argument("--target", choices=TARGET_CHOICES, default="opencl")
+    parser.add_argument("--name")
+    parser.add_argument("--transform")
+    parser.add_argument("--edit-code", action="store_true")
+    parser.add_argument("--occa-defines")
+    parser.add_argument("--occa-add-dummy-arg", action="store_true")
+    parser.add_argument("--print-ir", action="store_true")
+    args = parser.parse_args()
+
+    lp.set_default_target(get_target(args.target))
+
+    lang = None
+    if args.infile == "-":
+        infile_content = sys.stdin.read()
+    else:
+        lang = guess_language(args.infile)
+        with open(args.infile, "r") as infile_fd:
+            infile_content = infile_fd.read()
+
+    if args.lang is not None:
+        lang = args.lang
+
+    if lang is None:
+        raise RuntimeError("unable to deduce input language "
+                "(wrong input file extension? --lang flag?)")
+
+    kernels = read_kernels(args.infile, infile_content, lang,
+            transform=args.transform, occa_defines=args.occa_defines,
+            name=args.name)
 
     if args.print_ir:
         for kernel in kernels:
             print(kernel, file=sys.stderr)
 
     if args.occa_add_dummy_arg:
-        new_kernels = []
-        for kernel in kernels:
-            new_args = [
-                    lp.GlobalArg("occa_info", np.int32, shape=None)
-                    ] + kernel.args
-            new_kernels.append(kernel.copy(args=new_args))
-
-        kernels = new_kernels
-        del new_kernels
+        kernels = add_occa_dummy_arg(kernels)
 
     codes = []
     from loopy.codegen import generate_code
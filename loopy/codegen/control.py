@@ -25,6 +25,7 @@ THE SOFTWARE.
 """
 
 import six
+from pytools import memoize_on_first_arg
 from loopy.codegen.result import merge_codegen_results, wrap_in_if
 import islpy as isl
 from loopy.schedule import (
@@ -90,6 +91,71 @@ def synthesize_idis_for_extra_args(kernel, schedule_index):
     return idis
 
 
+# {{{ profiling
+
+@memoize_on_first_arg
+def get_profile_probe_sched_indices(kernel):
+    """Return a tuple of the schedule indices of the items that are
+    instrumented if :attr:`loopy.Options.profile_schedule` is set, i.e. all
+    :class:`loopy.schedule.CallKernel` and all :class:`loopy.schedule.EnterLoop`
+    items of sequential loops. The position of a schedule index in this tuple
+    is the index of its probe.
+    """
+    from loopy.kernel.data import (UnrolledIlpTag, UnrollTag, VectorizeTag,
+            filter_iname_tags_by_type)
+
+    result = []
+    for sched_index, sched_item in enumerate(kernel.schedule):
+        if isinstance(sched_item, CallKernel):
+            result.append(sched_index)
+        elif (isinstance(sched_item, EnterLoop)
+                and not filter_iname_tags_by_type(
+                    kernel.iname_tags(sched_item.iname),
+                    (UnrollTag, UnrolledIlpTag, VectorizeTag))):
+            result.append(sched_index)
+
+    return tuple(result)
+
+
+@memoize_on_first_arg
+def get_profile_probe_indices(kernel):
+    """Return a :class:`dict` mapping the schedule indices in
+    :func:`get_profile_probe_sched_indices` to the indices of their probes.
+    """
+    return dict(
+            (sched_index, probe_index)
+            for probe_index, sched_index in enumerate(
+                get_profile_probe_sched_indices(kernel)))
+
+
+def wrap_in_profile_probes(codegen_state, sched_index, codegen_result):
+    """If :attr:`loopy.Options.profile_schedule` is set, surround
+    *codegen_result* with timer probes for the schedule item at
+    *sched_index*.
+    """
+    kernel = codegen_state.kernel
+    if not (kernel.options.profile_schedule
+            and codegen_state.is_generating_device_code):
+        return codegen_result
+
+    probe_index = get_profile_probe_indices(kernel)[sched_index]
+
+    astb = codegen_state.ast_builder
+    codegen_result = merge_codegen_results(codegen_state, [
+        astb.emit_profile_probe(codegen_state, "entry", probe_index),
+        astb.emit_profile_probe(codegen_state, "start", probe_index),
+        codegen_result,
+        astb.emit_profile_probe(codegen_state, "stop", probe_index),
+        ])
+
+    return codegen_result.with_new_ast(
+            codegen_state,
+            astb.ast_block_scope_class(
+                codegen_result.current_ast(codegen_state)))
+
+# }}}
+
+
 def generate_code_for_sched_index(codegen_state, sched_index):
     kernel = codegen_state.kernel
     sched_item = kernel.schedule[sched_index]
@@ -145,7 +211,8 @@ def generate_code_for_sched_index(codegen_state, sched_index):
             func = generate_vectorize_loop
         elif not tags or filter_iname_tags_by_type(tags, (LoopedIlpTag,
                     ForceSequentialTag, InOrderSequentialSequentialTag)):
-            func = generate_sequential_loop_dim_code
+            return wrap_in_profile_probes(codegen_state, sched_index,
+                    generate_sequential_loop_dim_code(codegen_state, sched_index))
         else:
             raise RuntimeError("encountered (invalid) EnterLoop "
                     "for '%s', tagged '%s'"
@@ -437,6 +437,15 @@ def generate_sequential_loop_dim_code(codegen_state, sched_index):
 
         inner = build_loop_nest(new_codegen_state, sched_index+1)
 
+        if (kernel.options.profile_schedule
+                and codegen_state.is_generating_device_code):
+            from loopy.codegen.control import get_profile_probe_indices
+            inner = merge_codegen_results(codegen_state, [
+                codegen_state.ast_builder.emit_profile_probe(
+                    codegen_state, "trip",
+                    get_profile_probe_indices(kernel)[sched_index]),
+                inner])
+
         # }}}
 
         if cmt is not None:
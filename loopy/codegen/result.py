@@ -289,6 +289,10 @@ def generate_host_or_device_program(codegen_state, schedule_index):
                 codegen_state, schedule_index,
                 next_func=partial(build_loop_nest,
                     schedule_index=schedule_index + 1))
+
+        from loopy.codegen.control import wrap_in_profile_probes
+        codegen_result = wrap_in_profile_probes(
+                codegen_state, schedule_index, codegen_result)
     else:
         codegen_result = build_loop_nest(codegen_state, schedule_index)
 
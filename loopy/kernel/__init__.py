@@ -45,6 +45,7 @@ from loopy.diagnostic import CannotBranchDomainTree, LoopyError
 from loopy.tools import natsorted
 from loopy.diagnostic import StaticValueFindingError
 from loopy.kernel.data import filter_iname_tags_by_type
+from loopy.target.execution import KernelExecutorCache
 
 
 # {{{ unique var names
@@ -98,6 +99,10 @@ class _UniqueVarNameGenerator(UniqueNameGenerator):
 
 # {{{ loop kernel object
 
+def _get_domain_eq_key(domain):
+    return str(domain)
+
+
 class kernel_state:  # noqa
     INITIAL = 0
     PREPROCESSED = 1
@@ -193,6 +198,8 @@ class LoopKernel(ImmutableRecordWithoutPickling):
     .. attribute:: target
 
         A subclass of :class:`loopy.TargetBase`.
+
+    .. autoattribute:: executor_cache
     """
 
     # {{{ constructor
@@ -265,7 +272,7 @@ class LoopKernel(ImmutableRecordWithoutPickling):
 
         if cache_manager is None:
             from loopy.kernel.tools import SetOperationCacheManager
-            cache_manager = SetOperationCacheManager()
+            cache_manager = SetOperationCacheManager.get_shared(domains)
 
         # }}}
 
@@ -345,7 +352,7 @@ class LoopKernel(ImmutableRecordWithoutPickling):
                     overridden_get_grid_sizes_for_insn_ids),
                 _cached_written_variables=_cached_written_variables)
 
-        self._kernel_executor_cache = {}
+        self._kernel_executor_cache = KernelExecutorCache()
 
     # }}}
 
@@ -474,6 +481,16 @@ class LoopKernel(ImmutableRecordWithoutPickling):
     def id_to_insn(self):
         return dict((insn.id, insn) for insn in self.instructions)
 
+    @memoize_method
+    def get_instruction_match_index(self):
+        """Return a :class:`loopy.match.InstructionMatchIndex` for this
+        kernel.
+
+        .. versionadded:: 2018.2
+        """
+        from loopy.match import InstructionMatchIndex
+        return InstructionMatchIndex(self)
+
     # }}}
 
     # {{{ domain wrangling
@@ -1376,10 +1393,125 @@ class LoopKernel(ImmutableRecordWithoutPickling):
 
         return kex(*args, **kwargs)
 
+    @property
+    def executor_cache(self):
+        """The :class:`loopy.target.execution.KernelExecutorCache` holding
+        the executors (and thereby the compiled code) used by
+        :meth:`__call__`.
+
+        .. versionadded:: 2018.2
+        """
+        return self._kernel_executor_cache
+
+    # }}}
+
+    # {{{ copying
+
+    #: Maps the names of memoized methods to the fields their results
+    #: depend on. :meth:`copy` carries the memoized results of these methods
+    #: over to the new kernel if none of these fields are being replaced.
+    #: Methods not listed here always start out with an empty cache.
+    _memoized_analysis_dependencies = {
+            "non_iname_variable_names": ("args", "temporary_variables"),
+            "all_variable_names": (
+                "args", "temporary_variables", "substitutions", "domains"),
+            "id_to_insn": ("instructions",),
+            "get_instruction_match_index": ("instructions",),
+
+            # The domain tree depends on writers of loop bounds that are
+            # temporaries, see is_domain_dependent_on_inames.
+            "parents_per_domain": (
+                "domains", "temporary_variables", "instructions"),
+            "all_parents_per_domain": (
+                "domains", "temporary_variables", "instructions"),
+            "get_leaf_domain_indices": (
+                "domains", "temporary_variables", "instructions"),
+            "_get_inames_domain_backend": (
+                "domains", "temporary_variables", "instructions"),
+            "_get_home_domain_map": ("domains",),
+            "combine_domains": ("domains",),
+
+            "all_inames": ("domains",),
+            "all_params": ("domains",),
+            "all_insn_inames": ("instructions",),
+            "all_referenced_inames": ("instructions",),
+            "iname_to_insns": ("domains", "instructions"),
+            "_remove_inames_for_shared_hw_axes": ("iname_to_tags",),
+
+            "recursive_insn_dep_map": ("instructions",),
+
+            "reader_map": ("args", "temporary_variables", "instructions"),
+            "writer_map": ("instructions",),
+            "get_read_variables": ("instructions",),
+            "get_written_variables": (
+                "instructions", "_cached_written_variables"),
+            "get_temporary_to_base_storage_map": ("temporary_variables",),
+            "get_unwritten_value_args": (
+                "args", "instructions", "_cached_written_variables"),
+
+            "arg_dict": ("args",),
+            "scalar_loop_args": ("args", "domains"),
+            "global_var_names": ("args", "temporary_variables"),
+            "impl_arg_to_arg": ("args",),
+
+            "get_iname_bounds": (
+                "domains", "temporary_variables", "instructions",
+                "assumptions"),
+            "get_constant_iname_length": (
+                "domains", "temporary_variables", "instructions",
+                "assumptions"),
+
+            "local_var_names": ("temporary_variables",),
+            "get_nosync_set": ("instructions",),
+            }
+
+    def copy(self, **kwargs):
+        result = super(LoopKernel, self).copy(**kwargs)
+
+        # Fields are compared by identity, which is cheap and catches the
+        # common case of transforms passing along unchanged fields.
+        replaced_fields = frozenset(
+                field for field, value in six.iteritems(kwargs)
+                if value is not getattr(self, field, None))
+
+        for method_name, dependencies in six.iteritems(
+                self._memoized_analysis_dependencies):
+            if not replaced_fields.isdisjoint(dependencies):
+                continue
+
+            try:
+                memoized = self.__dict__["_memoize_dic_" + method_name]
+            except KeyError:
+                continue
+
+            setattr(result, "_memoize_dic_" + method_name, memoized.copy())
+
+        return result
+
     # }}}
 
     # {{{ pickling
 
+    def __getattr__(self, name):
+        # Only reached if *name* is not (yet) an attribute. Kernels loaded by
+        # loopy.kernel.serialization.load_kernel reconstruct some of their
+        # fields upon first access.
+        loader = self.__dict__.get("_lazy_field_loader")
+        if loader is not None and name in loader.lazy_field_names:
+            value = loader.load_field(self, name)
+            setattr(self, name, value)
+            return value
+
+        if name == "cache_manager":
+            # Unpickled kernels obtain their cache manager upon first use, to
+            # avoid having to unpickle the domains.
+            from loopy.kernel.tools import SetOperationCacheManager
+            self.cache_manager = SetOperationCacheManager.get_shared(
+                    self.domains)
+            return self.cache_manager
+
+        return super(LoopKernel, self).__getattr__(name)
+
     def __getstate__(self):
         result = dict(
                 (key, getattr(self, key))
@@ -1399,6 +1531,23 @@ class LoopKernel(ImmutableRecordWithoutPickling):
                 eq_key_getter=_get_insn_eq_key,
                 persistent_hash_key_getter=_get_insn_hash_key)
 
+        # Likewise for the domains (which are expensive to parse), the
+        # temporaries and the schedule. These are hashed as they are,
+        # using digests computed now.
+        from loopy.tools import (
+                LazilyUnpicklingDictWithEqAndPersistentHashing as LazyDict)
+
+        result["domains"] = LazyList(
+                self.domains,
+                eq_key_getter=_get_domain_eq_key,
+                persistent_hash_key_getter=None)
+        result["temporary_variables"] = LazyDict(self.temporary_variables)
+        if self.schedule is not None:
+            result["schedule"] = LazyList(
+                    self.schedule,
+                    eq_key_getter=None,
+                    persistent_hash_key_getter=None)
+
         # Cache written variables to avoid having to unpickle instructions in
         # order to compute the written variables. This is needed on the
         # cache-to-execution path.
@@ -1433,9 +1582,8 @@ class LoopKernel(ImmutableRecordWithoutPickling):
         else:
             self._pytools_persistent_hash_digest = p_hash_digest
 
-        from loopy.kernel.tools import SetOperationCacheManager
-        self.cache_manager = SetOperationCacheManager()
-        self._kernel_executor_cache = {}
+        # cache_manager is created upon first access, see __getattr__.
+        self._kernel_executor_cache = KernelExecutorCache()
 
     # }}}
 
@@ -1505,6 +1653,13 @@ class LoopKernel(ImmutableRecordWithoutPickling):
                 if len(self.domains) != len(other.domains):
                     return False
 
+                from loopy.tools import LazilyUnpicklingList
+                if ((isinstance(self.domains, LazilyUnpicklingList)
+                        or isinstance(other.domains, LazilyUnpicklingList))
+                        and self.domains == other.domains):
+                    # equal printed forms, checked without unpickling
+                    continue
+
                 for set_a, set_b in zip(self.domains, other.domains):
                     if not (set_a.plain_is_equal(set_b) or set_a.is_equal(set_b)):
                         return False
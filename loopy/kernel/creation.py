@@ -406,6 +406,11 @@ ELIF_RE = re.compile(
 
 ELSE_RE = re.compile(r"^\s*else\s*$")
 
+# Only lines starting with one of these words can open or continue a block,
+# which saves trying the block regexes on every instruction.
+BLOCK_KEYWORD_RE = re.compile(r"^\s*([a-z]+)")
+BLOCK_KEYWORDS = frozenset(["with", "for", "if", "elif", "else"])
+
 INSN_RE = re.compile(
         r"^"
         r"\s*"
@@ -817,7 +822,18 @@ def parse_instructions(instructions, defines):
 
             continue
 
-        with_options_match = WITH_OPTIONS_RE.match(insn)
+        keyword_match = BLOCK_KEYWORD_RE.match(insn)
+        if (keyword_match is None
+                or keyword_match.group(1) not in BLOCK_KEYWORDS):
+            with_options_match = for_match = if_match = None
+            elif_match = else_match = None
+        else:
+            with_options_match = WITH_OPTIONS_RE.match(insn)
+            for_match = FOR_RE.match(insn)
+            if_match = IF_RE.match(insn)
+            elif_match = ELIF_RE.match(insn)
+            else_match = ELSE_RE.match(insn)
+
         if with_options_match is not None:
             insn_options_stack.append(
                     parse_insn_options(
@@ -827,7 +843,6 @@ def parse_instructions(instructions, defines):
             check_illegal_options(insn_options_stack[-1], 'with-block')
             continue
 
-        for_match = FOR_RE.match(insn)
         if for_match is not None:
             options = insn_options_stack[-1].copy()
             added_inames = frozenset(
@@ -846,7 +861,6 @@ def parse_instructions(instructions, defines):
             del options
             continue
 
-        if_match = IF_RE.match(insn)
         if if_match is not None:
             options = insn_options_stack[-1].copy()
             predicate = if_match.group("predicate")
@@ -870,8 +884,6 @@ def parse_instructions(instructions, defines):
             del predicate
             continue
 
-        elif_match = ELIF_RE.match(insn)
-        else_match = ELSE_RE.match(insn)
         if elif_match is not None or else_match is not None:
             prev_predicates = insn_options_stack[-1].get(
                     "predicates", frozenset())
@@ -1668,58 +1680,101 @@ def _is_wildcard(s):
     return any(c in s for c in WILDCARD_SYMBOLS)
 
 
-def _resolve_dependencies(what, knl, insn, deps):
-    from loopy import find_instructions
-    from loopy.match import MatchExpressionBase
+class _DependencyResolver(object):
+    """Resolves the dependency specifications of the instructions of a kernel,
+    caching the result for each wildcard and match expression so that every
+    distinct specification is resolved only once. Wildcards are matched
+    against the range of sorted instruction IDs sharing their literal prefix.
+    """
+
+    def __init__(self, knl):
+        self.knl = knl
+        self.sorted_ids = sorted(knl.id_to_insn)
+        self.match_cache = {}
+
+    def find_wildcard_matches(self, dep):
+        from bisect import bisect_left
+        from fnmatch import fnmatchcase
 
-    new_deps = []
+        prefix_len = min(
+                dep.index(c) for c in WILDCARD_SYMBOLS if c in dep)
+        prefix = dep[:prefix_len]
 
-    for dep in deps:
-        found_any = False
+        sorted_ids = self.sorted_ids
+        result = []
+        for i in range(bisect_left(sorted_ids, prefix), len(sorted_ids)):
+            insn_id = sorted_ids[i]
+            if not insn_id.startswith(prefix):
+                break
+            if fnmatchcase(insn_id, dep):
+                result.append(insn_id)
+
+        return frozenset(result)
+
+    def find_matches(self, dep):
+        from loopy.match import MatchExpressionBase
+
+        try:
+            return self.match_cache[dep]
+        except KeyError:
+            pass
 
         if isinstance(dep, MatchExpressionBase):
-            for new_dep in find_instructions(knl, dep):
-                if new_dep.id != insn.id:
-                    new_deps.append(new_dep.id)
-                    found_any = True
-        elif _is_wildcard(dep):
-            from fnmatch import fnmatchcase
-            for other_insn in knl.instructions:
-                if other_insn.id != insn.id and fnmatchcase(other_insn.id, dep):
-                    new_deps.append(other_insn.id)
-                    found_any = True
+            result = dep.get_matching_ids(
+                    self.knl.get_instruction_match_index())
         else:
-            if dep in knl.id_to_insn:
-                new_deps.append(dep)
-                found_any = True
+            result = self.find_wildcard_matches(dep)
 
-        if not found_any and knl.options.check_dep_resolution:
-            raise LoopyError("instruction '%s' declared %s on '%s', "
-                    "which did not resolve to any instruction present in the "
-                    "kernel '%s'. Set the kernel option 'check_dep_resolution'"
-                    "to False to disable this check."
-                    % (insn.id, what, dep, knl.name))
+        self.match_cache[dep] = result
+        return result
 
-    for dep_id in new_deps:
-        if dep_id not in knl.id_to_insn:
-            raise LoopyError("instruction '%s' depends on instruction id '%s', "
-                    "which was not found" % (insn.id, dep_id))
+    def __call__(self, what, insn, deps):
+        from loopy.match import MatchExpressionBase
 
-    return frozenset(new_deps)
+        knl = self.knl
+        new_deps = []
+
+        for dep in deps:
+            found_any = False
+
+            if isinstance(dep, MatchExpressionBase) or _is_wildcard(dep):
+                for new_dep in self.find_matches(dep):
+                    if new_dep != insn.id:
+                        new_deps.append(new_dep)
+                        found_any = True
+            else:
+                if dep in knl.id_to_insn:
+                    new_deps.append(dep)
+                    found_any = True
+
+            if not found_any and knl.options.check_dep_resolution:
+                raise LoopyError("instruction '%s' declared %s on '%s', "
+                        "which did not resolve to any instruction present in the "
+                        "kernel '%s'. Set the kernel option 'check_dep_resolution'"
+                        "to False to disable this check."
+                        % (insn.id, what, dep, knl.name))
+
+        for dep_id in new_deps:
+            if dep_id not in knl.id_to_insn:
+                raise LoopyError("instruction '%s' depends on instruction id '%s', "
+                        "which was not found" % (insn.id, dep_id))
+
+        return frozenset(new_deps)
 
 
 def resolve_dependencies(knl):
+    resolve = _DependencyResolver(knl)
+
     new_insns = []
 
     for insn in knl.instructions:
         new_insns.append(insn.copy(
-            depends_on=_resolve_dependencies(
-                "a dependency", knl, insn, insn.depends_on),
+            depends_on=resolve("a dependency", insn, insn.depends_on),
             no_sync_with=frozenset(
                 (resolved_insn_id, nosync_scope)
                 for nosync_dep, nosync_scope in insn.no_sync_with
                 for resolved_insn_id in
-                _resolve_dependencies("nosync", knl, insn, (nosync_dep,))),
+                resolve("nosync", insn, (nosync_dep,))),
             ))
 
     return knl.copy(instructions=new_insns)
@@ -1786,10 +1841,8 @@ def apply_single_writer_depencency_heuristic(kernel, warn_if_used=True):
 
             # {{{ add automatic dependencies
 
-            all_my_var_writers = set()
             for var in dep_map[insn.id]:
                 var_writers = writer_map.get(var, set())
-                all_my_var_writers |= var_writers
 
                 if not var_writers and var not in arg_names:
                     tv = kernel.temporary_variables[var]
@@ -0,0 +1,281 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import six
+import struct
+
+from collections import OrderedDict
+from io import BytesIO
+from six.moves.cPickle import Pickler, Unpickler, HIGHEST_PROTOCOL
+
+from loopy.diagnostic import LoopyError
+
+
+__doc__ = """
+A serialization format for :class:`loopy.LoopKernel` that is faster to load
+than a plain pickle of the kernel:
+
+* Identical subexpressions in instructions and substitution rules are shared
+  (see :func:`loopy.intern_expressions`) before serialization, so that each
+  distinct subexpression (and the strings it contains) is stored and
+  reconstructed only once.
+
+* The bulky fields of the kernel (see :data:`LAZY_FIELDS`) are stored
+  separately and only reconstructed once they are first accessed. In
+  particular, this avoids re-parsing the kernel's domains if only, say, its
+  arguments are needed.
+
+* :func:`load_kernel_fields` reconstructs only a given set of fields.
+
+.. currentmodule:: loopy.kernel.serialization
+
+.. data:: FORMAT_VERSION
+
+    The version of the serialization format written by :func:`dump_kernel`.
+    Data written in other versions is rejected by the loading functions.
+
+.. data:: LAZY_FIELDS
+
+    The names of the fields that :func:`load_kernel` reconstructs upon
+    first access.
+
+.. autofunction:: dump_kernel
+.. autofunction:: load_kernel
+.. autofunction:: load_kernel_fields
+
+.. versionadded:: 2018.2
+"""
+
+
+FORMAT_VERSION = 2
+
+_MAGIC = b"LOOPYKNL"
+_HEADER_FORMAT = "<8sI"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+
+LAZY_FIELDS = frozenset([
+    "domains",
+    "assumptions",
+    "instructions",
+    "temporary_variables",
+    "substitutions",
+    "schedule",
+    "applied_iname_rewrites",
+    ])
+
+
+# {{{ isl object handling
+
+# Parsing isl objects from their string representation (which is how they are
+# pickled) dominates load time. Domains of related kernels are often equal,
+# so recently parsed objects are reused. (isl objects are never modified in
+# place.)
+
+_ISL_OBJECT_CACHE_SIZE = 1024
+_isl_object_cache = OrderedDict()
+
+
+_ISL_DIM_TYPE_NAMES = ["param", "in_", "out"]
+
+
+def _persistent_id(obj):
+    import islpy as isl
+    if not isinstance(obj, (isl.BasicSet, isl.Set, isl.BasicMap, isl.Map)):
+        return None
+
+    if obj.get_ctx() != isl.DEFAULT_CONTEXT:
+        return None
+
+    # Parsing the string form of an isl object turns dimension names with
+    # apostrophes (such as "i'") into primed variants of the name without,
+    # so those names are recorded separately.
+    space = obj.get_space()
+    dims_with_apostrophes = tuple(
+            (dim_type_name, i, name)
+            for dim_type_name in _ISL_DIM_TYPE_NAMES
+            for i, name in enumerate(space.get_var_names(
+                getattr(isl.dim_type, dim_type_name)))
+            if name is not None and "'" in name)
+
+    return (type(obj).__name__, str(obj), dims_with_apostrophes)
+
+
+def _persistent_load(pid):
+    try:
+        result = _isl_object_cache.pop(pid)
+    except KeyError:
+        import islpy as isl
+        cls_name, isl_str, dims_with_apostrophes = pid
+        result = getattr(isl, cls_name).read_from_str(
+                isl.DEFAULT_CONTEXT, isl_str)
+
+        for dim_type_name, i, name in dims_with_apostrophes:
+            result = result.set_dim_name(
+                    getattr(isl.dim_type, dim_type_name), i, name)
+
+        if len(_isl_object_cache) >= _ISL_OBJECT_CACHE_SIZE:
+            _isl_object_cache.popitem(last=False)
+
+    _isl_object_cache[pid] = result
+    return result
+
+
+def _dumps(obj):
+    outf = BytesIO()
+    pickler = Pickler(outf, HIGHEST_PROTOCOL)
+    pickler.persistent_id = _persistent_id
+    pickler.dump(obj)
+    return outf.getvalue()
+
+
+def _loads(data):
+    unpickler = Unpickler(BytesIO(data))
+    unpickler.persistent_load = _persistent_load
+    return unpickler.load()
+
+# }}}
+
+
+# {{{ dumping
+
+def dump_kernel(kernel):
+    """Return a :class:`bytes` object representing *kernel*, to be read back
+    by :func:`load_kernel` or :func:`load_kernel_fields`.
+    """
+    # Store the persistent hash, so that it need not be recomputed (from all
+    # fields) after loading.
+    from loopy.tools import LoopyKeyBuilder
+    LoopyKeyBuilder()(kernel)
+    hash_digest = kernel._pytools_persistent_hash_digest
+
+    from loopy.preprocess import prepare_for_caching
+    from loopy.transform.instruction import intern_expressions
+    kernel = intern_expressions(prepare_for_caching(kernel))
+
+    eager_fields = {}
+    lazy_fields = {}
+
+    for name in kernel.__class__.fields:
+        if name == "cache_manager" or not hasattr(kernel, name):
+            continue
+
+        value = getattr(kernel, name)
+
+        if name == "_cached_written_variables":
+            # Allows the executor to find written variables without loading
+            # the instructions.
+            value = kernel.get_written_variables()
+
+        if name in LAZY_FIELDS:
+            lazy_fields[name] = _dumps(value)
+        else:
+            eager_fields[name] = value
+
+    return (
+            struct.pack(_HEADER_FORMAT, _MAGIC, FORMAT_VERSION)
+            + _dumps((hash_digest, eager_fields, lazy_fields)))
+
+# }}}
+
+
+# {{{ loading
+
+def _load_payload(data):
+    if len(data) < _HEADER_SIZE:
+        raise LoopyError("data is not a serialized kernel")
+
+    magic, version = struct.unpack(_HEADER_FORMAT, data[:_HEADER_SIZE])
+    if magic != _MAGIC:
+        raise LoopyError("data is not a serialized kernel")
+    if version != FORMAT_VERSION:
+        raise LoopyError("unsupported kernel serialization format version %d "
+                "(expected %d)" % (version, FORMAT_VERSION))
+
+    return _loads(data[_HEADER_SIZE:])
+
+
+class _LazyFieldLoader(object):
+    """Reconstructs fields of a kernel loaded by :func:`load_kernel` upon
+    first access, see :meth:`loopy.LoopKernel.__getattr__`.
+    """
+
+    def __init__(self, serialized_fields):
+        self.serialized_fields = serialized_fields
+        self.lazy_field_names = frozenset(serialized_fields)
+
+    def load_field(self, kernel, name):
+        return _loads(self.serialized_fields[name])
+
+
+def load_kernel(data, lazy=True):
+    """Return the :class:`loopy.LoopKernel` represented by *data*, as written
+    by :func:`dump_kernel`.
+
+    :arg lazy: If *True*, the fields in :data:`LAZY_FIELDS` are reconstructed
+        upon first access.
+    """
+    hash_digest, eager_fields, lazy_fields = _load_payload(data)
+
+    from loopy.kernel import LoopKernel
+    kernel = LoopKernel.__new__(LoopKernel)
+    kernel.register_fields(set(eager_fields) | set(lazy_fields))
+
+    for name, value in six.iteritems(eager_fields):
+        setattr(kernel, name, value)
+
+    kernel._pytools_persistent_hash_digest = hash_digest
+    from loopy.target.execution import KernelExecutorCache
+    kernel._kernel_executor_cache = KernelExecutorCache()
+
+    loader = _LazyFieldLoader(lazy_fields)
+    if lazy:
+        kernel._lazy_field_loader = loader
+    else:
+        for name in sorted(lazy_fields):
+            setattr(kernel, name, loader.load_field(kernel, name))
+
+    return kernel
+
+
+def load_kernel_fields(data, field_names):
+    """Return a :class:`dict` mapping each name in *field_names* to the value of
+    that attribute of the :class:`loopy.LoopKernel` represented by *data*.
+    Only these fields are reconstructed.
+    """
+    _, eager_fields, lazy_fields = _load_payload(data)
+
+    result = {}
+    for name in field_names:
+        if name in eager_fields:
+            result[name] = eager_fields[name]
+        elif name in lazy_fields:
+            result[name] = _loads(lazy_fields[name])
+        else:
+            raise LoopyError("serialized kernel has no field '%s'" % name)
+
+    return result
+
+# }}}
+
+# vim: foldmethod=marker
@@ -206,6 +206,41 @@ def find_all_insn_inames(kernel):
         insn_id_to_inames[insn.id] = iname_deps
         insn_assignee_inames[insn.id] = write_deps & kernel.all_inames()
 
+    # {{{ implicit inames of written variables
+
+    # The inames implied by reading a variable are those shared by all its
+    # writers. They are kept up to date as the writers' inames grow, so that
+    # each reader only looks them up, rather than visiting all writers.
+
+    insn_reduction_inames = dict(
+            (insn.id, insn.reduction_inames()) for insn in kernel.instructions)
+
+    def get_implicit_inames(var_name):
+        result = None
+        for writer_id in writer_map[var_name]:
+            writer_implicit_inames = (
+                    insn_id_to_inames[writer_id]
+                    - insn_assignee_inames[writer_id])
+            if result is None:
+                result = writer_implicit_inames
+            else:
+                result = result & writer_implicit_inames
+
+        return result
+
+    var_to_implicit_inames = dict(
+            (var_name, get_implicit_inames(var_name))
+            for var_name in writer_map)
+
+    def update_inames(insn_id, inames):
+        insn_id_to_inames[insn_id] = inames
+        for var_name in all_write_deps[insn_id]:
+            if var_name in writer_map:
+                var_to_implicit_inames[var_name] = (
+                        get_implicit_inames(var_name))
+
+    # }}}
+
     # fixed point iteration until all iname dep sets have converged
 
     # Why is fixed point iteration necessary here? Consider the following
@@ -229,12 +264,15 @@ def find_all_insn_inames(kernel):
             # {{{ depdency-based propagation
 
             inames_old = insn_id_to_inames[insn.id]
-            inames_new = inames_old | guess_iname_deps_based_on_var_use(
-                    kernel, insn, insn_id_to_inames)
-
-            insn_id_to_inames[insn.id] = inames_new
+            inames_new = inames_old | (
+                    frozenset().union(*(
+                        var_to_implicit_inames[var_name]
+                        for var_name in all_read_deps[insn.id]
+                        if var_name in var_to_implicit_inames))
+                    - insn_reduction_inames[insn.id])
 
             if inames_new != inames_old:
+                update_inames(insn.id, inames_new)
                 did_something = True
 
                 warn_with_kernel(kernel, "inferred_iname",
@@ -272,7 +310,7 @@ def find_all_insn_inames(kernel):
 
             if inames_new != inames_old:
                 did_something = True
-                insn_id_to_inames[insn.id] = frozenset(inames_new)
+                update_inames(insn.id, frozenset(inames_new))
 
                 warn_with_kernel(kernel, "inferred_iname",
                         "The iname(s) '%s' on instruction '%s' was "
@@ -299,22 +337,158 @@ def find_all_insn_inames(kernel):
 
 # {{{ set operation cache
 
-class SetOperationCacheManager:
-    def __init__(self):
-        # mapping: set hash -> [(set, op, args, result)]
-        self.cache = {}
+def _get_isl_object_key(obj):
+    """Return a hashable key for the :mod:`islpy` object *obj* that is equal
+    for equal objects with equally named dimensions. (Equality of isl
+    objects disregards the names of non-parameter dimensions.)
+    """
+    if obj is None:
+        return None
+
+    # Basic sets and maps are hashed by identity, sets and maps by content.
+    if isinstance(obj, isl.BasicSet):
+        hashable_obj = isl.Set.from_basic_set(obj)
+    elif isinstance(obj, isl.BasicMap):
+        hashable_obj = isl.Map.from_basic_map(obj)
+    else:
+        hashable_obj = obj
+
+    space = obj.get_space()
+    return (type(obj), hashable_obj,
+            tuple(space.get_var_names(dim_type.in_)),
+            tuple(space.get_var_names(dim_type.out)))
+
+
+def _get_isl_object_persistent_key(obj):
+    """Like :func:`_get_isl_object_key`, but suitable as a key of a
+    :class:`pytools.persistent_dict.PersistentDict`.
+    """
+    if obj is None:
+        return None
+
+    space = obj.get_space()
+    return (type(obj).__name__, str(obj),
+            tuple(space.get_var_names(dim_type.in_)),
+            tuple(space.get_var_names(dim_type.out)))
+
+
+_base_index_and_length_cache = None
+
+
+def _get_base_index_and_length_cache():
+    global _base_index_and_length_cache
+    if _base_index_and_length_cache is None:
+        from pytools.persistent_dict import WriteOncePersistentDict
+        from loopy.tools import LoopyKeyBuilder
+        from loopy.version import DATA_MODEL_VERSION
+
+        _base_index_and_length_cache = WriteOncePersistentDict(
+                "loopy-base-index-and-length-cache-v2-"+DATA_MODEL_VERSION,
+                key_builder=LoopyKeyBuilder())
+
+    return _base_index_and_length_cache
+
+
+class SetOperationCacheManager(object):
+    """Caches the results of expensive operations on :mod:`islpy` sets, such
+    as finding the bounds of an iname. Shared among all copies of a kernel.
+
+    Results are looked up by the set (along with the names of its
+    dimensions), the name and the arguments of the operation. At most
+    *max_size* results are kept, the least recently used one being evicted
+    first.
+
+    .. attribute:: hits
+    .. attribute:: misses
+
+    .. automethod:: get_shared
+    .. automethod:: get_stats
+
+    .. versionchanged:: 2018.2
+
+        The cache is bounded and indexed by the sets themselves.
+    """
+
+    DEFAULT_MAX_SIZE = 4096
+
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = self.DEFAULT_MAX_SIZE
+
+        from collections import OrderedDict
+
+        # mapping: (set key, op name, args) -> result
+        self.cache = OrderedDict()
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+
+    # {{{ sharing among kernels
+
+    _shared_managers = None
+    MAX_SHARED_MANAGERS = 64
+
+    @classmethod
+    def get_shared(cls, domains):
+        """Return a cache manager shared by all kernels with *domains*
+        that obtain theirs from this method.
+        """
+        from collections import OrderedDict
+        if cls._shared_managers is None:
+            cls._shared_managers = OrderedDict()
+
+        key = tuple(_get_isl_object_key(dom) for dom in domains)
+
+        shared_managers = cls._shared_managers
+        try:
+            result = shared_managers.pop(key)
+        except KeyError:
+            result = cls()
+
+        # (re-)insert as most recently used
+        shared_managers[key] = result
+        while len(shared_managers) > cls.MAX_SHARED_MANAGERS:
+            shared_managers.popitem(last=False)
+
+        return result
+
+    # }}}
+
+    def get_stats(self):
+        """Return a :class:`dict` with the number of *hits* and *misses*
+        and the current and maximum *size* of the cache.
+        """
+        return dict(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self.cache),
+                max_size=self.max_size)
+
+    def _lookup(self, key):
+        result = self.cache.pop(key)
+
+        # (re-)insert as most recently used
+        self.cache[key] = result
+        self.hits += 1
+        return result
+
+    def _store(self, key, result):
+        self.misses += 1
+        self.cache[key] = result
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
 
     def op(self, set, op_name, op, args):
-        hashval = hash(set)
-        bucket = self.cache.setdefault(hashval, [])
+        key = (_get_isl_object_key(set), op_name, args)
 
-        for bkt_set, bkt_op, bkt_args, result in bucket:
-            if set.plain_is_equal(bkt_set) and op == bkt_op and args == bkt_args:
-                return result
+        try:
+            return self._lookup(key)
+        except KeyError:
+            pass
 
-        #print op, set.get_dim_name(dim_type.set, args[0])
         result = op(set, *args)
-        bucket.append((set, op_name, args, result))
+        self._store(key, result)
         return result
 
     def dim_min(self, set, *args):
@@ -337,6 +511,9 @@ class SetOperationCacheManager:
         :arg n_allowed_params_in_length: Simplifies the 'length'
             argument so that only the first that many params
             (in the domain of *set*) occur.
+
+        Results are also stored in a persistent cache on disk if enabled
+        by :func:`loopy.set_bounds_caching_enabled`.
         """
         if not isinstance(iname, int):
             iname_to_dim = set.space.get_var_dict()
@@ -344,6 +521,42 @@ class SetOperationCacheManager:
         else:
             idx = iname
 
+        key = (_get_isl_object_key(set), "base_index_and_length",
+                (idx, _get_isl_object_key(context),
+                    n_allowed_params_in_length))
+
+        try:
+            return self._lookup(key)
+        except KeyError:
+            pass
+
+        from loopy import CACHING_ENABLED, BOUNDS_CACHING_ENABLED
+        use_disk_cache = CACHING_ENABLED and BOUNDS_CACHING_ENABLED
+
+        if use_disk_cache:
+            disk_key = (_get_isl_object_persistent_key(set),
+                    idx, _get_isl_object_persistent_key(context),
+                    n_allowed_params_in_length)
+            try:
+                result = _get_base_index_and_length_cache()[disk_key]
+            except KeyError:
+                pass
+            else:
+                self._store(key, result)
+                return result
+
+        result = self._base_index_and_length_uncached(
+                set, idx, context, n_allowed_params_in_length)
+
+        self._store(key, result)
+        if use_disk_cache:
+            _get_base_index_and_length_cache().store_if_not_present(
+                    disk_key, result)
+
+        return result
+
+    def _base_index_and_length_uncached(self, set, idx, context,
+            n_allowed_params_in_length):
         lower_bound_pw_aff = self.dim_min(set, idx)
         upper_bound_pw_aff = self.dim_max(set, idx)
 
@@ -0,0 +1,612 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import six
+from six.moves import range, zip
+
+import islpy as isl
+from islpy import dim_type
+from pymbolic.mapper import WalkMapper
+from pymbolic.primitives import Variable
+
+from pytools import UniqueNameGenerator
+
+from loopy.diagnostic import LoopyError
+from loopy.kernel.data import ValueArg
+from loopy.symbolic import RuleAwareIdentityMapper, SubstitutionRuleMappingContext
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+.. currentmodule:: loopy
+
+.. autoclass:: LazyKernelGraph
+
+.. autoclass:: LazyArray
+"""
+
+
+# {{{ lazy array
+
+class LazyArray(object):
+    """A placeholder for an array written by a kernel call recorded in a
+    :class:`LazyKernelGraph`. May be passed as an argument to further calls
+    on the same graph and requested as an output of
+    :meth:`LazyKernelGraph.execute`.
+
+    .. attribute:: graph
+    .. attribute:: call_index
+    .. attribute:: name
+
+        The name of the kernel argument that this array was written to.
+    """
+
+    def __init__(self, graph, call_index, name):
+        self.graph = graph
+        self.call_index = call_index
+        self.name = name
+
+    @property
+    def key(self):
+        return (self.call_index, self.name)
+
+    def __repr__(self):
+        return "LazyArray(call=%d, name='%s')" % (self.call_index, self.name)
+
+# }}}
+
+
+# {{{ access analysis
+
+class _NotElementwise(Exception):
+    pass
+
+
+class _SubscriptCollector(WalkMapper):
+    def __init__(self, var_name):
+        self.var_name = var_name
+        self.indices = set()
+
+    def map_variable(self, expr):
+        if expr.name == self.var_name:
+            raise _NotElementwise()
+
+    def map_subscript(self, expr):
+        if (isinstance(expr.aggregate, Variable)
+                and expr.aggregate.name == self.var_name):
+            self.indices.add(expr.index_tuple)
+            for child in expr.index_tuple:
+                self.rec(child)
+        else:
+            WalkMapper.map_subscript(self, expr)
+
+
+def _get_access_indices(kernel, var_name, written):
+    """Return the set of index tuples with which *var_name* is written (if
+    *written*) or read in *kernel*, or *None* if some access is not by a
+    plain subscript.
+    """
+    from loopy.symbolic import get_dependencies
+
+    if any(var_name in get_dependencies(rule.expression)
+            for rule in six.itervalues(kernel.substitutions)):
+        return None
+
+    collector = _SubscriptCollector(var_name)
+
+    def collect(expr):
+        collector(expr)
+        return expr
+
+    try:
+        for insn in kernel.instructions:
+            if written:
+                if var_name in insn.assignee_var_names():
+                    for assignee in insn.assignees:
+                        collector(assignee)
+            elif var_name in insn.read_dependency_names():
+                insn.with_transformed_expressions(collect)
+
+    except _NotElementwise:
+        return None
+
+    return collector.indices
+
+
+def _get_elementwise_inames(kernel, var_name, written):
+    """If all writes (reads) of *var_name* in *kernel* use the same tuple of
+    distinct inames as subscript, and all involved instructions run within
+    exactly those inames, return that tuple. Otherwise return *None*.
+    """
+    indices = _get_access_indices(kernel, var_name, written)
+    if not indices or len(indices) != 1:
+        return None
+
+    index, = indices
+    if not all(isinstance(idx, Variable) for idx in index):
+        return None
+
+    inames = tuple(idx.name for idx in index)
+    if (len(set(inames)) != len(inames)
+            or not set(inames) <= kernel.all_inames()):
+        return None
+
+    for insn in kernel.instructions:
+        if written:
+            accesses = var_name in insn.assignee_var_names()
+        else:
+            accesses = var_name in insn.read_dependency_names()
+
+        if accesses and insn.within_inames != frozenset(inames):
+            return None
+
+    return inames
+
+
+def _domains_agree(knl_a, knl_b, inames):
+    def get_domain(knl):
+        dom = knl.get_inames_domain(frozenset(inames))
+        return dom.project_out_except(list(inames), [dim_type.set])
+
+    dom_a, dom_b = isl.align_two(get_domain(knl_a), get_domain(knl_b))
+    return dom_a <= dom_b and dom_b <= dom_a
+
+# }}}
+
+
+# {{{ scalarization of fused intermediates
+
+class _ScalarizingMapper(RuleAwareIdentityMapper):
+    def __init__(self, rule_mapping_context, var_names):
+        super(_ScalarizingMapper, self).__init__(rule_mapping_context)
+        self.var_names = var_names
+
+    def map_subscript(self, expr, expn_state):
+        if (isinstance(expr.aggregate, Variable)
+                and expr.aggregate.name in self.var_names):
+            return expr.aggregate
+
+        return super(_ScalarizingMapper, self).map_subscript(expr, expn_state)
+
+
+def _scalarize_intermediates(kernel, var_names):
+    """Turn the elementwise-accessed arguments *var_names* of *kernel* into
+    private scalar temporaries.
+    """
+    if not var_names:
+        return kernel
+
+    from loopy.kernel.data import TemporaryVariable, temp_var_scope, auto
+
+    new_args = []
+    new_temporaries = kernel.temporary_variables.copy()
+    for arg in kernel.args:
+        if arg.name in var_names:
+            new_temporaries[arg.name] = TemporaryVariable(
+                    name=arg.name,
+                    dtype=arg.dtype if arg.dtype is not None else auto,
+                    shape=(),
+                    scope=temp_var_scope.PRIVATE)
+        else:
+            new_args.append(arg)
+
+    kernel = kernel.copy(args=new_args, temporary_variables=new_temporaries)
+
+    rule_mapping_context = SubstitutionRuleMappingContext(
+            kernel.substitutions, kernel.get_var_name_generator())
+    mapper = _ScalarizingMapper(rule_mapping_context, var_names)
+    return rule_mapping_context.finish_kernel(mapper.map_kernel(kernel))
+
+# }}}
+
+
+# {{{ kernel graph
+
+class _Call(object):
+    def __init__(self, kernel, arg_values):
+        self.kernel = kernel
+        self.arg_values = arg_values
+
+
+class _FusedGroup(object):
+    """
+    .. attribute:: kernel
+
+        The (possibly fused) kernel, with array arguments renamed to their
+        binding names.
+
+    .. attribute:: call_indices
+    .. attribute:: bindings
+
+        A mapping from binding names to the value (array, scalar or
+        :class:`LazyArray` key) that gets passed for them.
+
+    .. attribute:: produced
+
+        A mapping from :attr:`LazyArray.key` to binding name for all
+        arrays written by this group.
+    """
+
+    def __init__(self, kernel, call_indices, bindings, produced):
+        self.kernel = kernel
+        self.call_indices = call_indices
+        self.bindings = bindings
+        self.produced = produced
+
+
+def _get_bound_arrays(group, names):
+    """Return a set of keys identifying the arrays bound to the arguments
+    *names* of *group*, such that arguments with intersecting keys may refer
+    to the same array.
+    """
+    name_to_produced_key = dict(
+            (name, key) for key, name in six.iteritems(group.produced))
+
+    result = set()
+    for name in names:
+        if name in name_to_produced_key:
+            result.add(("lazy", name_to_produced_key[name]))
+
+        if name not in group.bindings:
+            continue
+
+        value = group.bindings[name]
+        if isinstance(value, tuple):
+            result.add(("lazy", value))
+        else:
+            result.add(("obj", id(value)))
+
+    return result
+
+
+class LazyKernelGraph(object):
+    """Records a sequence of kernel calls without running them. When the
+    results are requested by :meth:`execute`, chains of calls in which one
+    call consumes an array produced by an earlier one element by element
+    are fused (using :func:`loopy.fuse_kernels`) into a single kernel, and
+    intermediate arrays that are not requested as outputs are never
+    written to memory.
+
+    Example::
+
+        graph = lp.LazyKernelGraph()
+        tmp, = graph(knl_scale, a=a)
+        out, = graph(knl_add, x=tmp, y=b)
+        result, = graph.execute(queue, outputs=[out])
+
+    Calls are only fused with their immediate predecessor group, and only
+    if every array linking them is written and read with the same tuple of
+    inames as its subscript. Kernels must be in
+    :attr:`loopy.kernel_state.INITIAL` state to be fused. All other calls
+    are run as recorded.
+
+    .. automethod:: __call__
+    .. automethod:: execute
+
+    .. versionadded:: 2018.2
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, kernel, **kwargs):
+        """Record a call of *kernel* with the keyword arguments *kwargs*,
+        which may contain :class:`LazyArray` instances from this graph.
+
+        :returns: a tuple of :class:`LazyArray` instances, one for each
+            argument of *kernel* that is written, in the order of
+            :attr:`loopy.LoopKernel.args`.
+        """
+        for name, value in six.iteritems(kwargs):
+            if isinstance(value, LazyArray) and value.graph is not self:
+                raise LoopyError("argument '%s' is a lazy array from a "
+                        "different graph" % name)
+
+        written = kernel.get_written_variables()
+        call_index = len(self.calls)
+        self.calls.append(_Call(kernel, kwargs))
+
+        return tuple(
+                LazyArray(self, call_index, arg.name)
+                for arg in kernel.args
+                if arg.name in written)
+
+    # {{{ grouping and fusion
+
+    def _make_group(self, call_index, name_gen, binding_names):
+        call = self.calls[call_index]
+        kernel = call.kernel
+
+        from loopy.transform.data import rename_argument
+
+        bindings = {}
+        produced = {}
+        written = kernel.get_written_variables()
+
+        for arg in kernel.args:
+            if isinstance(arg, ValueArg):
+                if arg.name in call.arg_values:
+                    bindings[arg.name] = call.arg_values[arg.name]
+                continue
+
+            if arg.name not in call.arg_values:
+                value_key = ("out", call_index, arg.name)
+            else:
+                value = call.arg_values[arg.name]
+                if isinstance(value, LazyArray):
+                    value_key = ("lazy",) + value.key
+                else:
+                    value_key = ("obj", id(value))
+
+            if arg.name in written:
+                # every written array needs its own binding so that the
+                # result can be retrieved
+                value_key = ("out", call_index, arg.name)
+
+            try:
+                new_name = binding_names[value_key]
+            except KeyError:
+                new_name = binding_names[value_key] = name_gen(arg.name)
+
+            kernel = rename_argument(kernel, arg.name, new_name)
+
+            if value_key[0] == "out":
+                produced[(call_index, arg.name)] = new_name
+                if arg.name in call.arg_values:
+                    bindings[new_name] = call.arg_values[arg.name]
+            elif value_key[0] == "lazy":
+                bindings[new_name] = value_key[1:]
+            else:
+                bindings[new_name] = call.arg_values[arg.name]
+
+        return _FusedGroup(kernel, [call_index], bindings, produced)
+
+    def _try_fuse(self, group, call_group, name_gen):
+        """Return a new :class:`_FusedGroup` performing *group* followed
+        by *call_group*, or *None* if they cannot be fused.
+        """
+        from loopy.kernel import kernel_state
+        if (group.kernel.state != kernel_state.INITIAL
+                or call_group.kernel.state != kernel_state.INITIAL
+                or group.kernel.target != call_group.kernel.target):
+            return None
+
+        # {{{ find links
+
+        links = []
+        for name, value in six.iteritems(call_group.bindings):
+            if isinstance(value, tuple) and value in group.produced:
+                links.append((group.produced[value], name))
+
+        if not links:
+            return None
+
+        consumer = call_group.kernel
+
+        # The consumer must not overwrite any array the group touches, under
+        # whichever name it is bound.
+        consumer_written = consumer.get_written_variables()
+        if (_get_bound_arrays(call_group, [
+                    arg.name for arg in consumer.args
+                    if not isinstance(arg, ValueArg)
+                    and arg.name in consumer_written])
+                & _get_bound_arrays(group, [
+                    arg.name for arg in group.kernel.args
+                    if not isinstance(arg, ValueArg)])):
+            return None
+
+        # Shared scalar arguments must agree.
+        for name, value in six.iteritems(call_group.bindings):
+            if (name in group.bindings
+                    and not isinstance(value, tuple)
+                    and group.bindings[name] is not value
+                    and group.bindings[name] != value):
+                return None
+
+        # }}}
+
+        # {{{ rename consumer inames to match the producer
+
+        from loopy.transform.iname import rename_iname
+
+        iname_renames = {}
+        for producer_name, consumer_name in links:
+            producer_inames = _get_elementwise_inames(
+                    group.kernel, producer_name, written=True)
+            consumer_inames = _get_elementwise_inames(
+                    consumer, consumer_name, written=False)
+
+            if (producer_inames is None or consumer_inames is None
+                    or len(producer_inames) != len(consumer_inames)):
+                return None
+
+            for c_iname, p_iname in zip(consumer_inames, producer_inames):
+                if iname_renames.setdefault(c_iname, p_iname) != p_iname:
+                    return None
+
+        if len(set(six.itervalues(iname_renames))) != len(iname_renames):
+            return None
+
+        try:
+            # first move all consumer inames out of the way, then connect
+            # the linked ones to the producer's inames
+            fresh_inames = {}
+            for iname in sorted(consumer.all_inames()):
+                fresh_inames[iname] = name_gen(iname)
+                consumer = rename_iname(consumer, iname, fresh_inames[iname])
+
+            for c_iname, p_iname in six.iteritems(iname_renames):
+                consumer = rename_iname(consumer, fresh_inames[c_iname], p_iname)
+
+            if not _domains_agree(group.kernel, consumer,
+                    sorted(six.itervalues(iname_renames))):
+                return None
+
+            # {{{ connect linked arrays
+
+            from loopy.transform.data import rename_argument
+            for producer_name, consumer_name in links:
+                consumer = rename_argument(consumer, consumer_name, producer_name)
+
+            # }}}
+
+            from loopy.transform.fusion import fuse_kernels
+            fused = fuse_kernels(
+                    [group.kernel, consumer],
+                    suffixes=["", "_%d" % call_group.call_indices[0]],
+                    data_flow=[
+                        (producer_name, 0, 1)
+                        for producer_name, _ in links])
+
+        except LoopyError as e:
+            logger.debug("not fusing call %d: %s"
+                    % (call_group.call_indices[0], e))
+            return None
+
+        # }}}
+
+        link_names = dict((c, p) for p, c in links)
+        bindings = group.bindings.copy()
+        for name, value in six.iteritems(call_group.bindings):
+            if name in link_names:
+                continue
+            bindings[name] = value
+
+        produced = group.produced.copy()
+        produced.update(call_group.produced)
+
+        return _FusedGroup(
+                fused,
+                group.call_indices + call_group.call_indices,
+                bindings, produced)
+
+    def _build_groups(self, output_keys):
+        all_names = set()
+        for call in self.calls:
+            all_names.update(call.kernel.all_variable_names())
+        name_gen = UniqueNameGenerator(all_names)
+        binding_names = {}
+
+        groups = []
+        for call_index in range(len(self.calls)):
+            call_group = self._make_group(call_index, name_gen, binding_names)
+
+            fused = None
+            if groups:
+                fused = self._try_fuse(groups[-1], call_group, name_gen)
+
+            if fused is not None:
+                groups[-1] = fused
+            else:
+                groups.append(call_group)
+
+        # {{{ scalarize intermediates that stay within a single group
+
+        consumed_keys = set()
+        for group in groups:
+            group_produced = set(group.produced)
+            for value in six.itervalues(group.bindings):
+                if isinstance(value, tuple) and value not in group_produced:
+                    consumed_keys.add(value)
+
+        result = []
+        for group in groups:
+            scalarized = set()
+            if len(group.call_indices) > 1:
+                for key, name in six.iteritems(group.produced):
+                    if (key in output_keys
+                            or key in consumed_keys
+                            or key[1] in self.calls[key[0]].arg_values):
+                        continue
+
+                    # Every access, including reads by the producer itself,
+                    # must be to the element of the current iteration.
+                    write_inames = _get_elementwise_inames(
+                            group.kernel, name, written=True)
+                    if (write_inames is not None
+                            and write_inames == _get_elementwise_inames(
+                                group.kernel, name, written=False)):
+                        scalarized.add(name)
+
+            kernel = _scalarize_intermediates(group.kernel, scalarized)
+            result.append(_FusedGroup(
+                kernel, group.call_indices,
+                group.bindings,
+                dict((key, name)
+                    for key, name in six.iteritems(group.produced)
+                    if name not in scalarized)))
+
+        # }}}
+
+        return result
+
+    # }}}
+
+    def execute(self, *args, **kwargs):
+        """Run the recorded calls, fusing where possible.
+
+        :arg args: passed on to each invocation of a kernel, e.g. a
+            :class:`pyopencl.CommandQueue` for OpenCL kernels.
+        :arg outputs: a list of :class:`LazyArray` instances from this graph
+            whose values are to be returned. Arrays not listed here and not
+            needed by a later, unfused call may not be computed into memory.
+        :returns: a tuple of values matching *outputs*.
+        """
+        outputs = kwargs.pop("outputs")
+        if kwargs:
+            raise TypeError("unexpected keyword arguments: %s"
+                    % ", ".join(kwargs))
+
+        for out in outputs:
+            if not isinstance(out, LazyArray) or out.graph is not self:
+                raise LoopyError("outputs must be lazy arrays from this graph")
+
+        output_keys = set(out.key for out in outputs)
+        values = {}
+
+        from loopy import set_options
+        for group in self._build_groups(output_keys):
+            call_kwargs = {}
+            for name, value in six.iteritems(group.bindings):
+                if isinstance(value, tuple):
+                    value = values[value]
+                call_kwargs[name] = value
+
+            knl = set_options(group.kernel, return_dict=True)
+            _, result = knl(*args, **call_kwargs)
+
+            for key, name in six.iteritems(group.produced):
+                values[key] = result[name]
+
+            if len(group.call_indices) > 1:
+                logger.info("lazy graph: fused calls %s"
+                        % ", ".join(str(i) for i in group.call_indices))
+
+        return tuple(values[out.key] for out in outputs)
+
+# }}}
+
+# vim: foldmethod=marker
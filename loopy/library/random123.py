@@ -1,4 +1,23 @@
-"""Library integration with Random123."""
+"""Library integration with Random123.
+
+.. currentmodule:: loopy
+
+The counter-based generators of Random123 are available as functions
+within kernels targeting PyOpenCL, such as ``philox4x32_f32(ctr, key)``,
+which returns a vector of random numbers along with the next counter.
+To fill large arrays, the following functions generate whole blocks of
+numbers per generator call, on PyOpenCL as well as on
+:class:`ExecutableCTarget`. The latter needs the Random123 headers on the
+include path of its compiler.
+
+.. autofunction:: make_random123_fill_kernel
+
+.. autofunction:: fill_random123
+
+.. autofunction:: get_random123_block_size
+
+.. versionadded:: 2018.2
+"""
 
 from __future__ import division, absolute_import
 
@@ -25,7 +44,8 @@ THE SOFTWARE.
 """
 
 
-from pytools import ImmutableRecord
+import six
+from pytools import ImmutableRecord, memoize
 from mako.template import Template
 import numpy as np
 
@@ -219,4 +239,328 @@ def random123_function_mangler(kernel, name, arg_dtypes):
     else:
         return None
 
+
+# {{{ bulk generation
+
+BULK_PREAMBLE_TEMPLATE = Template("""
+%if is_pyopencl_target:
+#include <${ rng_variant.pyopencl_header }>
+%else:
+#include <${ rng_variant.generic_header }>
+%endif
+
+<%
+name = rng_variant.full_name
+word_type = "uint%d_t" % rng_variant.bits
+if rng_variant.bits == 32:
+    ctr_words = ["(uint32_t) ctr", "(uint32_t) (ctr >> 32)"]
+else:
+    ctr_words = ["ctr"]
+ctr_words = ctr_words + ["0"] * (rng_variant.width - len(ctr_words))
+
+params = (
+        ["uint64_t ctr"]
+        + ["%s key%d" % (word_type, i) for i in range(rng_variant.key_width)]
+        + ["%s *result%d" % (result_type, i) for i in range(1, len(results))])
+%>
+
+${ qualifier } ${ result_type } ${ func_name }(${ ", ".join(params) })
+{
+    ${ name }_ctr_t c = {{ ${ ", ".join(ctr_words) } }};
+    ${ name }_key_t k = {{ ${ ", ".join(
+        "key%d" % i for i in range(rng_variant.key_width)) } }};
+    ${ name }_ctr_t r = ${ name }(c, k);
+
+    %for i in range(1, len(results)):
+    *result${ i } = ${ results[i] };
+    %endfor
+    return ${ results[0] };
+}
+""", strict_undefined=True)
+
+
+_BULK_SUFFIX_TO_DTYPE = {
+        "u32": np.dtype(np.uint32),
+        "u64": np.dtype(np.uint64),
+        "f32": np.dtype(np.float32),
+        "f64": np.dtype(np.float64),
+        }
+
+_BULK_DTYPE_SUFFIXES = dict(
+        (dtype, suffix) for suffix, dtype in six.iteritems(_BULK_SUFFIX_TO_DTYPE))
+
+_BULK_SUFFIX_TO_C_TYPE = {
+        "u32": "uint32_t",
+        "u64": "uint64_t",
+        "f32": "float",
+        "f64": "double",
+        }
+
+FUNC_NAMES_TO_BULK_RNG = dict(
+        ("%s_bulk_%s" % (v.full_name, suffix), (v, suffix))
+        for v in RNG_VARIANTS
+        for suffix in _BULK_SUFFIX_TO_C_TYPE)
+
+
+def _get_bulk_results(rng_variant, suffix):
+    """Return a list of C expressions for the values obtained from the
+    words ``r.v[i]`` of one generator call. Floating point values are
+    built from the most significant bits of the words, so that they are
+    uniform in :math:`[0, 1)`.
+    """
+    words = ["r.v[%d]" % i for i in range(rng_variant.width)]
+
+    if suffix == "u%d" % rng_variant.bits:
+        return words
+
+    elif suffix == "f32":
+        return [
+                "(float) (%s >> %d) * %rf" % (
+                    word, rng_variant.bits - 24, 1./2**24)
+                for word in words]
+
+    elif suffix == "f64":
+        if rng_variant.bits == 32:
+            # two words per value
+            words = [
+                    "(((uint64_t) %s << 32) | %s)" % (hi_word, lo_word)
+                    for hi_word, lo_word in zip(words[::2], words[1::2])]
+
+        return [
+                "(double) (%s >> 11) * %r" % (word, 1./2**53)
+                for word in words]
+
+    else:
+        return None
+
+
+def get_random123_block_size(rng, dtype):
+    """Return the number of values of *dtype* obtained from one call of
+    the Random123 generator *rng* (e.g. ``"philox4x32"``) in the kernels
+    made by :func:`make_random123_fill_kernel`, i.e. the number of values
+    per counter.
+    """
+    try:
+        suffix = _BULK_DTYPE_SUFFIXES[np.dtype(dtype)]
+        rng_variant = FUNC_NAMES_TO_BULK_RNG["%s_bulk_%s" % (rng, suffix)][0]
+    except (KeyError, TypeError):
+        rng_variant = suffix = None
+
+    results = None
+    if rng_variant is not None:
+        results = _get_bulk_results(rng_variant, suffix)
+
+    if results is None:
+        from loopy.diagnostic import LoopyError
+        raise LoopyError("cannot generate values of type '%s' with "
+                "Random123 generator '%s'" % (dtype, rng))
+
+    return len(results)
+
+
+def random123_bulk_preamble_generator(preamble_info):
+    for f in preamble_info.seen_functions:
+        try:
+            rng_variant, suffix = FUNC_NAMES_TO_BULK_RNG[f.name]
+        except KeyError:
+            continue
+
+        from loopy.target.pyopencl import PyOpenCLTarget
+        from loopy.library.reduction import _get_function_qualifier
+        yield ("91-random123-"+f.name,
+                BULK_PREAMBLE_TEMPLATE.render(
+                    is_pyopencl_target=isinstance(
+                        preamble_info.kernel.target,
+                        PyOpenCLTarget),
+                    rng_variant=rng_variant,
+                    qualifier=_get_function_qualifier(
+                        preamble_info.kernel.target),
+                    func_name=f.name,
+                    result_type=_BULK_SUFFIX_TO_C_TYPE[suffix],
+                    results=_get_bulk_results(rng_variant, suffix),
+                    ))
+
+
+def random123_bulk_function_mangler(kernel, name, arg_dtypes):
+    try:
+        rng_variant, suffix = FUNC_NAMES_TO_BULK_RNG[name]
+    except KeyError:
+        return None
+
+    results = _get_bulk_results(rng_variant, suffix)
+    if results is None:
+        return None
+
+    from loopy.types import NumpyType
+    result_dtype = NumpyType(_BULK_SUFFIX_TO_DTYPE[suffix])
+    word_dtype = NumpyType({32: np.uint32, 64: np.uint64}[rng_variant.bits])
+
+    from loopy.kernel.data import CallMangleInfo
+    return CallMangleInfo(
+            target_name=name,
+            result_dtypes=(result_dtype,)*len(results),
+            arg_dtypes=(
+                (NumpyType(np.dtype(np.uint64)),)
+                + (word_dtype,)*rng_variant.key_width))
+
+
+def make_random123_fill_kernel(rng="philox4x32", dtype=np.float32,
+        target=None, name=None):
+    """Return a kernel filling the one-dimensional array *out* of length
+    *n* with random numbers of *dtype* from the counter-based Random123
+    generator *rng*, which is one of ``philox2x32``, ``philox2x64``,
+    ``philox4x32``, ``philox4x64`` and the corresponding ``threefry``
+    variants.
+
+    Each iteration of the loop over the iname ``i`` makes one call of the
+    generator with the counter ``counter + i`` and the key made of the
+    arguments ``key0``, ``key1``, ... and stores all values obtained from
+    the output words (see :func:`get_random123_block_size`) to a block of
+    consecutive entries of *out*, in an unrolled loop over the iname ``w``.
+    Unsigned integers of the word size of *rng* are stored as generated.
+    Floating point numbers are uniform in :math:`[0, 1)`, double precision
+    numbers from a 32-bit generator use two words each.
+
+    The key words are of the word type of *rng*, *counter* is a 64-bit
+    unsigned integer. The loop over ``i`` is left to be parallelized.
+    """
+    from loopy.kernel.creation import make_kernel
+    from loopy.kernel.data import (
+            GlobalArg, ValueArg, TemporaryVariable, temp_var_scope)
+
+    block_size = get_random123_block_size(rng, dtype)
+    rng_variant, suffix = FUNC_NAMES_TO_BULK_RNG["%s_bulk_%s" % (
+        rng, _BULK_DTYPE_SUFFIXES[np.dtype(dtype)])]
+    word_dtype = {32: np.uint32, 64: np.uint64}[rng_variant.bits]
+
+    key_names = ["key%d" % i for i in range(rng_variant.key_width)]
+
+    kwargs = {}
+    if target is not None:
+        kwargs["target"] = target
+    if name is None:
+        name = "fill_%s_%s" % (rng, suffix)
+
+    knl = make_kernel(
+            "{ [i, w]: 0 <= i and 0 <= w < %(bs)d and %(bs)d*i + w < n }"
+            % {"bs": block_size},
+            """
+            %(block)s = %(rng)s_bulk_%(suffix)s(counter + i, %(keys)s)  \
+                    {id=gen}
+            out[%(bs)d*i + w] = block[w]  {dep=gen}
+            """ % {
+                "block": ", ".join(
+                    "block[%d]" % iw for iw in range(block_size)),
+                "rng": rng,
+                "suffix": suffix,
+                "keys": ", ".join(key_names),
+                "bs": block_size,
+                },
+            [
+                GlobalArg("out", dtype, shape=("n",)),
+                ValueArg("counter", np.uint64),
+                ] + [
+                ValueArg(key_name, word_dtype) for key_name in key_names
+                ] + [
+                TemporaryVariable("block", dtype, shape=(block_size,),
+                    scope=temp_var_scope.PRIVATE),
+                "..."],
+            name=name, lang_version=(2018, 2), **kwargs)
+
+    from loopy import (
+            register_function_manglers, register_preamble_generators,
+            tag_inames)
+    knl = register_function_manglers(knl, [random123_bulk_function_mangler])
+    knl = register_preamble_generators(knl,
+            [random123_bulk_preamble_generator])
+    return tag_inames(knl, {"w": "unr"})
+
+
+@memoize
+def _get_fill_kernel(rng, dtype, use_pyopencl, compiler=None):
+    from loopy import split_iname
+    if use_pyopencl:
+        from loopy.target.pyopencl import PyOpenCLTarget
+        knl = make_random123_fill_kernel(rng, dtype, target=PyOpenCLTarget())
+        return split_iname(knl, "i", 128, outer_tag="g.0", inner_tag="l.0")
+    else:
+        from loopy.target.c import ExecutableCTarget
+        knl = make_random123_fill_kernel(rng, dtype,
+                target=ExecutableCTarget(compiler=compiler))
+        return split_iname(knl, "i", 1024, outer_tag="g.0")
+
+
+def fill_random123(ary, key, counter=0, rng="philox4x32", queue=None,
+        compiler=None):
+    """Fill *ary* with random numbers from the Random123 generator *rng*,
+    using a kernel from :func:`make_random123_fill_kernel`.
+
+    :arg ary: a contiguous :class:`numpy.ndarray` or
+        :class:`pyopencl.array.Array`. A :mod:`numpy` array is filled
+        by :class:`loopy.ExecutableCTarget` code, unless *queue* is given.
+    :arg key: the key, a sequence of integers of the length of the key of
+        *rng*, or a single integer used as the first word of the key.
+    :arg counter: the counter of the first block of values. The following
+        blocks use the following counters, so a further call should start
+        from *counter* plus the number of blocks, the size of *ary* divided
+        by :func:`get_random123_block_size` and rounded up.
+    :arg queue: a :class:`pyopencl.CommandQueue` on which to fill the
+        array. Defaults to the queue of *ary* if it is a
+        :class:`pyopencl.array.Array`.
+    :arg compiler: the :class:`loopy.target.c.c_execution.CCompiler` used
+        to fill :mod:`numpy` arrays on the host, e.g. one with the location
+        of the Random123 headers among its *include_dirs*.
+    :returns: *ary*
+    """
+    dtype = ary.dtype
+    get_random123_block_size(rng, dtype)
+    rng_variant = FUNC_NAMES_TO_RNG[rng]
+    word_dtype = {32: np.uint32, 64: np.uint64}[rng_variant.bits]
+
+    from loopy.diagnostic import LoopyError
+    if isinstance(key, six.integer_types):
+        key = (key,) + (0,)*(rng_variant.key_width-1)
+    if len(key) != rng_variant.key_width:
+        raise LoopyError("Random123 generator '%s' takes a key of %d words, "
+                "%d given" % (rng, rng_variant.key_width, len(key)))
+
+    if not ary.flags.c_contiguous:
+        raise LoopyError("array to fill must be contiguous")
+
+    kwargs = dict(
+            ("key%d" % i, word_dtype(key_word))
+            for i, key_word in enumerate(key))
+    kwargs["counter"] = np.uint64(counter)
+
+    try:
+        import pyopencl.array as cl_array
+    except ImportError:
+        is_cl_array = False
+    else:
+        is_cl_array = isinstance(ary, cl_array.Array)
+
+    if is_cl_array and queue is None:
+        queue = ary.queue
+
+    flat_ary = ary.reshape(-1)
+
+    if queue is None:
+        # positional arguments only: memoize does not accept keywords in
+        # all versions of pytools
+        knl = _get_fill_kernel(rng, dtype, False, compiler)
+        knl(out=flat_ary, **kwargs)
+
+    elif is_cl_array:
+        knl = _get_fill_kernel(rng, dtype, True)
+        knl(queue, out=flat_ary, **kwargs)
+
+    else:
+        knl = _get_fill_kernel(rng, dtype, True)
+        evt, (out,) = knl(queue, n=flat_ary.size, out_host=False, **kwargs)
+        out.get(queue=queue, ary=flat_ary)
+
+    return ary
+
+# }}}
+
 # vim: foldmethod=marker
@@ -209,6 +209,16 @@ class ReductionOpFunction(FunctionIdentifier):
 # }}}
 
 
+def _get_function_qualifier(target):
+    from loopy.target.opencl import OpenCLTarget
+    if isinstance(target, OpenCLTarget):
+        return "inline"
+    else:
+        # A C99 inline definition does not provide an external definition
+        # to fall back on if the compiler chooses not to inline a call.
+        return "static inline"
+
+
 # {{{ segmented reduction
 
 class SegmentedOp(ReductionOpFunction):
@@ -269,7 +279,7 @@ def get_segmented_function_preamble(kernel, func_id, arg_dtypes):
     prefix = op.prefix(scalar_dtype, segment_flag_dtype)
 
     return (prefix, """
-    inline %(scalar_t)s %(prefix)s_op(
+    %(qualifier)s %(scalar_t)s %(prefix)s_op(
         %(scalar_t)s op1, %(segment_flag_t)s segment_flag1,
         %(scalar_t)s op2, %(segment_flag_t)s segment_flag2,
         %(segment_flag_t)s *segment_flag_out)
@@ -278,6 +288,7 @@ def get_segmented_function_preamble(kernel, func_id, arg_dtypes):
         return segment_flag2 ? op2 : %(combined)s;
     }
     """ % dict(
+            qualifier=_get_function_qualifier(kernel.target),
             scalar_t=kernel.target.dtype_to_typename(scalar_dtype),
             prefix=prefix,
             segment_flag_t=kernel.target.dtype_to_typename(segment_flag_dtype),
@@ -346,7 +357,7 @@ def get_argext_preamble(kernel, func_id, arg_dtypes):
     prefix = op.prefix(scalar_dtype, index_dtype)
 
     return (prefix, """
-    inline %(scalar_t)s %(prefix)s_op(
+    %(qualifier)s %(scalar_t)s %(prefix)s_op(
         %(scalar_t)s op1, %(index_t)s index1,
         %(scalar_t)s op2, %(index_t)s index2,
         %(index_t)s *index_out)
@@ -363,6 +374,7 @@ def get_argext_preamble(kernel, func_id, arg_dtypes):
         }
     }
     """ % dict(
+            qualifier=_get_function_qualifier(kernel.target),
             scalar_t=kernel.target.dtype_to_typename(scalar_dtype),
             prefix=prefix,
             index_t=kernel.target.dtype_to_typename(index_dtype),
@@ -397,6 +409,10 @@ def register_reduction_parser(parser):
     """
     _REDUCTION_OP_PARSERS.append(parser)
 
+    # parsed expressions may now refer to a different reduction
+    from loopy.symbolic import clear_parse_cache
+    clear_parse_cache()
+
 
 def parse_reduction_op(name):
     import re
@@ -471,19 +487,19 @@ def reduction_function_mangler(kernel, func_id, arg_dtypes):
 
 
 def reduction_preamble_generator(preamble_info):
-    from loopy.target.opencl import OpenCLTarget
+    from loopy.target.c import CTarget
 
     for func in preamble_info.seen_functions:
         if isinstance(func.name, ArgExtOp):
-            if not isinstance(preamble_info.kernel.target, OpenCLTarget):
-                raise LoopyError("only OpenCL supported for now")
+            if not isinstance(preamble_info.kernel.target, CTarget):
+                raise LoopyError("only C-like targets supported for now")
 
             yield get_argext_preamble(preamble_info.kernel, func.name,
                     func.arg_dtypes)
 
         elif isinstance(func.name, SegmentedOp):
-            if not isinstance(preamble_info.kernel.target, OpenCLTarget):
-                raise LoopyError("only OpenCL supported for now")
+            if not isinstance(preamble_info.kernel.target, CTarget):
+                raise LoopyError("only C-like targets supported for now")
 
             yield get_segmented_function_preamble(preamble_info.kernel, func.name,
                     func.arg_dtypes)
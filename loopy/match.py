@@ -25,7 +25,9 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import six
 from six.moves import range, intern
+from pytools import memoize, memoize_method
 
 
 NoneType = type(None)
@@ -41,6 +43,8 @@ Match expressions
 ^^^^^^^^^^^^^^^^^
 
 .. autoclass:: MatchExpressionBase
+    :members: get_matching_ids
+
 .. autoclass:: All
 .. autoclass:: And
 .. autoclass:: Or
@@ -50,6 +54,11 @@ Match expressions
 .. autoclass:: Writes
 .. autoclass:: Reads
 .. autoclass:: Iname
+
+Indexed matching
+^^^^^^^^^^^^^^^^
+
+.. autoclass:: InstructionMatchIndex
 """
 
 
@@ -117,6 +126,17 @@ class MatchExpressionBase(object):
     def __call__(self, kernel, matchable):
         raise NotImplementedError
 
+    def get_matching_ids(self, index):
+        """Return a :class:`frozenset` of the IDs of the instructions
+        matched in the kernel of the :class:`InstructionMatchIndex` *index*.
+
+        .. versionadded:: 2018.2
+        """
+        kernel = index.kernel
+        return frozenset(
+                insn.id for insn in kernel.instructions
+                if self(kernel, insn))
+
     def __ne__(self, other):
         return not self.__eq__(other)
 
@@ -134,6 +154,9 @@ class All(MatchExpressionBase):
     def __call__(self, kernel, matchable):
         return True
 
+    def get_matching_ids(self, index):
+        return index.all_ids
+
     def __str__(self):
         return "all"
 
@@ -179,11 +202,24 @@ class And(MultiChildMatchExpressionBase):
     def __call__(self, kernel, matchable):
         return all(ch(kernel, matchable) for ch in self.children)
 
+    def get_matching_ids(self, index):
+        result = index.all_ids
+        for ch in self.children:
+            if not result:
+                break
+            result = result & ch.get_matching_ids(index)
+
+        return result
+
 
 class Or(MultiChildMatchExpressionBase):
     def __call__(self, kernel, matchable):
         return any(ch(kernel, matchable) for ch in self.children)
 
+    def get_matching_ids(self, index):
+        return frozenset().union(
+                *(ch.get_matching_ids(index) for ch in self.children))
+
 
 class Not(MatchExpressionBase):
     def __init__(self, child):
@@ -192,6 +228,9 @@ class Not(MatchExpressionBase):
     def __call__(self, kernel, matchable):
         return not self.child(kernel, matchable)
 
+    def get_matching_ids(self, index):
+        return index.all_ids - self.child.get_matching_ids(index)
+
     def __str__(self):
         return "(not %s)" % str(self.child)
 
@@ -214,9 +253,36 @@ class GlobMatchExpressionBase(MatchExpressionBase):
     def __init__(self, glob):
         self.glob = glob
 
-        import re
-        from fnmatch import translate
-        self.re = re.compile("^"+translate(glob.strip())+"$")
+        self.re = re_from_glob(glob)
+
+        # Globs without wildcards are matched by plain string comparison.
+        if any(c in glob for c in "*?["):
+            self.literal = None
+        else:
+            self.literal = glob.strip()
+
+    def matches(self, s):
+        if self.literal is not None:
+            return s == self.literal
+        else:
+            return self.re.match(s) is not None
+
+    def get_index_map(self, index):
+        """Return a mapping from the strings matched against the glob to
+        :class:`frozenset` instances of instruction IDs.
+        """
+        raise NotImplementedError
+
+    def get_matching_ids(self, index):
+        index_map = self.get_index_map(index)
+
+        if self.literal is not None:
+            return index_map.get(self.literal, frozenset())
+
+        return frozenset().union(*(
+            insn_ids
+            for key, insn_ids in six.iteritems(index_map)
+            if self.re.match(key)))
 
     def __str__(self):
         descr = type(self).__name__
@@ -239,34 +305,129 @@ class GlobMatchExpressionBase(MatchExpressionBase):
 
 class Id(GlobMatchExpressionBase):
     def __call__(self, kernel, matchable):
-        return self.re.match(matchable.id)
+        return self.matches(matchable.id)
+
+    def get_matching_ids(self, index):
+        if self.literal is not None:
+            if self.literal in index.all_ids:
+                return frozenset([self.literal])
+            else:
+                return frozenset()
+
+        return frozenset(
+                insn_id for insn_id in index.all_ids
+                if self.re.match(insn_id))
 
 
 class Tagged(GlobMatchExpressionBase):
     def __call__(self, kernel, matchable):
         if matchable.tags:
-            return any(self.re.match(tag) for tag in matchable.tags)
+            return any(self.matches(tag) for tag in matchable.tags)
         else:
             return False
 
+    def get_index_map(self, index):
+        return index.tag_to_ids()
+
 
 class Writes(GlobMatchExpressionBase):
     def __call__(self, kernel, matchable):
-        return any(self.re.match(name)
+        return any(self.matches(name)
                 for name in matchable.write_dependency_names())
 
+    def get_index_map(self, index):
+        return index.writes_to_ids()
+
 
 class Reads(GlobMatchExpressionBase):
     def __call__(self, kernel, matchable):
-        return any(self.re.match(name)
+        return any(self.matches(name)
                 for name in matchable.read_dependency_names())
 
+    def get_index_map(self, index):
+        return index.reads_to_ids()
+
 
 class Iname(GlobMatchExpressionBase):
     def __call__(self, kernel, matchable):
-        return any(self.re.match(name)
+        return any(self.matches(name)
                 for name in matchable.within_inames)
 
+    def get_index_map(self, index):
+        return index.iname_to_ids()
+
+# }}}
+
+
+# {{{ instruction match index
+
+def _make_index_map(kernel, get_keys):
+    result = {}
+    for insn in kernel.instructions:
+        for key in get_keys(insn):
+            result.setdefault(key, set()).add(insn.id)
+
+    return dict(
+            (key, frozenset(insn_ids))
+            for key, insn_ids in six.iteritems(result))
+
+
+class InstructionMatchIndex(object):
+    """Maps the IDs, tags, inames and read and written variables of the
+    instructions of a kernel to the instructions having them, so that match
+    expressions may be evaluated by :meth:`MatchExpressionBase.get_matching_ids`
+    at a cost depending on the number of matches rather than the number of
+    instructions. Obtain instances using
+    :meth:`loopy.LoopKernel.get_instruction_match_index`.
+
+    .. attribute:: kernel
+    .. attribute:: all_ids
+
+    .. automethod:: find_instructions
+
+    .. versionadded:: 2018.2
+    """
+
+    def __init__(self, kernel):
+        self.kernel = kernel
+        self.all_ids = frozenset(insn.id for insn in kernel.instructions)
+
+    @memoize_method
+    def _id_to_position(self):
+        return dict(
+                (insn.id, i) for i, insn in enumerate(self.kernel.instructions))
+
+    @memoize_method
+    def tag_to_ids(self):
+        return _make_index_map(self.kernel, lambda insn: insn.tags)
+
+    @memoize_method
+    def iname_to_ids(self):
+        return _make_index_map(self.kernel, lambda insn: insn.within_inames)
+
+    @memoize_method
+    def writes_to_ids(self):
+        return _make_index_map(
+                self.kernel, lambda insn: insn.write_dependency_names())
+
+    @memoize_method
+    def reads_to_ids(self):
+        return _make_index_map(
+                self.kernel, lambda insn: insn.read_dependency_names())
+
+    def find_instructions(self, match):
+        """Return a list of the instructions matched by *match* (anything
+        understood by :func:`parse_match`), in the order in which they occur
+        in the kernel.
+        """
+        insn_ids = parse_match(match).get_matching_ids(self)
+
+        id_to_insn = self.kernel.id_to_insn
+        return [
+                id_to_insn[insn_id]
+                for insn_id in sorted(
+                    insn_ids, key=self._id_to_position().__getitem__)]
+
 # }}}
 
 
@@ -277,10 +438,22 @@ def parse_match(expr):
 
     * ``id:yoink and writes:a_temp``
     * ``id:yoink and (not writes:a_temp or tag:input)``
+
+    .. versionchanged:: 2018.2
+
+        The results of parsing strings are cached.
     """
     if not expr:
         return All()
 
+    if isinstance(expr, MatchExpressionBase):
+        return expr
+
+    return _parse_match_string(expr)
+
+
+@memoize
+def _parse_match_string(expr):
     def parse_terminal(pstate):
         next_tag = pstate.next_tag()
         if next_tag is _id:
@@ -341,9 +514,6 @@ def parse_match(expr):
 
         return left_query
 
-    if isinstance(expr, MatchExpressionBase):
-        return expr
-
     from pytools.lex import LexIterator, lex, InvalidTokenError
     try:
         pstate = LexIterator(
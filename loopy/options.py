@@ -159,6 +159,50 @@ class Options(ImmutableRecord):
 
         A :class:`bool`. Whether to allow colors in terminal output
 
+    .. attribute:: specialize_values_after
+
+        If an integer *n*, have the kernel executor watch the values passed
+        for integer :class:`ValueArg` arguments. Once a combination of
+        values has been passed *n* times, a variant of the kernel with
+        these values fixed by :func:`fix_parameters` is built and
+        used for further calls with the same values.
+        See :class:`loopy.target.execution.ValueSpecializationCache`.
+
+        Defaults to *None*, disabling specialization.
+
+        .. versionadded:: 2018.2
+
+    .. attribute:: max_value_specializations
+
+        The number of specialized variants kept when
+        :attr:`specialize_values_after` is set. The least recently used
+        variant is evicted first. Defaults to *None*, meaning 8.
+
+        .. versionadded:: 2018.2
+
+    .. attribute:: specialize_values_in_background
+
+        Build specialized variants in a background thread, continuing
+        to use the generic kernel until the variant is ready.
+
+        .. note::
+
+            :mod:`islpy` objects are not safe to use concurrently from
+            multiple threads. Only enable this if the rest of the program
+            does not transform kernels while the variant is being built.
+
+        .. versionadded:: 2018.2
+
+    .. attribute:: profile_schedule
+
+        Instrument the generated code with timers and counters around
+        each sequential loop and each device program, to find the
+        loop nest responsible for the run time of a kernel. Only supported
+        by :class:`ExecutableCTarget`, see
+        :meth:`loopy.target.c.c_execution.CKernelExecutor.get_schedule_profile`.
+
+        .. versionadded:: 2018.2
+
     .. rubric:: Features
 
     .. attribute:: disable_global_barriers
@@ -223,6 +267,13 @@ class Options(ImmutableRecord):
                 build_options=kwargs.get("build_options", []),
                 allow_terminal_colors=kwargs.get("allow_terminal_colors",
                     allow_terminal_colors_def),
+                profile_schedule=kwargs.get("profile_schedule", False),
+                specialize_values_after=kwargs.get(
+                    "specialize_values_after", None),
+                max_value_specializations=kwargs.get(
+                    "max_value_specializations", None),
+                specialize_values_in_background=kwargs.get(
+                    "specialize_values_in_background", False),
                 disable_global_barriers=kwargs.get("disable_global_barriers",
                     False),
                 check_dep_resolution=kwargs.get("check_dep_resolution", True),
@@ -0,0 +1,709 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import six
+import numpy as np
+
+from pytools import ImmutableRecord, div_ceil
+from loopy.diagnostic import LoopyError
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+An analytic (roofline-type) model of the run time of a kernel, built on the
+counts obtained by :func:`get_op_map`, :func:`get_mem_access_map`,
+:func:`get_synchronization_map` and :func:`gather_access_footprint_bytes`.
+It allows comparing variants of a kernel (e.g. differently transformed ones)
+without running them.
+
+The predicted run time is::
+
+    max(compute time, global memory time, local memory time)
+    + synchronization time
+
+where
+
+* the compute time is the number of operations of each type, weighted by
+  :attr:`MachineDescription.op_weights`, divided by the throughput for its
+  data type,
+* the global memory time is the time to move the footprint of the global
+  arrays at :attr:`MachineDescription.global_bandwidth`, plus the time for
+  the remaining (repeated) accesses at
+  :attr:`MachineDescription.cache_bandwidth`. Accesses by a sub-group of work
+  items that are not contiguous in memory are counted as moving whole
+  transactions,
+* the local memory time is the number of bytes of local memory accessed
+  divided by :attr:`MachineDescription.local_bandwidth`,
+* the synchronization time accounts for barriers (which stall each wave of
+  concurrently executing work groups) and kernel launches.
+
+.. currentmodule:: loopy
+
+.. autoclass:: MachineDescription
+
+.. autofunction:: get_performance_model
+
+.. autofunction:: rank_kernel_variants
+
+.. autofunction:: calibrate_machine_description
+
+.. currentmodule:: loopy.performance_model
+
+.. autoclass:: PerformanceModel
+
+.. autoclass:: RuntimeEstimate
+
+.. currentmodule:: loopy
+
+.. versionadded:: 2018.2
+"""
+
+
+# {{{ machine description
+
+class MachineDescription(ImmutableRecord):
+    """Describes the performance characteristics of a device, for use by
+    :func:`get_performance_model`. All rates are for the whole device.
+
+    .. attribute:: op_throughput
+
+        A :class:`dict` mapping :class:`numpy.dtype` instances to the number
+        of arithmetic operations on that type the device carries out per
+        second.
+
+    .. attribute:: default_op_throughput
+
+        The number of operations per second on types not found in
+        :attr:`op_throughput` (e.g. integer types used for index
+        computations), or *None* to use the largest throughput in
+        :attr:`op_throughput`.
+
+    .. attribute:: op_weights
+
+        A :class:`dict` mapping names of operations (see
+        :attr:`loopy.Op.name`) to the number of operations they count as,
+        e.g. to reflect that divisions are more expensive than additions.
+        Operations not found count as one.
+
+    .. attribute:: global_bandwidth
+
+        The bandwidth (in bytes per second) of global (off-chip) memory.
+
+    .. attribute:: cache_bandwidth
+
+        The bandwidth (in bytes per second) at which data that has already
+        been loaded from global memory is re-read, or *None* to charge such
+        accesses at :attr:`global_bandwidth`.
+
+    .. attribute:: local_bandwidth
+
+        The bandwidth (in bytes per second) of local memory, or *None* to
+        disregard local memory accesses.
+
+    .. attribute:: transaction_size
+
+        The size (in bytes) of a global memory transaction. Non-contiguous
+        accesses by the work items of a sub-group are counted as moving
+        whole transactions.
+
+    .. attribute:: subgroup_size
+
+        The number of work items in a sub-group, see
+        :func:`get_mem_access_map`.
+
+    .. attribute:: barrier_latency
+
+        The time (in seconds) a work group waits at a barrier.
+
+    .. attribute:: kernel_launch_overhead
+
+        The time (in seconds) taken up by launching a kernel.
+
+    .. attribute:: concurrent_groups
+
+        The number of work groups that execute concurrently.
+
+    .. automethod:: get_op_throughput
+    """
+
+    def __init__(self, op_throughput, global_bandwidth,
+            default_op_throughput=None, op_weights=None,
+            cache_bandwidth=None, local_bandwidth=None,
+            transaction_size=64, subgroup_size=32,
+            barrier_latency=0, kernel_launch_overhead=0,
+            concurrent_groups=1):
+        if op_weights is None:
+            op_weights = {}
+
+        ImmutableRecord.__init__(self,
+                op_throughput=dict(
+                    (np.dtype(dtype), throughput)
+                    for dtype, throughput in six.iteritems(op_throughput)),
+                default_op_throughput=default_op_throughput,
+                op_weights=op_weights,
+                global_bandwidth=global_bandwidth,
+                cache_bandwidth=cache_bandwidth,
+                local_bandwidth=local_bandwidth,
+                transaction_size=transaction_size,
+                subgroup_size=subgroup_size,
+                barrier_latency=barrier_latency,
+                kernel_launch_overhead=kernel_launch_overhead,
+                concurrent_groups=concurrent_groups)
+
+    def get_op_throughput(self, dtype):
+        """Return the number of operations on *dtype* carried out per
+        second.
+        """
+        dtype = np.dtype(dtype)
+
+        try:
+            return self.op_throughput[dtype]
+        except KeyError:
+            if self.default_op_throughput is not None:
+                return self.default_op_throughput
+            elif self.op_throughput:
+                return max(six.itervalues(self.op_throughput))
+            else:
+                raise LoopyError("machine description has no operation "
+                        "throughput for type '%s'" % dtype)
+
+# }}}
+
+
+# {{{ performance model
+
+class RuntimeEstimate(ImmutableRecord):
+    """The run time of a kernel as predicted by a :class:`PerformanceModel`.
+    All times are in seconds.
+
+    .. attribute:: compute_time
+    .. attribute:: global_memory_time
+    .. attribute:: local_memory_time
+    .. attribute:: sync_time
+
+        Time spent in barriers and kernel launches.
+
+    .. attribute:: total_time
+
+    .. attribute:: bottleneck
+
+        One of ``"compute"``, ``"global memory"`` and ``"local memory"``.
+    """
+
+    def __str__(self):
+        return ("%.3e s (%s bound; compute %.3e s, global memory %.3e s, "
+                "local memory %.3e s, sync %.3e s)" % (
+                    self.total_time, self.bottleneck,
+                    self.compute_time, self.global_memory_time,
+                    self.local_memory_time, self.sync_time))
+
+
+def _get_global_access_bytes(mem_access, machine):
+    """Return the number of bytes moved by each counted instance of
+    *mem_access*, taking coalescing within sub-groups into account.
+    """
+    from loopy.statistics import CountGranularity
+
+    itemsize = mem_access.dtype.itemsize
+
+    if mem_access.count_granularity != CountGranularity.WORKITEM:
+        # uniform accesses, counted once per sub-group (or work group)
+        return itemsize
+
+    stride = mem_access.lid_strides.get(0)
+    if stride is None:
+        return itemsize
+
+    subgroup_size = machine.subgroup_size
+    transaction_size = machine.transaction_size
+
+    if not isinstance(stride, six.integer_types):
+        # unknown stride, assume that the accesses are not coalesced
+        return max(itemsize, transaction_size)
+
+    ntransactions = min(
+            subgroup_size,
+            div_ceil(subgroup_size*abs(stride)*itemsize, transaction_size))
+    return max(
+            itemsize,
+            ntransactions*transaction_size/subgroup_size)
+
+
+class PerformanceModel(object):
+    """The predicted run time of a kernel as a function of its parameters,
+    see :func:`get_performance_model`.
+
+    .. attribute:: kernel
+    .. attribute:: machine
+
+        A :class:`loopy.MachineDescription`.
+
+    .. automethod:: __call__
+    """
+
+    def __init__(self, kernel, machine):
+        import loopy as lp
+
+        self.machine = machine
+
+        kernel = lp.set_options(kernel, ignore_boostable_into=True)
+        kernel = lp.preprocess_kernel(
+                lp.infer_unknown_types(kernel, expect_completion=True))
+        self.kernel = kernel
+
+        from loopy.statistics import (
+                get_op_map, get_mem_access_map, get_synchronization_map,
+                gather_access_footprint_bytes)
+
+        self.op_map = get_op_map(kernel, count_redundant_work=True)
+        self.mem_access_map = get_mem_access_map(kernel,
+                count_redundant_work=True,
+                subgroup_size=machine.subgroup_size)
+        self.sync_map = get_synchronization_map(kernel,
+                subgroup_size=machine.subgroup_size)
+
+        from loopy.kernel.data import GlobalArg
+        global_arrays = set(
+                arg.name for arg in kernel.args
+                if isinstance(arg, GlobalArg))
+
+        try:
+            footprint_bytes = gather_access_footprint_bytes(kernel)
+        except Exception as e:
+            logger.info("%s: unable to determine access footprints, charging "
+                    "all global memory accesses at global memory bandwidth "
+                    "(%s: %s)" % (kernel.name, type(e).__name__, e))
+            self.global_footprint_bytes = None
+        else:
+            self.global_footprint_bytes = [
+                    nbytes
+                    for (var_name, _), nbytes in six.iteritems(footprint_bytes)
+                    if var_name in global_arrays]
+
+        self.global_group_size_exprs, _ = (
+                kernel.get_grid_size_upper_bounds_as_exprs())
+
+    def _get_group_count(self, parameters):
+        from pymbolic import evaluate
+
+        result = 1
+        for size in self.global_group_size_exprs:
+            result *= evaluate(size, parameters)
+        return result
+
+    def __call__(self, parameters):
+        """Return a :class:`RuntimeEstimate` for the kernel parameter values
+        given by the :class:`dict` *parameters*.
+        """
+        machine = self.machine
+
+        # {{{ compute
+
+        compute_time = 0
+        for op, count in six.iteritems(self.op_map.count_map):
+            compute_time += (
+                    machine.op_weights.get(op.name, 1)
+                    * count.eval_with_dict(parameters)
+                    / machine.get_op_throughput(op.dtype))
+
+        # }}}
+
+        # {{{ memory
+
+        global_access_bytes = 0
+        local_access_bytes = 0
+        for mem_access, count in six.iteritems(self.mem_access_map.count_map):
+            count = count.eval_with_dict(parameters)
+
+            if mem_access.mtype == "global":
+                global_access_bytes += (
+                        count * _get_global_access_bytes(mem_access, machine))
+            elif mem_access.mtype == "local":
+                local_access_bytes += count * mem_access.dtype.itemsize
+
+        if (self.global_footprint_bytes is not None
+                and machine.cache_bandwidth is not None):
+            dram_bytes = min(
+                    global_access_bytes,
+                    sum(nbytes.eval_with_dict(parameters)
+                        for nbytes in self.global_footprint_bytes))
+            global_memory_time = (
+                    dram_bytes / machine.global_bandwidth
+                    + (global_access_bytes - dram_bytes)
+                    / machine.cache_bandwidth)
+        else:
+            global_memory_time = global_access_bytes / machine.global_bandwidth
+
+        if machine.local_bandwidth is not None:
+            local_memory_time = local_access_bytes / machine.local_bandwidth
+        else:
+            local_memory_time = 0
+
+        # }}}
+
+        # {{{ synchronization
+
+        sync_time = 0
+        nwaves = None
+        for kind, count in six.iteritems(self.sync_map.count_map):
+            count = count.eval_with_dict(parameters)
+
+            if kind == "kernel_launch":
+                sync_time += count * machine.kernel_launch_overhead
+            else:
+                if nwaves is None:
+                    nwaves = div_ceil(
+                            self._get_group_count(parameters),
+                            machine.concurrent_groups)
+                sync_time += count * machine.barrier_latency * nwaves
+
+        # }}}
+
+        bottleneck_time, bottleneck = max(
+                (compute_time, "compute"),
+                (global_memory_time, "global memory"),
+                (local_memory_time, "local memory"),
+                key=lambda time_and_name: time_and_name[0])
+
+        return RuntimeEstimate(
+                compute_time=compute_time,
+                global_memory_time=global_memory_time,
+                local_memory_time=local_memory_time,
+                sync_time=sync_time,
+                total_time=bottleneck_time + sync_time,
+                bottleneck=bottleneck)
+
+
+def get_performance_model(kernel, machine):
+    """Return a :class:`loopy.performance_model.PerformanceModel` predicting
+    the run time of *kernel* on the device described by the
+    :class:`MachineDescription` *machine*. The symbolic operation and access
+    counts are obtained once, so that evaluating the model for given
+    parameter values is cheap.
+
+    Example usage::
+
+        model = lp.get_performance_model(knl, machine)
+        print(model({"n": 1024}).total_time)
+    """
+    return PerformanceModel(kernel, machine)
+
+
+def rank_kernel_variants(kernels, machine, parameters):
+    """Return a :class:`list` of tuples ``(estimate, kernel)``, where
+    *estimate* is a :class:`loopy.performance_model.RuntimeEstimate`, one for
+    each kernel in *kernels*, sorted by increasing predicted run time for the
+    kernel parameter values given by the :class:`dict` *parameters*.
+    """
+    result = [
+            (get_performance_model(knl, machine)(parameters), i, knl)
+            for i, knl in enumerate(kernels)]
+    result.sort(key=lambda item: (item[0].total_time, item[1]))
+
+    return [(estimate, knl) for estimate, _, knl in result]
+
+# }}}
+
+
+# {{{ calibration
+
+class _Benchmarker(object):
+    def __init__(self, queue, nruns):
+        self.queue = queue
+        self.nruns = nruns
+
+    @property
+    def target(self):
+        if self.queue is None:
+            from loopy.target.c import ExecutableCTarget
+            return ExecutableCTarget()
+        else:
+            from loopy.target.pyopencl import PyOpenCLTarget
+            return PyOpenCLTarget(self.queue.device)
+
+    def parallelize(self, knl, iname, local_size):
+        if self.queue is None:
+            return knl
+
+        import loopy as lp
+        return lp.split_iname(knl, iname, local_size,
+                outer_tag="g.0", inner_tag="l.0")
+
+    def zeros(self, shape, dtype):
+        if self.queue is None:
+            return np.zeros(shape, dtype)
+        else:
+            import pyopencl.array as cl_array
+            return cl_array.zeros(self.queue, shape, dtype)
+
+    def time(self, knl, **kwargs):
+        """Return the smallest wall time of a call of *knl*, after a warm-up
+        call.
+        """
+        from time import time
+
+        if self.queue is None:
+            def call():
+                knl(**kwargs)
+        else:
+            def call():
+                knl(self.queue, **kwargs)
+                self.queue.finish()
+
+        call()
+
+        result = None
+        for irun in range(self.nruns):
+            start_time = time()
+            call()
+            elapsed = time() - start_time
+
+            if result is None or elapsed < result:
+                result = elapsed
+
+        return max(result, 1e-9)
+
+
+def _make_streaming_kernel(bench, dtype, local_size):
+    import loopy as lp
+
+    knl = lp.make_kernel(
+            "{[r,k,i]: 0<=r<nrepeats and 0<=k<m and 0<=i<n}",
+            "a[k, i] = a[k, i] + s*b[k, i]",
+            [
+                lp.GlobalArg("a,b", dtype, shape="m, n"),
+                lp.ValueArg("s", dtype),
+                "..."
+                ],
+            target=bench.target,
+            name="calibrate_bandwidth")
+    knl = lp.prioritize_loops(knl, "r,k")
+    return bench.parallelize(knl, "i", local_size)
+
+
+def _make_fma_kernel(bench, dtype, naccumulators, local_size):
+    import loopy as lp
+
+    acc_names = ["acc%d" % iacc for iacc in range(naccumulators)]
+    instructions = []
+    for iacc, acc in enumerate(acc_names):
+        instructions.append(
+                "<> %s = a[i] + %d {id=init_%s}" % (acc, iacc, acc))
+        instructions.append(
+                "%s = %s*x + y {id=update_%s, dep=init_%s, inames=i:r}"
+                % (acc, acc, acc, acc))
+    instructions.append(
+            "out[i] = %s {dep=%s}"
+            % (" + ".join(acc_names),
+                ":".join("update_%s" % acc for acc in acc_names)))
+
+    knl = lp.make_kernel(
+            "{[i,r]: 0<=i<n and 0<=r<nrepeats}",
+            instructions,
+            [
+                lp.GlobalArg("a,out", dtype, shape="n"),
+                lp.ValueArg("x,y", dtype),
+                "..."
+                ],
+            target=bench.target,
+            name="calibrate_op_throughput")
+    knl = lp.prioritize_loops(knl, "i,r")
+    return bench.parallelize(knl, "i", local_size)
+
+
+def _make_barrier_kernel(bench, dtype, local_size, with_barrier):
+    import loopy as lp
+
+    instructions = [
+            "<> tmp = 0 {id=init, inames=i}",
+            "tmp = tmp + 1 {id=update, dep=init, inames=r:i}",
+            "out[i] = tmp {dep=update:sync}",
+            ]
+    if with_barrier:
+        instructions.append("... lbarrier {id=sync, dep=update, inames=r:i}")
+    else:
+        instructions.append("... nop {id=sync, dep=update, inames=r:i}")
+
+    knl = lp.make_kernel(
+            "{[r,i]: 0<=r<nrepeats and 0<=i<%d}" % local_size,
+            instructions,
+            [lp.GlobalArg("out", dtype, shape=(local_size,)), "..."],
+            target=bench.target,
+            name="calibrate_barrier")
+    knl = lp.tag_inames(knl, {"i": "l.0"})
+    return knl
+
+
+def calibrate_machine_description(queue=None,
+        dtypes=(np.float32, np.float64),
+        global_memory_bytes=2**26, cache_bytes=2**15, repeats=None,
+        nruns=3, local_size=256):
+    """Return a :class:`MachineDescription` whose parameters are obtained
+    by running micro-benchmarks on the device on which *queue* (a
+    :class:`pyopencl.CommandQueue`) executes, or, if *queue* is *None*, by
+    running code for :class:`loopy.ExecutableCTarget` on the host.
+
+    :arg dtypes: the types for which the operation throughput is measured.
+        The largest throughput found is used for
+        :attr:`MachineDescription.default_op_throughput`.
+    :arg global_memory_bytes: the amount of data streamed through to measure
+        the global memory bandwidth. This should be much larger than the
+        caches of the device.
+    :arg cache_bytes: the amount of data repeatedly accessed to measure the
+        cache bandwidth. This should fit into the cache of interest.
+    :arg repeats: the number of times the innermost part of each benchmark is
+        repeated, by default chosen so that each benchmark moves or computes
+        about as much as the global memory benchmark.
+    :arg nruns: the number of timed runs of each benchmark, of which the
+        fastest is used.
+    :arg local_size: the number of work items per work group of the
+        benchmarks (ignored if *queue* is *None*).
+
+    The operation throughputs are measured with independent chains of
+    multiply-add operations, the bandwidths with a streaming
+    ``a[i] = a[i] + s*b[i]`` kernel. Barrier latency (which is not measured
+    on the host) is obtained from the time difference of a single work group
+    executing a loop with and without a barrier. The kernel launch overhead
+    is the time of a call of a kernel doing no work, including the overhead
+    of the :mod:`loopy` invoker. The local memory bandwidth is not
+    calibrated, set it using :meth:`MachineDescription.copy` if needed.
+
+    .. note::
+
+        The results reflect the code that :mod:`loopy` generates for the
+        benchmarks (e.g. without explicit vectorization) and may vary between
+        runs.
+    """
+    bench = _Benchmarker(queue, nruns)
+
+    if queue is None:
+        row_length = 1024
+        subgroup_size = 1
+        concurrent_groups = 1
+    else:
+        row_length = local_size * 16
+
+        from pyopencl.characterize import get_simd_group_size
+        subgroup_size = get_simd_group_size(queue.device, None) or 32
+        concurrent_groups = queue.device.max_compute_units
+
+    # {{{ bandwidths
+
+    bandwidth_dtype = np.dtype(np.float64)
+
+    def measure_bandwidth(nbytes, nrepeats):
+        nrows = max(1, nbytes // (2*bandwidth_dtype.itemsize*row_length))
+        knl = _make_streaming_kernel(bench, bandwidth_dtype, local_size)
+        a = bench.zeros((nrows, row_length), bandwidth_dtype)
+        b = bench.zeros((nrows, row_length), bandwidth_dtype)
+
+        elapsed = bench.time(knl, a=a, b=b, s=bandwidth_dtype.type(0.5),
+                nrepeats=np.int32(nrepeats))
+        moved_bytes = 3*nrows*row_length*bandwidth_dtype.itemsize*nrepeats
+        return moved_bytes / elapsed
+
+    global_bandwidth = measure_bandwidth(global_memory_bytes, 1)
+
+    if repeats is None:
+        cache_repeats = max(1, global_memory_bytes // cache_bytes)
+    else:
+        cache_repeats = repeats
+    cache_bandwidth = max(
+            global_bandwidth,
+            measure_bandwidth(cache_bytes, cache_repeats))
+
+    # }}}
+
+    # {{{ operation throughput
+
+    naccumulators = 8
+    nitems = row_length if queue is None else (
+            local_size * 4 * concurrent_groups)
+    if repeats is None:
+        fma_repeats = max(1,
+                global_memory_bytes // (naccumulators * nitems))
+    else:
+        fma_repeats = repeats
+
+    op_throughput = {}
+    for dtype in dtypes:
+        dtype = np.dtype(dtype)
+        knl = _make_fma_kernel(bench, dtype, naccumulators, local_size)
+        a = bench.zeros(nitems, dtype)
+        out = bench.zeros(nitems, dtype)
+
+        # The iteration acc <- acc*x + y converges to y/(1-x), avoiding
+        # overflow and denormals.
+        elapsed = bench.time(knl, a=a, out=out,
+                x=dtype.type(0.5), y=dtype.type(1),
+                nrepeats=np.int32(fma_repeats))
+        op_throughput[dtype] = 2*naccumulators*nitems*fma_repeats / elapsed
+
+    # }}}
+
+    # {{{ synchronization
+
+    launch_knl = _make_streaming_kernel(bench, bandwidth_dtype, local_size)
+    a = bench.zeros((1, row_length), bandwidth_dtype)
+    b = bench.zeros((1, row_length), bandwidth_dtype)
+    kernel_launch_overhead = bench.time(launch_knl, a=a, b=b,
+            s=bandwidth_dtype.type(0.5), nrepeats=np.int32(0))
+
+    barrier_latency = 0
+    if queue is not None:
+        barrier_repeats = 1000 if repeats is None else repeats
+        out = bench.zeros(local_size, np.float32)
+
+        times = []
+        for with_barrier in [True, False]:
+            knl = _make_barrier_kernel(bench, np.float32, local_size,
+                    with_barrier)
+            times.append(bench.time(knl, out=out,
+                nrepeats=np.int32(barrier_repeats)))
+
+        with_barrier_time, without_barrier_time = times
+        barrier_latency = max(
+                0, (with_barrier_time - without_barrier_time) / barrier_repeats)
+
+    # }}}
+
+    result = MachineDescription(
+            op_throughput=op_throughput,
+            default_op_throughput=max(six.itervalues(op_throughput)),
+            global_bandwidth=global_bandwidth,
+            cache_bandwidth=cache_bandwidth,
+            subgroup_size=subgroup_size,
+            barrier_latency=barrier_latency,
+            kernel_launch_overhead=kernel_launch_overhead,
+            concurrent_groups=concurrent_groups)
+
+    logger.info("calibrated machine description: %s" % result)
+
+    return result
+
+# }}}
+
+# vim: foldmethod=marker
@@ -0,0 +1,294 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from heapq import heappush, heappop
+
+from loopy.diagnostic import LoopyError
+
+
+__doc__ = """
+Dataflow analysis over the (linear) schedule of a kernel, in which loops
+introduce back edges from their :class:`loopy.schedule.LeaveLoop` to their
+:class:`loopy.schedule.EnterLoop` items.
+
+Sets of variables are represented as bitsets (:class:`int` instances), with
+the bit positions assigned by a :class:`BitsetIndex`.
+
+.. currentmodule:: loopy.schedule.dataflow
+
+.. autoclass:: BitsetIndex
+
+.. autofunction:: get_schedule_successors
+
+.. autofunction:: get_reverse_postorder
+
+.. autofunction:: solve_gen_kill_problem
+
+.. versionadded:: 2018.2
+"""
+
+
+# {{{ bitset index
+
+class BitsetIndex(object):
+    """Assigns bit positions to names, so that sets of names may be
+    represented as bitsets.
+
+    .. attribute:: names
+
+        A :class:`list` of the names in order of their bit positions.
+
+    .. automethod:: add
+    .. automethod:: to_bitset
+    .. automethod:: to_names
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self.name_to_bit = {}
+
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        """Return the bit position of *name*, assigning a new one if
+        necessary.
+        """
+        try:
+            return self.name_to_bit[name]
+        except KeyError:
+            bit = len(self.names)
+            self.names.append(name)
+            self.name_to_bit[name] = bit
+            return bit
+
+    @property
+    def universe(self):
+        """A bitset containing all names."""
+        return (1 << len(self.names)) - 1
+
+    def to_bitset(self, names):
+        """Return the bitset containing *names*, all of which must be known.
+        """
+        result = 0
+        for name in names:
+            result |= 1 << self.name_to_bit[name]
+        return result
+
+    def to_names(self, bitset):
+        """Return a :class:`frozenset` of the names in *bitset*."""
+        result = []
+        while bitset:
+            lowest = bitset & -bitset
+            result.append(self.names[lowest.bit_length() - 1])
+            bitset ^= lowest
+
+        return frozenset(result)
+
+# }}}
+
+
+# {{{ control flow
+
+def get_schedule_successors(schedule):
+    """Return a :class:`list` containing, for each item of *schedule*, a
+    :class:`frozenset` of the indices of the items that may be executed
+    next. Loops may be empty, and they may execute more than once.
+    """
+    from loopy.schedule import (
+            EnterLoop, LeaveLoop, RunInstruction,
+            CallKernel, ReturnFromKernel, Barrier)
+    from loopy.schedule.tools import get_block_boundaries
+
+    block_bounds = get_block_boundaries(schedule)
+    successors = [None] * len(schedule)
+
+    for sched_idx in range(len(schedule) - 1, -1, -1):
+        item = schedule[sched_idx]
+        next_item = (
+                schedule[sched_idx + 1]
+                if sched_idx + 1 < len(schedule)
+                else None)
+
+        # Look at next_item
+        if next_item is None:
+            after = set()
+        elif isinstance(next_item, EnterLoop):
+            # Account for empty loop
+            loop_end = block_bounds[sched_idx + 1]
+            after = set(successors[loop_end])
+            after.add(sched_idx + 1)
+        elif isinstance(next_item, (LeaveLoop, RunInstruction,
+                CallKernel, ReturnFromKernel, Barrier)):
+            after = set([sched_idx + 1])
+        else:
+            raise LoopyError("unexpected type of schedule item: {ty}"
+                .format(ty=type(next_item).__name__))
+
+        # Look at item
+        if isinstance(item, LeaveLoop):
+            # Account for loop
+            after.add(block_bounds[sched_idx])
+        elif not isinstance(item, (EnterLoop, RunInstruction,
+                CallKernel, ReturnFromKernel, Barrier)):
+            raise LoopyError("unexpected type of schedule item: {ty}"
+                .format(ty=type(item).__name__))
+
+        successors[sched_idx] = frozenset(after)
+
+    return successors
+
+
+def get_reverse_postorder(successors, roots):
+    """Return a :class:`list` of the nodes of the graph given by *successors*
+    (a sequence of collections of node numbers) in reverse postorder of a
+    depth-first traversal starting at *roots*. Nodes not reachable from
+    *roots* are appended in reverse numerical order.
+    """
+    nnodes = len(successors)
+    visited = [False] * nnodes
+    postorder = []
+
+    for root in roots:
+        if visited[root]:
+            continue
+
+        visited[root] = True
+        stack = [(root, iter(sorted(successors[root])))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if not visited[child]:
+                    visited[child] = True
+                    stack.append((child, iter(sorted(successors[child]))))
+                    break
+            else:
+                stack.pop()
+                postorder.append(node)
+
+    postorder.reverse()
+    postorder.extend(
+            node for node in range(nnodes - 1, -1, -1)
+            if not visited[node])
+
+    return postorder
+
+# }}}
+
+
+# {{{ gen/kill problem solver
+
+def solve_gen_kill_problem(successors, gen, kill, backward=True, may=True,
+        universe=None):
+    """Solve a dataflow problem whose transfer functions have the form
+    ``result = gen | (incoming & ~kill)``, by worklist iteration in reverse
+    postorder (with respect to the direction of the problem).
+
+    :arg successors: a sequence containing, for each node, a collection of the
+        numbers of its successor nodes, e.g. as returned by
+        :func:`get_schedule_successors`.
+    :arg gen: a sequence of bitsets, one per node.
+    :arg kill: a sequence of bitsets, one per node.
+    :arg backward: whether information flows from successors to
+        predecessors (as for liveness) or vice versa (as for reaching
+        definitions).
+    :arg may: if *True*, values arriving at a node are combined by union,
+        otherwise by intersection. In the latter case, *universe*, the bitset
+        of all values, must be given.
+    :returns: a tuple ``(before, after)`` of lists of bitsets, holding for
+        each node the values before and after it in the direction of
+        information flow. For a backward problem such as liveness, *before*
+        is the live-out and *after* the live-in set.
+    """
+    nnodes = len(successors)
+
+    predecessors = [[] for i in range(nnodes)]
+    for node, node_successors in enumerate(successors):
+        for succ in node_successors:
+            predecessors[succ].append(node)
+
+    if backward:
+        sources, targets = successors, predecessors
+    else:
+        sources, targets = predecessors, successors
+
+    if may:
+        initial = 0
+    else:
+        if universe is None:
+            raise LoopyError("universe must be given for a 'must' problem")
+        initial = universe
+
+    roots = [node for node in range(nnodes) if not sources[node]]
+    if not roots and nnodes:
+        roots = [nnodes - 1 if backward else 0]
+
+    order = get_reverse_postorder(targets, roots)
+    node_to_position = [None] * nnodes
+    for position, node in enumerate(order):
+        node_to_position[node] = position
+
+    before = [0 if not sources[node] else initial for node in range(nnodes)]
+    after = [initial] * nnodes
+
+    worklist = list(range(nnodes))
+    in_worklist = [True] * nnodes
+
+    while worklist:
+        node = order[heappop(worklist)]
+        in_worklist[node] = False
+
+        node_sources = sources[node]
+        if node_sources:
+            if may:
+                incoming = 0
+                for source in node_sources:
+                    incoming |= after[source]
+            else:
+                incoming = universe
+                for source in node_sources:
+                    incoming &= after[source]
+
+            before[node] = incoming
+        else:
+            incoming = before[node]
+
+        # Every node is visited at least once, since all of them start out
+        # on the worklist.
+        result = gen[node] | (incoming & ~kill[node])
+        if result != after[node]:
+            after[node] = result
+            for target in targets[node]:
+                if not in_worklist[target]:
+                    in_worklist[target] = True
+                    heappush(worklist, node_to_position[target])
+
+    return before, after
+
+# }}}
+
+# vim: foldmethod=marker
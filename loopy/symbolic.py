@@ -115,8 +115,59 @@ class IdentityMapperMixin(object):
     map_rule_argument = map_group_hw_index
 
 
+def _are_init_args_identical(args_a, args_b):
+    if len(args_a) != len(args_b):
+        return False
+
+    for arg_a, arg_b in zip(args_a, args_b):
+        if arg_a is arg_b:
+            continue
+
+        if type(arg_a) is not type(arg_b):
+            return False
+
+        if isinstance(arg_a, tuple):
+            if not _are_init_args_identical(arg_a, arg_b):
+                return False
+        elif isinstance(arg_a, str):
+            if arg_a != arg_b:
+                return False
+        else:
+            return False
+
+    return True
+
+
+def is_same_node(a, b):
+    """Return *True* if *a* and *b* are :mod:`pymbolic` expressions of the
+    same type that were built from the same (i.e. identical) constructor
+    arguments, without comparing any subexpressions.
+    """
+    return (
+            type(a) is type(b)
+            and isinstance(a, p.Expression)
+            and _are_init_args_identical(
+                a.__getinitargs__(), b.__getinitargs__()))
+
+
 class IdentityMapper(IdentityMapperBase, IdentityMapperMixin):
-    pass
+    """
+    .. versionchanged:: 2018.2
+
+        Expressions none of whose parts were changed by the mapper are
+        returned as the original object, preserving shared subexpressions
+        and their cached hashes.
+    """
+
+    def rec(self, expr, *args, **kwargs):
+        result = super(IdentityMapper, self).rec(expr, *args, **kwargs)
+
+        if result is not expr and is_same_node(result, expr):
+            return expr
+
+        return result
+
+    __call__ = rec
 
 
 class PartialEvaluationMapper(
@@ -658,6 +709,20 @@ def parse_tagged_name(expr):
         raise RuntimeError("subst rule name not understood: %s" % expr)
 
 
+def _get_typed_key(value):
+    """Return a hashable key for the substitution rule argument *value* that,
+    unlike *value* itself, tells apart leaves of equal value but differing
+    type, such as ``3`` and ``3.0``.
+    """
+    if isinstance(value, p.Expression):
+        return (type(value),) + tuple(
+                _get_typed_key(child) for child in value.__getinitargs__())
+    elif isinstance(value, tuple):
+        return (tuple,) + tuple(_get_typed_key(child) for child in value)
+    else:
+        return (type(value), value)
+
+
 class ExpansionState(ImmutableRecord):
     """
     .. attribute:: kernel
@@ -682,6 +747,25 @@ class ExpansionState(ImmutableRecord):
         return SubstitutionMapper(
                 make_subst_func(self.arg_context))(expr)
 
+    def get_cache_key(self, within=None):
+        """Return a hashable key identifying this state for the purpose of
+        memoizing results of a mapper whose behavior depends only on the
+        state and on the stack match *within*. The instruction is omitted
+        from the key if *within* matches all instructions.
+        """
+        from loopy.match import StackMatch, StackAllMatchComponent
+        if (isinstance(within, StackMatch)
+                and isinstance(within.root_component, StackAllMatchComponent)):
+            insn_id = None
+        else:
+            insn_id = self.insn_id if self.instruction is not None else None
+
+        return (
+                id(self.kernel), insn_id, self.stack,
+                tuple(sorted(
+                    (name, _get_typed_key(value))
+                    for name, value in six.iteritems(self.arg_context))))
+
 
 class SubstitutionRuleRenamer(IdentityMapper):
     def __init__(self, renames):
@@ -752,6 +836,10 @@ class SubstitutionRuleMappingContext(object):
         # name
         self.subst_rule_old_names = {}
 
+        # maps (mapper, kind, cache key) to mapped rule bodies,
+        # see RuleAwareIdentityMapper.get_cache_key
+        self.rule_body_cache = {}
+
     def register_subst_rule(self, original_name, args, body):
         """Returns a name (as a string) for a newly created substitution
         rule.
@@ -850,6 +938,39 @@ class RuleAwareIdentityMapper(IdentityMapper):
     def __init__(self, rule_mapping_context):
         self.rule_mapping_context = rule_mapping_context
 
+    def get_cache_key(self, expn_state):
+        """Return a hashable key such that mapping a substitution rule body
+        under expansion states with equal keys gives equal results, or
+        *None* if results may not be reused. If a key is returned, the
+        mapper must also not have side effects while mapping rule bodies.
+
+        Mapped rule bodies are memoized for the lifetime of
+        the :class:`SubstitutionRuleMappingContext`.
+        See also :meth:`ExpansionState.get_cache_key`.
+
+        .. versionadded:: 2018.2
+        """
+        return None
+
+    def rec_memoized(self, kind, compute, expn_state):
+        """Return *compute()*, reusing the result of an earlier call with
+        equal *kind* and :meth:`get_cache_key` of *expn_state*.
+        """
+        cache_key = self.get_cache_key(expn_state)
+        if cache_key is None:
+            return compute()
+
+        key = (self, kind, cache_key)
+        cache = self.rule_mapping_context.rule_body_cache
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        result = compute()
+        cache[key] = result
+        return result
+
     def map_variable(self, expr, expn_state):
         name, tag = parse_tagged_name(expr)
         if name not in self.rule_mapping_context.old_subst_rules:
@@ -895,7 +1016,10 @@ class RuleAwareIdentityMapper(IdentityMapper):
                 arg_context=self.make_new_arg_context(
                     name, rule.arguments, rec_arguments, expn_state.arg_context))
 
-        result = self.rec(rule.expression, new_expn_state)
+        result = self.rec_memoized(
+                "map",
+                lambda: self.rec(rule.expression, new_expn_state),
+                new_expn_state)
 
         new_name = self.rule_mapping_context.register_subst_rule(
                 name, rule.arguments, result)
@@ -943,6 +1067,9 @@ class RuleAwareSubstitutionMapper(RuleAwareIdentityMapper):
         self.subst_func = subst_func
         self.within = within
 
+    def get_cache_key(self, expn_state):
+        return expn_state.get_cache_key(self.within)
+
     def map_variable(self, expr, expn_state):
         if (expr.name in expn_state.arg_context
                 or not self.within(
@@ -965,6 +1092,9 @@ class RuleAwareSubstitutionRuleExpander(RuleAwareIdentityMapper):
         self.rules = rules
         self.within = within
 
+    def get_cache_key(self, expn_state):
+        return expn_state.get_cache_key(self.within)
+
     def map_substitution(self, name, tag, arguments, expn_state):
         if tag is None:
             tags = None
@@ -982,14 +1112,17 @@ class RuleAwareSubstitutionRuleExpander(RuleAwareIdentityMapper):
                     arg_context=self.make_new_arg_context(
                         name, rule.arguments, arguments, expn_state.arg_context))
 
-            result = self.rec(rule.expression, new_expn_state)
+            def expand():
+                result = self.rec(rule.expression, new_expn_state)
 
-            # substitute in argument values
-            from pymbolic.mapper.substitutor import make_subst_func
-            subst_map = SubstitutionMapper(make_subst_func(
-                new_expn_state.arg_context))
+                # substitute in argument values
+                from pymbolic.mapper.substitutor import make_subst_func
+                subst_map = SubstitutionMapper(make_subst_func(
+                    new_expn_state.arg_context))
 
-            return subst_map(result)
+                return subst_map(result)
+
+            return self.rec_memoized("expand", expand, new_expn_state)
 
         else:
             # do not expand
@@ -1108,11 +1241,165 @@ _open_dbl_bracket = intern("open_dbl_bracket")
 TRAILING_FLOAT_TAG_RE = re.compile("^(.*?)([a-zA-Z]*)$")
 
 
+try:
+    from pytools.lex import _matches_rule
+except ImportError:
+    # private to pytools, fall back to pytools.lex.lex if it goes away
+    _matches_rule = None
+
+
+class _UncombinableLexTableError(ValueError):
+    pass
+
+
+class CombinedLexer(object):
+    """Splits strings into the same tokens as :func:`pytools.lex.lex`, but
+    finds the rule that applies at each position by matching one regular
+    expression combining all rules of the lex table, rather than by trying
+    the rules one after the other.
+
+    The rule found this way is confirmed by matching it by itself, which
+    also provides the match object. If it only matches the empty string
+    (which :func:`pytools.lex.lex` does not consider a match), the following
+    rules are tried one after the other. Lex tables whose rules cannot be
+    combined are matched by :func:`pytools.lex.lex`, as is everything if
+    the installed version of :mod:`pytools` does not provide the means to
+    match single rules.
+    """
+
+    def __init__(self, lex_table):
+        self.lex_table = lex_table
+        self.rule_dict = dict(lex_table)
+
+        self.group_name_to_rule_index = {}
+        self._atomic_group_count = 0
+
+        if _matches_rule is None:
+            self.regex = None
+            return
+
+        try:
+            alternatives = []
+            for i, (_, rule) in enumerate(lex_table):
+                group_name = "_lpy_rule%d" % i
+                self.group_name_to_rule_index[group_name] = i
+                alternatives.append("(?P<%s>%s)" % (
+                    group_name, self._rule_to_regex(rule, top_level=True)))
+
+            self.regex = re.compile("|".join(alternatives))
+        except (_UncombinableLexTableError, re.error):
+            self.regex = None
+
+    def _atomic(self, regex):
+        # Lookaheads do not backtrack, so neither does the captured match
+        # once the regex continues past it, just like the rule sequences of
+        # pytools.lex.
+        group_name = "_lpy_atomic%d" % self._atomic_group_count
+        self._atomic_group_count += 1
+        return "(?=(?P<%s>%s))(?P=%s)" % (group_name, regex, group_name)
+
+    def _rule_to_regex(self, rule, top_level=False, depth=0):
+        if depth > 20:
+            raise _UncombinableLexTableError("rules nested too deeply")
+
+        if isinstance(rule, pytools.lex.RE):
+            if (rule.RE.flags & ~re.UNICODE
+                    or re.search(r"\\[1-9]|\(\?P[<=]", rule.Content)):
+                raise _UncombinableLexTableError(
+                        "unsupported regular expression")
+
+            if top_level:
+                return "(?:%s)" % rule.Content
+
+            if rule.RE.match("") is not None:
+                # A rule matching the empty string does not match within
+                # a sequence of rules in pytools.lex.
+                raise _UncombinableLexTableError(
+                        "nested rule matching the empty string")
+
+            return self._atomic(rule.Content)
+
+        elif isinstance(rule, six.string_types):
+            return self._rule_to_regex(
+                    self.rule_dict[rule], top_level, depth+1)
+
+        elif isinstance(rule, tuple):
+            if rule and rule[0] == "|":
+                return self._atomic("|".join(
+                    self._rule_to_regex(subrule, depth=depth+1)
+                    for subrule in rule[1:]))
+            else:
+                return self._atomic("".join(
+                    self._rule_to_regex(subrule, depth=depth+1)
+                    for subrule in rule))
+
+        else:
+            raise _UncombinableLexTableError("unknown rule type")
+
+    def __call__(self, s):
+        if self.regex is None:
+            return pytools.lex.lex(self.lex_table, s, match_objects=True)
+
+        result = []
+        i = 0
+        while i < len(s):
+            match = self.regex.match(s, i)
+            if match is None:
+                # report the error the way pytools.lex does
+                first_rule_index = 0
+            else:
+                first_rule_index = self.group_name_to_rule_index[
+                        match.lastgroup]
+
+            for name, rule in self.lex_table[first_rule_index:]:
+                length, match_obj = _matches_rule(rule, s, i, self.rule_dict)
+                if length:
+                    result.append((name, s[i:i+length], i, match_obj))
+                    i += length
+                    break
+            else:
+                raise pytools.lex.InvalidTokenError(s, i)
+
+        return result
+
+
 class LoopyParser(ParserBase):
     lex_table = [
             (_open_dbl_bracket, pytools.lex.RE(r"\[\[")),
             ] + ParserBase.lex_table
 
+    @classmethod
+    def get_lexer(cls):
+        lexer = cls.__dict__.get("_lexer")
+        if lexer is None or lexer.lex_table is not cls.lex_table:
+            lexer = CombinedLexer(cls.lex_table)
+            cls._lexer = lexer
+
+        return lexer
+
+    def lex(self, expr_str):
+        """Return the tokens of *expr_str* other than whitespace, as lexed by
+        :func:`pytools.lex.lex` with *match_objects* set.
+        """
+        from pymbolic.parser import _whitespace
+
+        return [
+                token
+                for token in self.get_lexer()(expr_str)
+                if token[0] is not _whitespace]
+
+    def __call__(self, expr_str, min_precedence=0):
+        if self.get_lexer().regex is None:
+            # lexing would be no faster than in pymbolic
+            return super(LoopyParser, self).__call__(expr_str, min_precedence)
+
+        pstate = pytools.lex.LexIterator(self.lex(expr_str), expr_str)
+
+        result = self.parse_expression(pstate, min_precedence)
+        if not pstate.is_at_end():
+            pstate.raise_parse_error("leftover input after completed parse")
+        return result
+
     def parse_float(self, s):
         match = TRAILING_FLOAT_TAG_RE.match(s)
 
@@ -1166,10 +1453,31 @@ class LoopyParser(ParserBase):
 # }}}
 
 
+_PARSE_CACHE = {}
+_PARSE_CACHE_MAX_SIZE = 10**4
+
+
+def clear_parse_cache():
+    _PARSE_CACHE.clear()
+
+
 def parse(expr_str):
-    return VarToTaggedVarMapper()(
+    # Code generators tend to emit the same expressions many times over.
+    # Expressions are immutable, so they may be shared.
+    try:
+        return _PARSE_CACHE[expr_str]
+    except KeyError:
+        pass
+
+    result = VarToTaggedVarMapper()(
             FunctionToPrimitiveMapper()(LoopyParser()(expr_str)))
 
+    if len(_PARSE_CACHE) >= _PARSE_CACHE_MAX_SIZE:
+        _PARSE_CACHE.clear()
+    _PARSE_CACHE[expr_str] = result
+
+    return result
+
 # }}}
 
 
@@ -1847,6 +2155,83 @@ class AccessRangeOverlapChecker(object):
 # }}}
 
 
+# {{{ expression interning
+
+def _get_intern_key_part(arg):
+    if isinstance(arg, p.Expression):
+        # Subexpressions are interned first, so that identical subtrees
+        # share one object.
+        return id(arg)
+
+    elif isinstance(arg, tuple):
+        result = []
+        for sub_arg in arg:
+            sub_key = _get_intern_key_part(sub_arg)
+            if sub_key is None:
+                return None
+            result.append(sub_key)
+
+        return (tuple, tuple(result))
+
+    elif isinstance(arg, (float, complex, np.number)):
+        # numpy.float32(1) == numpy.float64(1) == 1, and 0. == -0.
+        return (type(arg), repr(arg))
+
+    else:
+        try:
+            hash(arg)
+        except TypeError:
+            return None
+
+        return (type(arg), arg)
+
+
+class ExpressionInterner(IdentityMapper):
+    """Maps expressions to equal ones in which identical subexpressions are
+    shared (i.e. hash-consed) among all expressions mapped by the same
+    instance. Comparing two interned expressions for equality is cheap if
+    they share subexpressions, as is finding their hash.
+
+    Interned expressions are remembered only as long as they are in use
+    elsewhere.
+
+    .. versionadded:: 2018.2
+    """
+
+    def __init__(self):
+        from weakref import WeakValueDictionary
+        self.interned = WeakValueDictionary()
+
+    def rec(self, expr, *args, **kwargs):
+        result = super(ExpressionInterner, self).rec(expr, *args, **kwargs)
+
+        if not isinstance(result, p.Expression):
+            return result
+
+        key = _get_intern_key_part(result.__getinitargs__())
+        if key is None:
+            return result
+
+        key = (type(result), key)
+
+        try:
+            return self.interned[key]
+        except KeyError:
+            pass
+
+        try:
+            self.interned[key] = result
+        except TypeError:
+            # not weakly referenceable
+            pass
+
+        return result
+
+    __call__ = rec
+
+# }}}
+
+
 # {{{ is_expression_equal
 
 def is_expression_equal(a, b):
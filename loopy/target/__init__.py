@@ -232,6 +232,19 @@ class ASTBuilderBase(object):
     def emit_comment(self, s):
         raise NotImplementedError()
 
+    def emit_profile_probe(self, codegen_state, kind, probe_index):
+        """Return an AST for a profiling probe, see
+        :attr:`loopy.Options.profile_schedule`.
+
+        :arg kind: ``"start"`` or ``"stop"`` to emit timer probes, which are
+            placed in the same scope around the code being measured,
+            ``"entry"`` for a counter probe placed before it, or ``"trip"``
+            for a counter probe in a loop body.
+        :arg probe_index: an index into the list returned by
+            :func:`loopy.codegen.control.get_profile_probe_sched_indices`.
+        """
+        raise NotImplementedError()
+
     # }}}
 
     def process_ast(self, node):
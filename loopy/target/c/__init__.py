@@ -77,6 +77,15 @@ class DTypeRegistryWrapper(object):
 
 # {{{ preamble generator
 
+#: The number of entries per probe in the profile array, holding the
+#: accumulated time, the number of entries and the number of loop trips.
+PROFILE_ENTRIES_PER_PROBE = 3
+
+
+def get_profile_array_name(kernel):
+    return "_lpy_profile_%s" % kernel.name
+
+
 def _preamble_generator(preamble_info):
     c_funcs = set(func.c_name for func in preamble_info.seen_functions)
     if "int_floor_div" in c_funcs:
@@ -95,6 +104,36 @@ def _preamble_generator(preamble_info):
                 )
             """)
 
+    kernel = preamble_info.kernel
+    if isinstance(kernel.target, ExecutableCTarget):
+        # the code is compiled on its own, so it needs to declare the library
+        # functions and constants it uses itself
+        yield ("01_standard_headers", """
+            #include <math.h>
+            #include <limits.h>
+            """)
+
+    if kernel.options.profile_schedule:
+        from loopy.codegen.control import get_profile_probe_sched_indices
+        yield ("00_profile_schedule", """
+            #ifndef _POSIX_C_SOURCE
+            #define _POSIX_C_SOURCE 199309L
+            #endif
+            #include <time.h>
+
+            double %(array_name)s[%(size)d];
+
+            static double _lpy_prof_now(void)
+            {
+              struct timespec ts;
+              clock_gettime(CLOCK_MONOTONIC, &ts);
+              return ts.tv_sec + 1e-9 * ts.tv_nsec;
+            }
+            """ % {
+                "array_name": get_profile_array_name(kernel),
+                "size": PROFILE_ENTRIES_PER_PROBE * max(1, len(
+                    get_profile_probe_sched_indices(kernel)))})
+
 # }}}
 
 
@@ -313,16 +352,36 @@ class CTarget(TargetBase):
 class ExecutableCTarget(CTarget):
     """
     An executable CTarget that uses (by default) JIT compilation of C-code
+
+    .. versionchanged:: 2018.2
+
+        Added *num_workers*. Kernels using group axes (``g.*``) split the
+        range of group axis 0 among this many workers in a persistent
+        pool.
+
+        Global barriers now split the kernel into several device programs,
+        which are run one after the other. Global temporaries are allocated
+        for the duration of each call.
     """
 
-    def __init__(self, compiler=None, fortran_abi=False):
+    hash_fields = CTarget.hash_fields + ("num_workers",)
+    comparison_fields = CTarget.comparison_fields + ("num_workers",)
+
+    def __init__(self, compiler=None, fortran_abi=False, num_workers=None):
         super(ExecutableCTarget, self).__init__(fortran_abi=fortran_abi)
         from loopy.target.c.c_execution import CCompiler
         self.compiler = compiler or CCompiler()
+        self.num_workers = num_workers
+
+    def split_kernel_at_global_barriers(self):
+        # The workers among which group axis 0 is split only synchronize
+        # at the end of each device program.
+        return True
 
     def get_kernel_executor(self, knl, *args, **kwargs):
         from loopy.target.c.c_execution import CKernelExecutor
-        return CKernelExecutor(knl, compiler=self.compiler)
+        return CKernelExecutor(knl, compiler=self.compiler,
+                num_workers=self.num_workers)
 
     def get_host_ast_builder(self):
         # enable host code generation
@@ -331,6 +390,9 @@ class ExecutableCTarget(CTarget):
 # }}}
 
 
+GROUP_RANGE_ARG_NAMES = ("_lpy_gid_0_start", "_lpy_gid_0_stop")
+
+
 class _ConstRestrictPointer(Pointer):
     def get_decl_pair(self):
         sub_tp, sub_decl = self.subdecl.get_decl_pair()
@@ -338,7 +400,7 @@ class _ConstRestrictPointer(Pointer):
 
 
 class _ConstPointer(Pointer):
-    def get_decl_pait(self):
+    def get_decl_pair(self):
         sub_tp, sub_decl = self.subdecl.get_decl_pair()
         return sub_tp, ("*const %s" % sub_decl)
 
@@ -346,9 +408,14 @@ class _ConstPointer(Pointer):
 # {{{ symbol mangler
 
 def c_symbol_mangler(kernel, name):
-    # float NAN as defined in C99 standard
-    if name == "NAN":
+    # float NAN and INFINITY as defined in C99 standard
+    if name in ["NAN", "INFINITY"]:
         return NumpyType(np.dtype(np.float32)), name
+    # integer limits, used as neutral elements of reductions
+    elif name in ["INT_MAX", "INT_MIN"]:
+        return NumpyType(np.dtype(np.int32)), name
+    elif name in ["LONG_MAX", "LONG_MIN"]:
+        return NumpyType(np.dtype(np.int64)), name
     return None
 
 # }}}
@@ -440,9 +507,12 @@ class CASTBuilder(ASTBuilderBase):
                     ])
 
     def preamble_generators(self):
+        from loopy.library.reduction import reduction_preamble_generator
+
         return (
                 super(CASTBuilder, self).preamble_generators() + [
                     _preamble_generator,
+                    reduction_preamble_generator,
                     ])
 
     # }}}
@@ -495,6 +565,12 @@ class CASTBuilder(ASTBuilderBase):
 
                     result.append(decl)
 
+        group_axis_sizes = self.get_emulated_group_axis_sizes(
+                codegen_state, schedule_index)
+        if group_axis_sizes:
+            function_body = self.emit_group_axis_loops(
+                    codegen_state, group_axis_sizes, function_body)
+
         fbody = FunctionBody(function_decl, function_body)
         if not result:
             return fbody
@@ -530,15 +606,104 @@ class CASTBuilder(ASTBuilderBase):
         if self.target.fortran_abi:
             name += "_"
 
+        arg_decls = [
+                self.idi_to_cgen_declarator(codegen_state.kernel, idi)
+                for idi in codegen_state.implemented_data_info]
+
+        if self.get_emulated_group_axis_sizes(codegen_state, schedule_index):
+            from cgen import Const
+            arg_decls.extend(
+                    Const(POD(self, codegen_state.kernel.index_dtype, name))
+                    for name in GROUP_RANGE_ARG_NAMES)
+
         return FunctionDeclarationWrapper(
                 FunctionDeclaration(
                     Value("void", name),
-                    [self.idi_to_cgen_declarator(codegen_state.kernel, idi)
-                        for idi in codegen_state.implemented_data_info]))
+                    arg_decls))
 
     def get_kernel_call(self, codegen_state, name, gsize, lsize, extra_args):
         return None
 
+    # {{{ emulated group axes
+
+    def get_emulated_group_axis_sizes(self, codegen_state, schedule_index):
+        """Plain C has no notion of a grid launch. Instead, group axes
+        (``g.*``) are implemented as a loop nest around the body of the
+        device function. The range of axis 0 is not fixed in the generated
+        code but passed in through two trailing arguments named in
+        :data:`GROUP_RANGE_ARG_NAMES`, so that the caller may split the
+        grid into pieces and run them concurrently.
+
+        Subclasses for targets with hardware group axes override this to
+        return an empty tuple.
+
+        :returns: a tuple of :mod:`pymbolic` expressions for the number of
+            groups along each axis, empty if no group axes are emulated in
+            the function starting at *schedule_index*.
+        """
+        if not codegen_state.is_generating_device_code:
+            return ()
+
+        kernel = codegen_state.kernel
+
+        from loopy.schedule import get_insn_ids_for_block_at
+        glob_grid, _ = kernel.get_grid_sizes_for_insn_ids_as_exprs(
+                get_insn_ids_for_block_at(kernel.schedule, schedule_index))
+
+        return glob_grid
+
+    def emit_group_axis_loops(self, codegen_state, group_axis_sizes, inner):
+        ecm = codegen_state.expression_to_code_mapper
+
+        from cgen import For, InlineInitializer
+
+        start_name, stop_name = GROUP_RANGE_ARG_NAMES
+
+        for axis in reversed(range(len(group_axis_sizes))):
+            gid = "_lpy_gid_%d" % axis
+
+            if axis == 0:
+                start, stop = start_name, stop_name
+            else:
+                start = "0"
+                stop = str(ecm(group_axis_sizes[axis], PREC_NONE, "i"))
+
+            inner = For(
+                    InlineInitializer(
+                        POD(self, codegen_state.kernel.index_dtype, gid),
+                        start),
+                    "%s < %s" % (gid, stop),
+                    "++%s" % gid,
+                    inner)
+
+        return Block([inner])
+
+    # }}}
+
+    # {{{ profiling
+
+    def emit_profile_probe(self, codegen_state, kind, probe_index):
+        from cgen import Initializer, Const, Value, Statement
+
+        array_name = get_profile_array_name(codegen_state.kernel)
+        base = PROFILE_ENTRIES_PER_PROBE*probe_index
+        timer_name = "_lpy_prof_start_%d" % probe_index
+
+        if kind == "start":
+            return Initializer(
+                    Const(Value("double", timer_name)), "_lpy_prof_now()")
+        elif kind == "stop":
+            return Statement("%s[%d] += _lpy_prof_now() - %s"
+                    % (array_name, base, timer_name))
+        elif kind == "entry":
+            return Statement("%s[%d] += 1" % (array_name, base + 1))
+        elif kind == "trip":
+            return Statement("%s[%d] += 1" % (array_name, base + 2))
+        else:
+            raise ValueError("unknown profile probe kind '%s'" % kind)
+
+    # }}}
+
     def get_temporary_decls(self, codegen_state, schedule_index):
         from loopy.kernel.data import temp_var_scope
 
@@ -586,7 +751,7 @@ class CASTBuilder(ASTBuilderBase):
 
                         temp_decls.append(decl)
 
-            else:
+            elif tv.name in sub_knl_temps:
                 assert tv.initializer is None
 
                 offset = 0
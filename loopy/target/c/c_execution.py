@@ -27,13 +27,16 @@ import os
 
 from loopy.target.execution import (KernelExecutorBase, _KernelInfo,
                              ExecutionWrapperGeneratorBase, get_highlighted_code)
-from pytools import memoize_method
+from pytools import ImmutableRecord
+from loopy.diagnostic import LoopyError
 from pytools.py_codegen import (Indentation)
 from pytools.prefork import ExecError
 from codepy.toolchain import guess_toolchain, ToolchainGuessError, GCCToolchain
 from codepy.jit import compile_from_string
 import six
 import ctypes
+import threading
+import weakref
 
 import numpy as np
 
@@ -95,7 +98,8 @@ class CExecutionWrapperGenerator(ExecutionWrapperGeneratorBase):
                 for i in range(num_axes))
 
         # find order of array
-        order = "'C'" if arg.unvec_strides[-1] == 1 else "'F'"
+        order = ("'C'" if not num_axes or arg.unvec_strides[-1] == 1
+                else "'F'")
 
         gen("%(name)s = _lpy_np.empty(%(shape)s, "
                 "%(dtype)s, order=%(order)s)"
@@ -106,6 +110,10 @@ class CExecutionWrapperGenerator(ExecutionWrapperGeneratorBase):
                         kernel_arg.dtype.numpy_dtype),
                     order=order))
 
+        if not num_axes:
+            # a scalar has no strides to check
+            return
+
         expected_strides = tuple(
                 var("_lpy_expected_strides_%s" % i)
                 for i in range(num_axes))
@@ -147,10 +155,28 @@ class CExecutionWrapperGenerator(ExecutionWrapperGeneratorBase):
 
     def generate_invocation(self, gen, kernel_name, args,
             kernel, implemented_data_info):
+        from loopy.schedule import CallKernel
+        global_temporaries = sorted(set(
+            tv_name
+            for sched_item in kernel.schedule
+            if isinstance(sched_item, CallKernel)
+            for tv_name in sched_item.extra_args))
+
+        # global temporaries live for the duration of one call and are
+        # shared among the device programs
+        from pymbolic.mapper.stringifier import StringifyMapper
+        strify = StringifyMapper()
+        for tv_name in global_temporaries:
+            gen("%s = _lpy_np.empty(%s, _lpy_np.uint8)" % (
+                tv_name, strify(kernel.temporary_variables[tv_name].nbytes)))
+
         gen("for knl in _lpy_c_kernels:")
         with Indentation(gen):
             gen('knl({args})'.format(
-                args=", ".join(args)))
+                args=", ".join(
+                    list(args)
+                    + ["%s=%s" % (tv_name, tv_name)
+                        for tv_name in global_temporaries])))
 
     # }}}
 
@@ -190,6 +216,12 @@ class CExecutionWrapperGenerator(ExecutionWrapperGeneratorBase):
         return arg.name
 
 
+# Maps file names of shared libraries to the ctypes.CDLL instances through
+# which they are loaded, for as long as these are in use.
+_loaded_libraries = weakref.WeakValueDictionary()
+_loaded_libraries_lock = threading.Lock()
+
+
 class CCompiler(object):
     """
     The compiler module handles invocation of compilers to generate a shared lib
@@ -276,8 +308,17 @@ class CCompiler(object):
         else:
             logger.debug('Kernel {0} retrieved from cache'.format(name))
 
-        # and return compiled
-        return ctypes.CDLL(ext_file)
+        # Reuse the library if it is still loaded for another executor.
+        with _loaded_libraries_lock:
+            try:
+                return _loaded_libraries[ext_file]
+            except KeyError:
+                pass
+
+            # and return compiled
+            dll = ctypes.CDLL(ext_file)
+            _loaded_libraries[ext_file] = dll
+            return dll
 
 
 class CPlusPlusCompiler(CCompiler):
@@ -308,7 +349,7 @@ class IDIToCDLL(object):
         arg_info = []
         for arg in idi:
             # check if pointer
-            pointer = arg.shape
+            pointer = arg.shape is not None
             arg_info.append(self._dtype_to_ctype(arg.dtype, pointer))
 
         return arg_info
@@ -316,22 +357,90 @@ class IDIToCDLL(object):
     def _dtype_to_ctype(self, dtype, pointer=False):
         """Map NumPy dtype to equivalent ctypes type."""
         typename = self.registry.dtype_to_ctype(dtype)
-        typename = {'unsigned': 'uint'}.get(typename, typename)
+        typename = {
+                'unsigned': 'uint',
+                'unsigned long': 'ulong',
+                'unsigned short': 'ushort',
+                'unsigned char': 'ubyte',
+                'signed char': 'byte',
+                }.get(typename, typename)
         basetype = getattr(ctypes, 'c_' + typename)
         if pointer:
             return ctypes.POINTER(basetype)
         return basetype
 
 
+# {{{ worker pool
+
+_WORKER_POOLS = {}
+
+
+def _shut_down_worker_pools():
+    for pool in six.itervalues(_WORKER_POOLS):
+        pool.close()
+        pool.join()
+
+    _WORKER_POOLS.clear()
+
+
+def get_worker_pool(num_workers):
+    """Return a persistent pool of *num_workers* worker threads.
+
+    Foreign function calls through :mod:`ctypes` release the GIL, so
+    compiled kernels running on separate pieces of the group range execute
+    concurrently, operating directly on the (shared) argument arrays.
+    """
+    try:
+        return _WORKER_POOLS[num_workers]
+    except KeyError:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(num_workers)
+
+        if not _WORKER_POOLS:
+            import atexit
+            atexit.register(_shut_down_worker_pools)
+
+        _WORKER_POOLS[num_workers] = pool
+        return pool
+
+
+def split_group_range(num_groups, num_pieces):
+    """Split ``range(num_groups)`` into at most *num_pieces* contiguous
+    pieces of nearly equal length.
+
+    :returns: a list of ``(start, stop)`` tuples.
+    """
+    num_pieces = max(1, min(num_pieces, num_groups))
+    base, extra = divmod(num_groups, num_pieces)
+
+    result = []
+    start = 0
+    for i in range(num_pieces):
+        stop = start + base + (1 if i < extra else 0)
+        result.append((start, stop))
+        start = stop
+
+    return result
+
+# }}}
+
+
 class CompiledCKernel(object):
     """
     A CompiledCKernel wraps a loopy kernel, compiling it and loading the
     result as a shared library, and provides access to the kernel as a
     ctypes function object, wrapped by the __call__ method, which attempts
     to automatically map argument types.
+
+    If the kernel uses group axes, these are emulated by a loop nest in the
+    generated code (see
+    :meth:`loopy.target.c.CASTBuilder.get_emulated_group_axis_sizes`).
+    The range of axis 0 is then split among *num_workers* workers.
     """
 
-    def __init__(self, knl, idi, dev_code, target, comp=None):
+    def __init__(self, knl, idi, dev_code, target, comp=None,
+            group_axis_sizes=(), index_dtype=None, num_workers=None,
+            extra_arg_names=(), dll=None):
         from loopy.target.c import ExecutableCTarget
         assert isinstance(target, ExecutableCTarget)
         self.target = target
@@ -339,7 +448,10 @@ class CompiledCKernel(object):
         # get code and build
         self.code = dev_code
         self.comp = comp if comp is not None else CCompiler()
-        self.dll = self.comp.build(self.name, self.code)
+        if dll is None:
+            dll = self.comp.build(self.name, self.code)
+        self.dll = dll
+        self.extra_arg_names = tuple(extra_arg_names)
 
         # get the function declaration for interface with ctypes
         func_decl = IDIToCDLL(self.target)
@@ -347,10 +459,34 @@ class CompiledCKernel(object):
         self._fn = getattr(self.dll, self.name)
         # kernels are void by defn.
         self._fn.restype = None
+
+        self.num_groups_0 = None
+        if group_axis_sizes:
+            self.num_groups_0 = group_axis_sizes[0]
+            self.arg_names = [arg.name for arg in idi]
+
+            range_arg_t = func_decl._dtype_to_ctype(index_dtype)
+            arg_info = arg_info + [range_arg_t, range_arg_t]
+
         self._fn.argtypes = [ctype for ctype in arg_info]
+        self.num_workers = num_workers
+
+    def get_num_groups_0(self, args):
+        from pymbolic import evaluate
+        return int(evaluate(self.num_groups_0, dict(
+            (name, arg) for name, arg in zip(self.arg_names, args)
+            if not hasattr(arg, "ctypes"))))
+
+    def __call__(self, *args, **global_temporaries):
+        """Execute kernel with given args mapped to ctypes equivalents.
+
+        :arg global_temporaries: storage for global temporary variables,
+            of which those in :attr:`extra_arg_names` are passed after
+            *args*.
+        """
+        args = args + tuple(
+                global_temporaries[name] for name in self.extra_arg_names)
 
-    def __call__(self, *args):
-        """Execute kernel with given args mapped to ctypes equivalents."""
         args_ = []
         for arg, arg_t in zip(args, self._fn.argtypes):
             if hasattr(arg, 'ctypes'):
@@ -362,7 +498,58 @@ class CompiledCKernel(object):
             else:
                 arg_ = arg_t(arg)
             args_.append(arg_)
-        self._fn(*args_)
+
+        if self.num_groups_0 is None:
+            self._fn(*args_)
+            return
+
+        pieces = split_group_range(
+                self.get_num_groups_0(args), self.num_workers or 1)
+
+        if len(pieces) == 1:
+            (start, stop), = pieces
+            self._fn(*(args_ + [start, stop]))
+        else:
+            get_worker_pool(len(pieces)).map(
+                    lambda piece: self._fn(*(args_ + list(piece))),
+                    pieces)
+
+
+class ScheduleProfileEntry(ImmutableRecord):
+    """Timing and counts for one instrumented item of the kernel schedule,
+    see :attr:`loopy.Options.profile_schedule`.
+
+    .. attribute:: sched_index
+    .. attribute:: kind
+
+        ``"loop"`` or ``"kernel"``.
+
+    .. attribute:: name
+
+        The loop iname or the name of the device program.
+
+    .. attribute:: insn_ids
+
+        A :class:`frozenset` of the ids of the instructions within the
+        loop or device program.
+
+    .. attribute:: time
+
+        The accumulated wall time in seconds. If group axis 0 is split among
+        several workers, concurrent updates may be lost.
+
+    .. attribute:: entries
+
+        The number of times the loop or device program was entered.
+
+    .. attribute:: trip_count
+
+        The accumulated number of loop iterations. Zero for device programs.
+    """
+
+    def __str__(self):
+        return "%-8s %-20s %12.6f s %10d entries %12d trips" % (
+                self.kind, self.name, self.time, self.entries, self.trip_count)
 
 
 class CKernelExecutor(KernelExecutorBase):
@@ -373,23 +560,27 @@ class CKernelExecutor(KernelExecutorBase):
     .. automethod:: __call__
     """
 
-    def __init__(self, kernel, compiler=None):
+    def __init__(self, kernel, compiler=None, num_workers=None):
         """
         :arg kernel: may be a loopy.LoopKernel, a generator returning kernels
             (a warning will be issued if more than one is returned). If the
             kernel has not yet been loop-scheduled, that is done, too, with no
             specific arguments.
+        :arg num_workers: the number of workers among which the range of
+            group axis 0 is split. *None* or 1 runs the kernel in the
+            calling thread.
         """
 
         self.compiler = compiler if compiler else CCompiler()
+        self.num_workers = num_workers
+        self.last_kernel_info = None
         super(CKernelExecutor, self).__init__(kernel)
 
     def get_invoker_uncached(self, kernel, codegen_result):
         generator = CExecutionWrapperGenerator()
         return generator(kernel, codegen_result)
 
-    @memoize_method
-    def kernel_info(self, arg_to_dtype_set=frozenset(), all_kwargs=None):
+    def kernel_info_uncached(self, arg_to_dtype_set, all_kwargs):
         kernel = self.get_typed_and_scheduled_kernel(arg_to_dtype_set)
 
         from loopy.codegen import generate_code_v2
@@ -416,11 +607,39 @@ class CKernelExecutor(KernelExecutorBase):
             # update code from editor
             all_code = '\n'.join([dev_code, '', host_code])
 
+        from loopy.codegen.control import synthesize_idis_for_extra_args
+        from loopy.schedule import CallKernel, get_insn_ids_for_block_at
+        name_to_group_axis_sizes = {}
+        name_to_extra_idis = {}
+        for sched_index, sched_item in enumerate(kernel.schedule):
+            if isinstance(sched_item, CallKernel):
+                if sched_item.extra_inames:
+                    raise LoopyError("global barriers within loops are not "
+                            "supported by ExecutableCTarget (found in "
+                            "loop(s) '%s')"
+                            % ", ".join(sched_item.extra_inames))
+
+                glob_grid, _ = kernel.get_grid_sizes_for_insn_ids_as_exprs(
+                        get_insn_ids_for_block_at(kernel.schedule, sched_index))
+                name_to_group_axis_sizes[sched_item.kernel_name] = glob_grid
+                name_to_extra_idis[sched_item.kernel_name] = (
+                        synthesize_idis_for_extra_args(kernel, sched_index))
+
+        # all device programs live in the same source, build it only once
+        dll = self.compiler.build(kernel.name, all_code)
+
         c_kernels = []
         for dp in codegen_result.device_programs:
+            extra_idis = name_to_extra_idis.get(dp.name, [])
             c_kernels.append(CompiledCKernel(dp,
-                codegen_result.implemented_data_info, all_code, self.kernel.target,
-                self.compiler))
+                codegen_result.implemented_data_info + extra_idis,
+                all_code, self.kernel.target,
+                self.compiler,
+                group_axis_sizes=name_to_group_axis_sizes.get(dp.name, ()),
+                index_dtype=kernel.index_dtype,
+                num_workers=self.num_workers,
+                extra_arg_names=[idi.name for idi in extra_idis],
+                dll=dll))
 
         return _KernelInfo(
                 kernel=kernel,
@@ -430,6 +649,29 @@ class CKernelExecutor(KernelExecutorBase):
 
     # }}}
 
+    def get_kernel_info_memory_usage(self, kernel_info):
+        result = super(CKernelExecutor, self).get_kernel_info_memory_usage(
+                kernel_info)
+
+        codes = {}
+        libraries = set()
+        for c_kernel in kernel_info.c_kernels:
+            codes[id(c_kernel.code)] = c_kernel.code
+            libraries.add(c_kernel.dll._name)
+
+        result += sum(len(code) for code in six.itervalues(codes))
+        for library in libraries:
+            try:
+                result += os.path.getsize(library)
+            except OSError:
+                pass
+
+        return result
+
+    def release(self):
+        super(CKernelExecutor, self).release()
+        self.last_kernel_info = None
+
     def __call__(self, *args, **kwargs):
         """
         :returns: ``(None, output)`` the output is a tuple of output arguments
@@ -441,9 +683,70 @@ class CKernelExecutor(KernelExecutorBase):
             of the returned arrays.
         """
 
+        specialized = self.get_value_specialized_kernel(args, kwargs)
+        if specialized is not None:
+            knl, kwargs = specialized
+            return knl(*args, **kwargs)
+
         kwargs = self.packing_controller.unpack(kwargs)
 
         kernel_info = self.kernel_info(self.arg_to_dtype_set(kwargs))
+        self.last_kernel_info = kernel_info
 
         return kernel_info.invoker(
                 kernel_info.c_kernels, *args, **kwargs)
+
+    def get_schedule_profile(self, reset=False):
+        """Return the measurements accumulated so far by a kernel instrumented
+        through :attr:`loopy.Options.profile_schedule`, for the most recently
+        called typed variant of the kernel.
+
+        :arg reset: if *True*, zero the measurements after reading them.
+        :returns: a list of :class:`ScheduleProfileEntry` instances in
+            schedule order.
+        """
+        if not self.kernel.options.profile_schedule:
+            raise LoopyError("kernel was not built with the "
+                    "'profile_schedule' option")
+
+        kernel_info = self.last_kernel_info
+        if kernel_info is None:
+            return []
+
+        kernel = kernel_info.kernel
+
+        from loopy.codegen.control import get_profile_probe_sched_indices
+        from loopy.target.c import (
+                get_profile_array_name, PROFILE_ENTRIES_PER_PROBE)
+        probe_sched_indices = get_profile_probe_sched_indices(kernel)
+        size = PROFILE_ENTRIES_PER_PROBE * max(1, len(probe_sched_indices))
+
+        # all device programs share one library and thus one profile array
+        array = (ctypes.c_double * size).in_dll(
+                kernel_info.c_kernels[0].dll, get_profile_array_name(kernel))
+        values = np.ctypeslib.as_array(array).copy()
+        if reset:
+            ctypes.memset(array, 0, ctypes.sizeof(array))
+
+        from loopy.schedule import CallKernel, get_insn_ids_for_block_at
+
+        result = []
+        for probe_index, sched_index in enumerate(probe_sched_indices):
+            sched_item = kernel.schedule[sched_index]
+            if isinstance(sched_item, CallKernel):
+                kind, name = "kernel", sched_item.kernel_name
+            else:
+                kind, name = "loop", sched_item.iname
+
+            base = PROFILE_ENTRIES_PER_PROBE*probe_index
+            result.append(ScheduleProfileEntry(
+                sched_index=sched_index,
+                kind=kind,
+                name=name,
+                insn_ids=frozenset(
+                    get_insn_ids_for_block_at(kernel.schedule, sched_index)),
+                time=values[base],
+                entries=int(values[base+1]),
+                trip_count=int(values[base+2])))
+
+        return result
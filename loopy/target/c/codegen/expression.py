@@ -689,7 +689,10 @@ class ExpressionToCExpressionMapper(IdentityMapper):
     # }}}
 
     def map_group_hw_index(self, expr, type_context):
-        raise LoopyError("plain C does not have group hw axes")
+        # Plain C does not have group hw axes. They are emulated by a loop
+        # nest around the function body, see
+        # :meth:`loopy.target.c.CASTBuilder.get_emulated_group_axis_sizes`.
+        return var("_lpy_gid_%d" % expr.axis)
 
     def map_local_hw_index(self, expr, type_context):
         raise LoopyError("plain C does not have local hw axes")
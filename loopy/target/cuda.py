@@ -229,6 +229,13 @@ class CUDACASTBuilder(CASTBuilder):
 
     # {{{ top-level codegen
 
+    def get_emulated_group_axis_sizes(self, codegen_state, schedule_index):
+        # group axes are implemented in hardware
+        return ()
+
+    def emit_profile_probe(self, codegen_state, kind, probe_index):
+        raise LoopyError("schedule profiling is not supported on CUDA")
+
     def get_function_declaration(self, codegen_state, codegen_result,
             schedule_index):
         fdecl = super(CUDACASTBuilder, self).get_function_declaration(
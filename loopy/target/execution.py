@@ -24,6 +24,9 @@ THE SOFTWARE.
 
 
 import six
+import itertools
+import threading
+import weakref
 import numpy as np
 from pytools import ImmutableRecord, memoize_method
 from loopy.diagnostic import LoopyError
@@ -693,6 +696,305 @@ class _Kernels(object):
     pass
 
 
+# {{{ runtime value specialization
+
+class ValueSpecializationCache(object):
+    """Watches the values passed for integer :class:`loopy.ValueArg`
+    arguments of a kernel. Once a combination of values has been seen
+    *threshold* times, a variant of the kernel with these values fixed by
+    :func:`loopy.fix_parameters` is built and used for subsequent calls with
+    the same values. At most *max_variants* specialized variants are kept,
+    the least recently used one being evicted first. Calls with other
+    values use the generic kernel.
+
+    .. automethod:: __call__
+
+    .. versionadded:: 2018.2
+    """
+
+    def __init__(self, kernel, threshold, max_variants=None, background=False):
+        from loopy.kernel.data import ValueArg
+        from loopy.kernel import kernel_state
+
+        self.kernel = kernel
+        self.threshold = threshold
+        self.max_variants = (
+                max_variants if max_variants is not None else 8)
+        self.background = background
+
+        if kernel.state == kernel_state.INITIAL:
+            self.param_names = tuple(
+                    arg.name for arg in kernel.args
+                    if isinstance(arg, ValueArg)
+                    and (arg.dtype is None or arg.dtype.is_integral()))
+        else:
+            # fixing parameters is only sound before scheduling
+            self.param_names = ()
+
+        from collections import OrderedDict
+        self.counts = OrderedDict()
+        self.variants = OrderedDict()
+        self.pending = set()
+        self.failed = set()
+
+        import threading
+        self.lock = threading.Lock()
+
+    def get_key(self, kwargs):
+        return tuple(
+                (name, int(kwargs[name]))
+                for name in self.param_names
+                if isinstance(kwargs.get(name), six.integer_types + (np.integer,)))
+
+    def make_variant(self, key):
+        from loopy.transform.parameter import fix_parameters
+        variant = fix_parameters(self.kernel, **dict(key))
+
+        from loopy import set_options
+        return set_options(variant, specialize_values_after=None)
+
+    def _build_in_background(self, key, args, kwargs):
+        try:
+            variant = self.make_variant(key)
+
+            target = variant.target
+            kex = target.get_kernel_executor(variant, *args, **kwargs)
+            kex.kernel_info(kex.arg_to_dtype_set(
+                kex.packing_controller.unpack(kwargs)))
+            variant._kernel_executor_cache[
+                    target.get_kernel_executor_cache_key(*args, **kwargs)] = kex
+
+        except Exception as e:
+            logger.warning("%s: building variant for %s failed: %s"
+                    % (self.kernel.name, key, e))
+            with self.lock:
+                self.pending.discard(key)
+                self.failed.add(key)
+            return
+
+        with self.lock:
+            self.pending.discard(key)
+            self._store(key, variant)
+
+    def _store(self, key, variant):
+        self.variants[key] = variant
+        while len(self.variants) > self.max_variants:
+            evicted_key, _ = self.variants.popitem(last=False)
+            logger.debug("%s: evicting variant for %s"
+                    % (self.kernel.name, evicted_key))
+
+    def __call__(self, args, kwargs):
+        """
+        :returns: *None* if the generic kernel is to be used, otherwise a
+            tuple ``(kernel, kwargs)`` of the specialized kernel and the
+            keyword arguments to pass to it.
+        """
+        key = self.get_key(kwargs)
+        if not key:
+            return None
+
+        with self.lock:
+            variant = self.variants.pop(key, None)
+            if variant is not None:
+                # mark as most recently used
+                self.variants[key] = variant
+            elif key in self.pending or key in self.failed:
+                return None
+            else:
+                count = self.counts.pop(key, 0) + 1
+                self.counts[key] = count
+                while len(self.counts) > 16*self.max_variants:
+                    self.counts.popitem(last=False)
+
+                if count < self.threshold:
+                    return None
+
+                del self.counts[key]
+
+                if self.background:
+                    self.pending.add(key)
+                    import threading
+                    thread = threading.Thread(
+                            target=self._build_in_background,
+                            args=(key, args, kwargs))
+                    thread.daemon = True
+                    thread.start()
+                    return None
+
+        if variant is None:
+            logger.info("%s: specializing for %s" % (self.kernel.name, key))
+            variant = self.make_variant(key)
+            with self.lock:
+                self._store(key, variant)
+
+        fixed_names = set(name for name, _ in key)
+        return variant, dict(
+                (name, val) for name, val in six.iteritems(kwargs)
+                if name not in fixed_names)
+
+# }}}
+
+
+# {{{ executor cache
+
+# All instances of KernelExecutorCache that hold executors, so that the
+# limits set by loopy.set_executor_cache_limits apply across kernels.
+_executor_caches = weakref.WeakSet()
+_executor_cache_lock = threading.RLock()
+_executor_use_counter = itertools.count()
+
+
+class KernelExecutorCache(object):
+    """Maps the keys returned by
+    :meth:`loopy.target.TargetBase.get_kernel_executor_cache_key` to the
+    kernel executors used by :meth:`loopy.LoopKernel.__call__`, see
+    :attr:`loopy.LoopKernel.executor_cache`.
+
+    The number of executors held across all kernels and their estimated
+    memory usage are bounded as set by :func:`loopy.set_executor_cache_limits`,
+    the least recently used executors being evicted first. Evicted
+    executors are only weakly referenced: they (and the compiled code they
+    hold) are freed once no longer in use elsewhere, and are otherwise
+    reused upon the next lookup.
+
+    .. automethod:: get_memory_usage
+    .. automethod:: release
+
+    .. versionadded:: 2018.2
+    """
+
+    def __init__(self):
+        # maps keys to lists [executor, last_use]
+        self._executors = {}
+        self._evicted = None
+
+    def __getitem__(self, key):
+        with _executor_cache_lock:
+            try:
+                entry = self._executors[key]
+            except KeyError:
+                if self._evicted is None:
+                    raise
+                kex = self._evicted.pop(key)
+                entry = self._executors[key] = [kex, None]
+
+            entry[1] = next(_executor_use_counter)
+            return entry[0]
+
+    def __setitem__(self, key, kex):
+        with _executor_cache_lock:
+            if self._evicted is not None:
+                self._evicted.pop(key, None)
+
+            self._executors[key] = [kex, next(_executor_use_counter)]
+            _executor_caches.add(self)
+
+        enforce_executor_cache_limits()
+
+    def __contains__(self, key):
+        return key in self._executors
+
+    def __len__(self):
+        return len(self._executors)
+
+    def keys(self):
+        return list(self._executors.keys())
+
+    def values(self):
+        return [kex for kex, _ in six.itervalues(self._executors)]
+
+    def items(self):
+        return [(key, kex) for key, (kex, _) in six.iteritems(self._executors)]
+
+    def evict(self, key):
+        """Stop holding a strong reference to the executor for *key*."""
+        with _executor_cache_lock:
+            kex, _ = self._executors.pop(key)
+            if self._evicted is None:
+                self._evicted = weakref.WeakValueDictionary()
+            self._evicted[key] = kex
+
+    def get_memory_usage(self):
+        """Return a :class:`dict` mapping the keys of the cached executors to
+        their estimated memory usage in bytes, see
+        :meth:`KernelExecutorBase.get_memory_usage`.
+        """
+        return dict(
+                (key, kex.get_memory_usage())
+                for key, kex in self.items())
+
+    def release(self):
+        """Release the compiled code held by all cached executors (see
+        :meth:`KernelExecutorBase.release`) and empty the cache.
+        """
+        with _executor_cache_lock:
+            for kex in self.values():
+                kex.release()
+
+            self._executors.clear()
+            self._evicted = None
+            _executor_caches.discard(self)
+
+
+def get_executor_cache_memory_usage():
+    """Return the estimated number of bytes held by the executors in all
+    instances of :class:`KernelExecutorCache`.
+
+    .. versionadded:: 2018.2
+    """
+    with _executor_cache_lock:
+        return sum(
+                sum(six.itervalues(cache.get_memory_usage()))
+                for cache in list(_executor_caches))
+
+
+def enforce_executor_cache_limits():
+    """Evict the least recently used executors from all instances of
+    :class:`KernelExecutorCache` until the limits set by
+    :func:`loopy.set_executor_cache_limits` are met. The most recently used
+    executor is never evicted.
+
+    .. versionadded:: 2018.2
+    """
+    from loopy import EXECUTOR_CACHE_MAX_ENTRIES, EXECUTOR_CACHE_MAX_BYTES
+    max_entries = EXECUTOR_CACHE_MAX_ENTRIES
+    max_bytes = EXECUTOR_CACHE_MAX_BYTES
+
+    if max_entries is None and max_bytes is None:
+        return
+
+    with _executor_cache_lock:
+        caches = list(_executor_caches)
+
+        nentries = sum(len(cache) for cache in caches)
+        if max_bytes is None and nentries <= max_entries:
+            return
+
+        entries = sorted(
+                (last_use, id(cache), cache, key, kex)
+                for cache in caches
+                for key, (kex, last_use) in six.iteritems(cache._executors))
+
+        if max_bytes is not None:
+            usages = [kex.get_memory_usage() for _, _, _, _, kex in entries]
+        else:
+            usages = [0] * len(entries)
+
+        nbytes = sum(usages)
+
+        for (_, _, cache, key, kex), usage in zip(entries[:-1], usages):
+            if ((max_entries is None or nentries <= max_entries)
+                    and (max_bytes is None or nbytes <= max_bytes)):
+                break
+
+            logger.debug("%s: evicting executor from cache" % kex.kernel.name)
+            cache.evict(key)
+            nentries -= 1
+            nbytes -= usage
+
+# }}}
+
+
 typed_and_scheduled_cache = WriteOncePersistentDict(
         "loopy-typed-and-scheduled-cache-v1-"+DATA_MODEL_VERSION,
         key_builder=LoopyKeyBuilder())
@@ -711,6 +1013,8 @@ class KernelExecutorBase(object):
 
     .. automethod:: __init__
     .. automethod:: __call__
+    .. automethod:: get_memory_usage
+    .. automethod:: release
     """
 
     def __init__(self, kernel):
@@ -729,9 +1033,38 @@ class KernelExecutorBase(object):
                 arg.dtype is None
                 for arg in kernel.args)
 
-    def get_typed_and_scheduled_kernel_uncached(self, arg_to_dtype_set):
-        from loopy.kernel.tools import add_dtypes
+        self._kernel_infos = {}
+        self._kernel_info_memory_usage = {}
+
+        if kernel.options.specialize_values_after:
+            self.value_specialization_cache = ValueSpecializationCache(
+                    kernel, kernel.options.specialize_values_after,
+                    kernel.options.max_value_specializations,
+                    kernel.options.specialize_values_in_background)
+        else:
+            self.value_specialization_cache = None
 
+    def get_value_specialized_kernel(self, args, kwargs):
+        """
+        :returns: *None* or a tuple ``(kernel, kwargs)``, see
+            :class:`ValueSpecializationCache`.
+        """
+        if self.value_specialization_cache is None:
+            return None
+
+        return self.value_specialization_cache(args, kwargs)
+
+    @memoize_method
+    def get_arg_independently_typed_kernel(self):
+        """Return :attr:`kernel` with the types inferred that do not depend
+        on the types of the arguments passed at runtime, so that only the
+        remaining ones need to be inferred for each new set of argument
+        types.
+        """
+        from loopy.type_inference import infer_arg_independent_types
+        return infer_arg_independent_types(self.kernel)
+
+    def get_typed_and_scheduled_kernel_uncached(self, arg_to_dtype_set):
         kernel = self.kernel
 
         if arg_to_dtype_set:
@@ -749,10 +1082,10 @@ class KernelExecutorBase(object):
                             "no known variable/argument with that name"
                             % var)
 
-            kernel = add_dtypes(kernel, var_to_dtype)
-
-            from loopy.type_inference import infer_unknown_types
-            kernel = infer_unknown_types(kernel, expect_completion=True)
+            from loopy.type_inference import infer_types_for_arg_dtypes
+            kernel = infer_types_for_arg_dtypes(
+                    self.get_arg_independently_typed_kernel(), var_to_dtype,
+                    expect_completion=True)
 
         if kernel.schedule is None:
             from loopy.preprocess import preprocess_kernel
@@ -864,15 +1197,69 @@ class KernelExecutorBase(object):
 
     # {{{ call and info generator
 
-    @memoize_method
-    def kernel_info(self, arg_to_dtype_set=frozenset(), all_kwargs=None):
+    def kernel_info_uncached(self, arg_to_dtype_set, all_kwargs):
         raise NotImplementedError()
 
+    def kernel_info(self, arg_to_dtype_set=frozenset(), all_kwargs=None):
+        key = (arg_to_dtype_set, all_kwargs)
+        try:
+            return self._kernel_infos[key]
+        except KeyError:
+            pass
+
+        result = self.kernel_info_uncached(arg_to_dtype_set, all_kwargs)
+        self._kernel_infos[key] = result
+
+        enforce_executor_cache_limits()
+        return result
+
     def __call__(self, queue, **kwargs):
         raise NotImplementedError()
 
     # }}}
 
+    # {{{ memory management
+
+    def get_kernel_info_memory_usage(self, kernel_info):
+        """Return an estimate of the number of bytes held by *kernel_info*.
+        Subclasses add the size of the compiled code.
+        """
+        from six.moves import cPickle as pickle
+        return len(pickle.dumps(kernel_info.kernel, pickle.HIGHEST_PROTOCOL))
+
+    def get_memory_usage(self):
+        """Return an estimate of the number of bytes held by this executor,
+        i.e. by the typed and scheduled kernels and the compiled code for all
+        argument types it has been called with.
+
+        .. versionadded:: 2018.2
+        """
+        result = 0
+        for key, kernel_info in six.iteritems(self._kernel_infos):
+            try:
+                usage = self._kernel_info_memory_usage[key]
+            except KeyError:
+                usage = self.get_kernel_info_memory_usage(kernel_info)
+                self._kernel_info_memory_usage[key] = usage
+
+            result += usage
+
+        return result
+
+    def release(self):
+        """Release the typed and scheduled kernels and the compiled code held
+        by this executor. They are rebuilt (typically from the disk caches)
+        upon the next call.
+
+        .. versionadded:: 2018.2
+        """
+        self._kernel_infos = {}
+        self._kernel_info_memory_usage = {}
+        self.__dict__.pop(
+                "_memoize_dic_get_arg_independently_typed_kernel", None)
+
+    # }}}
+
 # }}}
 
 # {{{ code highlighers
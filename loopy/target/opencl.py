@@ -381,18 +381,22 @@ class OpenCLCASTBuilder(CASTBuilder):
                     ])
 
     def preamble_generators(self):
-        from loopy.library.reduction import reduction_preamble_generator
-
         return (
                 super(OpenCLCASTBuilder, self).preamble_generators() + [
                     opencl_preamble_generator,
-                    reduction_preamble_generator,
                     ])
 
     # }}}
 
     # {{{ top-level codegen
 
+    def get_emulated_group_axis_sizes(self, codegen_state, schedule_index):
+        # group axes are implemented in hardware
+        return ()
+
+    def emit_profile_probe(self, codegen_state, kind, probe_index):
+        raise LoopyError("schedule profiling is not supported on OpenCL")
+
     def get_function_declaration(self, codegen_state, codegen_result,
             schedule_index):
         fdecl = super(OpenCLCASTBuilder, self).get_function_declaration(
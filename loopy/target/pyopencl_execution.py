@@ -22,9 +22,9 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import six
 from six.moves import range, zip
 
-from pytools import memoize_method
 from pytools.py_codegen import Indentation
 from loopy.target.execution import (
     KernelExecutorBase, ExecutionWrapperGeneratorBase, _KernelInfo, _Kernels)
@@ -273,8 +273,7 @@ class PyOpenCLKernelExecutor(KernelExecutorBase):
         generator = PyOpenCLExecutionWrapperGenerator()
         return generator(kernel, codegen_result)
 
-    @memoize_method
-    def kernel_info(self, arg_to_dtype_set=frozenset(), all_kwargs=None):
+    def kernel_info_uncached(self, arg_to_dtype_set, all_kwargs):
         kernel = self.get_typed_and_scheduled_kernel(arg_to_dtype_set)
 
         from loopy.codegen import generate_code_v2
@@ -314,6 +313,21 @@ class PyOpenCLKernelExecutor(KernelExecutorBase):
                 implemented_data_info=codegen_result.implemented_data_info,
                 invoker=self.get_invoker(kernel, codegen_result))
 
+    def get_kernel_info_memory_usage(self, kernel_info):
+        result = super(PyOpenCLKernelExecutor, self).get_kernel_info_memory_usage(
+                kernel_info)
+
+        import pyopencl as cl
+        programs = {}
+        for cl_kernel in six.itervalues(kernel_info.cl_kernels.__dict__):
+            program = cl_kernel.get_info(cl.kernel_info.PROGRAM)
+            programs[program.int_ptr] = program
+
+        for program in six.itervalues(programs):
+            result += sum(program.get_info(cl.program_info.BINARY_SIZES))
+
+        return result
+
     def __call__(self, queue, **kwargs):
         """
         :arg allocator: a callable passed a byte count and returning
@@ -341,6 +355,11 @@ class PyOpenCLKernelExecutor(KernelExecutorBase):
             of the returned arrays.
         """
 
+        specialized = self.get_value_specialized_kernel((queue,), kwargs)
+        if specialized is not None:
+            knl, kwargs = specialized
+            return knl(queue, **kwargs)
+
         allocator = kwargs.pop("allocator", None)
         wait_for = kwargs.pop("wait_for", None)
         out_host = kwargs.pop("out_host", None)
@@ -102,8 +102,25 @@ class LoopyKeyBuilder(KeyBuilderBase):
     def update_for_pymbolic_expression(self, key_hash, key):
         if key is None:
             self.update_for_NoneType(key_hash, key)
-        else:
-            PersistentHashWalkMapper(key_hash)(key)
+            return
+
+        try:
+            digest = key._loopy_expr_persistent_hash_digest
+        except AttributeError:
+            from pytools.persistent_dict import new_hash
+            inner_key_hash = new_hash()
+            PersistentHashWalkMapper(inner_key_hash)(key)
+            digest = inner_key_hash.digest()
+
+            # Expressions are immutable, and interned ones (see
+            # loopy.symbolic.ExpressionInterner) are shared widely.
+            try:
+                key._loopy_expr_persistent_hash_digest = digest
+            except AttributeError:
+                # e.g. a constant
+                pass
+
+        key_hash.update(digest)
 
 
 class PymbolicExpressionHashWrapper(object):
@@ -451,6 +468,39 @@ class _PickledObjectWithEqAndPersistentHashKeys(_PickledObject):
                 "eq_key": self.eq_key,
                 "persistent_hash_key": self.persistent_hash_key}
 
+
+class _PickledObjectWithEqKeyAndPersistentHashDigest(_PickledObject):
+    """Like :class:`_PickledObject`, with an additional attribute `eq_key`
+    and with the persistent hash digest of the pickled object, so that it
+    hashes like the object itself (see
+    :meth:`pytools.persistent_dict.KeyBuilder.rec`).
+    """
+
+    def __init__(self, obj, eq_key, persistent_hash_digest):
+        _PickledObject.__init__(self, obj)
+        self.eq_key = eq_key
+        self._pytools_persistent_hash_digest = persistent_hash_digest
+
+    def __getstate__(self):
+        return {"objstring": self.objstring,
+                "eq_key": self.eq_key,
+                "_pytools_persistent_hash_digest":
+                self._pytools_persistent_hash_digest}
+
+
+class _DigestCapture(object):
+    def update(self, digest):
+        self.digest = digest
+
+
+def _get_persistent_hash_digest(obj):
+    """Return the digest that :class:`LoopyKeyBuilder` contributes to a hash
+    for *obj*.
+    """
+    capture = _DigestCapture()
+    LoopyKeyBuilder().rec(capture, obj)
+    return capture.digest
+
 # }}}
 
 
@@ -481,11 +531,80 @@ class LazilyUnpicklingDict(collections.MutableMapping):
     def __iter__(self):
         return iter(self._map)
 
+    def copy(self):
+        """Return a :class:`dict` with the same (unpickled) items."""
+        return dict(six.iteritems(self))
+
     def __getstate__(self):
         return {"_map": dict(
             (key, _PickledObject(val))
             for key, val in six.iteritems(self._map))}
 
+
+class LazilyUnpicklingDictWithEqAndPersistentHashing(LazilyUnpicklingDict):
+    """A dictionary-like object which lazily unpickles its values, and supports
+    equality comparison and persistent hashing without unpickling.
+
+    Persistent hashing only works in conjunction with :class:`LoopyKeyBuilder`.
+    Values are hashed as themselves, with their hash digests computed when
+    they are pickled. Similarly, the keys used for equality comparison of
+    values are computed by the function *eq_key_getter* given to the
+    constructor when values are pickled. If it is not given, the persistent
+    hash digest is used for equality comparison.
+
+    .. versionadded:: 2018.2
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.eq_key_getter = kwargs.pop("eq_key_getter", None)
+        LazilyUnpicklingDict.__init__(self, *args, **kwargs)
+
+    def update_persistent_hash(self, key_hash, key_builder):
+        key_builder.update_for_dict(key_hash, self._map)
+
+    def _get_eq_key(self, obj):
+        if isinstance(obj, _PickledObjectWithEqKeyAndPersistentHashDigest):
+            return obj.eq_key
+        if self.eq_key_getter is None:
+            return _get_persistent_hash_digest(obj)
+        return self.eq_key_getter(obj)
+
+    def __eq__(self, other):
+        if not isinstance(other, (dict, LazilyUnpicklingDict)):
+            return NotImplemented
+
+        if isinstance(other, LazilyUnpicklingDict):
+            other = other._map
+
+        if len(self._map) != len(other):
+            return False
+
+        for key, value in six.iteritems(self._map):
+            try:
+                other_value = other[key]
+            except KeyError:
+                return False
+
+            if value is other_value:
+                continue
+
+            if self._get_eq_key(value) != self._get_eq_key(other_value):
+                return False
+
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __getstate__(self):
+        return {"_map": dict(
+                (key, _PickledObjectWithEqKeyAndPersistentHashDigest(
+                    val,
+                    self._get_eq_key(val),
+                    _get_persistent_hash_digest(val)))
+                for key, val in six.iteritems(self._map)),
+                "eq_key_getter": self.eq_key_getter}
+
 # }}}
 
 
@@ -498,11 +617,20 @@ class LazilyUnpicklingList(collections.MutableSequence):
         self._list = list(*args, **kwargs)
 
     def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self._list)))]
+
         item = self._list[key]
         if isinstance(item, _PickledObject):
             item = self._list[key] = item.unpickle()
         return item
 
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
     def __setitem__(self, key, value):
         self._list[key] = value
 
@@ -530,6 +658,13 @@ class LazilyUnpicklingListWithEqAndPersistentHashing(LazilyUnpicklingList):
     constructor. These functions should return keys that can be used in place of
     the original object for the respective purposes of equality comparison and
     persistent hashing.
+
+    .. versionchanged:: 2018.2
+
+        `persistent_hash_key_getter` may be *None*, in which case items are
+        hashed as themselves, with their hash digests computed when they are
+        pickled. `eq_key_getter` may be *None*, in which case the persistent
+        hash digest is used for equality comparison.
     """
 
     def __init__(self, *args, **kwargs):
@@ -541,8 +676,11 @@ class LazilyUnpicklingListWithEqAndPersistentHashing(LazilyUnpicklingList):
         key_builder.update_for_list(key_hash, self._list)
 
     def _get_eq_key(self, obj):
-        if isinstance(obj, _PickledObjectWithEqAndPersistentHashKeys):
+        if isinstance(obj, (_PickledObjectWithEqAndPersistentHashKeys,
+                _PickledObjectWithEqKeyAndPersistentHashDigest)):
             return obj.eq_key
+        if self.eq_key_getter is None:
+            return _get_persistent_hash_digest(obj)
         return self.eq_key_getter(obj)
 
     def _get_persistent_hash_key(self, obj):
@@ -561,6 +699,9 @@ class LazilyUnpicklingListWithEqAndPersistentHashing(LazilyUnpicklingList):
             return False
 
         for a, b in zip(self._list, other):
+            if a is b:
+                continue
+
             if self._get_eq_key(a) != self._get_eq_key(b):
                 return False
 
@@ -569,13 +710,22 @@ class LazilyUnpicklingListWithEqAndPersistentHashing(LazilyUnpicklingList):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def _pickle_item(self, obj):
+        if self.persistent_hash_key_getter is None:
+            if isinstance(obj, _PickledObjectWithEqKeyAndPersistentHashDigest):
+                return obj
+            return _PickledObjectWithEqKeyAndPersistentHashDigest(
+                    obj,
+                    self._get_eq_key(obj),
+                    _get_persistent_hash_digest(obj))
+        else:
+            return _PickledObjectWithEqAndPersistentHashKeys(
+                    obj,
+                    self._get_eq_key(obj),
+                    self._get_persistent_hash_key(obj))
+
     def __getstate__(self):
-        return {"_list": [
-                _PickledObjectWithEqAndPersistentHashKeys(
-                    val,
-                    self._get_eq_key(val),
-                    self._get_persistent_hash_key(val))
-                for val in self._list],
+        return {"_list": [self._pickle_item(val) for val in self._list],
                 "eq_key_getter": self.eq_key_getter,
                 "persistent_hash_key_getter": self.persistent_hash_key_getter}
 
@@ -64,9 +64,8 @@ def add_barrier(knl, insn_before="", insn_after="", id_based_on=None,
     else:
         id = knl.make_unique_instruction_id(based_on=id_based_on)
 
-    match = parse_match(insn_before)
-    insn_before_list = [insn.id for insn in knl.instructions if match(knl,
-                        insn)]
+    insn_before_list = parse_match(insn_before).get_matching_ids(
+            knl.get_instruction_match_index())
 
     barrier_to_add = BarrierInstruction(depends_on=frozenset(insn_before_list),
                                         depends_on_is_final=True,
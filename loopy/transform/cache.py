@@ -0,0 +1,401 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import sys
+import threading
+import six
+
+from functools import wraps
+from six.moves import cPickle as pickle
+
+import numpy as np
+
+from loopy.tools import LoopyKeyBuilder, PymbolicExpressionHashWrapper
+from loopy.version import DATA_MODEL_VERSION
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+Transformations decorated with :func:`memoize_transform` may store their
+results in a disk cache, keyed by their input kernel and (normalized)
+arguments. Since this amounts to additional disk traffic for every
+transformation step, it is opt-in: it is enabled by setting the
+``LOOPY_TRANSFORM_CACHE`` environment variable or by calling
+:func:`loopy.set_transform_caching_enabled`. It is also subject to
+:func:`loopy.set_caching_enabled`.
+
+The cache is invalidated whenever :data:`loopy.version.DATA_MODEL_VERSION`
+changes. Its size on disk is bounded by ``LOOPY_TRANSFORM_CACHE_MAX_SIZE``
+(in bytes, default 256 MiB), beyond which the least recently used entries
+are removed.
+
+.. currentmodule:: loopy.transform.cache
+
+.. autofunction:: memoize_transform
+
+.. autoclass:: TransformResultCache
+
+.. data:: transform_result_cache
+
+    The :class:`TransformResultCache` used by :func:`memoize_transform`.
+
+.. versionadded:: 2018.2
+"""
+
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+# {{{ bounded persistent cache
+
+def _remove_if_present(filename):
+    try:
+        os.unlink(filename)
+    except OSError:
+        pass
+
+
+class TransformResultCache(object):
+    """A cache of transformation results on disk whose total size is kept
+    below *max_size* bytes by removing the least recently used entries.
+
+    Each entry is stored in a file named by the hash of its key, which holds
+    the pickled key (to detect hash collisions) and value. Entry files are
+    written atomically, so that the cache may be shared among processes.
+    The modification time of an entry file records the last use of the
+    entry.
+
+    .. attribute:: hits
+    .. attribute:: misses
+
+    .. automethod:: fetch
+    .. automethod:: store
+    .. automethod:: store_if_not_present
+    .. automethod:: get_disk_usage
+    .. automethod:: prune
+    .. automethod:: clear
+    """
+
+    def __init__(self, identifier, key_builder=None, container_dir=None,
+            max_size=None):
+        self.identifier = identifier
+
+        if key_builder is None:
+            key_builder = LoopyKeyBuilder()
+
+        self.key_builder = key_builder
+
+        if container_dir is None:
+            import appdirs
+            container_dir = os.path.join(
+                    appdirs.user_cache_dir("loopy", "loopy"),
+                    "%s-py%d" % (identifier, sys.version_info[0]))
+
+        self.container_dir = container_dir
+
+        try:
+            os.makedirs(container_dir)
+        except OSError:
+            if not os.path.isdir(container_dir):
+                raise
+
+        if max_size is None:
+            max_size = int(os.environ.get(
+                "LOOPY_TRANSFORM_CACHE_MAX_SIZE", DEFAULT_MAX_SIZE))
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        # Lazily computed by get_disk_usage(), then updated incrementally.
+        self._disk_usage = None
+
+    def _entry_file(self, key):
+        return os.path.join(self.container_dir, self.key_builder(key))
+
+    def _get_entries(self):
+        """Return a list of ``(last_use, size, entry_file)`` tuples."""
+        from os.path import join, getsize, getmtime
+
+        result = []
+        for name in os.listdir(self.container_dir):
+            if name.startswith("."):
+                # entries being written
+                continue
+
+            entry_file = join(self.container_dir, name)
+            try:
+                result.append((getmtime(entry_file), getsize(entry_file),
+                    entry_file))
+            except OSError:
+                # removed concurrently
+                pass
+
+        return result
+
+    def get_disk_usage(self):
+        """Return the number of bytes occupied by the cache on disk."""
+        self._disk_usage = sum(size for _, size, _ in self._get_entries())
+        return self._disk_usage
+
+    def prune(self, max_size=None):
+        """Remove the least recently used entries until the cache occupies no
+        more than *max_size* (by default, :attr:`max_size`) bytes on disk.
+        """
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = sorted(self._get_entries())
+        disk_usage = sum(size for _, size, _ in entries)
+
+        for _, size, entry_file in entries:
+            if disk_usage <= max_size:
+                break
+
+            logger.debug("%s: pruning '%s'" % (self.identifier, entry_file))
+            _remove_if_present(entry_file)
+            disk_usage -= size
+
+        self._disk_usage = disk_usage
+
+    def fetch(self, key):
+        """Return the value stored for *key*. Raise :exc:`KeyError` if there
+        is none.
+        """
+        entry_file = self._entry_file(key)
+
+        try:
+            with open(entry_file, "rb") as inf:
+                stored_key, value = pickle.load(inf)
+        except (IOError, OSError):
+            self.misses += 1
+            raise KeyError(key)
+        except Exception as e:
+            logger.debug("%s: removing unreadable entry '%s' (%s)"
+                    % (self.identifier, entry_file, e))
+            _remove_if_present(entry_file)
+            self.misses += 1
+            raise KeyError(key)
+
+        if stored_key != key:
+            logger.debug("%s: hash collision on '%s'"
+                    % (self.identifier, entry_file))
+            self.misses += 1
+            raise KeyError(key)
+
+        self.hits += 1
+
+        # Mark the entry as recently used.
+        try:
+            os.utime(entry_file, None)
+        except OSError:
+            pass
+
+        return value
+
+    __getitem__ = fetch
+
+    def store(self, key, value, _skip_if_present=False):
+        """Store *value* for *key*, replacing any previously stored value."""
+        entry_file = self._entry_file(key)
+        if _skip_if_present and os.path.exists(entry_file):
+            return
+
+        data = pickle.dumps((key, value), pickle.HIGHEST_PROTOCOL)
+
+        from tempfile import mkstemp
+        fd, temp_file = mkstemp(prefix=".", dir=self.container_dir)
+        try:
+            with os.fdopen(fd, "wb") as outf:
+                outf.write(data)
+
+            os.rename(temp_file, entry_file)
+        except OSError:
+            # On Windows, renaming fails if the entry was stored concurrently.
+            _remove_if_present(temp_file)
+            if not os.path.exists(entry_file):
+                raise
+        except Exception:
+            _remove_if_present(temp_file)
+            raise
+
+        if self._disk_usage is None:
+            self.get_disk_usage()
+        else:
+            self._disk_usage += len(data)
+
+        if self._disk_usage > self.max_size:
+            self.prune()
+
+    def store_if_not_present(self, key, value):
+        """Store *value* for *key*, unless a value is already stored."""
+        self.store(key, value, _skip_if_present=True)
+
+    def clear(self):
+        """Remove all entries."""
+        for _, _, entry_file in self._get_entries():
+            _remove_if_present(entry_file)
+
+        self._disk_usage = 0
+
+
+transform_result_cache = TransformResultCache(
+        "loopy-transform-result-cache-v2-"+DATA_MODEL_VERSION,
+        key_builder=LoopyKeyBuilder())
+
+# }}}
+
+
+# {{{ argument normalization
+
+_kernel_key_builder = LoopyKeyBuilder()
+
+
+class _KernelHashKey(object):
+    def __init__(self, hexdigest):
+        self.hexdigest = hexdigest
+
+    def __eq__(self, other):
+        return (type(self) is type(other)
+                and self.hexdigest == other.hexdigest)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def update_persistent_hash(self, key_hash, key_builder):
+        key_builder.rec(key_hash, self.hexdigest)
+
+
+def _normalize_transform_argument(value):
+    from loopy.kernel import LoopKernel
+    from pymbolic.primitives import Expression
+
+    if isinstance(value, LoopKernel):
+        # Only store the kernel's hash in the key. Unpickling (and thereby
+        # re-parsing the domains of) a full kernel just for the collision
+        # check would cost about as much as loading the result.
+        return _KernelHashKey(_kernel_key_builder(value))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_normalize_transform_argument(v) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(_normalize_transform_argument(v) for v in value)
+    elif isinstance(value, dict):
+        return dict(
+                (k, _normalize_transform_argument(v))
+                for k, v in six.iteritems(value))
+    elif isinstance(value, type) and issubclass(value, np.generic):
+        return np.dtype(value)
+    elif isinstance(value, Expression):
+        return PymbolicExpressionHashWrapper(value)
+    else:
+        return value
+
+
+def _make_transform_cache_key(transform_id, arg_names, defaults, args, kwargs):
+    bound_args = dict(zip(arg_names, args))
+    bound_args.update(kwargs)
+
+    # Arguments left at their defaults are omitted, so that sentinel defaults
+    # (which are not picklable with identity intact) never enter the key.
+    return (transform_id, tuple(
+            (name, _normalize_transform_argument(value))
+            for name, value in sorted(six.iteritems(bound_args))
+            if not (name in defaults and value is defaults[name])))
+
+# }}}
+
+
+# {{{ memoize_transform
+
+# The number of memoized transformations currently running in this thread
+_nesting_state = threading.local()
+
+
+def memoize_transform(func):
+    """A decorator that makes the transformation *func* look up and store its
+    result in :data:`transform_result_cache`, if transform caching is enabled.
+
+    *func* must be deterministic in its arguments, and its arguments must be
+    hashable by :class:`loopy.tools.LoopyKeyBuilder` after normalization
+    (lists become tuples, :class:`loopy.LoopKernel` instances are replaced
+    by their persistent hash, :mod:`pymbolic` expressions are wrapped). Calls whose
+    arguments cannot be hashed are simply not cached. Transformations
+    invoked by another memoized transformation are not cached separately.
+    """
+    code = six.get_function_code(func)
+    arg_names = code.co_varnames[:code.co_argcount]
+
+    default_values = six.get_function_defaults(func) or ()
+    defaults = dict(zip(arg_names[len(arg_names)-len(default_values):],
+        default_values))
+
+    transform_id = "%s.%s" % (func.__module__, func.__name__)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        from loopy import CACHING_ENABLED, TRANSFORM_CACHING_ENABLED
+        nesting_level = getattr(_nesting_state, "level", 0)
+        if (not (CACHING_ENABLED and TRANSFORM_CACHING_ENABLED)
+                or nesting_level):
+            return func(*args, **kwargs)
+
+        cache_key = _make_transform_cache_key(
+                transform_id, arg_names, defaults, args, kwargs)
+
+        try:
+            transform_result_cache.key_builder(cache_key)
+        except TypeError as e:
+            logger.debug("%s: not caching, unhashable arguments (%s)"
+                    % (transform_id, e))
+            return func(*args, **kwargs)
+
+        try:
+            result = transform_result_cache[cache_key]
+            logger.debug("%s: transform cache hit" % transform_id)
+            return result
+        except KeyError:
+            pass
+
+        _nesting_state.level = nesting_level + 1
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _nesting_state.level = nesting_level
+
+        from loopy.kernel import LoopKernel
+        if isinstance(result, LoopKernel):
+            from loopy.preprocess import prepare_for_caching
+            transform_result_cache.store_if_not_present(
+                    cache_key, prepare_for_caching(result))
+
+        return result
+
+    return wrapper
+
+# }}}
+
+# vim: foldmethod=marker
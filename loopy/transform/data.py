@@ -25,6 +25,7 @@ THE SOFTWARE.
 import six  # noqa
 
 from loopy.diagnostic import LoopyError
+from loopy.transform.cache import memoize_transform
 from islpy import dim_type
 
 from loopy.kernel.data import ImageArg
@@ -140,6 +141,7 @@ class _not_provided:  # noqa: N801
     pass
 
 
+@memoize_transform
 def add_prefetch(kernel, var_name, sweep_inames=[], dim_arg_names=None,
 
         # "None" is a valid value here, distinct from the default.
@@ -29,6 +29,7 @@ import islpy as isl
 from islpy import dim_type
 
 from loopy.diagnostic import LoopyError
+from loopy.transform.cache import memoize_transform
 from pymbolic import var
 
 
@@ -287,6 +288,7 @@ def _fuse_two_kernels(knla, knlb):
 # }}}
 
 
+@memoize_transform
 def fuse_kernels(kernels, suffixes=None, data_flow=None):
     """Return a kernel that performs all the operations in all entries
     of *kernels*.
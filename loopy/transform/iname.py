@@ -33,6 +33,7 @@ from loopy.symbolic import (
         RuleAwareIdentityMapper, RuleAwareSubstitutionMapper,
         SubstitutionRuleMappingContext)
 from loopy.diagnostic import LoopyError
+from loopy.transform.cache import memoize_transform
 
 
 __doc__ = """
@@ -134,6 +135,9 @@ class _InameSplitter(RuleAwareIdentityMapper):
 
         self.replacement_index = replacement_index
 
+    def get_cache_key(self, expn_state):
+        return expn_state.get_cache_key(self.within)
+
     def map_reduction(self, expr, expn_state):
         if (self.split_iname in expr.inames
                 and self.split_iname not in expn_state.arg_context
@@ -306,6 +310,7 @@ def _split_iname_backend(kernel, split_iname,
 
 # {{{ split iname
 
+@memoize_transform
 def split_iname(kernel, split_iname, inner_length,
         outer_iname=None, inner_iname=None,
         outer_tag=None, inner_tag=None,
@@ -761,6 +766,9 @@ class _InameDuplicator(RuleAwareIdentityMapper):
         self.old_inames_set = set(six.iterkeys(old_to_new))
         self.within = within
 
+    def get_cache_key(self, expn_state):
+        return expn_state.get_cache_key(self.within)
+
     def map_reduction(self, expr, expn_state):
         if (set(expr.inames) & self.old_inames_set
                 and self.within(
@@ -1556,9 +1564,7 @@ def find_unused_axis_tag(kernel, kind, insn_match=None):
         if not found:
             raise LoopyError("invlaid tag kind: %s" % kind)
 
-    from loopy.match import parse_match
-    match = parse_match(insn_match)
-    insns = [insn for insn in kernel.instructions if match(kernel, insn)]
+    insns = kernel.get_instruction_match_index().find_instructions(insn_match)
 
     for insn in insns:
         for iname in kernel.insn_inames(insn):
@@ -1719,12 +1725,13 @@ def add_inames_to_insn(knl, inames, insn_match):
         raise TypeError("'inames' must be a frozenset")
 
     from loopy.match import parse_match
-    match = parse_match(insn_match)
+    insn_ids = parse_match(insn_match).get_matching_ids(
+            knl.get_instruction_match_index())
 
     new_instructions = []
 
     for insn in knl.instructions:
-        if match(knl, insn):
+        if insn.id in insn_ids:
             new_instructions.append(
                     insn.copy(within_inames=insn.within_inames | inames))
         else:
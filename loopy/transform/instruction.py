@@ -30,9 +30,7 @@ from loopy.diagnostic import LoopyError
 # {{{ find_instructions
 
 def find_instructions(kernel, insn_match):
-    from loopy.match import parse_match
-    match = parse_match(insn_match)
-    return [insn for insn in kernel.instructions if match(kernel, insn)]
+    return kernel.get_instruction_match_index().find_instructions(insn_match)
 
 # }}}
 
@@ -41,12 +39,13 @@ def find_instructions(kernel, insn_match):
 
 def map_instructions(kernel, insn_match, f):
     from loopy.match import parse_match
-    match = parse_match(insn_match)
+    insn_ids = parse_match(insn_match).get_matching_ids(
+            kernel.get_instruction_match_index())
 
     new_insns = []
 
     for insn in kernel.instructions:
-        if match(kernel, insn):
+        if insn.id in insn_ids:
             new_insns.append(f(insn))
         else:
             new_insns.append(insn)
@@ -56,6 +55,36 @@ def map_instructions(kernel, insn_match, f):
 # }}}
 
 
+# {{{ intern_expressions
+
+def intern_expressions(kernel, interner=None):
+    """Return *kernel* with the expressions in its instructions and
+    substitution rules replaced by equal ones in which identical
+    subexpressions are shared, reducing memory use and making comparing
+    and hashing them cheaper. Identity-type mappers (see
+    :class:`loopy.symbolic.IdentityMapper`) preserve this sharing in the
+    parts of the expressions they leave unchanged.
+
+    :arg interner: a :class:`loopy.symbolic.ExpressionInterner`, to share
+        subexpressions with other kernels. If not given, a new one is used.
+
+    .. versionadded:: 2018.2
+    """
+    if interner is None:
+        from loopy.symbolic import ExpressionInterner
+        interner = ExpressionInterner()
+
+    return kernel.copy(
+            instructions=[
+                insn.with_transformed_expressions(interner)
+                for insn in kernel.instructions],
+            substitutions=dict(
+                (name, rule.copy(expression=interner(rule.expression)))
+                for name, rule in six.iteritems(kernel.substitutions)))
+
+# }}}
+
+
 # {{{ set_instruction_priority
 
 def set_instruction_priority(kernel, insn_match, priority):
@@ -91,8 +120,9 @@ def add_dependency(kernel, insn_match, depends_on):
     if isinstance(depends_on, str) and depends_on in kernel.id_to_insn:
         added_deps = frozenset([depends_on])
     else:
-        added_deps = frozenset(
-                dep.id for dep in find_instructions(kernel, depends_on))
+        from loopy.match import parse_match
+        added_deps = parse_match(depends_on).get_matching_ids(
+                kernel.get_instruction_match_index())
 
     if not added_deps:
         raise LoopyError("no instructions found matching '%s' "
@@ -211,11 +241,12 @@ def replace_instruction_ids(kernel, replacements):
 
 def tag_instructions(kernel, new_tag, within=None):
     from loopy.match import parse_match
-    within = parse_match(within)
+    insn_ids = parse_match(within).get_matching_ids(
+            kernel.get_instruction_match_index())
 
     new_insns = []
     for insn in kernel.instructions:
-        if within(kernel, insn):
+        if insn.id in insn_ids:
             new_insns.append(
                     insn.copy(tags=insn.tags | frozenset([new_tag])))
         else:
@@ -0,0 +1,1155 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import six
+
+import islpy as isl
+from islpy import dim_type
+
+from pytools import memoize_on_first_arg
+from pymbolic.mapper import WalkMapper
+from pymbolic.primitives import Variable, Subscript
+
+from loopy.diagnostic import LoopyError
+from loopy.symbolic import pw_aff_to_expr
+from loopy.transform.cache import memoize_transform
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+.. currentmodule:: loopy
+
+.. autoclass:: iname_dependence_kind
+
+.. autofunction:: get_iname_dependence_kinds
+
+.. autofunction:: auto_parallelize
+
+.. autofunction:: parallelize_reduction
+
+.. autodata:: DETERMINISTIC_NCHUNKS
+"""
+
+
+class iname_dependence_kind:  # noqa
+    """How the instances of the instructions in a loop depend on each other
+    across iterations of the loop.
+
+    .. attribute:: PARALLEL
+
+        No dependences are carried by the loop. Its iterations may be
+        executed in any order or concurrently.
+
+    .. attribute:: REDUCTION
+
+        The only dependences carried by the loop are those of a reduction,
+        either expressed as one (see :class:`loopy.symbolic.Reduction`) or as
+        an instruction accumulating into a location that does not depend on
+        the loop, such as ``s = s + a[i]``.
+
+    .. attribute:: SEQUENTIAL
+
+        The loop may carry other dependences. Its iterations must be
+        executed in order.
+
+    .. versionadded:: 2018.2
+    """
+
+    PARALLEL = "parallel"
+    REDUCTION = "reduction"
+    SEQUENTIAL = "sequential"
+
+
+# {{{ access relations
+
+class _AccessCollector(WalkMapper):
+    def __init__(self, var_names):
+        self.var_names = var_names
+        self.accesses = []
+
+    def map_variable(self, expr):
+        if expr.name in self.var_names:
+            self.accesses.append((expr.name, ()))
+
+    def map_subscript(self, expr):
+        if (isinstance(expr.aggregate, Variable)
+                and expr.aggregate.name in self.var_names):
+            index = expr.index
+            if not isinstance(index, tuple):
+                index = (index,)
+            self.accesses.append((expr.aggregate.name, index))
+        else:
+            self.rec(expr.aggregate)
+
+        self.rec(expr.index)
+
+    def map_reduction(self, expr):
+        self.rec(expr.expr)
+
+    def map_type_cast(self, expr):
+        self.rec(expr.child)
+
+    def map_tagged_variable(self, expr):
+        self.map_variable(expr)
+
+    def map_linear_subscript(self, expr):
+        # accesses the whole array as far as this analysis is concerned
+        self.accesses.append((expr.aggregate.name, None))
+        self.rec(expr.index)
+
+
+class _Access(object):
+    """
+    .. attribute:: var_name
+    .. attribute:: index
+
+        A tuple of index expressions, or *None* if any element of the
+        variable may be accessed.
+
+    .. attribute:: is_write
+    """
+
+    def __init__(self, var_name, index, is_write):
+        self.var_name = var_name
+        self.index = index
+        self.is_write = is_write
+
+
+class _InstructionAccesses(object):
+    """
+    .. attribute:: insn
+    .. attribute:: inames
+
+        The inames of all loops around the accesses, including those of
+        reductions.
+
+    .. attribute:: domain
+
+        An :class:`islpy.Set` of the values of *inames*.
+
+    .. attribute:: accesses
+
+        A list of :class:`_Access` instances.
+    """
+
+    def __init__(self, kernel, insn):
+        from loopy.kernel.instruction import (
+                MultiAssignmentBase, CInstruction)
+
+        self.insn = insn
+        self.inames = sorted(insn.within_inames | insn.reduction_inames())
+
+        domain = kernel.get_inames_domain(frozenset(self.inames))
+        domain = domain.project_out_except(self.inames, [dim_type.set])
+        assumptions, domain = isl.align_two(kernel.assumptions, domain)
+        self.domain = domain & assumptions
+
+        # Variables that are never written cannot carry dependences.
+        var_names = (
+                set(kernel.temporary_variables)
+                | kernel.get_written_variables())
+
+        self.accesses = []
+
+        def add_accesses(expr, is_write):
+            collector = _AccessCollector(var_names)
+            collector(expr)
+            for var_name, index in collector.accesses:
+                self.accesses.append(_Access(var_name, index, is_write))
+
+        if isinstance(insn, MultiAssignmentBase):
+            for assignee in insn.assignees:
+                if isinstance(assignee, Subscript):
+                    add_accesses(assignee, is_write=True)
+                    add_accesses(assignee.index, is_write=False)
+                else:
+                    add_accesses(assignee, is_write=True)
+
+            add_accesses(insn.expression, is_write=False)
+            for pred in insn.predicates:
+                add_accesses(pred, is_write=False)
+
+        elif isinstance(insn, CInstruction):
+            for var_name in insn.assignee_var_names():
+                self.accesses.append(_Access(var_name, None, is_write=True))
+            for var_name in insn.read_dependency_names() & var_names:
+                self.accesses.append(_Access(var_name, None, is_write=False))
+
+        else:
+            for var_name in insn.assignee_var_names():
+                self.accesses.append(_Access(var_name, None, is_write=True))
+
+
+def _rename_set_dims(set_, prefix):
+    for i in range(set_.dim(dim_type.set)):
+        set_ = set_.set_dim_name(
+                dim_type.set, i, prefix + set_.get_dim_name(dim_type.set, i))
+    return set_
+
+
+def _substitute_inames(expr, inames, prefix):
+    from loopy.symbolic import SubstitutionMapper
+    from pymbolic.mapper.substitutor import make_subst_func
+    return SubstitutionMapper(make_subst_func(dict(
+        (iname, Variable(prefix + iname)) for iname in inames)))(expr)
+
+
+def _get_subscript_equality_set(space, index_a, index_b):
+    """Return the subset of *space* in which *index_a* and *index_b* refer to
+    the same element. Axes along which this cannot be determined are
+    assumed to possibly coincide.
+    """
+    from loopy.symbolic import pwaff_from_expr, with_aff_conversion_guard
+    from loopy.diagnostic import ExpressionToAffineConversionError
+
+    result = isl.Set.universe(space)
+    if index_a is None or index_b is None or len(index_a) != len(index_b):
+        return result
+
+    for idx_a, idx_b in zip(index_a, index_b):
+        try:
+            result = result & with_aff_conversion_guard(
+                    pwaff_from_expr, space, idx_a - idx_b,
+                    frozenset()).zero_set()
+        except ExpressionToAffineConversionError:
+            pass
+
+    return result
+
+
+def _get_index_params(kernel, accesses):
+    from loopy.symbolic import get_dependencies
+    from loopy.kernel.data import ValueArg
+
+    result = set()
+    for access in accesses:
+        if access.index is None:
+            continue
+        for dep in get_dependencies(access.index):
+            if isinstance(kernel.arg_dict.get(dep), ValueArg):
+                result.add(dep)
+    return result
+
+
+def _get_pair_conflict_set(kernel, ia_a, access_a, ia_b, access_b):
+    """Return an :class:`islpy.Set` of the pairs of instances of the
+    instructions of *ia_a* and *ia_b*, with inames prefixed by ``_lp_a_``
+    and ``_lp_b_``, respectively, for which *access_a* and *access_b* may
+    refer to the same element.
+    """
+    dom_a = _rename_set_dims(ia_a.domain, "_lp_a_")
+    dom_b = _rename_set_dims(ia_b.domain, "_lp_b_")
+
+    params = (
+            set(dom_a.get_var_names(dim_type.param))
+            | set(dom_b.get_var_names(dim_type.param))
+            | _get_index_params(kernel, [access_a, access_b]))
+
+    space = isl.Space.create_from_names(isl.DEFAULT_CONTEXT,
+            set=(
+                dom_a.get_var_names(dim_type.set)
+                + dom_b.get_var_names(dim_type.set)),
+            params=sorted(params))
+    template = isl.Set.universe(space)
+
+    result = (
+            isl.align_spaces(dom_a, template)
+            & isl.align_spaces(dom_b, template))
+
+    index_a = access_a.index
+    if index_a is not None:
+        index_a = _substitute_inames(index_a, ia_a.inames, "_lp_a_")
+    index_b = access_b.index
+    if index_b is not None:
+        index_b = _substitute_inames(index_b, ia_b.inames, "_lp_b_")
+
+    return result & _get_subscript_equality_set(space, index_a, index_b)
+
+
+def _carries_conflict(conflict_set, iname):
+    """Return whether *conflict_set* as returned by
+    :func:`_get_pair_conflict_set` contains pairs of instances in different
+    iterations of the loop over *iname*.
+    """
+    space = conflict_set.space
+    differ = (
+            isl.Set.universe(space).add_constraint(
+                isl.Constraint.ineq_from_names(space, {
+                    "_lp_b_" + iname: 1, "_lp_a_" + iname: -1, 1: -1}))
+            | isl.Set.universe(space).add_constraint(
+                isl.Constraint.ineq_from_names(space, {
+                    "_lp_a_" + iname: 1, "_lp_b_" + iname: -1, 1: -1})))
+
+    return not (conflict_set & differ).is_empty()
+
+# }}}
+
+
+# {{{ privatization
+
+def _get_touched_set(kernel, ia, access, iname):
+    """Return an :class:`islpy.Set` of the pairs of values of *iname* and
+    indices touched by *access*, or *None* if these are not known.
+    """
+    from loopy.symbolic import pwaff_from_expr, with_aff_conversion_guard
+    from loopy.diagnostic import ExpressionToAffineConversionError
+
+    if access.index is None:
+        return None
+
+    idx_names = ["_lp_idx%d" % i for i in range(len(access.index))]
+
+    space = isl.Space.create_from_names(isl.DEFAULT_CONTEXT,
+            set=ia.domain.get_var_names(dim_type.set) + idx_names,
+            params=sorted(
+                set(ia.domain.get_var_names(dim_type.param))
+                | _get_index_params(kernel, [access])))
+    domain = isl.align_spaces(ia.domain, isl.Set.universe(space))
+
+    try:
+        for idx_name, idx in zip(idx_names, access.index):
+            domain = domain & with_aff_conversion_guard(
+                    pwaff_from_expr, domain.space, Variable(idx_name) - idx,
+                    frozenset()).zero_set()
+    except ExpressionToAffineConversionError:
+        return None
+
+    return domain.project_out_except([iname] + idx_names, [dim_type.set])
+
+
+def _is_privatizable(kernel, var_name, iname, insn_accesses):
+    """Return whether each iteration of the loop over *iname* only reads
+    values of the temporary *var_name* that were written earlier in the same
+    iteration, so that the temporary may be private to the iteration.
+    """
+    from loopy.kernel.data import temp_var_scope
+
+    tv = kernel.temporary_variables.get(var_name)
+    if tv is None or tv.scope == temp_var_scope.GLOBAL:
+        return False
+
+    if tv.initializer is not None:
+        return False
+
+    users = [ia for ia in insn_accesses
+            if any(access.var_name == var_name for access in ia.accesses)]
+    if any(iname not in ia.inames for ia in users):
+        return False
+
+    dep_map = kernel.recursive_insn_dep_map()
+
+    for reader in users:
+        read_sets = []
+        for access in reader.accesses:
+            if access.var_name == var_name and not access.is_write:
+                read_sets.append(
+                        _get_touched_set(kernel, reader, access, iname))
+
+        if not read_sets:
+            continue
+
+        write_sets = []
+        for writer in users:
+            # Only unconditional writes cover the values read.
+            if (writer is reader
+                    or writer.insn.predicates
+                    or writer.insn.id not in dep_map[reader.insn.id]):
+                continue
+
+            for access in writer.accesses:
+                if access.var_name == var_name and access.is_write:
+                    write_sets.append(
+                            _get_touched_set(kernel, writer, access, iname))
+
+        if (not write_sets
+                or any(read_set is None for read_set in read_sets)
+                or any(write_set is None for write_set in write_sets)):
+            return False
+
+        written = write_sets[0]
+        for write_set in write_sets[1:]:
+            written = written | write_set
+
+        for read_set in read_sets:
+            read_set, written_aligned = isl.align_two(read_set, written)
+            if not read_set.is_subset(written_aligned):
+                return False
+
+    return True
+
+# }}}
+
+
+# {{{ dependence kinds
+
+def _is_accumulation(insn, var_name):
+    """Return whether *insn* has the form ``x = x + expr`` (or with ``*``,
+    ``max`` or ``min``), where *x* refers to *var_name* and *expr* does not
+    depend on *var_name*.
+    """
+    from loopy.kernel.instruction import Assignment
+    from loopy.symbolic import get_dependencies
+    from pymbolic.primitives import Sum, Product, Call
+
+    if not isinstance(insn, Assignment):
+        return False
+
+    assignee = insn.assignee
+    if isinstance(assignee, Subscript):
+        if assignee.aggregate.name != var_name:
+            return False
+    elif not (isinstance(assignee, Variable) and assignee.name == var_name):
+        return False
+
+    expr = insn.expression
+    if isinstance(expr, (Sum, Product)):
+        operands = expr.children
+    elif (isinstance(expr, Call)
+            and isinstance(expr.function, Variable)
+            and expr.function.name in ["max", "min"]):
+        operands = expr.parameters
+    else:
+        return False
+
+    others = list(operands)
+    if assignee not in others:
+        return False
+    others.remove(assignee)
+
+    return all(var_name not in get_dependencies(other) for other in others)
+
+
+@memoize_on_first_arg
+def _get_insn_accesses(kernel):
+    from loopy.kernel.instruction import NoOpInstruction, BarrierInstruction
+
+    return [_InstructionAccesses(kernel, insn)
+            for insn in kernel.instructions
+            if not isinstance(insn, (NoOpInstruction, BarrierInstruction))]
+
+
+def _get_iname_dependence_kind(kernel, iname, insn_accesses):
+    reduction_only = True
+    for ia in insn_accesses:
+        if iname in ia.insn.within_inames:
+            reduction_only = False
+
+    if reduction_only:
+        # only used in loopy reductions, which are handled by loopy
+        return iname_dependence_kind.REDUCTION
+
+    in_loop = [ia for ia in insn_accesses if iname in ia.insn.within_inames]
+
+    var_to_accesses = {}
+    for ia in in_loop:
+        for access in ia.accesses:
+            var_to_accesses.setdefault(access.var_name, []).append(
+                    (ia, access))
+
+    result = iname_dependence_kind.PARALLEL
+
+    for var_name, accesses in sorted(six.iteritems(var_to_accesses)):
+        if not any(access.is_write for _, access in accesses):
+            continue
+
+        conflicting_insns = set()
+        for i, (ia_a, access_a) in enumerate(accesses):
+            for ia_b, access_b in accesses[i:]:
+                if not (access_a.is_write or access_b.is_write):
+                    continue
+
+                conflict_set = _get_pair_conflict_set(
+                        kernel, ia_a, access_a, ia_b, access_b)
+                if _carries_conflict(conflict_set, iname):
+                    conflicting_insns.update([ia_a.insn.id, ia_b.insn.id])
+
+        if not conflicting_insns:
+            continue
+
+        if _is_privatizable(kernel, var_name, iname, in_loop):
+            continue
+
+        if len(conflicting_insns) == 1:
+            insn_id, = conflicting_insns
+            insn = kernel.id_to_insn[insn_id]
+            if (_is_accumulation(insn, var_name)
+                    and not any(
+                        access.var_name == var_name
+                        for ia in in_loop if ia.insn.id != insn_id
+                        for access in ia.accesses)):
+                result = iname_dependence_kind.REDUCTION
+                continue
+
+        logger.debug("%s: loop over '%s' carries dependences through '%s' "
+                "between instructions %s" % (kernel.name, iname, var_name,
+                    ", ".join(sorted(conflicting_insns))))
+        return iname_dependence_kind.SEQUENTIAL
+
+    return result
+
+
+def get_iname_dependence_kinds(kernel, inames=None):
+    """Determine which dependences between the instances of the instructions
+    of *kernel* are carried by the loops over each of *inames*. The read and
+    write accesses of each instruction are described by access relations
+    over its iteration domain, using :mod:`islpy`. A loop carries a
+    dependence if two instances in different iterations of the loop
+    may access the same element of a variable, at least one of them for
+    writing. Accesses whose indices are not affine are assumed to possibly
+    refer to any element.
+
+    Dependences through temporaries that are written in each iteration of
+    the loop before being read in it are not counted, since such temporaries
+    can be made private to the iteration.
+
+    :arg inames: an iterable of inames for which to determine the dependence
+        kind. Defaults to all inames of *kernel*.
+    :returns: a :class:`dict` mapping inames to one of the values in
+        :class:`iname_dependence_kind`.
+
+    .. versionadded:: 2018.2
+    """
+    if inames is None:
+        inames = kernel.all_inames()
+
+    insn_accesses = _get_insn_accesses(kernel)
+
+    return dict(
+            (iname, _get_iname_dependence_kind(kernel, iname, insn_accesses))
+            for iname in inames)
+
+# }}}
+
+
+# {{{ auto_parallelize
+
+@memoize_transform
+def auto_parallelize(kernel, max_axes=1, inames=None):
+    """Tag the outermost untagged inames whose loops carry no dependences
+    (see :func:`get_iname_dependence_kinds`) as group axes (``g.*``),
+    numbered after any group axes already in use. On the C target, these run
+    concurrently, see :class:`loopy.ExecutableCTarget`.
+
+    Only inames whose loops surround all instructions of *kernel* are
+    considered. Among these, an iname is considered to be further outside
+    if it comes first in a loop priority (see :func:`prioritize_loops`), if
+    the domains of other candidates depend on it, or if fewer array
+    accesses are contiguous along it, in this order.
+
+    :arg max_axes: the maximum number of inames to tag. Only group axis 0 is
+        split among workers on the C target.
+    :arg inames: if not *None*, an iterable of the inames that may be
+        tagged.
+
+    The tagged inames are logged at the ``INFO`` level.
+
+    .. versionadded:: 2018.2
+    """
+    from loopy.kernel.data import GroupIndexTag
+    from loopy.kernel.instruction import NoOpInstruction, BarrierInstruction
+
+    insns = [insn for insn in kernel.instructions
+            if not isinstance(insn, (NoOpInstruction, BarrierInstruction))]
+    if not insns:
+        return kernel
+
+    candidates = frozenset.intersection(
+            *[insn.within_inames for insn in insns])
+    if inames is not None:
+        if isinstance(inames, str):
+            inames = [s.strip() for s in inames.split(",") if s.strip()]
+        unknown_inames = set(inames) - kernel.all_inames()
+        if unknown_inames:
+            raise LoopyError("auto_parallelize: unknown inames: %s"
+                    % ", ".join(sorted(unknown_inames)))
+        candidates = candidates & frozenset(inames)
+
+    candidates = [iname for iname in sorted(candidates)
+            if not kernel.iname_tags(iname)]
+
+    kinds = get_iname_dependence_kinds(kernel, candidates)
+    candidates = [iname for iname in candidates
+            if kinds[iname] == iname_dependence_kind.PARALLEL]
+
+    if not candidates:
+        logger.info("%s: auto_parallelize: no parallel loops found"
+                % kernel.name)
+        return kernel
+
+    # {{{ find outermost candidates
+
+    def get_priority_rank(iname):
+        return min([
+            prio.index(iname)
+            for prio in kernel.loop_priority
+            if iname in prio] + [len(kernel.all_inames())])
+
+    def get_dependent_count(iname):
+        return sum(
+                1 for other in candidates
+                if iname in kernel.domains[
+                    kernel.get_home_domain_index(other)]
+                .get_var_dict(dim_type.param))
+
+    from loopy.transform.tiling import _get_contiguity_scores
+    contiguity = _get_contiguity_scores(kernel, insns, candidates)
+
+    candidates.sort(key=lambda iname: (
+        get_priority_rank(iname),
+        -get_dependent_count(iname),
+        contiguity[iname],
+        iname))
+
+    # }}}
+
+    used_axes = set()
+    for iname in kernel.all_inames():
+        for tag in kernel.iname_tags_of_type(iname, GroupIndexTag):
+            used_axes.add(tag.axis)
+
+    first_axis = max(used_axes) + 1 if used_axes else 0
+
+    new_tags = dict(
+            (iname, "g.%d" % (first_axis + i))
+            for i, iname in enumerate(candidates[:max_axes]))
+
+    logger.info("%s: auto_parallelize: tagging %s" % (kernel.name,
+        ", ".join("%s: %s" % (iname, new_tags[iname])
+            for iname in candidates[:max_axes])))
+
+    from loopy.transform.iname import tag_inames
+    return tag_inames(kernel, new_tags)
+
+# }}}
+
+
+# {{{ parallelize_reduction
+
+# The number of chunks into which reductions are split by
+# parallelize_reduction(deterministic=True) if not given.
+DETERMINISTIC_NCHUNKS = 64
+
+
+def _get_default_nchunks(kernel):
+    num_workers = getattr(kernel.target, "num_workers", None)
+    if num_workers:
+        return num_workers
+
+    import multiprocessing
+    return multiprocessing.cpu_count()
+
+
+def _make_chunk_domain(length, nchunks, chunk_iname, pos_iname):
+    """Return a domain of *length* points in *nchunks* chunks, in which
+    *chunk_iname* enumerates the chunks and *pos_iname* the points in each
+    chunk. The points are distributed among the chunks cyclically, as in
+    :func:`loopy.chunk_iname`, so that the domain remains affine. Their
+    position is given by :func:`_get_chunk_position`.
+    """
+    space = isl.Space.create_from_names(length.get_ctx(),
+            set=[chunk_iname, pos_iname],
+            params=length.get_var_names(dim_type.param))
+    affs = isl.affs_from_space(space)
+
+    length = isl.align_spaces(length, affs[0])
+    chunk = affs[chunk_iname]
+    pos = affs[pos_iname]
+
+    dom = (
+            affs[0].le_set(chunk)
+            & chunk.lt_set(affs[0] + nchunks)
+            & affs[0].le_set(pos)
+            & (chunk + nchunks*pos).lt_set(length)
+            ).coalesce()
+
+    basic_sets = dom.get_basic_sets()
+    if len(basic_sets) != 1:
+        raise LoopyError("extent '%s' leads to a non-convex domain when "
+                "split into chunks" % length)
+
+    return basic_sets[0]
+
+
+def _get_chunk_position(length, nchunks, chunk, pos):
+    """Return the position, in the range [0, *length*), of the point *pos* of
+    *chunk* in the domain returned by :func:`_make_chunk_domain`. Each chunk
+    covers a contiguous range of positions.
+    """
+    k0 = isl.Aff.zero_on_domain(length.domain().space)
+    chunk_ceil = pw_aff_to_expr(length.div(k0+nchunks).ceil())
+    chunk_floor = pw_aff_to_expr(length.div(k0+nchunks).floor())
+    chunk_mod = pw_aff_to_expr(length.mod_val(nchunks))
+
+    # min(chunk, chunk_mod), avoiding 'min', which plain C lacks for integers
+    from pymbolic.primitives import If, Comparison
+    long_chunks = If(Comparison(chunk, "<", chunk_mod), chunk, chunk_mod)
+
+    return (pos
+            + chunk_ceil * long_chunks
+            + chunk_floor * (chunk - long_chunks))
+
+
+def _get_iname_extent(kernel, iname):
+    """Return :mod:`pymbolic` expressions for the lower bound and the number
+    of values of *iname*, taken over all values of the other inames.
+    """
+    from loopy.isl_helpers import static_min_of_pw_aff, static_max_of_pw_aff
+
+    bounds = kernel.get_iname_bounds(iname, constants_only=False)
+    return (
+            pw_aff_to_expr(static_min_of_pw_aff(
+                bounds.lower_bound_pw_aff, constants_only=False)),
+            pw_aff_to_expr(static_max_of_pw_aff(
+                bounds.size, constants_only=False)))
+
+
+def _get_box_extent(kernel, iname):
+    """Return the lower bound and the number of values of *iname* as
+    :class:`islpy.PwAff` instances, making sure that these bounds do not
+    depend on other inames.
+    """
+    bounds = kernel.get_iname_bounds(iname, constants_only=False)
+    lower_bound = bounds.lower_bound_pw_aff
+    upper_bound = bounds.upper_bound_pw_aff
+
+    dom = kernel.get_inames_domain(frozenset([iname]))
+    dt, idx = dom.get_var_dict()[iname]
+
+    aff_zero = isl.Aff.zero_on_domain(dom.space)
+    aff_iname = aff_zero.set_coefficient_val(dim_type.in_, idx, 1)
+    box_dom = (
+            dom.eliminate(dt, idx, 1)
+            & isl.align_spaces(lower_bound, aff_zero).le_set(
+                isl.PwAff.from_aff(aff_iname))
+            & isl.PwAff.from_aff(aff_iname).le_set(
+                isl.align_spaces(upper_bound, aff_zero)))
+
+    if not (box_dom <= dom and dom <= box_dom):
+        raise LoopyError("domain '%s' is not box-shaped about iname "
+                "'%s', cannot split it into chunks" % (dom, iname))
+
+    return lower_bound, upper_bound - lower_bound + 1
+
+
+def _with_assignees(insn, assignees, expression, **kwargs):
+    from loopy.kernel.instruction import Assignment
+    if isinstance(insn, Assignment):
+        assignee, = assignees
+        return insn.copy(assignee=assignee, expression=expression, **kwargs)
+    else:
+        return insn.copy(assignees=assignees, expression=expression, **kwargs)
+
+
+def _substitute(expr, subst_map):
+    from pymbolic.mapper.substitutor import make_subst_func
+    from loopy.symbolic import SubstitutionMapper
+    return SubstitutionMapper(make_subst_func(subst_map))(expr)
+
+
+def _as_tuple(expr):
+    if isinstance(expr, tuple):
+        return expr
+    else:
+        return (expr,)
+
+
+def _strip_if_scalar(values):
+    if len(values) == 1:
+        return values[0]
+    else:
+        return tuple(values)
+
+
+@memoize_transform
+def parallelize_reduction(kernel, insn_id, iname=None, nchunks=None,
+        deterministic=False, chunk_tag="g.0"):
+    """Split the reduction or scan on the right-hand side of the instruction
+    *insn_id* into *nchunks* chunks, which are processed concurrently as
+    the iterations of a loop tagged *chunk_tag*. On
+    :class:`loopy.ExecutableCTarget`, these are distributed among the
+    workers.
+
+    For a reduction over *iname*, the partial results of the chunks are
+    stored in global temporaries and combined in order after a global
+    barrier. For a scan (a triangular reduction as understood by
+    :func:`loopy.realize_reduction` with *force_scan*) along the sweep iname
+    *iname*, the totals of the chunks are computed first. After a global
+    barrier, each chunk then scans its range, starting from the combined
+    totals of the preceding chunks.
+
+    Any :class:`loopy.library.reduction.ReductionOperation` is supported,
+    including those with multiple results such as ``argmax`` and
+    ``segmented(sum)``. The instruction with the reduction may be nested in
+    further loops (only for reductions), but must not have any other
+    expression around the reduction.
+
+    Global barriers order the partial results, the combination and the
+    instructions depending on the result, so all other global barriers of
+    the kernel need to be ordered with respect to these.
+
+    :arg iname: the reduction iname to split, or the sweep iname of a scan.
+        May be omitted if the reduction has a single iname, in which case a
+        scan is recognized automatically.
+    :arg nchunks: the number of chunks. Defaults to
+        :data:`DETERMINISTIC_NCHUNKS` if *deterministic*, and otherwise to
+        the number of workers of the target (or of processors).
+    :arg deterministic: Results are combined in the same order in each run,
+        and thus only depend on the number of chunks. If *True*, the number
+        of chunks defaults to a fixed value, so that the (floating point)
+        results are the same irrespective of the number of workers or
+        processors.
+    :arg chunk_tag: the iname tag (see :ref:`iname-tags`) of the loops over
+        the chunks.
+
+    .. versionadded:: 2018.2
+    """
+    from loopy.kernel.data import TemporaryVariable, temp_var_scope, auto
+    from loopy.kernel.instruction import (
+            MultiAssignmentBase, BarrierInstruction, make_assignment)
+    from loopy.symbolic import Reduction, get_dependencies
+    from pymbolic import var
+
+    insn = kernel.id_to_insn[insn_id]
+    if not (isinstance(insn, MultiAssignmentBase)
+            and isinstance(insn.expression, Reduction)):
+        raise LoopyError("right-hand side of instruction '%s' must be a "
+                "reduction" % insn_id)
+
+    red = insn.expression
+    if iname is None and len(red.inames) != 1:
+        raise LoopyError("reduction in instruction '%s' has several "
+                "inames, must specify which one to split" % insn_id)
+
+    if nchunks is None:
+        if deterministic:
+            nchunks = DETERMINISTIC_NCHUNKS
+        else:
+            nchunks = _get_default_nchunks(kernel)
+
+    from loopy.kernel.data import HardwareConcurrentTag
+    for outer_iname in insn.within_inames:
+        if kernel.iname_tags_of_type(outer_iname, HardwareConcurrentTag):
+            raise LoopyError("instruction '%s' is already within the "
+                    "parallel loop '%s'" % (insn_id, outer_iname))
+
+    # {{{ scan or reduction?
+
+    from loopy.preprocess import (
+            _try_infer_scan_candidate_from_expr,
+            _check_reduction_is_triangular)
+
+    scan_param = None
+    if iname is None:
+        # a reduction over a triangular domain within the iname it is
+        # bounded by is a scan, anything else is split as a reduction
+        try:
+            scan_param = _try_infer_scan_candidate_from_expr(
+                    kernel, red, kernel.insn_inames(insn))
+        except ValueError:
+            pass
+        else:
+            if (scan_param.sweep_iname in insn.within_inames
+                    and _check_reduction_is_triangular(
+                        kernel, red, scan_param)[0]):
+                iname = scan_param.sweep_iname
+            else:
+                scan_param = None
+
+        if scan_param is None:
+            iname, = red.inames
+
+    elif len(red.inames) == 1 and iname in insn.within_inames:
+        try:
+            scan_param = _try_infer_scan_candidate_from_expr(
+                    kernel, red, kernel.insn_inames(insn), sweep_iname=iname)
+        except ValueError as e:
+            raise LoopyError("reduction in instruction '%s' is not a scan "
+                    "along '%s': %s" % (insn_id, iname, e))
+
+        is_triangular, error = _check_reduction_is_triangular(
+                kernel, red, scan_param)
+        if not is_triangular:
+            raise LoopyError("reduction in instruction '%s' is not a scan "
+                    "along '%s': %s" % (insn_id, iname, error))
+
+    elif iname not in red.inames:
+        raise LoopyError("'%s' is neither an iname of the reduction in "
+                "instruction '%s' nor its sweep iname" % (iname, insn_id))
+
+    # }}}
+
+    vng = kernel.get_var_name_generator()
+    ing = kernel.get_instruction_id_generator()
+
+    var_names = insn.assignee_var_names()
+    nresults = len(var_names)
+    if nresults > 1 and not isinstance(red.expr, tuple):
+        raise LoopyError("arguments of the reduction in instruction '%s' "
+                "must be given as a tuple" % insn_id)
+
+    new_domains = list(kernel.domains)
+    new_temporary_variables = kernel.temporary_variables.copy()
+    new_insns = [other_insn for other_insn in kernel.instructions
+            if other_insn.id != insn_id]
+    new_tags = {}
+
+    def add_temporaries(suffix, shape, scope):
+        names = [vng("%s_%s" % (name, suffix)) for name in var_names]
+        for name in names:
+            new_temporary_variables[name] = TemporaryVariable(
+                    name=name, dtype=auto, shape=shape, scope=scope)
+        return names
+
+    def make_chunk_domain(length, suffix):
+        chunk_iname = vng("%s_chunk" % iname)
+        pos_iname = vng("%s_%s" % (iname, suffix))
+        new_domains.append(
+                _make_chunk_domain(length, nchunks, chunk_iname, pos_iname))
+        new_tags[chunk_iname] = chunk_tag
+        return chunk_iname, pos_iname
+
+    if scan_param is None:
+        # {{{ reduction: partial results, then combine
+
+        lower_bound, length = _get_box_extent(kernel, iname)
+        chunk_iname, pos_iname = make_chunk_domain(length, "inner")
+
+        # partial results are indexed by the surrounding loops
+        outer_inames = sorted(kernel.insn_inames(insn))
+        outer_extents = [_get_iname_extent(kernel, outer_iname)
+                for outer_iname in outer_inames]
+        outer_shape = tuple(size for _, size in outer_extents)
+
+        partial_names = add_temporaries("partial",
+                outer_shape + (nchunks,), temp_var_scope.GLOBAL)
+
+        outer_index = tuple(
+                var(outer_iname) - outer_lower_bound
+                for outer_iname, (outer_lower_bound, _) in zip(
+                    outer_inames, outer_extents))
+
+        chunk_expr = _substitute(red.expr, {
+            iname: pw_aff_to_expr(lower_bound) + _get_chunk_position(
+                length, nchunks, var(chunk_iname), var(pos_iname))})
+
+        partial_id = ing("%s_partial" % insn_id)
+        new_insns.append(make_assignment(
+            tuple(var(name)[outer_index + (var(chunk_iname),)]
+                for name in partial_names),
+            Reduction(red.operation,
+                tuple(red_iname if red_iname != iname else pos_iname
+                    for red_iname in red.inames),
+                chunk_expr, red.allow_simultaneous),
+            id=partial_id,
+            depends_on=insn.depends_on,
+            within_inames=insn.within_inames | frozenset([chunk_iname]),
+            predicates=insn.predicates))
+
+        barrier_id = ing("%s_barrier" % insn_id)
+        new_insns.append(BarrierInstruction(
+            id=barrier_id,
+            depends_on=frozenset([partial_id]),
+            synchronization_kind="global",
+            mem_kind="global"))
+
+        combine_iname = vng("%s_chunk" % iname)
+        new_domains.append(isl.BasicSet(
+            "{ [%s]: 0 <= %s < %d }" % (combine_iname, combine_iname, nchunks)))
+
+        new_insns.append(_with_assignees(insn, insn.assignees,
+            Reduction(red.operation, (combine_iname,),
+                _strip_if_scalar([
+                    var(name)[outer_index + (var(combine_iname),)]
+                    for name in partial_names]),
+                False),
+            depends_on=insn.depends_on | frozenset([partial_id, barrier_id])))
+
+        # The combination runs sequentially, so whatever uses its result
+        # belongs in a device program of its own.
+        if any(insn_id in other_insn.depends_on for other_insn in new_insns):
+            done_barrier_id = ing("%s_done_barrier" % insn_id)
+            new_insns = [
+                    other_insn.copy(
+                        depends_on=other_insn.depends_on
+                        | frozenset([done_barrier_id]))
+                    if insn_id in other_insn.depends_on
+                    else other_insn
+                    for other_insn in new_insns]
+            new_insns.append(BarrierInstruction(
+                id=done_barrier_id,
+                depends_on=frozenset([insn_id]),
+                synchronization_kind="global",
+                mem_kind="global"))
+
+        removed_inames = [iname]
+
+        # }}}
+
+    else:
+        # {{{ scan: chunk totals, then scans starting from the preceding totals
+
+        if scan_param.stride != 1:
+            raise LoopyError("scan in instruction '%s' has stride %d, only "
+                    "scans with stride 1 can be parallelized"
+                    % (insn_id, scan_param.stride))
+
+        sweep_iname = scan_param.sweep_iname
+        scan_iname = scan_param.scan_iname
+
+        if kernel.insn_inames(insn) != frozenset([sweep_iname]):
+            raise LoopyError("scan in instruction '%s' must not be nested "
+                    "in loops other than over '%s'" % (insn_id, sweep_iname))
+        if sweep_iname in get_dependencies(red.expr):
+            raise LoopyError("arguments of the scan in instruction '%s' must "
+                    "not depend on the sweep iname '%s'"
+                    % (insn_id, sweep_iname))
+
+        length = scan_param.sweep_upper_bound - scan_param.sweep_lower_bound + 1
+        sweep_lower_bound = pw_aff_to_expr(scan_param.sweep_lower_bound)
+        scan_lower_bound = pw_aff_to_expr(scan_param.scan_lower_bound)
+
+        def chunk_args(chunk_iname, pos_iname):
+            return _substitute(red.expr, {
+                scan_iname: scan_lower_bound + _get_chunk_position(
+                    length, nchunks, var(chunk_iname), var(pos_iname))})
+
+        # {{{ totals of the chunks
+
+        total_chunk_iname, total_pos_iname = make_chunk_domain(
+                length, "total")
+        total_names = add_temporaries("total", (nchunks,),
+                temp_var_scope.GLOBAL)
+
+        total_id = ing("%s_total" % insn_id)
+        new_insns.append(make_assignment(
+            tuple(var(name)[var(total_chunk_iname)] for name in total_names),
+            Reduction(red.operation, (total_pos_iname,),
+                chunk_args(total_chunk_iname, total_pos_iname),
+                red.allow_simultaneous),
+            id=total_id,
+            depends_on=insn.depends_on,
+            within_inames=frozenset([total_chunk_iname]),
+            predicates=insn.predicates))
+
+        barrier_id = ing("%s_barrier" % insn_id)
+        new_insns.append(BarrierInstruction(
+            id=barrier_id,
+            depends_on=frozenset([total_id]),
+            synchronization_kind="global",
+            mem_kind="global"))
+
+        # }}}
+
+        chunk_iname, pos_iname = make_chunk_domain(length, "inner")
+
+        # {{{ combined totals of the preceding chunks
+
+        prev_chunk_iname = vng("%s_prev" % chunk_iname)
+        new_domains.append(isl.BasicSet(
+            "[%(chunk)s] -> { [%(prev)s]: 0 <= %(prev)s < %(chunk)s }"
+            % dict(chunk=chunk_iname, prev=prev_chunk_iname)))
+
+        offset_names = add_temporaries("offset", (), temp_var_scope.PRIVATE)
+        offset_id = ing("%s_offset" % insn_id)
+        new_insns.append(make_assignment(
+            tuple(var(name) for name in offset_names),
+            Reduction(red.operation, (prev_chunk_iname,),
+                _strip_if_scalar([
+                    var(name)[var(prev_chunk_iname)] for name in total_names]),
+                False),
+            id=offset_id,
+            depends_on=frozenset([total_id, barrier_id]),
+            within_inames=frozenset([chunk_iname])))
+
+        # }}}
+
+        # {{{ scans of the chunks
+
+        chunk_scan_iname = vng("%s_%s" % (scan_iname, "inner"))
+        new_domains.append(isl.BasicSet(
+            "[%(pos)s] -> { [%(scan)s]: 0 <= %(scan)s <= %(pos)s }"
+            % dict(pos=pos_iname, scan=chunk_scan_iname)))
+
+        chunk_scan_names = add_temporaries("chunk_scan", (),
+                temp_var_scope.PRIVATE)
+        chunk_scan_id = ing("%s_chunk_scan" % insn_id)
+        new_insns.append(make_assignment(
+            tuple(var(name) for name in chunk_scan_names),
+            Reduction(red.operation, (chunk_scan_iname,),
+                chunk_args(chunk_iname, chunk_scan_iname),
+                red.allow_simultaneous),
+            id=chunk_scan_id,
+            depends_on=frozenset([barrier_id]),
+            within_inames=frozenset([chunk_iname, pos_iname]),
+            predicates=insn.predicates))
+
+        # }}}
+
+        offsets = tuple(var(name) for name in offset_names)
+        chunk_scans = tuple(var(name) for name in chunk_scan_names)
+        if nresults == 1:
+            offsets, = offsets
+            chunk_scans, = chunk_scans
+
+        sweep_index = sweep_lower_bound + _get_chunk_position(
+                length, nchunks, var(chunk_iname), var(pos_iname))
+        new_insns.append(_with_assignees(insn,
+            tuple(_substitute(assignee, {sweep_iname: sweep_index})
+                for assignee in insn.assignees),
+            red.operation(None, offsets, chunk_scans),
+            depends_on=insn.depends_on | frozenset([offset_id, chunk_scan_id]),
+            within_inames=frozenset([chunk_iname, pos_iname])))
+
+        removed_inames = [sweep_iname, scan_iname]
+
+        # }}}
+
+    kernel = kernel.copy(
+            domains=new_domains,
+            instructions=new_insns,
+            temporary_variables=new_temporary_variables)
+
+    from loopy.transform.iname import (
+            tag_inames, remove_unused_inames, duplicate_inames)
+    kernel = tag_inames(kernel, new_tags)
+    kernel = remove_unused_inames(kernel, removed_inames)
+
+    if scan_param is None and outer_inames:
+        # The loops around the partial results and around the combination
+        # are separated by the barrier.
+        kernel = duplicate_inames(kernel, outer_inames,
+                within="id:%s" % partial_id)
+
+    if scan_param is not None:
+        from loopy.preprocess import realize_reduction
+        kernel = realize_reduction(kernel, insn_id_filter=chunk_scan_id,
+                force_scan=True, force_outer_iname_for_scan=pos_iname)
+
+    return kernel
+
+# }}}
+
+# vim: foldmethod=marker
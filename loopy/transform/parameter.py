@@ -27,6 +27,8 @@ import six
 from loopy.symbolic import (RuleAwareSubstitutionMapper,
         SubstitutionRuleMappingContext)
 import islpy as isl
+import numpy as np
+from loopy.diagnostic import LoopyError
 
 __doc__ = """
 
@@ -35,6 +37,10 @@ __doc__ = """
 .. autofunction:: fix_parameters
 
 .. autofunction:: assume
+
+.. autofunction:: make_multiversioned_kernel
+
+.. autoclass:: MultiVersionedKernel
 """
 
 
@@ -149,4 +155,163 @@ def fix_parameters(kernel, **value_dict):
 
 # }}}
 
+
+# {{{ multi-versioning
+
+def _is_aligned(ary, alignment):
+    if isinstance(ary, np.ndarray):
+        return ary.ctypes.data % alignment == 0
+
+    # e.g. pyopencl.array.Array, whose buffers are allocated aligned
+    offset = getattr(ary, "offset", None)
+    if offset is not None:
+        return offset % alignment == 0
+
+    return False
+
+
+class MultiVersionedKernel(object):
+    """A callable that dispatches to the first of several variants of a
+    kernel whose conditions hold for the arguments of each call. Created by
+    :func:`make_multiversioned_kernel`.
+
+    .. attribute:: variants
+
+        A list of tuples ``(assumptions, alignments, kernel)``, where
+        *assumptions* is a parameter-only :class:`islpy.BasicSet` and
+        *alignments* maps argument names to alignments in bytes. The last
+        entry is the generic kernel, without any conditions.
+
+    .. automethod:: select_variant
+    .. automethod:: __call__
+
+    .. versionadded:: 2018.2
+    """
+
+    def __init__(self, variants):
+        self.variants = variants
+
+        generic_kernel = variants[-1][2]
+        self.param_names = generic_kernel.outer_params()
+
+        # where to find parameters that are not passed explicitly
+        from pymbolic.primitives import Variable
+        self.param_to_shape_axes = {}
+        for arg in generic_kernel.args:
+            for iaxis, shape_entry in enumerate(getattr(arg, "shape", None) or ()):
+                if (isinstance(shape_entry, Variable)
+                        and shape_entry.name in self.param_names):
+                    self.param_to_shape_axes.setdefault(
+                            shape_entry.name, []).append((arg.name, iaxis))
+
+    @property
+    def generic_kernel(self):
+        return self.variants[-1][2]
+
+    def get_param_values(self, kwargs):
+        result = {}
+        for name in self.param_names:
+            if name in kwargs:
+                result[name] = kwargs[name]
+            else:
+                for arg_name, iaxis in self.param_to_shape_axes.get(name, []):
+                    ary = kwargs.get(arg_name)
+                    if ary is not None:
+                        result[name] = ary.shape[iaxis]
+                        break
+
+        return result
+
+    def select_variant(self, kwargs):
+        """Return the index into :attr:`variants` of the kernel that is to be
+        used for a call with the keyword arguments *kwargs*.
+        """
+        param_values = self.get_param_values(kwargs)
+
+        for i, (assumptions, alignments, kernel) in enumerate(
+                self.variants[:-1]):
+            if not all(
+                    name in kwargs and _is_aligned(kwargs[name], alignment)
+                    for name, alignment in six.iteritems(alignments)):
+                continue
+
+            holds = True
+            for name, (dt, idx) in six.iteritems(assumptions.get_var_dict()):
+                if name not in param_values:
+                    holds = False
+                    break
+                assumptions = assumptions.fix_val(
+                        dt, idx, int(param_values[name]))
+
+            if holds and not assumptions.is_empty():
+                return i
+
+        return len(self.variants) - 1
+
+    def __call__(self, *args, **kwargs):
+        """Call the applicable variant with *args* and *kwargs*."""
+        _, _, kernel = self.variants[self.select_variant(kwargs)]
+        return kernel(*args, **kwargs)
+
+
+def make_multiversioned_kernel(kernel, variants, transform=None):
+    """Return a :class:`MultiVersionedKernel` that runs a variant of
+    *kernel* specialized for stronger assumptions whenever these hold for
+    the arguments at runtime, and *kernel* itself otherwise. This allows,
+    e.g., loops split with :func:`split_iname` to run without remainder
+    handling in the common case.
+
+    :arg variants: a list of variant conditions, ordered by preference.
+        Each entry is a string of assumptions about :ref:`domain-parameters`
+        as understood by :func:`assume` (e.g. ``"n mod 16 = 0"``),
+        or a tuple ``(assumptions, alignments)`` where *alignments* maps
+        names of array arguments to a required alignment in bytes of the
+        passed array, which is recorded in :attr:`ArrayBase.alignment`.
+        *assumptions* may be *None* in this form.
+    :arg transform: if given, a function that is applied to each variant,
+        including the generic one, after its assumptions have been added.
+    """
+
+    if transform is None:
+        def transform(knl):
+            return knl
+
+    result = []
+    for variant in variants:
+        if isinstance(variant, tuple):
+            assumptions, alignments = variant
+        else:
+            assumptions, alignments = variant, {}
+
+        variant_knl = kernel
+        if assumptions is not None:
+            variant_knl = assume(variant_knl, assumptions)
+
+        if alignments:
+            arg_dict = variant_knl.arg_dict
+            for name in alignments:
+                if name not in arg_dict or not hasattr(arg_dict[name], "shape"):
+                    raise LoopyError("cannot require alignment of '%s': "
+                            "no such array argument" % name)
+
+            variant_knl = variant_knl.copy(args=[
+                arg.copy(alignment=alignments[arg.name])
+                if arg.name in alignments else arg
+                for arg in variant_knl.args])
+
+        variant_knl = variant_knl.copy(
+                name="%s_v%d" % (kernel.name, len(result)))
+
+        result.append((
+            variant_knl.assumptions.params(),
+            alignments,
+            transform(variant_knl)))
+
+    result.append((None, {}, transform(kernel)))
+
+    return MultiVersionedKernel(result)
+
+# }}}
+
+
 # vim: foldmethod=marker
@@ -30,6 +30,7 @@ from loopy.symbolic import (get_dependencies,
         RuleAwareIdentityMapper, RuleAwareSubstitutionMapper,
         SubstitutionRuleMappingContext)
 from loopy.diagnostic import LoopyError
+from loopy.transform.cache import memoize_transform
 from pymbolic.mapper.substitutor import make_subst_func
 import numpy as np
 
@@ -258,6 +259,7 @@ class _not_provided(object):  # noqa: N801
     pass
 
 
+@memoize_transform
 def precompute(kernel, subst_use, sweep_inames=[], within=None,
         storage_axes=None, temporary_name=None, precompute_inames=None,
         precompute_outer_inames=None,
@@ -24,6 +24,7 @@ THE SOFTWARE.
 
 
 from loopy.diagnostic import LoopyError
+from loopy.transform.cache import memoize_transform
 import loopy as lp
 import six
 
@@ -33,8 +34,6 @@ from loopy.schedule import (
             EnterLoop, LeaveLoop, RunInstruction,
             CallKernel, ReturnFromKernel, Barrier)
 
-from loopy.schedule.tools import get_block_boundaries
-
 
 import logging
 logger = logging.getLogger(__name__)
@@ -49,15 +48,36 @@ __doc__ = """
 
 # {{{ liveness analysis
 
-class LivenessResult(dict):
+class LivenessResult(object):
+    """Maps schedule indices to :class:`InstructionResult` instances. The
+    live variables are stored as bitsets with respect to :attr:`var_index`
+    and only converted to sets of names upon lookup.
+    """
 
     class InstructionResult(Record):
         __slots__ = ["live_in", "live_out"]
 
-    @classmethod
-    def make_empty(cls, nscheditems):
-        return cls((idx, cls.InstructionResult(live_in=set(), live_out=set()))
-                   for idx in range(nscheditems))
+    def __init__(self, var_index, live_in, live_out):
+        self.var_index = var_index
+        self.live_in_bitsets = live_in
+        self.live_out_bitsets = live_out
+        self._results = {}
+
+    def __len__(self):
+        return len(self.live_in_bitsets)
+
+    def __getitem__(self, sched_idx):
+        try:
+            return self._results[sched_idx]
+        except KeyError:
+            pass
+
+        result = self.InstructionResult(
+                live_in=self.var_index.to_names(self.live_in_bitsets[sched_idx]),
+                live_out=self.var_index.to_names(
+                    self.live_out_bitsets[sched_idx]))
+        self._results[sched_idx] = result
+        return result
 
 
 class LivenessAnalysis(object):
@@ -68,57 +88,37 @@ class LivenessAnalysis(object):
 
     @memoize_method
     def get_successor_relation(self):
-        successors = {}
-        block_bounds = get_block_boundaries(self.kernel.schedule)
-
-        for idx, (item, next_item) in enumerate(zip(
-                reversed(self.schedule),
-                reversed(self.schedule + [None]))):
-            sched_idx = len(self.schedule) - idx - 1
-
-            # Look at next_item
-            if next_item is None:
-                after = set()
-            elif isinstance(next_item, EnterLoop):
-                # Account for empty loop
-                loop_end = block_bounds[sched_idx + 1]
-                after = successors[loop_end] | set([sched_idx + 1])
-            elif isinstance(next_item, (LeaveLoop, RunInstruction,
-                    CallKernel, ReturnFromKernel, Barrier)):
-                after = set([sched_idx + 1])
-            else:
-                raise LoopyError("unexpected type of schedule item: {ty}"
-                    .format(ty=type(next_item).__name__))
+        from loopy.schedule.dataflow import get_schedule_successors
+        return get_schedule_successors(self.schedule)
 
-            # Look at item
-            if isinstance(item, LeaveLoop):
-                # Account for loop
-                loop_begin = block_bounds[sched_idx]
-                after |= set([loop_begin])
-            elif not isinstance(item, (EnterLoop, RunInstruction,
-                    CallKernel, ReturnFromKernel, Barrier)):
-                raise LoopyError("unexpected type of schedule item: {ty}"
-                    .format(ty=type(item).__name__))
-
-            successors[sched_idx] = after
-
-        return successors
+    @memoize_method
+    def get_var_index(self):
+        from loopy.schedule.dataflow import BitsetIndex
+        return BitsetIndex(sorted(self.kernel.temporary_variables))
 
     def get_gen_and_kill_sets(self):
-        gen = dict((idx, set()) for idx in range(len(self.schedule)))
-        kill = dict((idx, set()) for idx in range(len(self.schedule)))
+        """Return a tuple ``(gen, kill)`` of lists containing a bitset (with
+        respect to :meth:`get_var_index`) for each schedule item.
+        """
+        var_index = self.get_var_index()
+        name_to_bit = var_index.name_to_bit
+        temporary_variables = self.kernel.temporary_variables
+
+        gen = [0] * len(self.schedule)
+        kill = [0] * len(self.schedule)
 
         for sched_idx, sched_item in enumerate(self.schedule):
             if not isinstance(sched_item, RunInstruction):
                 continue
             insn = self.kernel.id_to_insn[sched_item.insn_id]
             for var in insn.assignee_var_names():
-                if var not in self.kernel.temporary_variables:
+                if var not in temporary_variables:
                     continue
+                bit = 1 << name_to_bit[var]
                 if not insn.predicates:
                     # Fully kills the liveness only when unconditional.
-                    kill[sched_idx].add(var)
-                if len(self.kernel.temporary_variables[var].shape) > 0:
+                    kill[sched_idx] |= bit
+                if len(temporary_variables[var].shape) > 0:
                     # For an array variable, all definitions generate a use as
                     # well, because the write could be a partial write,
                     # necessitating a reload of whatever is not written.
@@ -126,36 +126,26 @@ class LivenessAnalysis(object):
                     # We don't currently check if the write is a partial write
                     # or a full write. Instead, we analyze the access
                     # footprint later on to determine how much to reload/save.
-                    gen[sched_idx].add(var)
+                    gen[sched_idx] |= bit
             for var in insn.read_dependency_names():
-                if var not in self.kernel.temporary_variables:
+                if var not in temporary_variables:
                     continue
-                gen[sched_idx].add(var)
+                gen[sched_idx] |= 1 << name_to_bit[var]
 
         return gen, kill
 
     @memoize_method
     def liveness(self):
         logger.info("running liveness analysis")
-        successors = self.get_successor_relation()
         gen, kill = self.get_gen_and_kill_sets()
 
-        # Fixed point iteration for liveness analysis
-        lr = LivenessResult.make_empty(len(self.schedule))
-
-        prev_lr = None
-
-        while prev_lr != lr:
-            from copy import deepcopy
-            prev_lr = deepcopy(lr)
-            for idx in range(len(self.schedule) - 1, -1, -1):
-                for succ in successors[idx]:
-                    lr[idx].live_out.update(lr[succ].live_in)
-                lr[idx].live_in = gen[idx] | (lr[idx].live_out - kill[idx])
+        from loopy.schedule.dataflow import solve_gen_kill_problem
+        live_out, live_in = solve_gen_kill_problem(
+                self.get_successor_relation(), gen, kill, backward=True)
 
         logger.info("done running liveness analysis")
 
-        return lr
+        return LivenessResult(self.get_var_index(), live_in, live_out)
 
     def print_liveness(self):
         print(75 * "-")
@@ -722,6 +712,7 @@ class TemporarySaver(object):
 
 # {{{ auto save and reload across kernel calls
 
+@memoize_transform
 def save_and_reload_temporaries(knl):
     """
     Add instructions to save and reload temporary variables that are live
@@ -0,0 +1,313 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import six
+
+from loopy.diagnostic import LoopyError
+from loopy.transform.cache import memoize_transform
+from loopy.kernel.data import temp_var_scope
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+.. currentmodule:: loopy
+
+.. autofunction:: reuse_temporary_storage
+
+.. autofunction:: get_temporary_storage_footprint
+"""
+
+
+# {{{ storage footprint
+
+def get_temporary_storage_footprint(kernel):
+    """Return a :class:`dict` mapping each :class:`loopy.temp_var_scope` value
+    to the number of bytes of storage taken up by the temporaries of *kernel*
+    in that scope, where temporaries sharing a
+    :attr:`loopy.TemporaryVariable.base_storage` are counted once, with the
+    size of the largest of them. Temporaries whose size is not a constant are
+    not counted.
+
+    .. versionadded:: 2018.2
+    """
+    result = {}
+    base_storage_to_nbytes = {}
+
+    for tv in six.itervalues(kernel.temporary_variables):
+        nbytes = tv.nbytes
+        if not isinstance(nbytes, six.integer_types):
+            continue
+
+        if tv.base_storage is None:
+            result[tv.scope] = result.get(tv.scope, 0) + nbytes
+        else:
+            key = (tv.scope, tv.base_storage)
+            base_storage_to_nbytes[key] = max(
+                    base_storage_to_nbytes.get(key, 0), nbytes)
+
+    for (scope, _), nbytes in six.iteritems(base_storage_to_nbytes):
+        result[scope] = result.get(scope, 0) + nbytes
+
+    return result
+
+# }}}
+
+
+# {{{ occupancy analysis
+
+def _get_occupancy(kernel, var_index, scope_bitsets):
+    """Return a list containing, for each schedule item, a bitset of the
+    temporaries that may hold data needed later while the item executes.
+    """
+    from loopy.schedule import (
+            RunInstruction, Barrier, CallKernel, ReturnFromKernel)
+    from loopy.schedule.dataflow import (
+            get_schedule_successors, solve_gen_kill_problem)
+
+    schedule = kernel.schedule
+    nitems = len(schedule)
+    name_to_bit = var_index.name_to_bit
+
+    reads = [0] * nitems
+    writes = [0] * nitems
+    full_writes = [0] * nitems
+
+    for sched_idx, sched_item in enumerate(schedule):
+        if not isinstance(sched_item, RunInstruction):
+            continue
+
+        insn = kernel.id_to_insn[sched_item.insn_id]
+        for var in insn.read_dependency_names():
+            if var in name_to_bit:
+                reads[sched_idx] |= 1 << name_to_bit[var]
+        for var in insn.assignee_var_names():
+            if var in name_to_bit:
+                bit = 1 << name_to_bit[var]
+                writes[sched_idx] |= bit
+
+                # Writes to arrays may be partial, so only unconditional
+                # writes to scalars end the lifetime of the previous value.
+                if (not insn.predicates
+                        and kernel.temporary_variables[var].shape == ()):
+                    full_writes[sched_idx] |= bit
+
+    successors = get_schedule_successors(schedule)
+
+    # Storage is occupied where a value has been written and may still be
+    # read.
+    reached_before, reached_after = solve_gen_kill_problem(
+            successors, writes, [0] * nitems, backward=False)
+    needed_after, needed_before = solve_gen_kill_problem(
+            successors, reads, full_writes, backward=True)
+
+    # All temporaries accessed by an instruction occupy storage at the same
+    # time, since the instruction may be executed for several values of
+    # its (e.g. parallel or unrolled) inames at once.
+    occupancy = [
+            (reached_before[i] & needed_before[i])
+            | (reached_after[i] & needed_after[i])
+            | reads[i] | writes[i]
+            for i in range(nitems)]
+
+    # Local memory is shared among the work items of a group, which may be
+    # at different points of the schedule between two barriers. So local
+    # temporaries occupy storage from their previous to their next barrier.
+    local_bits = scope_bitsets.get(temp_var_scope.LOCAL, 0)
+    if local_bits:
+        local_occupancy = [occ & local_bits for occ in occupancy]
+        sync = [
+                var_index.universe
+                if isinstance(sched_item, (
+                    Barrier, CallKernel, ReturnFromKernel))
+                else 0
+                for sched_item in schedule]
+
+        _, since_barrier = solve_gen_kill_problem(
+                successors, local_occupancy, sync, backward=False)
+        _, until_barrier = solve_gen_kill_problem(
+                successors, local_occupancy, sync, backward=True)
+
+        occupancy = [
+                occupancy[i]
+                | ((since_barrier[i] | until_barrier[i]) & local_bits)
+                for i in range(nitems)]
+
+    return occupancy
+
+
+def _get_interference(var_index, occupancy):
+    interference = [0] * len(var_index)
+
+    for bitset in set(occupancy):
+        remaining = bitset
+        while remaining:
+            lowest = remaining & -remaining
+            bit = lowest.bit_length() - 1
+            interference[bit] |= bitset
+            remaining ^= lowest
+
+    return interference
+
+# }}}
+
+
+# {{{ reuse temporary storage
+
+def _is_candidate(tv):
+    return (
+            tv.scope in (temp_var_scope.PRIVATE, temp_var_scope.LOCAL)
+            and tv.base_storage is None
+            and tv.initializer is None
+            and not tv.read_only
+            and isinstance(tv.nbytes, six.integer_types))
+
+
+@memoize_transform
+def reuse_temporary_storage(kernel, base_name_prefix="temp_storage",
+        allow_mixed_dtypes=False):
+    """Return a kernel in which private and local temporaries whose lifetimes
+    do not overlap share storage, through a common
+    :attr:`loopy.TemporaryVariable.base_storage`. This reduces the amount of
+    local and private memory needed, cf. :func:`alias_temporaries`, which
+    does so for a given set of temporaries.
+
+    *kernel* must be scheduled. A temporary is considered live from its
+    first write until the last read that may observe that write. Since
+    local memory is shared among work items, the lifetime of local
+    temporaries is extended up to the surrounding barriers. Only temporaries
+    used in a single subkernel, with a constant size, without an
+    initializer and without a base storage of their own are considered.
+    Global temporaries are left alone, since they are allocated separately
+    by the host code.
+
+    :arg base_name_prefix: the prefix for the names of the shared storage
+        arrays.
+    :arg allow_mixed_dtypes: whether temporaries of different types may share
+        storage. The shared storage array is aligned for the most strictly
+        aligned of them.
+
+    The reduction in the number of bytes of temporary storage (see
+    :func:`get_temporary_storage_footprint`) is logged at the ``INFO``
+    level.
+
+    .. versionadded:: 2018.2
+    """
+    if kernel.schedule is None:
+        raise LoopyError("reuse_temporary_storage requires a scheduled kernel")
+
+    from loopy.kernel.tools import get_subkernel_to_insn_id_map
+    from loopy.schedule.dataflow import BitsetIndex
+
+    # {{{ find candidates
+
+    temp_to_subkernels = {}
+    for subkernel, insn_ids in six.iteritems(
+            get_subkernel_to_insn_id_map(kernel)):
+        for insn_id in insn_ids:
+            for var in kernel.id_to_insn[insn_id].dependency_names():
+                if var in kernel.temporary_variables:
+                    temp_to_subkernels.setdefault(var, set()).add(subkernel)
+
+    candidates = sorted(
+            tv.name for tv in six.itervalues(kernel.temporary_variables)
+            if _is_candidate(tv)
+            and len(temp_to_subkernels.get(tv.name, ())) == 1)
+
+    if len(candidates) < 2:
+        return kernel
+
+    var_index = BitsetIndex(candidates)
+
+    scope_bitsets = {}
+    for name in candidates:
+        scope = kernel.temporary_variables[name].scope
+        scope_bitsets[scope] = (
+                scope_bitsets.get(scope, 0) | (1 << var_index.name_to_bit[name]))
+
+    # }}}
+
+    interference = _get_interference(
+            var_index, _get_occupancy(kernel, var_index, scope_bitsets))
+
+    # {{{ pack non-interfering temporaries, largest first
+
+    def get_group_key(tv):
+        subkernel, = temp_to_subkernels[tv.name]
+        return (subkernel, tv.scope, None if allow_mixed_dtypes else tv.dtype)
+
+    # each a list [group key, bitset of members, list of member names]
+    storages = []
+
+    for name in sorted(candidates,
+            key=lambda name: (-kernel.temporary_variables[name].nbytes, name)):
+        tv = kernel.temporary_variables[name]
+        key = get_group_key(tv)
+        bit = 1 << var_index.name_to_bit[name]
+
+        for storage in storages:
+            storage_key, members, member_names = storage
+            if storage_key == key and not (interference[
+                    var_index.name_to_bit[name]] & members):
+                storage[1] = members | bit
+                member_names.append(name)
+                break
+        else:
+            storages.append([key, bit, [name]])
+
+    # }}}
+
+    vng = kernel.get_var_name_generator()
+    new_temporary_variables = kernel.temporary_variables.copy()
+
+    for _, _, member_names in storages:
+        if len(member_names) < 2:
+            continue
+
+        base_name = vng(base_name_prefix)
+        logger.debug("%s: temporaries %s share storage '%s'"
+                % (kernel.name, ", ".join(member_names), base_name))
+
+        for name in member_names:
+            # The members are accessed at different times through different
+            # pointers, so these must not be declared 'restrict'.
+            new_temporary_variables[name] = (
+                    kernel.temporary_variables[name].copy(
+                        base_storage=base_name,
+                        _base_storage_access_may_be_aliasing=True))
+
+    result = kernel.copy(temporary_variables=new_temporary_variables)
+
+    if logger.isEnabledFor(logging.INFO):
+        before = sum(six.itervalues(get_temporary_storage_footprint(kernel)))
+        after = sum(six.itervalues(get_temporary_storage_footprint(result)))
+        logger.info("%s: reusing temporary storage reduced temporary storage "
+                "from %d to %d bytes" % (kernel.name, before, after))
+
+    return result
+
+# }}}
+
+# vim: foldmethod=marker
@@ -0,0 +1,582 @@
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2018 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import six
+
+import islpy as isl
+from islpy import dim_type
+
+from pymbolic.mapper import WalkMapper
+from pymbolic.primitives import Variable
+
+from loopy.diagnostic import LoopyError, warn_with_kernel
+from loopy.transform.cache import memoize_transform
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+.. currentmodule:: loopy
+
+.. autofunction:: auto_tile
+"""
+
+
+# {{{ access gathering
+
+class _SubscriptGatherer(WalkMapper):
+    def __init__(self, array_names):
+        self.array_names = array_names
+        self.accesses = []
+
+    def map_subscript(self, expr):
+        if (isinstance(expr.aggregate, Variable)
+                and expr.aggregate.name in self.array_names):
+            index = expr.index
+            if not isinstance(index, tuple):
+                index = (index,)
+            self.accesses.append((expr.aggregate.name, index))
+
+        self.rec(expr.index)
+
+    def map_reduction(self, expr):
+        self.rec(expr.expr)
+
+    def map_type_cast(self, expr):
+        self.rec(expr.child)
+
+    def map_tagged_variable(self, expr):
+        pass
+
+    def map_linear_subscript(self, expr):
+        self.rec(expr.index)
+
+# }}}
+
+
+# {{{ footprint model
+
+def _get_unit_stride_axis(kernel, var_name, index):
+    from loopy.kernel.array import FixedStrideArrayDimTag
+
+    dim_tags = kernel.get_var_descriptor(var_name).dim_tags
+    if dim_tags is not None and len(dim_tags) == len(index):
+        for axis, dim_tag in enumerate(dim_tags):
+            if (isinstance(dim_tag, FixedStrideArrayDimTag)
+                    and dim_tag.stride == 1):
+                return axis
+
+    return len(index) - 1
+
+
+class _FootprintModel(object):
+    """Counts the bytes in the cache lines of array data touched by a
+    rectangular tile of the iteration space, anchored at the lower bounds of
+    the inames.
+    """
+
+    def __init__(self, kernel, insns, lower_bounds, line_size):
+        self.kernel = kernel
+        self.line_size = line_size
+
+        array_names = set(kernel.arg_dict) | set(kernel.temporary_variables)
+
+        from loopy.symbolic import (
+                pwaff_from_expr, with_aff_conversion_guard, get_dependencies)
+        from loopy.diagnostic import ExpressionToAffineConversionError
+
+        gatherer = _SubscriptGatherer(array_names)
+        for insn in insns:
+            insn.with_transformed_expressions(
+                    lambda expr: gatherer(expr) or expr)
+
+        self.uncountable = set()
+        accesses = []
+        inames = set()
+        for var_name, index in gatherer.accesses:
+            if kernel.get_var_descriptor(var_name).dtype is None:
+                raise LoopyError("auto_tile needs to know the type of '%s', "
+                        "use add_dtypes" % var_name)
+
+            index_deps = get_dependencies(index)
+
+            if not index_deps <= set(kernel.all_inames()):
+                self.uncountable.add(var_name)
+                continue
+
+            accesses.append((var_name, index))
+            inames.update(index_deps)
+
+        self.inames = sorted(inames)
+
+        # Inames not being tiled are held fixed at their lower bounds.
+        self.lower_bounds = dict(
+                (iname, lower_bounds.get(iname, 0)) for iname in self.inames)
+
+        self.var_to_access_sets = {}
+        self.var_to_inames = {}
+        for var_name, index in accesses:
+            idx_names = ["_lp_idx%d" % i for i in range(len(index))]
+            space = isl.Space.create_from_names(
+                    isl.DEFAULT_CONTEXT, set=self.inames + idx_names)
+
+            # Count cache lines rather than elements along the unit-stride
+            # axis.
+            unit_stride_axis = _get_unit_stride_axis(kernel, var_name, index)
+            itemsize = kernel.get_var_descriptor(
+                    var_name).dtype.numpy_dtype.itemsize
+            index = (index[:unit_stride_axis]
+                    + (index[unit_stride_axis] // max(1, line_size // itemsize),)
+                    + index[unit_stride_axis+1:])
+
+            access_set = isl.Set.universe(space)
+            try:
+                for idx_name, idx in zip(idx_names, index):
+                    access_set = access_set & with_aff_conversion_guard(
+                            pwaff_from_expr, space, Variable(idx_name) - idx,
+                            frozenset()).zero_set()
+            except ExpressionToAffineConversionError:
+                self.uncountable.add(var_name)
+                continue
+
+            self.var_to_access_sets.setdefault(var_name, []).append(access_set)
+            self.var_to_inames.setdefault(var_name, set()).update(
+                    get_dependencies(index))
+
+        for var_name in self.uncountable:
+            self.var_to_access_sets.pop(var_name, None)
+            self.var_to_inames.pop(var_name, None)
+
+        if self.uncountable:
+            warn_with_kernel(kernel, "auto_tile_uncountable",
+                    "auto_tile: footprint of accesses to '%s' cannot be "
+                    "determined, ignored" % ", ".join(sorted(self.uncountable)))
+
+    def get_tile_set(self, space, tile_sizes):
+        result = isl.BasicSet.universe(space)
+        for iname in self.inames:
+            lower = self.lower_bounds[iname]
+            size = tile_sizes.get(iname, 1)
+            result = (result
+                    .add_constraint(isl.Constraint.ineq_from_names(
+                        space, {1: -lower, iname: 1}))
+                    .add_constraint(isl.Constraint.ineq_from_names(
+                        space, {1: lower + size - 1, iname: -1})))
+
+        return result
+
+    def __call__(self, tile_sizes):
+        """Return the number of bytes touched by the tile with extents
+        *tile_sizes*, a mapping from inames to sizes.
+        """
+        total = 0
+        for var_name, access_sets in six.iteritems(self.var_to_access_sets):
+            footprint = None
+            for access_set in access_sets:
+                fp = (access_set & self.get_tile_set(access_set.space, tile_sizes))
+                fp = fp.project_out(dim_type.set, 0, len(self.inames))
+                footprint = fp if footprint is None else footprint | fp
+
+            total += footprint.count_val().to_python() * self.line_size
+
+        return total
+
+# }}}
+
+
+# {{{ tile size selection
+
+def _get_tile_points(tile_sizes):
+    result = 1
+    for size in six.itervalues(tile_sizes):
+        result *= size
+    return result
+
+
+def _choose_tile_sizes(footprint_model, start_sizes, growable_inames, extents,
+        capacity):
+    """Grow the tile sizes of *growable_inames* from *start_sizes* by
+    repeated doubling, choosing each time the iname that yields the most
+    iteration points per byte of footprint, while the footprint stays within
+    *capacity* bytes. Earlier entries of *growable_inames* win ties.
+    """
+    sizes = dict(start_sizes)
+    if footprint_model(sizes) > capacity:
+        return sizes
+
+    while True:
+        best_score = None
+        best_sizes = None
+
+        for iname in growable_inames:
+            if sizes[iname] >= extents[iname]:
+                continue
+
+            trial_sizes = sizes.copy()
+            trial_sizes[iname] = min(2*sizes[iname], extents[iname])
+
+            footprint = footprint_model(trial_sizes)
+            if footprint > capacity:
+                continue
+
+            score = _get_tile_points(trial_sizes) / max(footprint, 1)
+            if best_score is None or score > best_score:
+                best_score = score
+                best_sizes = trial_sizes
+
+        if best_sizes is None:
+            return sizes
+
+        sizes = best_sizes
+
+# }}}
+
+
+# {{{ auto_tile
+
+def _get_contiguity_scores(kernel, insns, inames):
+    """Return a :class:`dict` mapping each iname in *inames* to the number of
+    accesses in *insns* whose stride-one index depends on it.
+    """
+    from loopy.symbolic import get_dependencies
+
+    gatherer = _SubscriptGatherer(
+            set(kernel.arg_dict) | set(kernel.temporary_variables))
+    for insn in insns:
+        insn.with_transformed_expressions(lambda expr: gatherer(expr) or expr)
+
+    scores = dict((iname, 0) for iname in inames)
+    for var_name, index in gatherer.accesses:
+        unit_stride_axis = _get_unit_stride_axis(kernel, var_name, index)
+        for iname in get_dependencies(index[unit_stride_axis]) & set(inames):
+            scores[iname] += 1
+
+    return scores
+
+
+@memoize_transform
+def auto_tile(kernel, cache_sizes=(32*1024, 256*1024), parameters=None,
+        within=None, fill_factor=0.5, line_size=64, prefetch=False):
+    """Tile the loops of the instructions matching *within* for a hierarchy
+    of caches. For each cache, starting with the smallest, tile sizes are
+    chosen by repeated doubling such that the cache lines of array data
+    touched by one tile take up at most *fill_factor* times the capacity of
+    the cache, while maximizing the number of loop iterations per byte
+    touched. The inames are then split accordingly, using
+    :func:`split_iname`, and the loops are ordered with
+    :func:`prioritize_loops`, with the loops touching contiguous data
+    innermost.
+
+    Along an iname ``i``, the outermost loop over tiles is named
+    ``i_outer``, the loop over the tiles for the next smaller cache within
+    a tile for the *n*-th cache (counting from one) is named ``i_ln``, and
+    the loop within a tile for the smallest cache is named ``i_inner``.
+
+    If the instructions carry out reductions, the reduction inames are only
+    tiled for the smallest cache, and the innermost loops of the other
+    inames are tagged ``ilp.seq``, so that the reduction can be carried out
+    in a block of private accumulators.
+
+    :arg cache_sizes: a sequence of cache capacities in bytes, from the
+        smallest (L1) to the largest cache to be tiled for.
+    :arg parameters: a :class:`dict` mapping names of kernel parameters to
+        values representative of the intended use. Only inames whose number
+        of iterations is known once these values are fixed are tiled.
+    :arg within: a match expression understood by
+        :func:`loopy.match.parse_match` selecting the instructions whose
+        loops are tiled.
+    :arg fill_factor: the fraction of each cache that a tile is allowed to
+        occupy, leaving room for other data and for conflict misses.
+    :arg line_size: the size of a cache line in bytes.
+    :arg prefetch: if *True*, arrays that are only read by the kernel and
+        whose data is reused within a tile of the smallest level are fetched
+        into temporaries using :func:`add_prefetch`. The kind of temporary
+        is chosen by :func:`add_prefetch`.
+
+    The chosen tile sizes are logged at the ``INFO`` level.
+
+    .. versionadded:: 2018.2
+    """
+    if not cache_sizes:
+        raise LoopyError("auto_tile needs at least one cache size")
+
+    cache_sizes = tuple(cache_sizes)
+    if list(cache_sizes) != sorted(cache_sizes):
+        raise LoopyError("cache_sizes must be given in increasing order")
+
+    if parameters is None:
+        parameters = {}
+
+    from loopy.match import parse_match
+    within = parse_match(within)
+
+    insns = [insn for insn in kernel.instructions if within(kernel, insn)]
+    if not insns:
+        return kernel
+
+    # {{{ find the inames to tile
+
+    from loopy.transform.parameter import fix_parameters
+    from loopy.transform.subst import expand_subst
+    from loopy.isl_helpers import (
+            static_min_of_pw_aff, static_max_of_pw_aff,
+            StaticValueFindingError)
+    from loopy.symbolic import aff_to_expr
+
+    analysis_kernel = expand_subst(kernel)
+    if parameters:
+        analysis_kernel = fix_parameters(analysis_kernel, **parameters)
+
+    analysis_insns = [analysis_kernel.id_to_insn[insn.id] for insn in insns]
+
+    reduction_inames = set()
+    candidate_inames = set()
+    for insn in analysis_insns:
+        candidate_inames.update(insn.within_inames)
+        insn_reduction_inames = insn.reduction_inames()
+        reduction_inames.update(insn_reduction_inames)
+        candidate_inames.update(insn_reduction_inames)
+
+    lower_bounds = {}
+    extents = {}
+    for iname in sorted(candidate_inames):
+        if kernel.iname_tags(iname):
+            continue
+
+        bounds = analysis_kernel.get_iname_bounds(iname)
+        try:
+            lower = aff_to_expr(static_min_of_pw_aff(
+                bounds.lower_bound_pw_aff, constants_only=True))
+            extent = aff_to_expr(static_max_of_pw_aff(
+                bounds.size, constants_only=True))
+        except StaticValueFindingError:
+            lower = extent = None
+
+        if not (isinstance(lower, six.integer_types)
+                and isinstance(extent, six.integer_types)):
+            warn_with_kernel(kernel, "auto_tile_unknown_extent",
+                    "auto_tile: number of iterations of '%s' is not known, "
+                    "not tiling it (pass its parameters in 'parameters')"
+                    % iname)
+            continue
+
+        lower_bounds[iname] = lower
+        extents[iname] = extent
+
+    if not extents:
+        return kernel
+
+    contiguity = _get_contiguity_scores(analysis_kernel, analysis_insns, extents)
+
+    # most contiguous first
+    tiled_inames = sorted(extents, key=lambda iname: (-contiguity[iname], iname))
+    reduction_inames = [iname for iname in tiled_inames
+            if iname in reduction_inames]
+    output_inames = [iname for iname in tiled_inames
+            if iname not in reduction_inames]
+
+    # }}}
+
+    # {{{ choose tile sizes
+
+    footprint_model = _FootprintModel(
+            analysis_kernel, analysis_insns, lower_bounds, line_size)
+
+    # level_sizes[level][iname]
+    level_sizes = []
+    for level, cache_size in enumerate(cache_sizes):
+        capacity = fill_factor * cache_size
+
+        if level == 0:
+            start_sizes = dict((iname, 1) for iname in tiled_inames)
+            growable_inames = tiled_inames
+        else:
+            start_sizes = level_sizes[-1].copy()
+            if reduction_inames:
+                # The reduction is carried out in full within each tile of
+                # the output.
+                growable_inames = output_inames
+                for iname in reduction_inames:
+                    start_sizes[iname] = extents[iname]
+            else:
+                growable_inames = tiled_inames
+
+        level_sizes.append(_choose_tile_sizes(
+            footprint_model, start_sizes, growable_inames, extents,
+            capacity))
+
+        footprint = footprint_model(level_sizes[-1])
+        if level == 0 and footprint > capacity:
+            logger.info("%s: auto_tile: not tiling, footprint of a single "
+                    "iteration is already %d bytes" % (kernel.name, footprint))
+            return kernel
+        elif footprint > capacity:
+            logger.info("%s: auto_tile: not tiling for %d-byte cache, "
+                    "footprint of smaller tile is already %d bytes"
+                    % (kernel.name, cache_size, footprint))
+        else:
+            logger.info("%s: auto_tile: tile for %d-byte cache: %s (%d bytes)"
+                    % (kernel.name, cache_size,
+                        ", ".join("%s: %d" % (iname, level_sizes[-1][iname])
+                            for iname in tiled_inames),
+                        footprint))
+
+    # }}}
+
+    # {{{ split inames
+
+    from loopy.transform.iname import split_iname, tag_inames, prioritize_loops
+
+    nlevels = len(cache_sizes)
+    vng = kernel.get_var_name_generator()
+
+    # maps (band, iname) to the loop walking the tiles of level *band*-1
+    # within a tile of level *band* along *iname*, where band 0 is the loop
+    # within a tile of the smallest level
+    band_loops = {}
+
+    for iname in tiled_inames:
+        sizes = [level_sizes[level][iname] for level in range(nlevels)]
+        sizes.append(extents[iname])
+
+        split_bands = [band for band in range(nlevels, 0, -1)
+                if sizes[band-1] < sizes[band]]
+
+        remaining_iname = iname
+        for band in split_bands:
+            if band == split_bands[0]:
+                outer_iname = vng(iname + "_outer")
+            else:
+                outer_iname = vng("%s_l%d" % (iname, band + 1))
+
+            if band == split_bands[-1]:
+                inner_iname = vng(iname + "_inner")
+            else:
+                # split further below
+                inner_iname = vng(iname + "_rest")
+
+            kernel = split_iname(kernel, remaining_iname, sizes[band-1],
+                    outer_iname=outer_iname, inner_iname=inner_iname)
+
+            band_loops[band, iname] = outer_iname
+            remaining_iname = inner_iname
+
+        band_loops[0, iname] = remaining_iname
+
+    # }}}
+
+    # {{{ order loops
+
+    def get_band_loops(bands, inames):
+        return [band_loops[band, iname]
+                for band in bands
+                for iname in reversed(inames)
+                if (band, iname) in band_loops]
+
+    outer_bands = list(range(nlevels, 0, -1))
+    if reduction_inames:
+        loop_priority = (
+                get_band_loops(outer_bands, output_inames)
+                + get_band_loops(outer_bands + [0], reduction_inames)
+                + get_band_loops([0], output_inames))
+
+        # Privatize the accumulators across the innermost output loops, so
+        # that these may be nested within the reduction loops.
+        kernel = tag_inames(kernel, dict(
+            (iname, "ilp.seq")
+            for iname in get_band_loops([0], output_inames)))
+    else:
+        loop_priority = get_band_loops(outer_bands + [0], tiled_inames)
+
+    if len(loop_priority) > 1:
+        kernel = prioritize_loops(kernel, loop_priority)
+
+    # }}}
+
+    # {{{ prefetch
+
+    if prefetch:
+        kernel = _add_tile_prefetches(kernel, insns, band_loops,
+                footprint_model)
+
+    # }}}
+
+    return kernel
+
+
+def _add_tile_prefetches(kernel, insns, band_loops, footprint_model):
+    insn_ids = set(insn.id for insn in insns)
+
+    iname_to_inner_loop = dict(
+            (iname, loop) for (band, iname), loop in six.iteritems(band_loops)
+            if band == 0)
+    inner_loops = set(six.itervalues(iname_to_inner_loop))
+
+    written_vars = set()
+    for insn in kernel.instructions:
+        written_vars.update(insn.assignee_var_names())
+
+    from loopy.kernel.data import temp_var_scope
+    from loopy.transform.data import add_prefetch
+
+    for var_name in sorted(footprint_model.var_to_inames):
+        if var_name in written_vars:
+            continue
+
+        if (var_name in kernel.temporary_variables
+                and kernel.temporary_variables[var_name].scope
+                == temp_var_scope.PRIVATE):
+            continue
+
+        using_insns = [insn for insn in kernel.instructions
+                if var_name in insn.read_dependency_names()]
+        if any(insn.id not in insn_ids for insn in using_insns):
+            continue
+
+        sweep_inames = sorted(
+                iname_to_inner_loop[iname]
+                for iname in footprint_model.var_to_inames[var_name]
+                if iname in iname_to_inner_loop)
+
+        insn_loops = set()
+        for insn in using_insns:
+            insn_loops.update(insn.within_inames | insn.reduction_inames())
+
+        if not sweep_inames or set(sweep_inames) == insn_loops & inner_loops:
+            # The data is not reused within a tile.
+            continue
+
+        logger.info("%s: auto_tile: prefetching '%s' over '%s'"
+                % (kernel.name, var_name, ", ".join(sweep_inames)))
+
+        kernel = add_prefetch(kernel, var_name, sweep_inames,
+                default_tag=None,
+                fetch_outer_inames=frozenset(insn_loops - inner_loops))
+
+    return kernel
+
+# }}}
+
+# vim: foldmethod=marker
@@ -47,13 +47,20 @@ def _debug(kernel, s, *args):
 # {{{ type inference mapper
 
 class TypeInferenceMapper(CombineMapper):
-    def __init__(self, kernel, new_assignments=None):
+    def __init__(self, kernel, new_assignments=None,
+            expr_type_cache=None, volatile_names=frozenset()):
         """
         :arg new_assignments: mapping from names to either
             :class:`loopy.kernel.data.TemporaryVariable`
             or
             :class:`loopy.kernel.data.KernelArgument`
             instances
+        :arg expr_type_cache: if not *None*, a :class:`dict` in which the
+            types of subexpressions are remembered, by identity of the
+            subexpression. Subexpressions whose type depends on an unknown
+            type or on a name in *volatile_names* are not remembered.
+        :arg volatile_names: names whose type may still change while
+            *expr_type_cache* is in use
         """
         self.kernel = kernel
         if new_assignments is None:
@@ -61,13 +68,16 @@ class TypeInferenceMapper(CombineMapper):
         self.new_assignments = new_assignments
         self.symbols_with_unknown_types = set()
 
+        self.expr_type_cache = expr_type_cache
+        self.volatile_names = volatile_names
+        self.volatile_lookup_count = 0
+
     def __call__(self, expr, return_tuple=False, return_dtype_set=False):
         kwargs = {}
         if return_tuple:
             kwargs["return_tuple"] = True
 
-        result = super(TypeInferenceMapper, self).__call__(
-                expr, **kwargs)
+        result = self.rec(expr, **kwargs)
 
         assert isinstance(result, list)
 
@@ -91,9 +101,35 @@ class TypeInferenceMapper(CombineMapper):
 
     # /!\ Introduce caches with care--numpy.float32(x) and numpy.float64(x)
     # are Python-equal (for many common constants such as integers).
+    # This is why expr_type_cache is keyed by the identity of the
+    # subexpression, which is kept alive by the cache entry.
+
+    def rec(self, expr, *args, **kwargs):
+        from pymbolic.primitives import Expression
+
+        cache = self.expr_type_cache
+        if cache is None or args or not isinstance(expr, Expression):
+            return super(TypeInferenceMapper, self).rec(expr, *args, **kwargs)
+
+        key = (id(expr), kwargs.get("return_tuple", False))
+        try:
+            _, result = cache[key]
+        except KeyError:
+            pass
+        else:
+            return result
+
+        prev_volatile_lookup_count = self.volatile_lookup_count
+        result = super(TypeInferenceMapper, self).rec(expr, *args, **kwargs)
+
+        if self.volatile_lookup_count == prev_volatile_lookup_count:
+            cache[key] = (expr, result)
+
+        return result
 
     def copy(self):
-        return type(self)(self.kernel, self.new_assignments)
+        return type(self)(self.kernel, self.new_assignments,
+                self.expr_type_cache, self.volatile_names)
 
     def with_assignments(self, names_to_vars):
         new_ass = self.new_assignments.copy()
@@ -315,6 +351,9 @@ class TypeInferenceMapper(CombineMapper):
         if isinstance(obj, (KernelArgument, TemporaryVariable)):
             assert obj.dtype is not lp.auto
             result = [obj.dtype]
+            if result[0] is None or expr.name in self.volatile_names:
+                self.volatile_lookup_count += 1
+
             if result[0] is None:
                 self.symbols_with_unknown_types.add(expr.name)
                 return []
@@ -404,7 +443,13 @@ class TypeInferenceMapper(CombineMapper):
 
 # {{{ infer single variable
 
-def _infer_var_type(kernel, var_name, type_inf_mapper, subst_expander):
+def _infer_var_type(kernel, var_name, type_inf_mapper, subst_expander,
+        expanded_exprs=None):
+    """
+    :arg expanded_exprs: if not *None*, a :class:`dict` mapping instruction
+        IDs to their expressions with substitution rules expanded, used to
+        avoid expanding them repeatedly. Missing entries are filled in.
+    """
     if var_name in kernel.all_params():
         return [kernel.index_dtype], []
 
@@ -422,7 +467,14 @@ def _infer_var_type(kernel, var_name, type_inf_mapper, subst_expander):
         if not isinstance(writer_insn, lp.MultiAssignmentBase):
             continue
 
-        expr = subst_expander(writer_insn.expression)
+        if expanded_exprs is None:
+            expr = subst_expander(writer_insn.expression)
+        else:
+            try:
+                expr = expanded_exprs[writer_insn_id]
+            except KeyError:
+                expr = subst_expander(writer_insn.expression)
+                expanded_exprs[writer_insn_id] = expr
 
         debug("             via expr %s", expr)
         if isinstance(writer_insn, lp.Assignment):
@@ -482,27 +534,10 @@ class _DictUnionView:
 
 # {{{ infer_unknown_types
 
-def infer_unknown_types(kernel, expect_completion=False):
-    """Infer types on temporaries and arguments."""
-
-    logger.debug("%s: infer types" % kernel.name)
-
-    from functools import partial
-    debug = partial(_debug, kernel)
-
-    import time
-    start_time = time.time()
-
-    unexpanded_kernel = kernel
-    if kernel.substitutions:
-        from loopy.transform.subst import expand_subst
-        kernel = expand_subst(kernel)
-
-    new_temp_vars = kernel.temporary_variables.copy()
-    new_arg_dict = kernel.arg_dict.copy()
-
-    # {{{ find names_with_unknown_types
-
+def _get_names_for_type_inference(kernel):
+    """Return a list of the names of all arguments and temporaries whose
+    type is not yet known.
+    """
     # contains both arguments and temporaries
     names_for_type_inference = []
 
@@ -517,14 +552,17 @@ def infer_unknown_types(kernel, expect_completion=False):
         if arg.dtype is None:
             names_for_type_inference.append(arg.name)
 
-    # }}}
+    return names_for_type_inference
 
-    logger.debug("finding types for {count:d} names".format(
-            count=len(names_for_type_inference)))
 
+def _get_type_dependency_graph(kernel, names_for_type_inference):
+    """Return a mapping from each name in *names_for_type_inference* to the
+    names in *names_for_type_inference* read by the instructions writing it.
+    """
+    names_for_type_inference = frozenset(names_for_type_inference)
     writer_map = kernel.writer_map()
 
-    dep_graph = dict(
+    return dict(
             (written_var, set(
                 read_var
                 for insn_id in writer_map.get(written_var, [])
@@ -532,6 +570,45 @@ def infer_unknown_types(kernel, expect_completion=False):
                 if read_var in names_for_type_inference))
             for written_var in names_for_type_inference)
 
+
+def infer_unknown_types(kernel, expect_completion=False):
+    """Infer types on temporaries and arguments."""
+
+    logger.debug("%s: infer types" % kernel.name)
+
+    return _infer_unknown_types(kernel, expect_completion)
+
+
+def _infer_unknown_types(kernel, expect_completion,
+        names_for_type_inference=None):
+    """
+    :arg names_for_type_inference: if not *None*, only the types of these
+        names are inferred. Must be closed under type dependencies (see
+        :func:`_get_type_dependency_graph`) among names of unknown type.
+    """
+
+    from functools import partial
+    debug = partial(_debug, kernel)
+
+    import time
+    start_time = time.time()
+
+    unexpanded_kernel = kernel
+    if kernel.substitutions:
+        from loopy.transform.subst import expand_subst
+        kernel = expand_subst(kernel)
+
+    new_temp_vars = kernel.temporary_variables.copy()
+    new_arg_dict = kernel.arg_dict.copy()
+
+    if names_for_type_inference is None:
+        names_for_type_inference = _get_names_for_type_inference(kernel)
+
+    logger.debug("finding types for {count:d} names".format(
+            count=len(names_for_type_inference)))
+
+    dep_graph = _get_type_dependency_graph(kernel, names_for_type_inference)
+
     from loopy.tools import compute_sccs
 
     # To speed up processing, we sort the variables by computing the SCCs of the
@@ -544,7 +621,11 @@ def infer_unknown_types(kernel, expect_completion=False):
             new_temp_vars,
             new_arg_dict
             ])
-    type_inf_mapper = TypeInferenceMapper(kernel, item_lookup)
+
+    # Types of subexpressions not depending on a variable whose type may
+    # still change are shared across the whole inference run.
+    expr_type_cache = {}
+    expanded_exprs = {}
 
     from loopy.symbolic import SubstitutionRuleExpander
     subst_expander = SubstitutionRuleExpander(kernel.substitutions)
@@ -552,33 +633,36 @@ def infer_unknown_types(kernel, expect_completion=False):
     # {{{ work on type inference queue
 
     from loopy.kernel.data import TemporaryVariable, KernelArgument
+    from collections import deque
 
     for var_chain in sccs:
-        changed_during_last_queue_run = False
-        queue = var_chain[:]
+        type_inf_mapper = TypeInferenceMapper(kernel, item_lookup,
+                expr_type_cache=expr_type_cache,
+                volatile_names=frozenset(var_chain))
+
+        # mapping: name -> names in the same SCC whose writers read it
+        var_chain_set = frozenset(var_chain)
+        readers = dict((name, []) for name in var_chain)
+        for name in var_chain:
+            for read_var in dep_graph[name]:
+                if read_var in var_chain_set:
+                    readers[read_var].append(name)
+
+        queue = deque(var_chain)
+        queued = set(var_chain)
         failed_names = set()
 
-        while queue or changed_during_last_queue_run:
-            if not queue and changed_during_last_queue_run:
-                changed_during_last_queue_run = False
-                # Optimization: If there's a single variable in the SCC without
-                # a self-referential dependency, then the type is known after a
-                # single iteration (we don't need to look at the expressions
-                # again).
-                if len(var_chain) == 1:
-                    single_var, = var_chain
-                    if single_var not in dep_graph[single_var]:
-                        break
-                queue = var_chain[:]
-
-            name = queue.pop(0)
+        while queue:
+            name = queue.popleft()
+            queued.remove(name)
             item = item_lookup[name]
 
             debug("inferring type for %s %s", type(item).__name__, item.name)
 
             result, symbols_with_unavailable_types = (
                     _infer_var_type(
-                            kernel, item.name, type_inf_mapper, subst_expander))
+                            kernel, item.name, type_inf_mapper, subst_expander,
+                            expanded_exprs))
 
             failed = not result
             if not failed:
@@ -589,7 +673,6 @@ def infer_unknown_types(kernel, expect_completion=False):
                 debug("     success: %s", new_dtype)
                 if new_dtype != item.dtype:
                     debug("     changed from: %s", item.dtype)
-                    changed_during_last_queue_run = True
 
                     if isinstance(item, TemporaryVariable):
                         new_temp_vars[name] = item.copy(dtype=new_dtype)
@@ -597,10 +680,19 @@ def infer_unknown_types(kernel, expect_completion=False):
                         new_arg_dict[name] = item.copy(dtype=new_dtype)
                     else:
                         raise LoopyError("unexpected item type in type inference")
+
+                    # Only the variables reading this one need another look.
+                    for reader in readers[name]:
+                        if reader not in queued:
+                            queue.append(reader)
+                            queued.add(reader)
+
+                # we've made progress, reset failure markers
+                failed_names = set()
+
             else:
                 debug("     failure")
 
-            if failed:
                 if item.name in failed_names:
                     # this item has failed before, give up.
                     advice = ""
@@ -621,17 +713,9 @@ def infer_unknown_types(kernel, expect_completion=False):
                 # remember that this item failed
                 failed_names.add(item.name)
 
-                if set(queue) == failed_names:
-                    # We did what we could...
-                    print(queue, failed_names, item.name)
-                    assert not expect_completion
-                    break
-
                 # can't infer type yet, put back into queue
                 queue.append(name)
-            else:
-                # we've made progress, reset failure markers
-                failed_names = set()
+                queued.add(name)
 
     # }}}
 
@@ -647,6 +731,66 @@ def infer_unknown_types(kernel, expect_completion=False):
 # }}}
 
 
+# {{{ incremental type inference for argument types
+
+def infer_arg_independent_types(kernel):
+    """Infer the types of all temporaries and arguments whose type does not
+    depend on the type of an argument of unknown type. The types of the
+    remaining variables are left unknown.
+
+    The result may be passed to :func:`infer_types_for_arg_dtypes` any number
+    of times.
+
+    .. versionadded:: 2018.2
+    """
+    logger.debug("%s: infer argument-independent types" % kernel.name)
+
+    names_for_type_inference = _get_names_for_type_inference(kernel)
+    dep_graph = _get_type_dependency_graph(kernel, names_for_type_inference)
+
+    # mapping: name -> names whose writers read it
+    readers = dict((name, set()) for name in names_for_type_inference)
+    for name, read_vars in six.iteritems(dep_graph):
+        for read_var in read_vars:
+            readers[read_var].add(name)
+
+    # Any argument of unknown type may receive a type from the caller.
+    dependent_names = set(
+            arg.name for arg in kernel.args
+            if arg.dtype is None)
+
+    queue = list(dependent_names)
+    while queue:
+        name = queue.pop()
+        for reader in readers[name]:
+            if reader not in dependent_names:
+                dependent_names.add(reader)
+                queue.append(reader)
+
+    return _infer_unknown_types(kernel, expect_completion=False,
+            names_for_type_inference=[
+                name for name in names_for_type_inference
+                if name not in dependent_names])
+
+
+def infer_types_for_arg_dtypes(kernel, var_to_dtype, expect_completion=False):
+    """Specify the types of the arguments in *var_to_dtype* and infer the
+    types of all remaining variables of unknown type. Equivalent to
+    :func:`loopy.add_dtypes` followed by :func:`infer_unknown_types`.
+
+    If *kernel* was obtained from :func:`infer_arg_independent_types`, only the
+    variables whose type depends on an argument type are inferred.
+
+    .. versionadded:: 2018.2
+    """
+    from loopy.kernel.tools import add_dtypes
+    kernel = add_dtypes(kernel, var_to_dtype)
+
+    return infer_unknown_types(kernel, expect_completion=expect_completion)
+
+# }}}
+
+
 # {{{ reduction expression helper
 
 def infer_arg_and_reduction_dtypes_for_reduction_expression(
@@ -295,6 +295,278 @@ def test_c_execution_with_global_temporaries():
     assert np.allclose(knl(a=np.zeros(10, dtype=np.int32))[1], np.arange(10))
 
 
+@pytest.mark.parametrize("num_workers", [None, 3])
+def test_c_group_axes(num_workers):
+    from loopy.target.c import ExecutableCTarget
+
+    knl = lp.make_kernel(
+            "{ [i,j]: 0<=i<n and 0<=j<m }",
+            "out[i, j] = 2*a[i, j]",
+            [
+                lp.GlobalArg("out", np.float64, shape=lp.auto),
+                lp.GlobalArg("a", np.float64, shape=("n", "m")),
+                "..."
+                ],
+            target=ExecutableCTarget(num_workers=num_workers))
+
+    knl = lp.split_iname(knl, "i", 16, outer_tag="g.0")
+    knl = lp.split_iname(knl, "j", 8, outer_tag="g.1")
+
+    assert "_lpy_gid_0_start" in lp.generate_code_v2(knl).device_code()
+
+    a = np.random.rand(131, 17)
+    assert np.allclose(knl(a=a)[1], 2*a)
+
+
+def test_split_group_range():
+    from loopy.target.c.c_execution import split_group_range
+
+    assert split_group_range(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert split_group_range(2, 4) == [(0, 1), (1, 2)]
+    assert split_group_range(0, 4) == [(0, 0)]
+
+
+def test_c_target_num_workers_in_key():
+    from loopy.target.c import ExecutableCTarget
+    from loopy.tools import LoopyKeyBuilder
+
+    kb = LoopyKeyBuilder()
+    assert ExecutableCTarget(num_workers=3) != ExecutableCTarget()
+    assert ExecutableCTarget(num_workers=3) == ExecutableCTarget(num_workers=3)
+    assert (kb(ExecutableCTarget(num_workers=3))
+            != kb(ExecutableCTarget()))
+
+
+def test_lazy_kernel_graph_fusion():
+    from loopy.target.c import ExecutableCTarget
+
+    scale = lp.make_kernel(
+            "{ [i]: 0<=i<n }",
+            "out[i] = 2*a[i]",
+            [
+                lp.GlobalArg("out", np.float64, shape=("n",)),
+                lp.GlobalArg("a", np.float64, shape=("n",)),
+                "..."
+                ],
+            target=ExecutableCTarget())
+
+    add = lp.make_kernel(
+            "{ [k]: 0<=k<n }",
+            "out[k] = x[k] + y[k]",
+            [
+                lp.GlobalArg("out", np.float64, shape=("n",)),
+                lp.GlobalArg("x", np.float64, shape=("n",)),
+                lp.GlobalArg("y", np.float64, shape=("n",)),
+                "..."
+                ],
+            target=ExecutableCTarget())
+
+    a = np.random.rand(100)
+    b = np.random.rand(100)
+
+    graph = lp.LazyKernelGraph()
+    tmp, = graph(scale, a=a)
+    tmp2, = graph(add, x=tmp, y=b)
+    result, = graph(add, x=tmp2, y=a)
+
+    groups = graph._build_groups(set([result.key]))
+    assert len(groups) == 1
+    fused_knl = groups[0].kernel
+    assert len(fused_knl.temporary_variables) == 2
+    assert all(tv.shape == () for tv in fused_knl.temporary_variables.values())
+
+    res, res_tmp = graph.execute(outputs=[result, tmp])
+    assert np.allclose(res_tmp, 2*a)
+    assert np.allclose(res, 3*a + b)
+
+    # a shifted read is not elementwise and is run unfused
+    shift = lp.make_kernel(
+            "{ [i]: 0<=i<n-1 }",
+            "out[i] = x[i+1]",
+            [
+                lp.GlobalArg("out", np.float64, shape=("n",)),
+                lp.GlobalArg("x", np.float64, shape=("n",)),
+                "..."
+                ],
+            target=ExecutableCTarget())
+
+    graph = lp.LazyKernelGraph()
+    tmp, = graph(scale, a=a)
+    result, = graph(shift, x=tmp, out=np.zeros_like(a))
+
+    assert len(graph._build_groups(set([result.key]))) == 2
+    res, = graph.execute(outputs=[result])
+    assert np.allclose(res[:-1], 2*a[1:])
+
+    # an intermediate also read at other indices by its producer is fused,
+    # but not scalarized
+    scale_and_shift = lp.make_kernel(
+            ["{ [i]: 0<=i<n }", "{ [j]: 0<=j<n-1 }"],
+            """
+            out[i] = 2*a[i]  {id=scale}
+            shifted[j] = out[j+1]  {dep=scale}
+            """,
+            [
+                lp.GlobalArg("out,shifted", np.float64, shape=("n",)),
+                lp.GlobalArg("a", np.float64, shape=("n",)),
+                "..."
+                ],
+            target=ExecutableCTarget())
+
+    graph = lp.LazyKernelGraph()
+    tmp, shifted = graph(scale_and_shift, a=a, shifted=np.zeros_like(a))
+    result, = graph(add, x=tmp, y=b)
+
+    groups = graph._build_groups(set([result.key, shifted.key]))
+    assert len(groups) == 1
+    assert not groups[0].kernel.temporary_variables
+
+    res, res_shifted = graph.execute(outputs=[result, shifted])
+    assert np.allclose(res, 2*a + b)
+    assert np.allclose(res_shifted[:-1], 2*a[1:])
+
+    # the consumer overwrites an array the producer reads, under another name
+    smooth = lp.make_kernel(
+            "{ [i]: 1<=i<n }",
+            "out[i] = a[i] + a[i-1]",
+            [
+                lp.GlobalArg("out,a", np.float64, shape=("n",)),
+                "..."
+                ],
+            target=ExecutableCTarget())
+    copy = lp.make_kernel(
+            "{ [k]: 1<=k<n }",
+            "y[k] = x[k]",
+            [
+                lp.GlobalArg("x,y", np.float64, shape=("n",)),
+                "..."
+                ],
+            target=ExecutableCTarget())
+
+    a_copy = a.copy()
+    graph = lp.LazyKernelGraph()
+    tmp, = graph(smooth, a=a_copy)
+    result, = graph(copy, x=tmp, y=a_copy)
+
+    assert len(graph._build_groups(set([result.key]))) == 2
+    res, = graph.execute(outputs=[result])
+    assert np.allclose(res[1:], a[1:] + a[:-1])
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_c_value_specialization(background):
+    from loopy.target.c import ExecutableCTarget
+
+    knl = lp.make_kernel(
+            "{ [i]: 0<=i<n }",
+            "out[i] = 2*a[i]",
+            [
+                lp.GlobalArg("out", np.float64, shape=("n",)),
+                lp.GlobalArg("a", np.float64, shape=("n",)),
+                lp.ValueArg("n", np.int32),
+                ],
+            target=ExecutableCTarget())
+    knl = lp.set_options(knl, specialize_values_after=2,
+            max_value_specializations=1,
+            specialize_values_in_background=background)
+
+    a = np.random.rand(10)
+    b = np.random.rand(7)
+    for i in range(3):
+        assert np.allclose(knl(a=a, n=10)[1], 2*a)
+
+    cache, = [kex.value_specialization_cache
+            for kex in knl._kernel_executor_cache.values()]
+
+    if background:
+        import time
+        while cache.pending:
+            time.sleep(0.01)
+
+    variant, = cache.variants.values()
+    assert "n" not in [arg.name for arg in variant.args]
+    assert np.allclose(knl(a=a, n=10)[1], 2*a)
+
+    for i in range(3):
+        assert np.allclose(knl(a=b, n=7)[1], 2*b)
+
+    if background:
+        while cache.pending:
+            time.sleep(0.01)
+
+    # the variant for n=10 was evicted
+    assert list(cache.variants) == [(("n", 7),)]
+    assert np.allclose(knl(a=a, n=10)[1], 2*a)
+
+
+def test_c_multiversioned_kernel():
+    from loopy.target.c import ExecutableCTarget
+
+    knl = lp.make_kernel(
+            "{ [i]: 0<=i<n }",
+            "out[i] = 2*a[i]",
+            [
+                lp.GlobalArg("out", np.float64, shape=("n",)),
+                lp.GlobalArg("a", np.float64, shape=("n",)),
+                lp.ValueArg("n", np.int32),
+                ],
+            target=ExecutableCTarget())
+
+    mv_knl = lp.make_multiversioned_kernel(knl,
+            [("n mod 16 = 0", {"a": 16}), "n >= 1000"],
+            transform=lambda knl: lp.split_iname(knl, "i", 16))
+
+    assert len(mv_knl.variants) == 3
+    # no remainder handling in the specialized variant
+    assert "-16 * i_outer" not in (
+            lp.generate_code_v2(mv_knl.variants[0][2]).device_code())
+    assert "-16 * i_outer" in (
+            lp.generate_code_v2(mv_knl.generic_kernel).device_code())
+
+    for n, variant in [(32, 0), (33, 2), (1001, 1)]:
+        a = np.random.rand(n)
+        assert mv_knl.select_variant(dict(a=a, n=n)) == variant
+        assert mv_knl.select_variant(dict(a=a)) == variant
+        assert np.allclose(mv_knl(a=a, n=n)[1], 2*a)
+
+    a = np.random.rand(33)[1:]
+    assert mv_knl.select_variant(dict(a=a, n=32)) == 2
+
+
+def test_c_schedule_profile():
+    from loopy.target.c import ExecutableCTarget
+
+    knl = lp.make_kernel(
+            "{ [i,j]: 0<=i<n and 0<=j<m }",
+            "out[i, j] = 2*a[i, j]",
+            [
+                lp.GlobalArg("out", np.float64, shape=lp.auto),
+                lp.GlobalArg("a", np.float64, shape=("n", "m")),
+                "..."
+                ],
+            target=ExecutableCTarget())
+    knl = lp.prioritize_loops(knl, "i,j")
+    knl = lp.set_options(knl, profile_schedule=True)
+
+    assert "_lpy_prof_now()" in lp.generate_code_v2(knl).device_code()
+
+    a = np.random.rand(13, 7)
+    for i in range(2):
+        assert np.allclose(knl(a=a)[1], 2*a)
+
+    kex, = knl._kernel_executor_cache.values()
+    prof_kernel, prof_i, prof_j = kex.get_schedule_profile(reset=True)
+
+    assert prof_kernel.kind == "kernel"
+    assert prof_kernel.entries == 2
+    assert prof_kernel.insn_ids == frozenset(["insn"])
+    assert (prof_i.name, prof_i.entries, prof_i.trip_count) == ("i", 2, 2*13)
+    assert (prof_j.name, prof_j.entries, prof_j.trip_count) == ("j", 2*13, 2*13*7)
+    assert prof_kernel.time >= prof_i.time >= prof_j.time >= 0
+
+    assert all(entry.entries == 0 for entry in kex.get_schedule_profile())
+
+
 def test_missing_compilers():
     from loopy.target.c import ExecutableCTarget, CTarget
     from loopy.target.c.c_execution import CCompiler
@@ -343,6 +615,192 @@ def test_missing_compilers():
         __test(eval_tester, ExecutableCTarget, compiler=ccomp)
 
 
+def test_executor_cache_limits():
+    from loopy.target.c import ExecutableCTarget
+
+    def make_knl(factor):
+        return lp.make_kernel(
+                "{ [i]: 0<=i<n }",
+                "out[i] = %d*a[i]" % factor,
+                target=ExecutableCTarget())
+
+    knls = [make_knl(factor) for factor in range(1, 4)]
+
+    a = np.random.rand(10)
+    a32 = a.astype(np.float32)
+
+    try:
+        lp.set_executor_cache_limits(max_entries=2)
+
+        for factor, knl in enumerate(knls, 1):
+            assert np.allclose(knl(a=a)[1], factor*a)
+
+        # the least recently used executor was evicted
+        assert [len(knl.executor_cache) for knl in knls] == [0, 1, 1]
+
+        # two variants by argument type within one executor
+        assert np.allclose(knls[2](a=a32)[1], 3*a32)
+        usage, = knls[2].executor_cache.get_memory_usage().values()
+        kex, = knls[2].executor_cache.values()
+        assert usage == kex.get_memory_usage() > 0
+
+        from loopy.target.execution import get_executor_cache_memory_usage
+        assert get_executor_cache_memory_usage() >= usage
+
+        # held elsewhere, so an evicted executor remains available
+        kex = knls[1].executor_cache.values()[0]
+        lp.set_executor_cache_limits(max_entries=None, max_bytes=usage)
+        assert [len(knl.executor_cache) for knl in knls] == [0, 0, 1]
+        assert np.allclose(knls[1](a=a)[1], 2*a)
+        assert knls[1].executor_cache.values() == [kex]
+
+        knls[2].executor_cache.release()
+        assert len(knls[2].executor_cache) == 0
+        assert kex.get_memory_usage() > 0
+        kex.release()
+        assert kex.get_memory_usage() == 0
+        assert np.allclose(knls[1](a=a)[1], 2*a)
+
+    finally:
+        lp.set_executor_cache_limits(max_entries=128)
+
+
+@pytest.mark.parametrize("nchunks", [None, 7])
+def test_c_parallelize_reduction(nchunks):
+    from loopy.target.c import ExecutableCTarget
+
+    knl = lp.make_kernel(
+            "{ [i, k]: 1<=i<n and 0<=k<m }",
+            """
+            rowsum[i] = sum(k, a[i, k])  {id=rowsum}
+            maxval[0], imax[0] = argmax(k, a[3, k], k)  {id=argmax,dep=rowsum}
+            """,
+            [
+                lp.GlobalArg("a", np.float64, shape=("n", "m")),
+                lp.GlobalArg("rowsum", np.float64, shape=("n",)),
+                lp.GlobalArg("maxval", np.float64, shape=(1,)),
+                lp.GlobalArg("imax", np.int32, shape=(1,)),
+                "..."],
+            target=ExecutableCTarget(num_workers=3))
+
+    for insn_id in ["rowsum", "argmax"]:
+        knl = lp.parallelize_reduction(knl, insn_id, nchunks=nchunks)
+
+    a = np.random.rand(5, 103)
+    rowsum = np.zeros(5)
+
+    knl = lp.set_options(knl, return_dict=True)
+    evt, out = knl(a=a, rowsum=rowsum)
+
+    assert np.allclose(out["rowsum"][1:], a[1:].sum(axis=1))
+    assert out["imax"][0] == np.argmax(a[3])
+    assert out["maxval"][0] == a[3].max()
+
+
+@pytest.mark.parametrize("segmented", [False, True])
+def test_c_parallelize_scan(segmented):
+    from loopy.target.c import ExecutableCTarget
+
+    if segmented:
+        insn = ("out[i], flag_out[i] = "
+                "reduce(segmented(sum), j, a[j], segflag[j])")
+    else:
+        insn = "out[i] = sum(j, a[j])"
+
+    knl = lp.make_kernel(
+            "{ [i, j]: 0<=i<n and 0<=j<=i }",
+            insn,
+            [
+                lp.GlobalArg("a", np.float64, shape=("n",)),
+                lp.GlobalArg("segflag", np.int32, shape=("n",)),
+                lp.GlobalArg("out", np.float64, shape=("n",)),
+                lp.GlobalArg("flag_out", np.int32, shape=("n",)),
+                "..."],
+            target=ExecutableCTarget(num_workers=3))
+    if not segmented:
+        knl = lp.remove_unused_arguments(knl)
+
+    knl = lp.parallelize_reduction(knl, "insn", nchunks=6)
+
+    n = 103
+    a = np.random.rand(n)
+    segflag = (np.random.rand(n) < 0.1).astype(np.int32)
+    segflag[0] = 1
+
+    ref = np.empty(n)
+    acc = 0
+    for i in range(n):
+        acc = a[i] if segmented and segflag[i] else acc + a[i]
+        ref[i] = acc
+
+    if segmented:
+        evt, (out, flag_out) = knl(a=a, segflag=segflag)
+    else:
+        evt, (out,) = knl(a=a)
+
+    assert np.allclose(out, ref)
+
+
+def test_c_parallelize_reduction_deterministic():
+    from loopy.target.c import ExecutableCTarget
+
+    def make_knl(num_workers):
+        return lp.make_kernel(
+                "{ [k]: 0<=k<n }",
+                "out[0] = sum(k, a[k])",
+                [
+                    lp.GlobalArg("a", np.float64, shape=("n",)),
+                    lp.GlobalArg("out", np.float64, shape=(1,)),
+                    "..."],
+                target=ExecutableCTarget(num_workers=num_workers))
+
+    a = np.random.rand(10**5)
+
+    results = set()
+    for num_workers in [1, 2, 4]:
+        knl = lp.parallelize_reduction(
+                make_knl(num_workers), "insn", deterministic=True)
+        evt, (out,) = knl(a=a)
+        results.add(out[0])
+
+    assert len(results) == 1
+    assert np.isclose(results.pop(), a.sum())
+
+    with pytest.raises(lp.LoopyError):
+        lp.parallelize_reduction(make_knl(2), "insn", iname="i")
+
+
+def test_c_random123_fill():
+    from loopy.target.c.c_execution import CCompiler
+    from codepy import CompileError
+
+    compiler = CCompiler()
+    try:
+        compiler.build("random123_probe",
+                "#include <Random123/philox.h>\n"
+                "#include <Random123/threefry.h>\n")
+    except CompileError:
+        pytest.skip("Random123 headers not found")
+
+    out = np.empty(4, np.uint32)
+    lp.fill_random123(out, 0, rng="philox4x32", compiler=compiler)
+    assert list(out) == [0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8]
+
+    for rng in ["philox4x32", "threefry4x64"]:
+        out = np.empty((3, 1001), np.float64)
+        lp.fill_random123(out, 324830944, counter=5, rng=rng,
+                compiler=compiler)
+        assert (0 <= out).all()
+        assert (out < 1).all()
+        assert abs(out.mean() - 0.5) < 0.05
+
+        block_size = lp.get_random123_block_size(rng, np.float64)
+        out2 = np.empty(3003 - block_size, np.float64)
+        lp.fill_random123(out2, 324830944, counter=6, rng=rng,
+                compiler=compiler)
+        assert (out2 == out.ravel()[block_size:]).all()
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         exec(sys.argv[1])
@@ -152,6 +152,36 @@ def test_type_inference_with_type_dependencies():
     assert knl.temporary_variables["d"].dtype == to_loopy_type(np.complex128)
 
 
+def test_incremental_type_inference_for_arg_dtypes():
+    knl = lp.make_kernel(
+            "{[i]: 0<=i<n}",
+            """
+            <>a = 2.5
+            <>b = a + x[i]
+            y[i] = b + a
+            """,
+            [
+                lp.GlobalArg("x,y", shape="n"),
+                lp.ValueArg("n", np.int32)])
+
+    base_knl = lp.infer_arg_independent_types(knl)
+
+    from loopy.types import to_loopy_type
+    assert base_knl.temporary_variables["a"].dtype == to_loopy_type(np.float32)
+    assert base_knl.temporary_variables["b"].dtype is None
+    assert base_knl.arg_dict["y"].dtype is None
+
+    for dtype in [np.float32, np.float64]:
+        ref_knl = lp.infer_unknown_types(
+                lp.add_dtypes(knl, {"x": dtype}), expect_completion=True)
+        incr_knl = lp.infer_types_for_arg_dtypes(
+                base_knl, {"x": dtype}, expect_completion=True)
+
+        assert incr_knl.temporary_variables == ref_knl.temporary_variables
+        assert incr_knl.args == ref_knl.args
+        assert incr_knl.arg_dict["y"].dtype == to_loopy_type(dtype)
+
+
 def test_sized_and_complex_literals(ctx_factory):
     ctx = ctx_factory()
 
@@ -2911,6 +2941,55 @@ def test_dep_cycle_printing_and_error():
         print(lp.generate_code(knl)[0])
 
 
+def test_intern_expressions():
+    knl = lp.make_kernel(
+            "{[i]: 0<=i<n}",
+            """
+            out[i] = a[i]*a[i] + 2*a[i]
+            out2[i] = 2*a[i]
+            """)
+    knl = lp.add_and_infer_dtypes(knl, {"a": np.float32})
+
+    iknl = lp.intern_expressions(knl)
+
+    insn1, insn2 = iknl.instructions
+    prod, sum_term = insn1.expression.children
+    assert prod.children[0] is prod.children[1]
+    assert sum_term is insn2.expression
+    assert insn1.assignee.index is insn2.assignee.index
+
+    assert iknl.instructions == knl.instructions
+    assert lp.generate_code_v2(iknl).device_code() == \
+            lp.generate_code_v2(knl).device_code()
+
+    # Identity mappers preserve parts they do not change.
+    from loopy.symbolic import SubstitutionRuleExpander
+    mapped = SubstitutionRuleExpander({})(insn1.expression)
+    assert mapped is insn1.expression
+
+
+def test_copy_keeps_memoized_analyses():
+    knl = lp.make_kernel(
+            "{ [i,j]: 0<=i,j<n }",
+            "out[i, j] = 2*a[i, j]")
+
+    writer_map = knl.writer_map()
+    all_inames = knl.all_inames()
+    domain = knl.get_inames_domain(frozenset(["i"]))
+
+    # only changes tags: derived facts about instructions and domains survive
+    tagged_knl = lp.tag_inames(knl, "i:g.0")
+    assert tagged_knl.writer_map() is writer_map
+    assert tagged_knl.all_inames() is all_inames
+    assert tagged_knl.get_inames_domain(frozenset(["i"])) is domain
+
+    # changes instructions: analyses of instructions are recomputed
+    renamed_knl = lp.rename_argument(knl, "out", "result")
+    assert "result" in renamed_knl.writer_map()
+    assert "out" not in renamed_knl.writer_map()
+    assert renamed_knl.all_inames() is all_inames
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         exec(sys.argv[1])
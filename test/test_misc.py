@@ -287,6 +287,420 @@ def test_LazilyUnpicklingListWithEqAndPersistentHashing():
     # }}}
 
 
+class PickleDetectorForLazilyUnpicklingDictWithEqAndPersistentHashing(
+        PickleDetector):
+    instance_unpickled = False
+
+    def __init__(self, comparison_key):
+        self.state = comparison_key
+
+    def update_persistent_hash(self, key_hash, key_builder):
+        key_builder.rec(key_hash, repr(self.state))
+
+
+def test_LazilyUnpicklingDictWithEqAndPersistentHashing():
+    from loopy.tools import (
+            LazilyUnpicklingDictWithEqAndPersistentHashing, LoopyKeyBuilder)
+
+    cls = PickleDetectorForLazilyUnpicklingDictWithEqAndPersistentHashing
+    from pickle import loads, dumps
+
+    mapping = {"a": cls(0), "b": cls(1)}
+    lazy_mapping = loads(dumps(
+        LazilyUnpicklingDictWithEqAndPersistentHashing(mapping)))
+
+    kb = LoopyKeyBuilder()
+    assert kb(lazy_mapping) == kb(mapping)
+    assert lazy_mapping == mapping
+    assert mapping == lazy_mapping
+    assert lazy_mapping != {"a": cls(0), "b": cls(2)}
+    assert lazy_mapping != {"a": cls(0)}
+    assert not cls.instance_unpickled
+
+    assert lazy_mapping.copy()["b"].state == 1
+    assert cls.instance_unpickled
+
+
+def test_kernel_pickling_is_lazy():
+    import numpy as np
+    import loopy as lp
+    from pickle import loads, dumps
+    from loopy.tools import LoopyKeyBuilder, _PickledObject
+
+    knl = lp.make_kernel(
+            "{[i,j]: 0<=i,j<n}",
+            """
+            <> tmp[i] = 2*a[i]
+            b[i, j] = tmp[i] + j
+            """)
+    knl = lp.add_and_infer_dtypes(knl, {"a": np.float32})
+    knl = lp.get_one_scheduled_kernel(lp.preprocess_kernel(knl))
+
+    unpickled_knl = loads(dumps(knl))
+
+    def is_pickled(container):
+        items = getattr(container, "_list", None)
+        if items is None:
+            items = list(container._map.values())
+        return all(isinstance(item, _PickledObject) for item in items)
+
+    assert unpickled_knl == knl
+    assert LoopyKeyBuilder()(unpickled_knl) == LoopyKeyBuilder()(knl)
+    assert unpickled_knl.get_written_variables() == knl.get_written_variables()
+    assert [arg.name for arg in unpickled_knl.args] == [
+            arg.name for arg in knl.args]
+
+    assert is_pickled(unpickled_knl.domains)
+    assert is_pickled(unpickled_knl.temporary_variables)
+    assert is_pickled(unpickled_knl.schedule)
+
+    # hashing derived kernels agrees as well
+    assert (LoopyKeyBuilder()(unpickled_knl.copy(name="x"))
+            == LoopyKeyBuilder()(knl.copy(name="x")))
+
+    assert (lp.generate_code_v2(unpickled_knl).device_code()
+            == lp.generate_code_v2(knl).device_code())
+
+
+def test_gen_kill_dataflow():
+    from loopy.schedule.dataflow import BitsetIndex, solve_gen_kill_problem
+
+    index = BitsetIndex(["a", "b", "c"])
+
+    # 0 -> 1 -> 2 -> 3, with a loop 2 -> 1
+    successors = [{1}, {2}, {1, 3}, set()]
+
+    # {{{ liveness: 0 writes a, 1 reads a and writes b, 2 reads b, 3 reads c
+
+    gen = [index.to_bitset(names) for names in [[], ["a"], ["b"], ["c"]]]
+    kill = [index.to_bitset(names) for names in [["a"], ["b"], [], []]]
+
+    live_out, live_in = solve_gen_kill_problem(successors, gen, kill)
+
+    assert [index.to_names(bs) for bs in live_in] == [
+            frozenset(["c"]), frozenset(["a", "c"]), frozenset(["a", "b", "c"]),
+            frozenset(["c"])]
+    assert index.to_names(live_out[0]) == frozenset(["a", "c"])
+    assert live_out[3] == 0
+
+    # }}}
+
+    # {{{ forward 'must' problem: definitely assigned variables
+
+    gen = [index.to_bitset(names) for names in [["a"], ["b"], ["c"], []]]
+    kill = [0] * 4
+
+    before, after = solve_gen_kill_problem(successors, gen, kill,
+            backward=False, may=False, universe=index.universe)
+
+    assert index.to_names(before[1]) == frozenset(["a"])
+    assert index.to_names(after[2]) == frozenset(["a", "b", "c"])
+    assert index.to_names(before[3]) == frozenset(["a", "b", "c"])
+
+    # }}}
+
+
+def test_SetOperationCacheManager():
+    import islpy as isl
+    from loopy.kernel.tools import SetOperationCacheManager
+
+    mgr = SetOperationCacheManager(max_size=2)
+
+    dom = isl.BasicSet("[n] -> {[i]: 0<=i<n}")
+    dom2 = isl.BasicSet("[n] -> {[i]: 1<=i<n}")
+
+    lower = mgr.dim_min(dom, 0)
+    assert mgr.dim_min(isl.BasicSet(str(dom)), 0) == lower
+    assert mgr.get_stats()["hits"] == 1
+    assert mgr.get_stats()["misses"] == 1
+
+    mgr.dim_max(dom, 0)
+    mgr.dim_min(dom2, 0)
+    stats = mgr.get_stats()
+    assert stats["size"] == 2
+    assert stats["misses"] == 3
+
+    # least recently used entry was evicted
+    mgr.dim_min(dom, 0)
+    assert mgr.get_stats()["misses"] == 4
+
+    # equal sets with differently named dimensions are distinct
+    mgr.dim_min(isl.BasicSet("[n] -> {[j]: 0<=j<n}"), 0)
+    assert mgr.get_stats()["misses"] == 5
+
+    # {{{ opt-in disk tier for base indices and lengths
+
+    import loopy as lp
+
+    def fail(*args):
+        raise AssertionError("not found on disk")
+
+    prev_bounds_caching_enabled = lp.BOUNDS_CACHING_ENABLED
+    lp.set_bounds_caching_enabled(True)
+    try:
+        with lp.CacheMode(True):
+            result = SetOperationCacheManager().base_index_and_length(dom, "i")
+
+            mgr = SetOperationCacheManager()
+            mgr._base_index_and_length_uncached = fail
+            assert mgr.base_index_and_length(dom, "i") == result
+    finally:
+        lp.set_bounds_caching_enabled(prev_bounds_caching_enabled)
+
+    # }}}
+
+    # {{{ sharing among kernels
+
+    knl1 = lp.make_kernel("{[i]: 0<=i<n}", "a[i] = 1")
+    knl2 = lp.make_kernel("{[i]: 0<=i<n}", "b[i] = 2")
+    knl3 = lp.make_kernel("{[i]: 0<=i<m}", "a[i] = 1")
+
+    assert knl1.cache_manager is knl2.cache_manager
+    assert knl1.cache_manager is not knl3.cache_manager
+
+    # }}}
+
+
+def test_indexed_instruction_matching():
+    import loopy as lp
+    from loopy.match import parse_match
+
+    knl = lp.make_kernel(
+            "{[i,j]: 0<=i,j<n}",
+            """
+            <> tmp[i] = 2*a[i]  {id=init,tags=setup}
+            b[i, j] = tmp[i] + j  {id=compute_b,tags=compute}
+            c[i] = tmp[i] + a[i]  {id=compute_c,tags=compute:post}
+            """)
+
+    index = knl.get_instruction_match_index()
+
+    for match_str in [
+            "", "id:compute_b", "id:compute_*", "id:nonexistent",
+            "tag:compute", "tag:*", "tag:setup or tag:post",
+            "writes:tmp", "reads:tmp and not writes:c", "reads:a",
+            "iname:j", "iname:i and not iname:j", "not (id:c* or tag:setup)",
+            ]:
+        match = parse_match(match_str)
+
+        assert [insn.id for insn in index.find_instructions(match_str)] == [
+                insn.id for insn in knl.instructions if match(knl, insn)]
+
+    # parsed match expressions are shared
+    assert parse_match("id:init") is parse_match("id:init")
+
+    # the index carries over to kernels with the same instructions
+    assert knl.copy(name="other").get_instruction_match_index() is index
+
+
+def test_kernel_serialization():
+    import numpy as np
+    import loopy as lp
+    from loopy.diagnostic import LoopyError
+    from loopy.kernel.serialization import (
+            dump_kernel, load_kernel, load_kernel_fields)
+
+    knl = lp.make_kernel(
+            "{[i,j]: 0<=i,j<n}",
+            """
+            <> tmp[i] = 2*a[i] + 1
+            b[i, j] = (2*a[i] + 1)*tmp[i] + j
+            """)
+    knl = lp.add_and_infer_dtypes(knl, {"a": np.float32})
+
+    data = dump_kernel(knl)
+
+    lazy_knl = load_kernel(data)
+    assert "domains" not in lazy_knl.__dict__
+    assert [arg.name for arg in lazy_knl.args] == [
+            arg.name for arg in knl.args]
+    assert lazy_knl.get_written_variables() == knl.get_written_variables()
+    assert "instructions" not in lazy_knl.__dict__
+
+    assert lazy_knl.domains == knl.domains
+    assert lazy_knl == knl
+    assert hash(lazy_knl) == hash(knl)
+    assert load_kernel(data, lazy=False) == knl
+
+    assert (lp.generate_code_v2(load_kernel(data)).device_code()
+            == lp.generate_code_v2(knl).device_code())
+
+    # equal subexpressions are stored once
+    insn_a, insn_b = load_kernel(data).instructions
+    assert insn_a.expression is insn_b.expression.children[0].children[0]
+
+    fields = load_kernel_fields(data, ["name", "temporary_variables"])
+    assert fields == {
+            "name": knl.name,
+            "temporary_variables": knl.temporary_variables}
+
+    with pytest.raises(LoopyError):
+        load_kernel(b"not a kernel")
+
+    # isl objects survive the round trip, including dimension names with
+    # apostrophes
+    import islpy as isl
+    from loopy.kernel.serialization import _dumps, _loads
+    primed = isl.BasicSet("[n] -> { [i, j] : 0 <= i < n and 0 <= j < i }")
+    primed = primed.set_dim_name(isl.dim_type.set, 1, "i'")
+    isl_map = isl.Map("[m] -> { [i] -> [j] : j = i or j = m }")
+    loaded_primed, loaded_map = _loads(_dumps([primed, isl_map]))
+    assert loaded_primed == primed
+    assert loaded_primed.get_var_names(isl.dim_type.set) == ["i", "i'"]
+    assert loaded_map == isl_map
+
+
+def test_combined_lexer():
+    import pytools.lex
+    from pymbolic.parser import Parser
+    from loopy.symbolic import CombinedLexer, LoopyParser
+
+    for lex_table in [Parser.lex_table, LoopyParser.lex_table]:
+        lexer = CombinedLexer(lex_table)
+        assert lexer.regex is not None
+
+        for s in [
+                "a[i, j]*2.5e-3f + sin(b[[i+1]]) ** -x",
+                "x if y < 3 else z >= 4 and not w",
+                "a.b // 3 % 2 << 1.5j != 7L",
+                "reduce(sum, [i, j], a[i]) - 1e10 + .5 + 5.",
+                "f(c, d) or a == b",
+                ]:
+            def strip_match_objects(tokens):
+                return [
+                        token[:3] + (token[3] and token[3].groups(),)
+                        for token in tokens]
+
+            assert strip_match_objects(lexer(s)) == strip_match_objects(
+                    pytools.lex.lex(lex_table, s, match_objects=True))
+
+        with pytest.raises(pytools.lex.InvalidTokenError):
+            lexer("a ? b")
+
+
+def test_combined_lexer_fallback(monkeypatch):
+    import pytools.lex
+    import loopy.symbolic
+    from loopy.symbolic import CombinedLexer, LoopyParser
+
+    s = "a[i, j]*2.5e-3f + sin(b[[i+1]]) ** -x"
+    expected = LoopyParser()(s)
+
+    monkeypatch.setattr(loopy.symbolic, "_matches_rule", None)
+
+    lexer = CombinedLexer(LoopyParser.lex_table)
+    assert lexer.regex is None
+    assert [token[:3] for token in lexer(s)] == pytools.lex.lex(
+            LoopyParser.lex_table, s)
+
+    class FallbackParser(LoopyParser):
+        pass
+
+    assert FallbackParser()(s) == expected
+
+
+def test_instruction_parsing_fast_paths():
+    import loopy as lp
+    from loopy.symbolic import parse
+
+    # identical expression strings are parsed once
+    assert parse("a[i] + 2*b[i]") is parse("a[i] + 2*b[i]")
+
+    knl = lp.make_kernel(
+            "{[i]: 0<=i<n}",
+            """
+            format[i] = 1  {id=write_a0}
+            if_flag[i] = 2  {id=write_a1}
+            for i
+                elsewhere[i] = 3  {id=write_b0}
+            end
+            out[i] = format[i] + if_flag[i]  {id=read_a,dep=write_a*}
+            out2[i] = elsewhere[i]  {id=read_b,dep=write_?0,dep_query=id:write_b*}
+            out3[i] = 1  {id=other,dep=*write_*:read_*}
+            """)
+
+    id_to_insn = knl.id_to_insn
+    assert id_to_insn["read_a"].depends_on == frozenset(
+            ["write_a0", "write_a1"])
+    assert id_to_insn["read_b"].depends_on == frozenset(
+            ["write_a0", "write_b0"])
+    assert id_to_insn["other"].depends_on == frozenset(
+            insn.id for insn in knl.instructions if insn.id != "other")
+
+
+def test_cli_batch(tmpdir):
+    import json
+    import loopy as lp
+    from loopy.cli import batch_main
+
+    for name in ["a", "b", "c"]:
+        tmpdir.join(name + ".loopy").write(
+                "lp_knl = lp.make_kernel(\n"
+                "        '{[i]: 0<=i<n}',\n"
+                "        'out[i] = 2*inp[i]',\n"
+                "        [lp.GlobalArg('inp,out', np.float32, shape='n'), '...'],\n"
+                "        name='knl_%s')\n" % name)
+
+    infiles = [str(tmpdir.join(name + ".loopy")) for name in ["a", "b", "c"]]
+    outdir = tmpdir.join("out")
+
+    default_target = lp._DEFAULT_TARGET
+
+    def build(*extra_args):
+        assert batch_main(
+                infiles + ["-o", str(outdir), "--target", "opencl",
+                    "--target", "c"] + list(extra_args)) == 0
+
+        with open(str(outdir.join("manifest.json"))) as manifest_fd:
+            return json.load(manifest_fd)["files"]
+
+    results = build("-j", "2")
+    assert set(result["status"] for result in results.values()) == set(["built"])
+    assert "knl_b" in outdir.join("opencl", "b.cl").read()
+    assert "knl_b" in outdir.join("c", "b.c").read()
+    assert set(results[infiles[1]]["timings"]["c"]) == set([
+        "translation", "preprocessing", "scheduling", "codegen"])
+
+    # only changed inputs are rebuilt
+    tmpdir.join("b.loopy").write(
+            "lp_knl = lp.split_iname(lp_knl, 'i', 4)\n", mode="a")
+    results = build("-j", "1")
+    assert [results[infile]["status"] for infile in infiles] == [
+            "unchanged", "built", "unchanged"]
+    assert "i_inner" in outdir.join("c", "b.c").read()
+
+    # inputs built in this process leave the default target alone
+    assert lp._DEFAULT_TARGET is default_target
+
+    results = build("--force")
+    assert [results[infile]["status"] for infile in infiles] == ["built"]*3
+
+    # the order of the targets does not matter
+    assert batch_main(
+            infiles + ["-o", str(outdir), "--target", "c",
+                "--target", "opencl", "--target", "c"]) == 0
+    results = build()
+    assert [results[infile]["status"] for infile in infiles] == ["unchanged"]*3
+
+    # failures are reported in the manifest and the exit status, and the
+    # outputs of earlier builds are removed
+    tmpdir.join("c.loopy").write("lp_knl = None\n")
+    assert outdir.join("c", "c.c").check()
+    assert batch_main(infiles + ["-o", str(outdir), "--target", "c"]) == 1
+    assert lp._DEFAULT_TARGET is default_target
+    assert not outdir.join("c", "c.c").check()
+
+    with open(str(outdir.join("manifest.json"))) as manifest_fd:
+        results = json.load(manifest_fd)["files"]
+    assert results[infiles[2]]["status"] == "failed"
+    assert results[infiles[2]]["outputs"] == {}
+
+    # inputs no longer given are dropped from the manifest
+    assert batch_main(infiles[:2] + ["-o", str(outdir), "--target", "c"]) == 0
+    with open(str(outdir.join("manifest.json"))) as manifest_fd:
+        assert set(json.load(manifest_fd)["files"]) == set(infiles[:2])
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         exec(sys.argv[1])
@@ -1179,6 +1179,125 @@ def test_strided_footprint():
     assert 2*num < denom
 
 
+def test_performance_model():
+    knl = lp.make_kernel(
+            "{[i,j]: 0<=i,j<n}",
+            "out[i] = sum(j, a[i, j]*x[j])",
+            [lp.GlobalArg("a", np.float64, shape="n, n"), "..."],
+            assumptions="n>=1")
+    knl = lp.add_and_infer_dtypes(knl, dict(x=np.float64))
+
+    machine = lp.MachineDescription(
+            op_throughput={np.float64: 1e9},
+            global_bandwidth=1e10,
+            cache_bandwidth=1e11)
+
+    n = 512
+    params = {"n": n}
+    estimate = lp.get_performance_model(knl, machine)(params)
+
+    footprint_bytes = 8*(n*n + 2*n)
+    access_bytes = 8*(2*n*n + n)
+    assert np.isclose(estimate.compute_time, 2*n*n/1e9)
+    assert np.isclose(estimate.global_memory_time,
+            footprint_bytes/1e10 + (access_bytes - footprint_bytes)/1e11)
+    assert estimate.bottleneck == "compute"
+    assert estimate.total_time == estimate.compute_time
+
+    # work items of a sub-group access a with stride n, x with stride 0
+    uncoalesced_knl = lp.split_iname(knl, "i", 32,
+            outer_tag="g.0", inner_tag="l.0")
+    estimate = lp.get_performance_model(
+            uncoalesced_knl, machine.copy(op_throughput={np.float64: 1e12}))(
+                    params)
+    assert estimate.bottleneck == "global memory"
+    assert np.isclose(estimate.global_memory_time,
+            footprint_bytes/1e10
+            + (64*n*n + 8*n*n/32 + 8*n - footprint_bytes)/1e11)
+
+    ranking = lp.rank_kernel_variants([uncoalesced_knl, knl], machine, params)
+    assert [variant for _, variant in ranking] == [knl, uncoalesced_knl]
+
+
+def test_calibrate_machine_description():
+    machine = lp.calibrate_machine_description(
+            dtypes=[np.float32], global_memory_bytes=2**20, cache_bytes=2**14,
+            repeats=4, nruns=1)
+
+    assert machine.global_bandwidth > 0
+    assert machine.cache_bandwidth >= machine.global_bandwidth
+    assert machine.get_op_throughput(np.float32) > 0
+    assert machine.get_op_throughput(np.int32) > 0
+
+
+def test_memory_access_trace():
+    n = 64
+    knl = lp.make_kernel(
+            "{[i]: 0<=i<n}",
+            "out[i] = a[i] + a[n-1-i]",
+            [lp.GlobalArg("a,out", np.float64, shape="n"), "..."],
+            target=lp.CTarget())
+
+    trace = lp.get_memory_access_trace(knl, {"n": n}, alignment=1024)
+    assert trace.array_names == ["a", "out"]
+
+    i = np.arange(n)
+    expected = np.empty((n, 3), dtype=np.int64)
+    expected[:, 0] = 8*i
+    expected[:, 1] = 8*(n-1-i)
+    expected[:, 2] = trace.array_base_addresses["out"] + 8*i
+    assert (trace.addresses == expected.ravel()).all()
+    assert (trace.is_write == np.tile([False, False, True], n)).all()
+
+    # work groups one after the other, work items in order
+    par_knl = lp.split_iname(knl, "i", 16, outer_tag="g.0", inner_tag="l.0")
+    par_trace = lp.get_memory_access_trace(par_knl, {"n": n}, alignment=1024)
+    assert (np.sort(par_trace.addresses[par_trace.is_write])
+            == par_trace.addresses[par_trace.is_write]).all()
+    assert sorted(par_trace.addresses) == sorted(trace.addresses)
+
+
+def test_simulate_cache():
+    n = 256
+    knl = lp.make_kernel(
+            "{[i,j]: 0<=i,j<n}",
+            "out[i, j] = a[i, j]",
+            [lp.GlobalArg("a,out", np.float64, shape="n, n"), "..."],
+            target=lp.CTarget())
+    knl = lp.prioritize_loops(knl, "i,j")
+
+    levels = [lp.CacheLevel("L1", 32*1024, line_size=64, associativity=8)]
+
+    result = lp.simulate_cache(knl, {"n": n}, levels)
+    a_stats, = result.by_array["a"]
+    out_stats, = result.by_array["out"]
+
+    nlines = n*n*8//64
+    assert a_stats.accesses == n*n
+    assert a_stats.misses == nlines
+    assert a_stats.traffic_bytes == nlines*64
+    # write-allocate fetches, then write-backs
+    assert out_stats.misses == nlines
+    assert out_stats.traffic_bytes == 2*nlines*64
+
+    assert result.total[0].hit_rate == 1 - 1/8
+
+    # Accessing a column at a time uses 2 of the 64 sets, which cannot hold
+    # the lines of a column.
+    transposed_knl = lp.prioritize_loops(
+            lp.set_loop_priority(knl, []), "j,i")
+    result = lp.simulate_cache(transposed_knl, {"n": n}, levels)
+    assert result.total[0].hit_rate == 0
+
+    levels.append(lp.CacheLevel("L2", 1024*1024, line_size=64,
+        associativity=16))
+    result = lp.simulate_cache(transposed_knl, {"n": n}, levels)
+    l1_stats, l2_stats = result.total
+    assert l2_stats.accesses == l1_stats.traffic_bytes // 64
+    # but the L2 can hold the lines of the columns of a and out
+    assert l2_stats.hit_rate > 0.8
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         exec(sys.argv[1])
@@ -227,6 +227,58 @@ def test_random123(ctx_factory, tp):
     assert (0 <= out).all()
 
 
+# first words of the known-answer tests of Random123, for zero counter and key
+RANDOM123_KAT_WORDS = {
+        "philox4x32": [0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8],
+        "threefry4x64": [
+            0x09218ebde6c85537, 0x55941f5266d86105,
+            0x4bd25e16282434dc, 0xee29ec846bd2e40b],
+        }
+
+
+@pytest.mark.parametrize(("rng", "dtype"), [
+    ("philox4x32", np.uint32),
+    ("philox4x32", np.float32),
+    ("philox4x32", np.float64),
+    ("threefry4x64", np.uint64),
+    ("threefry4x64", np.float64),
+    ])
+def test_random123_fill(ctx_factory, rng, dtype):
+    ctx = ctx_factory()
+    queue = cl.CommandQueue(ctx)
+
+    import pyopencl.array as cl_array
+
+    key = (324830944, 234181)
+    if rng == "threefry4x64":
+        key = key + (2233, 2)
+
+    out = np.empty((5, 1001), dtype)
+    assert lp.fill_random123(out, key, counter=17, rng=rng, queue=queue) is out
+
+    out_dev = cl_array.empty(queue, (5005,), dtype)
+    lp.fill_random123(out_dev, key, counter=17, rng=rng)
+    assert (out_dev.get() == out.ravel()).all()
+
+    # the blocks following the first three
+    block_size = lp.get_random123_block_size(rng, dtype)
+    out_dev = cl_array.empty(queue, (5005 - 3*block_size,), dtype)
+    lp.fill_random123(out_dev, key, counter=20, rng=rng)
+    assert (out_dev.get() == out.ravel()[3*block_size:]).all()
+
+    if dtype in [np.float32, np.float64]:
+        assert (0 <= out).all()
+        assert (out < 1).all()
+        assert abs(out.mean() - 0.5) < 0.05
+    else:
+        kat_out = np.empty(4, dtype)
+        lp.fill_random123(kat_out, 0, rng=rng, queue=queue)
+        assert list(kat_out) == RANDOM123_KAT_WORDS[rng]
+
+    with pytest.raises(lp.LoopyError):
+        lp.fill_random123(out, key, rng="philox4x16", queue=queue)
+
+
 def test_tuple(ctx_factory):
     ctx = ctx_factory()
     queue = cl.CommandQueue(ctx)
@@ -245,6 +245,96 @@ def test_alias_temporaries(ctx_factory):
             parameters=dict(n=30))
 
 
+def test_reuse_temporary_storage(ctx_factory):
+    ctx = ctx_factory()
+
+    knl = lp.make_kernel(
+        "{[i]: 0<=i<n}",
+        """
+        times2(i) := 2*a[i]
+        times3(i) := 3*a[i]
+        times4(i) := 4*a[i]
+
+        x[i] = times2(i)
+        y[i] = times3(i)
+        z[i] = times4(i)
+        """)
+
+    knl = lp.add_and_infer_dtypes(knl, {"a": np.float32})
+
+    ref_knl = knl
+
+    knl = lp.split_iname(knl, "i", 16, outer_tag="g.0", inner_tag="l.0")
+
+    knl = lp.precompute(knl, "times2", "i_inner", default_tag="l.auto")
+    knl = lp.precompute(knl, "times3", "i_inner", default_tag="l.auto")
+    knl = lp.precompute(knl, "times4", "i_inner", default_tag="l.auto")
+
+    # all three local temporaries are written before the single barrier
+    knl = lp.get_one_scheduled_kernel(lp.preprocess_kernel(knl))
+    assert lp.reuse_temporary_storage(knl) == knl
+
+    # local temporaries separated by a barrier
+    def make_local_knl(barrier):
+        knl = lp.make_kernel(
+            "{[i,j]: 0<=i,j<16}",
+            """
+            <> u[i] = a[i] {id=u}
+            ... lbarrier {id=b1, dep=u}
+            y[i] = u[15-i] {id=y, dep=b1}
+            %s
+            <> v[j] = 2*a[j] {id=v, dep=%s}
+            ... lbarrier {id=b2, dep=v}
+            z[j] = v[15-j] {id=z, dep=b2}
+            """ % (
+                ("... lbarrier {id=b3, dep=y}", "b3") if barrier
+                else ("", "y")))
+        knl = lp.add_and_infer_dtypes(knl, {"a": np.float32})
+        knl = lp.tag_inames(knl, {"i": "l.0", "j": "l.0"})
+        return lp.set_temporary_scope(knl, "u,v", "local")
+
+    knl = make_local_knl(barrier=False)
+    knl = lp.get_one_scheduled_kernel(lp.preprocess_kernel(knl))
+    assert lp.reuse_temporary_storage(knl) == knl
+
+    ref_knl = make_local_knl(barrier=True)
+    knl = lp.get_one_scheduled_kernel(lp.preprocess_kernel(ref_knl))
+    knl = lp.reuse_temporary_storage(knl)
+    assert lp.get_temporary_storage_footprint(knl) == {
+            lp.temp_var_scope.LOCAL: 16*4}
+
+    lp.auto_test_vs_ref(ref_knl, ctx, knl)
+
+    # a chain of private arrays
+    knl = lp.make_kernel(
+        "{[i,j,k,l]: 0<=i,j,k,l<16}",
+        """
+        <> p[i] = a[i] {id=p}
+        <> q[j] = 2*p[j] {id=q, dep=p}
+        <> r[k] = 3*q[k] {id=r, dep=q}
+        <> s[l] = r[l] + 1 {id=s, dep=r}
+        out[l] = s[l] {dep=s}
+        """)
+    knl = lp.add_and_infer_dtypes(knl, {"a": np.float32})
+    for name in "pqrs":
+        knl = lp.set_temporary_scope(knl, name, "private")
+
+    ref_knl = knl
+
+    knl = lp.get_one_scheduled_kernel(lp.preprocess_kernel(knl))
+    knl = lp.reuse_temporary_storage(knl)
+
+    # p and r, as well as q and s, share storage.
+    tv = knl.temporary_variables
+    assert tv["p"].base_storage == tv["r"].base_storage is not None
+    assert tv["q"].base_storage == tv["s"].base_storage is not None
+    assert tv["p"].base_storage != tv["q"].base_storage
+    assert lp.get_temporary_storage_footprint(knl) == {
+            lp.temp_var_scope.PRIVATE: 2*16*4}
+
+    lp.auto_test_vs_ref(ref_knl, ctx, knl)
+
+
 def test_vectorize(ctx_factory):
     ctx = ctx_factory()
 
@@ -291,6 +381,66 @@ def test_extract_subst(ctx_factory):
     assert insn.expression == parse("bsquare(23) + bsquare(25)")
 
 
+def test_memoized_subst_expansion():
+    knl = lp.make_kernel(
+            "{[i]: 0<=i<n}",
+            """
+            sq(x) := x*x
+            quad(x) := sq(x)*sq(x)
+            a[i] = quad(b[i])  {id=insn_a,tags=first}
+            c[i] = quad(b[i])  {id=insn_c}
+            """)
+
+    # Rule bodies mapped under the same expansion state are shared.
+    expanded = lp.expand_subst(knl)
+    insn_a, insn_c = expanded.instructions
+    assert insn_a.expression is insn_c.expression
+
+    from loopy.symbolic import parse
+    assert insn_a.expression == parse("b[i]*b[i]*b[i]*b[i]")
+
+    # ... but not where within filters tell instructions apart.
+    for within in ["id:insn_a", "tag:first", "id:insn_a > id:quad"]:
+        expanded = lp.expand_subst(knl, within=within)
+        insn_a, insn_c = expanded.instructions
+        assert insn_a.expression == parse("b[i]*b[i]*b[i]*b[i]")
+        assert insn_c.expression == parse("quad(b[i])")
+
+    expanded = lp.expand_subst(knl, within="... > id:sq")
+    assert "sq" not in expanded.substitutions
+    insn_a, insn_c = expanded.instructions
+    assert insn_a.expression == insn_c.expression == parse("quad(b[i])")
+
+    # Arguments of equal value but differing type must not share results.
+    knl = lp.make_kernel(
+            "{[i]: 0<=i<n}",
+            """
+            f(x) := x*x
+            a[i] = f(3)
+            b[i] = f(3.0)
+            c[i] = f(3.0f)
+            d[i] = f(3*n)
+            e[i] = f(3.0*n)
+            """)
+    import pymbolic.primitives as p
+
+    def get_constant_types(expr):
+        if isinstance(expr, p.Variable):
+            return set()
+        elif isinstance(expr, p.Expression):
+            return set().union(*[
+                get_constant_types(child) for child in expr.children])
+        else:
+            return set([type(expr)])
+
+    expected_types = {
+            "a": int, "b": float, "c": np.float32, "d": int, "e": float}
+
+    for insn in lp.expand_subst(knl).instructions:
+        assert (get_constant_types(insn.expression)
+                == set([expected_types[insn.assignee.aggregate.name]]))
+
+
 def test_join_inames(ctx_factory):
     ctx = ctx_factory()
 
@@ -313,6 +463,106 @@ def test_join_inames(ctx_factory):
     lp.auto_test_vs_ref(ref_knl, ctx, knl, print_ref_code=True)
 
 
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_auto_tile(ctx_factory, prefetch):
+    ctx = ctx_factory()
+
+    knl = lp.make_kernel(
+            "{[i,j,k]: 0<=i,j,k<n}",
+            "c[i, j] = sum(k, a[i, k]*b[k, j])",
+            [lp.GlobalArg("a,b,c", np.float32, shape=("n", "n")), "..."])
+
+    ref_knl = knl
+
+    knl = lp.auto_tile(knl, cache_sizes=(2048, 65536), parameters={"n": 200},
+            prefetch=prefetch)
+
+    assert set(knl.all_inames()) >= set([
+        "i_outer", "i_inner", "j_outer", "j_inner", "k_outer", "k_inner"])
+    assert knl.iname_tags_of_type("j_inner", lp.kernel.data.LoopedIlpTag)
+    assert not knl.iname_tags("k_inner")
+
+    if prefetch:
+        assert set(knl.temporary_variables) >= set(["a_fetch", "b_fetch"])
+
+    lp.auto_test_vs_ref(ref_knl, ctx, knl, parameters=dict(n=200))
+
+    # unknown extents are not tiled
+    with pytest.warns(lp.diagnostic.LoopyWarning):
+        assert lp.auto_tile(ref_knl) == ref_knl
+
+
+def test_get_iname_dependence_kinds():
+    par = lp.iname_dependence_kind.PARALLEL
+    red = lp.iname_dependence_kind.REDUCTION
+    seq = lp.iname_dependence_kind.SEQUENTIAL
+
+    def get_kinds(domain, instructions):
+        knl = lp.make_kernel(domain, instructions,
+                [lp.GlobalArg("a,b", np.float64, shape=lp.auto), "..."])
+        return lp.get_iname_dependence_kinds(knl)
+
+    assert get_kinds("{[i,j]: 1<=i,j<n}", "a[i, j] = a[i, j-1] + 1") == {
+            "i": par, "j": seq}
+    assert get_kinds("{[i,j]: 0<=i,j<n}", "b[i] = sum(j, a[i, j])") == {
+            "i": par, "j": red}
+
+    # accumulation into a location independent of the loop
+    assert get_kinds("{[i]: 0<=i<n}", """
+            <> s = 0 {id=init}
+            s = s + a[i] {id=acc, dep=init}
+            b[0] = s {dep=acc}
+            """) == {"i": red}
+
+    # temporaries written before being read in each iteration are private
+    assert get_kinds("{[i,j]: 0<=i,j<n}", """
+            <> t = 2*a[i, j] {id=t}
+            b[i, j] = t {dep=t}
+            """) == {"i": par, "j": par}
+
+    # ... but not if they are only written conditionally
+    knl = lp.make_kernel("{[i]: 0<=i<n}", """
+            <float64> t = a[i] {id=w, if=c[i] > 0}
+            b[i] = t {dep=w}
+            """, [lp.GlobalArg("a,b,c", np.float64, shape=lp.auto), "..."])
+    assert lp.get_iname_dependence_kinds(knl) == {"i": seq}
+    assert not lp.auto_parallelize(knl).iname_tags("i")
+
+    # the outer loop carries the dependence, but would no longer be outside
+    # once the inner loop is parallelized
+    assert get_kinds("{[t,i]: 0<=t<m and 1<=i<n-1}",
+            "a[t+1, i] = a[t, i-1] + a[t, i+1]") == {"t": seq, "i": seq}
+
+    # data-dependent indices may refer to anything
+    assert get_kinds("{[i]: 0<=i<n}", "a[b[i]] = 1") == {"i": seq}
+
+
+def test_auto_parallelize(ctx_factory):
+    ctx = ctx_factory()
+
+    knl = lp.make_kernel(
+            "{[i,j,k]: 0<=i,j,k<n}",
+            """
+            <> acc = 0 {id=init, inames=i:j}
+            acc = acc + a[i, k]*b[k, j] {id=update, dep=init}
+            c[i, j] = acc {dep=update}
+            """,
+            [lp.GlobalArg("a,b,c", np.float32, shape=("n", "n")), "..."])
+
+    ref_knl = knl
+
+    # i is further outside, since accesses are contiguous along j
+    knl = lp.auto_parallelize(knl)
+    assert knl.iname_tags("i") == frozenset([lp.kernel.data.GroupIndexTag(0)])
+    assert not knl.iname_tags("j")
+
+    knl = lp.auto_parallelize(knl)
+    assert knl.iname_tags("j") == frozenset([lp.kernel.data.GroupIndexTag(1)])
+    assert lp.auto_parallelize(knl) == knl
+
+    lp.auto_test_vs_ref(ref_knl, ctx, knl, parameters=dict(n=50))
+
+
 def test_tag_data_axes(ctx_factory):
     ctx = ctx_factory()
 
@@ -533,6 +783,57 @@ def test_uniquify_instruction_ids():
     assert all(isinstance(id, str) for id in insn_ids)
 
 
+def test_transform_result_cache(tmpdir, monkeypatch):
+    from loopy.tools import LoopyKeyBuilder
+    import loopy.transform.cache as tcache
+
+    cache = tcache.TransformResultCache(
+            "loopy-test-transform-result-cache",
+            key_builder=LoopyKeyBuilder(), container_dir=str(tmpdir))
+    monkeypatch.setattr(tcache, "transform_result_cache", cache)
+    monkeypatch.setattr(lp, "CACHING_ENABLED", True)
+    monkeypatch.setattr(lp, "TRANSFORM_CACHING_ENABLED", True)
+
+    def make_knl():
+        knl = lp.make_kernel(
+                "{[i,j]: 0<=i,j<n}",
+                "a[i,j] = b[i,j] + 1",
+                [lp.GlobalArg("a,b", np.float32, shape=("n", "n")), "..."])
+        return lp.prioritize_loops(knl, "i,j")
+
+    def transform(knl):
+        knl = lp.split_iname(knl, "i", 16, inner_tag="l.0")
+        return lp.add_prefetch(knl, "b", ["i_inner", "j"], default_tag="l.auto")
+
+    ref_knl = transform(make_knl())
+    assert cache.hits == 0
+    # add_prefetch calls precompute, which is not cached separately.
+    assert cache.misses == 2
+
+    knl = transform(make_knl())
+    assert cache.hits == 2
+    assert knl == ref_knl
+
+    # different arguments miss
+    lp.split_iname(make_knl(), "i", 8)
+    assert cache.misses == 3
+
+    # entries are shared with other instances, e.g. in other processes
+    other_cache = tcache.TransformResultCache(
+            "loopy-test-transform-result-cache",
+            key_builder=LoopyKeyBuilder(), container_dir=str(tmpdir))
+    monkeypatch.setattr(tcache, "transform_result_cache", other_cache)
+    assert transform(make_knl()) == ref_knl
+    assert other_cache.hits == 2
+    monkeypatch.setattr(tcache, "transform_result_cache", cache)
+
+    # disk usage stays bounded
+    cache.prune(max_size=0)
+    assert cache.get_disk_usage() == 0
+    transform(make_knl())
+    assert cache.hits == 2
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         exec(sys.argv[1])